@@ -0,0 +1,308 @@
+import argparse
+import itertools
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Elevator_System')))
+from elevator_shared.archive import ReceiptArchiver
+from elevator_shared.billing import BillingEngine
+from elevator_shared.db import ARCHIVE_SCHEMA, ParkingRepository, SCHEMA, nearest_free_spot, select_spot
+from elevator_shared.migrations import migrate
+
+# Size of the seeded database
+default_receipts = 1000000
+default_spots = 10000
+
+# Receipts closed before this are seeded into the archive database
+archived_before = "2024-10-15"
+
+# Statements issued by the scripts in this folder, with sample parameters
+script_queries = [
+    ("UpdateSpotStatus.get_parking_spot_details",
+     "SELECT Spot_ID, Spot_type, Level_ID, Is_occupied FROM Parking_Spots WHERE Spot_ID = ?", (42,)),
+]
+
+# Lookups through the history views (db.py) that span the hot and
+# archived tables
+history_queries = [
+    ("Receipt_History by receipt", "SELECT * FROM Receipt_History WHERE Receipt_ID = ?", ("H00000001",)),
+    ("Receipt_History by exit time", "SELECT * FROM Receipt_History WHERE Exit_time >= ? AND Exit_time < ?",
+     ("2024-10-01", "2024-10-02")),
+    ("Payment_History by receipt", "SELECT * FROM Payment_History WHERE Receipt_ID = ?", ("H00000001",)),
+]
+
+# Tables a statement is allowed to read in full, keyed by step name. The
+# overview lists every spot, so walking Parking_Spots is the point of it.
+# Pruning snapshots walks Spot_Snapshots, which only ever holds a few rows.
+allowed_scans = {
+    "parking_overview": {"ps"},
+    "parking_overview_at": {"ps"},
+    "event_log_snapshot": {"Spot_Snapshots"},
+}
+
+# Steps allowed to sort in a temp B-tree: the overview orders every spot
+# by level, which no index on Parking_Spots gives
+allowed_sorts = {"parking_overview", "parking_overview_at"}
+
+# Steps whose whole purpose is a full read (loading the spot index,
+# listing spots for the canvas, clearing the garage, counting rows) are
+# not checked
+unchecked_steps = {"list_spots", "clear_all_parking_spots", "archive_counts"}
+
+# Any SCAN of a table reads all of it, unless a covering index other than
+# the primary key's serves it; SCAN CONSTANT ROW and subqueries are not tables
+table_scan = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)(?: USING (COVERING )?INDEX (\S+))?")
+temp_sort = re.compile(r"^USE TEMP B-TREE FOR ")
+# A view or subquery run on its own; the SCAN of its rows that follows is
+# not a table read, and its own steps are checked
+subquery_result = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+
+
+def seed_database(path, spots, receipts):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rng = random.Random(7)
+    levels = (spots + 1) // 2
+    occupied = set(rng.sample(range(1, spots + 1), spots // 2))
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right',
+         spot_id in occupied, True, 200 + spot_id)
+        for spot_id in range(1, spots + 1)))
+    conn.executemany("INSERT INTO Levels VALUES (?, ?)", ((level, f"Level {level}") for level in range(1, levels + 1)))
+
+    # Closed history, then one open receipt per occupied spot
+    def rows():
+        for n in range(receipts - len(occupied)):
+            day = 1 + n % 28
+            yield (f"H{n:08d}", f"2024-10-{day:02d} 08:00:00", f"2024-10-{day:02d} 17:00:00", rng.randint(1, spots))
+        for n, spot_id in enumerate(sorted(occupied)):
+            yield (f"O{n:08d}", "2024-11-24 09:00:00", None, spot_id)
+    conn.executemany("INSERT INTO Parking_Receipts VALUES (?, ?, ?, ?)", rows())
+    conn.execute("""
+        INSERT INTO Payments (Payment_ID, Receipt_ID, Payment_time, Amount, Payment_method)
+        SELECT rowid, Receipt_ID, Exit_time, 12.5, 'card' FROM Parking_Receipts WHERE Exit_time IS NOT NULL
+    """)
+    conn.commit()
+    conn.close()
+    return sorted(occupied)
+
+
+# Moves the receipts closed before archived_before, with their payments,
+# into the archive database in one go, as a long-running archive job would
+# have by now
+def seed_archive(path, archive_path):
+    conn = sqlite3.connect(path)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    conn.executescript(ARCHIVE_SCHEMA)
+    conn.execute("""
+        INSERT INTO archive.Payments SELECT p.* FROM Payments p
+        JOIN Parking_Receipts pr ON pr.Receipt_ID = p.Receipt_ID WHERE pr.Exit_time < ?
+    """, (archived_before,))
+    conn.execute("DELETE FROM Payments WHERE Receipt_ID IN (SELECT Receipt_ID FROM archive.Payments)")
+    conn.execute("INSERT INTO archive.Parking_Receipts SELECT * FROM Parking_Receipts WHERE Exit_time < ?",
+                 (archived_before,))
+    conn.execute("DELETE FROM Parking_Receipts WHERE Exit_time < ?", (archived_before,))
+    conn.commit()
+    conn.close()
+
+
+# Receipts the repository calls below look up: one still open, and one
+# closed on 2024-10-15 that is still in the hot table
+open_receipt = "O00000000"
+closed_receipt = "H00000014"
+
+# Every repository, billing and archive call checked, as (step name,
+# call). Each call gets the traced repository, billing engine and archiver,
+# the occupied spots and the nearest free spot.
+repository_steps = [
+    ("billing_quote", lambda t: t.engine.quote(open_receipt)),
+    ("billing_settle", lambda t: t.engine.settle(closed_receipt)),
+    ("billing_recompute", lambda t: t.engine.recompute("2024-10-20", "2024-10-21")),
+    ("billing_audit", lambda t: t.engine.audit("2024-10-01", "2024-11-01")),
+    ("billing_bill_unpaid", lambda t: t.engine.bill_unpaid("2024-10-01", "2024-11-01")),
+    ("archive_chunk", lambda t: t.archiver.archive_chunk("2024-10-20")),
+    ("archive_find", lambda t: t.archiver.find("H00000001")),
+    ("archive_counts", lambda t: t.archiver.counts()),
+    ("find_available_platform", lambda t: t.repo.find_available_platform()),
+    ("validate_receipt", lambda t: t.repo.validate_receipt(open_receipt)),
+    ("get_spot", lambda t: t.repo.get_spot(t.occupied[0])),
+    ("parking_overview", lambda t: t.repo.parking_overview()),
+    ("parking_overview_at", lambda t: t.repo.parking_overview_at()),
+    ("open_receipt", lambda t: t.repo.open_receipt(t.occupied[0])),
+    ("update_spot_status", lambda t: t.repo.update_spot_status(t.occupied[1], True)),
+    ("apply_parking_events", lambda t: t.repo.apply_parking_events(
+        [("Parked", t.occupied[3], '2024-11-24 12:00:00'), ("Retrieved", t.occupied[3], '2024-11-24 13:00:00')])),
+    ("apply_sensor_readings", lambda t: t.repo.apply_sensor_readings(
+        [(1, t.occupied[2])], [(200 + t.occupied[2], t.occupied[2], 'Occupied', '2024-11-24 12:00:00')])),
+    ("insert_parking_receipt", lambda t: t.repo.insert_parking_receipt(t.occupied[1], "TRACE0")),
+    ("update_exit_time", lambda t: t.repo.update_exit_time("TRACE0")),
+    ("park", lambda t: t.repo.park()),
+    ("park_selected_spot", lambda t: t.repo.park(select_spot(t.free_spot), "TRACE2")),
+    ("retrieve", lambda t: t.repo.retrieve(open_receipt)),
+    ("set_spot_operational", lambda t: t.repo.set_spot_operational(t.occupied[4], False)),
+    ("event_log_state", lambda t: t.repo.event_log.state),
+    ("event_log_snapshot", lambda t: snapshot_after(t.repo, lambda: t.repo.update_spot_status(t.occupied[4], False))),
+]
+
+
+# Runs every repository step once and records the SQL each one issued
+def trace_repository(path, archive_path, occupied):
+    trace_ids = (f"TRACE{n}" for n in itertools.count(1))
+    repo = ParkingRepository(path, readers=1, receipt_id_factory=lambda: next(trace_ids),
+                             archive_path=archive_path)
+    traced = types.SimpleNamespace(repo=repo, engine=BillingEngine(repo),
+                                   archiver=ReceiptArchiver(repo, archive_path, pause_s=0),
+                                   occupied=occupied, free_spot=nearest_free_spot_id(path))
+    statements = []
+    current = [None]
+
+    def record(sql):
+        text = sql.strip()
+        if current[0] and not re.match(r"^(BEGIN|COMMIT|ROLLBACK|PRAGMA)\b", text, re.I):
+            statements.append((current[0], text))
+
+    # Load the spot index and the event log state before tracing; each
+    # reads the whole of Parking_Spots once by design
+    repo.spot_index
+    repo.event_log.state
+    repo.pool.set_trace_callback(record)
+    try:
+        with repo.pool.read() as conn:
+            current[0] = "nearest_free_spot"
+            nearest_free_spot(conn)
+        for name, step in repository_steps:
+            current[0] = name
+            step(traced)
+    finally:
+        current[0] = None
+        repo.pool.set_trace_callback(None)
+        repo.close()
+    return statements
+
+
+# Runs a step with the event log due for a snapshot
+def snapshot_after(repo, step):
+    every = repo.event_log.snapshot_every
+    repo.event_log.snapshot_every = 1
+    try:
+        step()
+    finally:
+        repo.event_log.snapshot_every = every
+
+
+def nearest_free_spot_id(path):
+    conn = sqlite3.connect(path)
+    try:
+        return nearest_free_spot(conn)[0]
+    finally:
+        conn.close()
+
+
+def plan_problems(conn, name, sql, params=()):
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    details = [row[3] for row in plan]
+    subqueries = {match.group(1) for match in map(subquery_result.match, details) if match}
+    problems = []
+    for detail in details:
+        match = table_scan.match(detail)
+        if match and match.group(1) in subqueries:
+            continue
+        if match:
+            covering = match.group(2) and not match.group(3).startswith("sqlite_autoindex_")
+            if not covering and match.group(1) not in allowed_scans.get(name, set()):
+                problems.append(detail)
+        elif temp_sort.match(detail) and name not in allowed_sorts:
+            problems.append(detail)
+    return details, problems
+
+
+# Names of the steps whose statements are checked, in the order they run
+def checked_step_names():
+    names = ["nearest_free_spot"] + [name for name, _ in repository_steps if name not in unchecked_steps]
+    return names + [name for name, _, _ in script_queries + history_queries]
+
+
+# Seeds the database and its archive in directory tmp and brings the
+# schema up to date; returns (path, archive_path, occupied Spot_IDs)
+def prepare_database(tmp, spots, receipts):
+    path = os.path.join(tmp, 'plans.db')
+    occupied = seed_database(path, spots, receipts)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    migrate(conn)
+    conn.execute("COMMIT")
+    conn.close()
+    archive_path = os.path.join(tmp, 'plans_archive.db')
+    seed_archive(path, archive_path)
+    return path, archive_path, occupied
+
+
+# Plans are checked on a connection set up like the repository's: archive
+# attached, history views and the archive job's batch table
+def plan_connection(path, archive_path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    ParkingRepository._setup_archive(conn)
+    conn.execute("CREATE TEMP TABLE Archive_Batch (Receipt_ID TEXT PRIMARY KEY)")
+    conn.execute("ANALYZE")
+    return conn
+
+
+# (name, sql, params) for every distinct statement to check: those the
+# repository steps issued, then the scripts' and the history views' own
+def checked_statements(path, archive_path, occupied):
+    queries = trace_repository(path, archive_path, occupied)
+    queries += [(name, sql, params) for name, sql, params in script_queries + history_queries]
+    statements = []
+    seen = set()
+    for query in queries:
+        name, sql = query[0], query[1]
+        params = query[2] if len(query) > 2 else ()
+        key = (name, " ".join(sql.split()))
+        if key in seen or name in unchecked_steps:
+            continue
+        seen.add(key)
+        statements.append((name, key[1], params))
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fail if any parking query falls back to a full table scan or a temp B-tree sort.")
+    parser.add_argument('--receipts', type=int, default=default_receipts)
+    parser.add_argument('--spots', type=int, default=default_spots)
+    parser.add_argument('--verbose', action='store_true', help="print every plan, not just failures")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        path, archive_path, occupied = prepare_database(tmp, args.spots, args.receipts)
+        print(f"Seeded {args.receipts} receipts over {args.spots} spots in {time.perf_counter() - start:.1f}s")
+
+        conn = plan_connection(path, archive_path)
+        statements = checked_statements(path, archive_path, occupied)
+        failures = 0
+        for name, sql, params in statements:
+            details, problems = plan_problems(conn, name, sql, params)
+            if problems:
+                failures += 1
+                print(f"FAIL {name}: {' | '.join(problems)}")
+                print(f"     {sql}")
+            elif args.verbose:
+                print(f"ok   {name}: {' | '.join(details)}")
+        conn.close()
+
+    print(f"{len(statements)} statements checked, {failures} with full table scans or temp B-tree sorts")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-import serial
+import argparse
+import asyncio
+import os
 import sqlite3
-import time
-from datetime import datetime
+import sys
+
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Elevator_System')))
+from elevator_shared import metrics
+from elevator_shared.db import get_repository
+from elevator_shared.event_gateway import EventGateway
 
 
 # Serial port settings
-SERIAL_PORT = 'COM3' 
+SERIAL_PORT = 'COM3'
 BAUD_RATE = 9600
 
 # Database file path
@@ -15,87 +22,45 @@ DB_PATH = 'C:\\Users\\Azi\\iCloudDrive\\School\\Year 3\\Term 1\\Smart Systems\\D
 PARKING_SPOT_ID = 1
 
 
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-    time.sleep(2) 
-    print(f"Connected to Arduino on port {SERIAL_PORT}")
-except serial.SerialException as e:
-    print(f"Error connecting to serial port {SERIAL_PORT}: {e}")
-    exit(1)
+# Function to read "PORT=SPOT_ID" pairs, one controller per bay
+def parse_port(text):
+    port, _, spot = text.rpartition('=')
+    if not port:
+        raise argparse.ArgumentTypeError(f"expected PORT=SPOT_ID, got {text!r}")
+    return port, int(spot)
+
+
+parser = argparse.ArgumentParser(description="Log Parked/Retrieved events from the bay controllers.")
+parser.add_argument('--port', dest='ports', action='append', type=parse_port, metavar='PORT=SPOT_ID',
+                    help=f"controller port and the spot it reports (default {SERIAL_PORT}={PARKING_SPOT_ID}); repeat for each bay")
+parser.add_argument('--db', default=DB_PATH)
+parser.add_argument('--baud', type=int, default=BAUD_RATE)
+parser.add_argument('--metrics-dump', action='store_true', help="print the metrics on exit")
+args = parser.parse_args()
 
+# Events the gateway gives up writing are counted in elevator_gateway_dropped_events_total
+metrics.dump_at_exit()
+metrics.start_endpoint()
 
 try:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    print(f"Connected to database at {DB_PATH}")
+    repo = get_repository(args.db)
+    print(f"Connected to database at {args.db}")
 except sqlite3.Error as e:
     print(f"Error connecting to database: {e}")
     exit(1)
 
+ports = dict(args.ports or [(SERIAL_PORT, PARKING_SPOT_ID)])
+gateway = EventGateway(repo, ports, baud_rate=args.baud)
 
-def update_parking_status(spot_id, is_occupied):
-    try:
-        cursor.execute("""
-            UPDATE Parking_Spots
-            SET Is_Occupied = ?
-            WHERE Spot_ID = ?
-        """, (is_occupied, spot_id))
-        conn.commit()
-        print(f"Updated Parking_Spots: Spot_ID={spot_id}, Is_Occupied={is_occupied}")
-    except sqlite3.Error as e:
-        print(f"Error updating parking status: {e}")
-
-def log_parking_entry(spot_id):
-    try:
-        entry_time = datetime.now()
-        cursor.execute("""
-            INSERT INTO Parking_Receipts (Spot_ID, Entry_Time)
-            VALUES (?, ?)
-        """, (spot_id, entry_time))
-        conn.commit()
-        print(f"Logged parking entry: Spot_ID={spot_id}, Entry_Time={entry_time}")
-    except sqlite3.Error as e:
-        print(f"Error logging parking entry: {e}")
-
-def log_parking_exit(spot_id):
-    try:
-        exit_time = datetime.now()
-        cursor.execute("""
-            UPDATE Parking_Receipts
-            SET Exit_Time = ?
-            WHERE Spot_ID = ? AND Exit_Time IS NULL
-        """, (exit_time, spot_id))
-        conn.commit()
-        print(f"Logged parking exit: Spot_ID={spot_id}, Exit_Time={exit_time}")
-    except sqlite3.Error as e:
-        print(f"Error logging parking exit: {e}")
-
-
-print("Starting main loop.")
+print(f"Starting main loop on {len(ports)} port(s).")
 
 try:
-    while True:
-        if ser.in_waiting > 0:
-            arduino_message = ser.readline().decode('utf-8').strip()
-            print(f"Received from Arduino: '{arduino_message}'")
-            
-            if arduino_message == "Parked":
-                # Update parking spot status to occupied
-                update_parking_status(PARKING_SPOT_ID, True)
-                # Log the parking entry
-                log_parking_entry(PARKING_SPOT_ID)
-            elif arduino_message == "Retrieved":
-                # Update parking spot status to available
-                update_parking_status(PARKING_SPOT_ID, False)
-                # Log the parking exit
-                log_parking_exit(PARKING_SPOT_ID)
-        else:
-            # No data from Arduino
-            time.sleep(0.1)
+    asyncio.run(gateway.run())
 except KeyboardInterrupt:
     print("Exiting program.")
 finally:
     # Close serial and database connections
-    ser.close()
-    conn.close()
+    repo.close()
+    if gateway.dropped:
+        print(f"{gateway.dropped} events could not be written ({gateway.retries} batches retried).")
     print("Closed serial and database connections.")
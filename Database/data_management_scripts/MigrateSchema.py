@@ -0,0 +1,55 @@
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Elevator_System')))
+from elevator_shared.migrations import MIGRATIONS, current_version, latest_version, migrate_file
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+# Every elevator_system.db shipped in the repository
+def default_databases():
+    pattern = os.path.join(repo_root, '**', 'elevator_system.db')
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def show_status(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        version = current_version(conn)
+    finally:
+        conn.close()
+    pending = [number for number, _, _ in MIGRATIONS if number > version]
+    print(f"{db_path}: version {version}, {len(pending)} pending")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations to elevator_system.db files.")
+    parser.add_argument('databases', nargs='*', help="database files (default: every elevator_system.db in the repo)")
+    parser.add_argument('--status', action='store_true', help="only print the current version of each database")
+    parser.add_argument('--target', type=int, default=latest_version, help="migrate up to this version")
+    args = parser.parse_args()
+
+    databases = args.databases or default_databases()
+    for db_path in databases:
+        if args.status:
+            show_status(db_path)
+            continue
+        try:
+            applied = migrate_file(db_path, args.target)
+        except sqlite3.Error as e:
+            print(f"Error migrating {db_path}: {e}")
+            continue
+        if applied:
+            for number, description in applied:
+                print(f"{db_path}: applied {number} - {description}")
+        else:
+            print(f"{db_path}: up to date")
+
+
+if __name__ == "__main__":
+    main()
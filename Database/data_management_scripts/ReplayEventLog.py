@@ -0,0 +1,82 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Elevator_System')))
+from elevator_shared.event_log import SpotState, load_state, read_events
+
+default_db_path = os.path.join(os.path.dirname(__file__), '..', 'elevator_system.db')
+
+
+def print_events(conn, after, upto):
+    for seq, event_time, kind, spot_id, value, detail in read_events(conn, after, upto):
+        spot = "" if spot_id is None else spot_id
+        extra = "".join(f"  {item}" for item in (value, detail) if item is not None)
+        print(f"{seq:>10}  {event_time}  {kind:<9}{spot:>8}{extra}")
+
+
+def print_state(state):
+    print(f"{'Spot_ID':>8}  {'Occupied':<9}{'Operational':<11}")
+    for spot_id, is_occupied, is_operational in state.rows():
+        print(f"{spot_id:>8}  {'Yes' if is_occupied else 'No':<9}{'Yes' if is_operational else 'No':<11}")
+
+
+# Spots whose rebuilt flags differ from Parking_Spots
+def compare_with_table(conn, state):
+    table = SpotState.from_spots_table(conn, state.seq)
+    return sorted(spot_id for spot_id in set(table.spots) | set(state.spots)
+                  if table.spots.get(spot_id) != state.spots.get(spot_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild spot state from the event log.")
+    parser.add_argument('db', nargs='?', default=default_db_path)
+    parser.add_argument('--at', type=int, help="state as of this event sequence number (default: the end of the log)")
+    parser.add_argument('--full', action='store_true', help="replay every event instead of starting from the newest snapshot")
+    parser.add_argument('--events', action='store_true', help="print the events replayed")
+    parser.add_argument('--spots', action='store_true', help="print the state of every spot")
+    parser.add_argument('--verify', action='store_true', help="compare the rebuilt state with Parking_Spots")
+    args = parser.parse_args()
+
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(args.db)}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        print(f"Error opening {args.db}: {e}")
+        sys.exit(1)
+
+    try:
+        conn.execute("BEGIN")
+        start = time.perf_counter()
+        state, replayed = load_state(conn, args.at, use_snapshot=not args.full)
+        elapsed = time.perf_counter() - start
+        snapshot_seq = state.seq - replayed
+        if args.events:
+            print_events(conn, snapshot_seq, state.seq)
+        if args.spots:
+            print_state(state)
+        rows = state.rows()
+        occupied = sum(1 for _, is_occupied, _ in rows if is_occupied)
+        out_of_service = sum(1 for _, _, is_operational in rows if not is_operational)
+        print(f"State at event {state.seq}: {len(state.spots)} spots, {occupied} occupied, {out_of_service} out of service")
+        print(f"Rebuilt from the snapshot at event {snapshot_seq} plus {replayed} events in {elapsed * 1000:.1f} ms")
+        if args.verify:
+            if args.at is not None:
+                print("--verify compares the end of the log; ignoring --at")
+                state, _ = load_state(conn)
+            mismatched = compare_with_table(conn, state)
+            if mismatched:
+                print(f"{len(mismatched)} spots differ from Parking_Spots: {mismatched[:20]}")
+                sys.exit(1)
+            print("Parking_Spots matches the event log")
+    except sqlite3.Error as e:
+        print(f"Error reading the event log: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
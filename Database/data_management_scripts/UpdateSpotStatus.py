@@ -1,40 +1,35 @@
-import sqlite3
 import time
 import random
 import os
+import sys
 import serial
 
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'Elevator_System')))
+from elevator_shared.db import get_repository
+from elevator_shared.sensor_ingest import SensorIngestor
+
 # Connect to SQLite database
-db_path = os.path.join(os.path.dirname(__file__), '..', 'Database', 'elevator_system.db')
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+db_path = os.path.join(os.path.dirname(__file__), '..', 'elevator_system.db')
+repo = get_repository(db_path)
 
 # Simulate sensor data for testing
 def simulate_sensor_data():
     return random.choice(["Occupied", "Available"])
 
-# Function to get parking spot details
-def get_parking_spot_details(spot_id):
-    cursor.execute("SELECT Spot_ID, Spot_type, Level, Is_occupied FROM Parking_Spots WHERE Spot_ID = ?", (spot_id,))
-    return cursor.fetchone()
-
-# Function to update both Parking_Spots and Parking_Sensors tables
-def update_parking_status(spot_id, sensor_id, sensor_status):
-    # Update the Parking_Spots table
-    is_occupied = 1 if sensor_status == "Occupied" else 0
-    cursor.execute("UPDATE Parking_Spots SET Is_occupied = ? WHERE Spot_ID = ?", (is_occupied, spot_id))
+# Function to report each batch written to Parking_Spots and Parking_Sensors,
+# with the spots it changed (taken from the batch, not read back)
+def report_flush(rows, spot_changes):
+    print(f"Wrote {rows} sensor readings ({len(spot_changes)} spot changes)")
+    for is_occupied, spot_id in spot_changes:
+        print(f"Updated Spot: ID={spot_id}, Occupied={'Yes' if is_occupied else 'No'}")
 
-    # Update the Parking_Sensors table
-    cursor.execute('''
-        INSERT INTO Parking_Sensors (Sensor_ID, Spot_ID, Status, Last_checked, Sensor_type)
-        VALUES (?, ?, ?, datetime('now'), 'Ultrasonic')
-        ON CONFLICT(Sensor_ID) DO UPDATE SET
-            Status = excluded.Status,
-            Last_checked = datetime('now')
-    ''', (sensor_id, spot_id, sensor_status))
+# Readings are buffered and written in batches, one transaction per flush
+ingestor = SensorIngestor(repo, on_flush=report_flush)
 
-    # Commit changes
-    conn.commit()
+# Function to queue a reading for Parking_Spots and Parking_Sensors
+def update_parking_status(spot_id, sensor_id, sensor_status):
+    ingestor.submit(sensor_id, spot_id, sensor_status)
 
 try:
     # Simulate data or receive from the serial
@@ -50,10 +45,6 @@ try:
         # Update parking spot and sensor status in the database
         update_parking_status(spot_id, sensor_id, sensor_data)
 
-        # Retrieve updated parking spot details
-        details = get_parking_spot_details(spot_id)
-        print(f"Updated Spot Details: ID={details[0]}, Type={details[1]}, Level={details[2]}, Occupied={'Yes' if details[3] else 'No'}")
-
         # Wait before the next reading
         time.sleep(2)
 
@@ -72,6 +63,7 @@ try:
             update_parking_status(spot_id, sensor_id, sensor_data)
 
 finally:
-    # Close the database connection
-    conn.close()
+    # Write what is still buffered and close the database connection
+    ingestor.close()
+    repo.close()
     print("Database connection closed.")
@@ -1,152 +1,123 @@
 import sqlite3
 import time
-from datetime import datetime
-import serial
 import tkinter as tk
 from tkinter import messagebox
 import os
-
-# Constants for physical dimensions
-level_height_cm = 20  # Height between levels in cm
-platform_width = 20    # Width of the platform in pixels
-elevator_shaft_x = 150  # X position of the elevator shaft in pixels
-cm_to_steps = 10       # Conversion factor from cm to steps
+import sys
 
 # Database connection
 db_path = os.path.join(os.path.dirname(__file__), 'database', 'elevator_system.db')
+repo = None
 
-# Arduino port setup
-arduino_port = 'COM3'
-baud_rate = 9600
-arduino = None
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from elevator_shared import metrics
+from elevator_shared.controller_link import ControllerLink, serial_opener
+from elevator_shared.db import get_repository
+from elevator_shared.topology import GarageTopology, default_topology_path
+from elevator_shared.tracing import trace_from_argv, tracer
 
-# Initialize serial connection
-try:
-    arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
-    print(f"Connected to Arduino on {arduino_port}")
-except serial.SerialException as e:
-    print(f"Failed to connect to Arduino: {e}")
+# Levels, spots and their step distances; point this at another topology
+# file for a different garage
+topology_path = default_topology_path
+topology = GarageTopology.load(topology_path)
 
-time.sleep(2)  # Wait for connection
+# Arduino port setup. The port is opened in the background the first time
+# a command is sent; a command waits up to connect_timeout_s for it.
+arduino_port = 'COM3'
+baud_rate = 9600
+connect_timeout_s = 5
+controller = ControllerLink(serial_opener(arduino_port, baud_rate))
 
 def connect_db():
-    try:
-        conn = sqlite3.connect(db_path)
-        return conn
-    except sqlite3.Error as e:
-        print(f"Failed to connect to the database: {e}")
-        return None
+    global repo
+    if repo is None:
+        try:
+            repo = get_repository(db_path)
+        except sqlite3.Error as e:
+            print(f"Failed to connect to the database: {e}")
+            return None
+    return repo
 
 def setup_database():
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.close()
+    if connect_db() is not None:
         print("Connected to database.")
-    except sqlite3.Error as e:
-        print(f"Failed to connect to the database: {e}")
 
 def populate_parking_spots():
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT COUNT(*) FROM Parking_Spots")
-        count = cursor.fetchone()[0]
-        if count == 0:
-            parking_spots = []
-            sensor_id = 201  # Starting Sensor_ID, adjust as necessary
-            for level in range(1, 7):
-                spot_id_left = level * 2 - 1
-                spot_id_right = level * 2
-                parking_spots.append((spot_id_left, level, 'left', False, True, sensor_id))
-                parking_spots.append((spot_id_right, level, 'right', False, True, sensor_id + 1))
-                sensor_id += 2  # Increment Sensor_ID for next spot
-            cursor.executemany("""
-                INSERT INTO Parking_Spots (Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational, Sensor_ID)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, parking_spots)
-            conn.commit()
+        if repo.populate_parking_spots(topology.parking_spots()):
             print("Parking spots populated.")
     except sqlite3.Error as e:
         print(f"Error populating parking spots: {e}")
-    finally:
-        conn.close()
 
 def send_command(command):
+    arduino = controller.wait(connect_timeout_s)
     if arduino:
         try:
-            arduino.write((command + '\n').encode())
-            time.sleep(0.1)
-            response = arduino.readline().decode().strip()
+            started = time.perf_counter()
+            with tracer.span(command, cat="serial") as span:
+                arduino.write((command + '\n').encode())
+                time.sleep(0.1)
+                response = arduino.readline().decode().strip()
+                span.set(reply=response)
+            if response:
+                metrics.record_command(command, time.perf_counter() - started)
+            else:
+                metrics.command_timed_out(command)
             print(f"Arduino response: {response}")
             return response
         except Exception as e:
             print(f"Failed to send command to Arduino: {e}")
+            metrics.command_failed()
+            controller.failed(e, arduino)
             return None
     else:
-        print("Arduino not connected.")
+        print(f"Arduino not connected: {controller.status_text()}")
         return None
 
 def move_platform(spot_id, action):
-    conn = connect_db()
-    if conn is None:
+    started = time.perf_counter()
+    repo = connect_db()
+    if repo is None:
+        metrics.request_failed(action)
+        return
+    if spot_id not in topology:
+        print(f"No platform found for Spot_ID {spot_id}")
+        metrics.request_failed(action)
         return
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT Level_ID, Spot_type
-            FROM Parking_Spots
-            WHERE Spot_ID = ?
-        """, (spot_id,))
-        result = cursor.fetchone()
-        if result:
-            level_id, spot_type = result
-            original_x = elevator_shaft_x
-            original_y = level_id * level_height_cm
-            target_x = elevator_shaft_x
-            ground_y = 0
-
-            vertical_distance_cm = abs(original_y - ground_y)
-            steps = int(vertical_distance_cm * cm_to_steps)
-
-            if original_y > ground_y:
-                send_command(f"MOVE_VERTICAL_DOWN {steps}")
-            else:
-                send_command(f"MOVE_VERTICAL_UP {steps}")
-
-            if spot_type.lower() == 'left':
-                send_command(f"MOVE_HORIZONTAL_LEFT {steps_to_middle_position}")
-            else:
-                send_command(f"MOVE_HORIZONTAL_RIGHT {steps_to_middle_position}")
+        with tracer.span(action, spot_id=spot_id):
+            # Step distances come from the topology tables, not the database
+            vertical_steps, horizontal_command, horizontal_steps = topology.spot_steps[spot_id]
+            send_command(f"MOVE_VERTICAL_DOWN {vertical_steps}")
+            send_command(f"{horizontal_command} {horizontal_steps}")
 
             if action == 'park':
                 print("Car is being parked.")
                 # Update Parking_Spots to set Is_occupied = True
-                cursor.execute("""
-                    UPDATE Parking_Spots
-                    SET Is_occupied = 1
-                    WHERE Spot_ID = ?
-                """, (spot_id,))
-                conn.commit()
+                with tracer.span("update_spot_status", cat="db"):
+                    repo.update_spot_status(spot_id, True)
                 print(f"Parking spot {spot_id} marked as occupied.")
             elif action == 'retrieve':
                 print("Car is being retrieved.")
                 # Update Parking_Spots to set Is_occupied = False
-                cursor.execute("""
-                    UPDATE Parking_Spots
-                    SET Is_occupied = 0
-                    WHERE Spot_ID = ?
-                """, (spot_id,))
-                conn.commit()
+                with tracer.span("update_spot_status", cat="db"):
+                    repo.update_spot_status(spot_id, False)
                 print(f"Parking spot {spot_id} marked as available.")
+        metrics.request_seconds(action).observe(time.perf_counter() - started)
     except sqlite3.Error as e:
         print(f"Error moving platform: {e}")
-    finally:
-        conn.close()
+        metrics.request_failed(action)
 
 # Main
 if __name__ == "__main__":
+    # --metrics-dump prints the command and database timings on exit, and
+    # --trace [FILE] writes the spans for chrome://tracing or Perfetto
+    metrics.dump_at_exit()
+    trace_from_argv()
     print("Initializing system...")
     setup_database()
     populate_parking_spots()
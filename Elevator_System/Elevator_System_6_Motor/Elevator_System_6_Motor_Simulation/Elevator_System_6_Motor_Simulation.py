@@ -1,137 +1,128 @@
 import sqlite3
 import time
-from datetime import datetime
-import random
 import tkinter as tk
 from tkinter import messagebox
 import os
+import sys
 
-# Constants for physical dimensions
-level_height_cm = 20    # Height between levels in cm
-platform_width = 20     # Width of the platform in pixels
-elevator_shaft_x = 150  # X position of the elevator shaft in pixels
+# Platform speed in pixels per second and loading time in seconds
+platform_speed_px = 200
+loading_time_s = 1
 
-# Mapping from cm to pixels for the simulation
-cm_to_px = 5 
+# How queued parks and retrieves are handed to a shaft (fcfs, nearest,
+# look, scan or destination; see elevator_shared/dispatcher.py). A
+# platform can only go through its own spot's shaft, so each shaft has its
+# own queue, and a request made while a platform is in that shaft waits
+# its turn instead of sending a second platform in. The 6x2 garage has
+# one shaft, so there everything waits in one queue.
+dispatch_policy = 'look'
 
 # Global variables
 platforms = {}
 root = None
 canvas = None
+animation = None
+dispatchers = {}  # shaft number -> Dispatcher
 
 # Database connection
 db_path = os.path.join(os.path.dirname(__file__), 'database', 'elevator_system.db')
 
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from elevator_shared import metrics
+from elevator_shared.animation import AnimationEngine
+from elevator_shared.billing import BillingEngine, format_amount
+from elevator_shared.db import get_repository
+from elevator_shared.dispatcher import Dispatcher, Request
+from elevator_shared.overview import ParkingOverview
+from elevator_shared.receipt_ids import format_receipt_id, normalize_receipt_id
+from elevator_shared.simulator import GarageModel
+from elevator_shared.topology import GarageTopology, default_topology_path
+from elevator_shared.tracing import trace_from_argv, tracer
+
+# Levels, shafts, spots and their dimensions; point this at another
+# topology file for a different garage
+topology_path = default_topology_path
+topology = GarageTopology.load(topology_path)
+
+repo = None
+overview = None
+
 
 def connect_db():
-    try:
-        conn = sqlite3.connect(db_path)
-        return conn
-    except sqlite3.Error as e:
-        print(f"Failed to connect to the database: {e}")
-        return None
+    global repo
+    if repo is None:
+        try:
+            repo = get_repository(db_path)
+        except sqlite3.Error as e:
+            print(f"Failed to connect to the database: {e}")
+            return None
+    return repo
 
 def setup_database():
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.close()
+    if connect_db() is not None:
         print("Connected to database.")
-    except sqlite3.Error as e:
-        print(f"Failed to connect to the database: {e}")
 
 def populate_parking_spots():
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
     try:
-        # Check if Parking_Spots table is empty
-        cursor.execute("SELECT COUNT(*) FROM Parking_Spots")
-        count = cursor.fetchone()[0]
-        if count == 0:
-            # Insert initial data into Parking_Spots
-            parking_spots = []
-            sensor_id = 201  
-            for level in range(1, 7):  # Levels 1 to 6
-                spot_id_left = level * 2 - 1
-                spot_id_right = level * 2
-                parking_spots.append((spot_id_left, level, 'left', False, True, sensor_id))
-                parking_spots.append((spot_id_right, level, 'right', False, True, sensor_id + 1))
-                sensor_id += 2  # Increment Sensor_ID for next spot
-            cursor.executemany("""
-                INSERT INTO Parking_Spots (Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational, Sensor_ID)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, parking_spots)
-            conn.commit()
+        # Insert initial data into Parking_Spots if the table is empty
+        if repo.populate_parking_spots(topology.parking_spots()):
             print("Parking spots populated.")
     except sqlite3.Error as e:
         print(f"Error populating parking spots: {e}")
-    finally:
-        conn.close()
 
 # Function to insert a parking receipt
 def insert_parking_receipt(spot_id):
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return None
-    cursor = conn.cursor()
-    entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    receipt_id = f"R{random.randint(1000, 9999)}"
     try:
-        cursor.execute("""
-            INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
-            VALUES (?, ?, ?)
-        """, (receipt_id, entry_time, spot_id))
-        conn.commit()
+        receipt_id = repo.insert_parking_receipt(spot_id)
     except sqlite3.Error as e:
         print(f"Error inserting parking receipt: {e}")
         receipt_id = None
-    finally:
-        conn.close()
     if receipt_id:
         print(f"Inserted parking receipt for Spot_ID {spot_id}: {receipt_id}")
     return receipt_id
 
 # Function to update a parking receipt with exit time
 def update_exit_time(receipt_id):
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
-    exit_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
-        cursor.execute("""
-            UPDATE Parking_Receipts
-            SET Exit_time = ?
-            WHERE Receipt_ID = ?
-        """, (exit_time, receipt_id))
-        conn.commit()
+        repo.update_exit_time(receipt_id)
     except sqlite3.Error as e:
         print(f"Error updating parking receipt: {e}")
-    finally:
-        conn.close()
     print(f"Updated parking receipt {receipt_id} with exit time")
 
+# Function to charge a closed receipt; returns the fee in cents or None
+def settle_payment(receipt_id):
+    repo = connect_db()
+    if repo is None:
+        return None
+    try:
+        fee = BillingEngine(repo).settle(receipt_id)
+    except sqlite3.Error as e:
+        print(f"Error recording payment: {e}")
+        return None
+    if fee is not None:
+        print(f"Recorded payment of {format_amount(fee)} for receipt {receipt_id}")
+    return fee
+
 # Function to find the closest available platform
 def find_available_platform():
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return None
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT Spot_ID, Level_ID, Spot_type
-            FROM Parking_Spots
-            WHERE Is_occupied = 0 AND Is_operational = 1
-            ORDER BY ABS(Level_ID - 1), Spot_ID
-            LIMIT 1
-        """)
-        result = cursor.fetchone()
+        result = repo.find_available_platform()
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         result = None
-    finally:
-        conn.close()
     if result:
         spot_id, level_id, spot_type = result
         return spot_id, level_id, spot_type
@@ -140,25 +131,19 @@ def find_available_platform():
 
 # Function to update the status of a parking spot
 def update_spot_status(spot_id, is_occupied):
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            UPDATE Parking_Spots
-            SET Is_occupied = ?
-            WHERE Spot_ID = ?
-        """, (is_occupied, spot_id))
-        conn.commit()
+        repo.update_spot_status(spot_id, is_occupied)
     except sqlite3.Error as e:
         print(f"Error updating spot status: {e}")
-    finally:
-        conn.close()
     status = "occupied" if is_occupied else "available"
     print(f"Spot {spot_id} marked as {status}")
+    set_platform_color(spot_id, is_occupied)
 
-    # Update graphical representation
+# Function to update the graphical representation of a spot
+def set_platform_color(spot_id, is_occupied):
     platform = platforms.get(spot_id)
     if platform and canvas:
         color = 'red' if is_occupied else 'green'
@@ -166,188 +151,189 @@ def update_spot_status(spot_id, is_occupied):
 
 # Function to validate receipt and get Spot_ID
 def validate_receipt(receipt_id):
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return None
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT Spot_ID FROM Parking_Receipts
-            WHERE Receipt_ID = ? AND Exit_time IS NULL
-        """, (receipt_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        return repo.validate_receipt(receipt_id)
     except sqlite3.Error as e:
         print(f"Error retrieving Spot_ID: {e}")
         return None
-    finally:
-        conn.close()
 
-# Function to move the platform to pick up or drop off the car
-def move_platform(spot_id, action):
-    global canvas, platforms
+# Function to move the platform to pick up or drop off the car.
+# The moves are queued on the animation engine and play out from the Tk
+# event loop; on_done is called once the platform is back in place.
+def move_platform(spot_id, action, on_done=None):
     platform = platforms.get(spot_id)
     if not platform:
         print(f"No platform found for Spot_ID {spot_id}")
-        return
-
+        return False
 
-    canvas_width = canvas.winfo_width()
-    canvas_height = canvas.winfo_height()
+    # The spot's shaft and the ground level for the platform
+    shaft_center_x = topology.shaft_x(topology.spot_shaft[spot_id])
+    ground_y = topology.ground_y
 
-    # Constants for platform and shaft dimensions
-    platform_width_px = level_height_cm * cm_to_px
-    platform_height_px = platform_width_px / 4
-    shaft_center_x = canvas_width // 2  # Exact center of the shaft
-    ground_y = canvas_height - platform_height_px  # Ground level for the platform
-
-    # Current platform position
-    original_x = platform['x']
-    original_y = platform['y']
+    # Resting platform position
+    original_x = platform['home_x']
+    original_y = platform['home_y']
 
+    started = time.perf_counter()
     print(f"Original Position - Spot_ID: {spot_id}, X: {original_x}, Y: {original_y}")
     print(f"Shaft Center X: {shaft_center_x}, Ground Y: {ground_y}")
 
     # Step 1: Horizontal movement to align with shaft center
-    dx = 1 if original_x < shaft_center_x else -1
-    while abs(platform['x'] - shaft_center_x) > 1:
-        platform['x'] += dx
-        canvas.move(platform['rect'], dx, 0)
-        canvas.update()
-        time.sleep(0.005)
-
-    # Snap to exact alignment with shaft center
-    canvas.move(platform['rect'], shaft_center_x - platform['x'], 0)
-    platform['x'] = shaft_center_x
-
-    print(f"Aligned with Shaft - Spot_ID: {spot_id}, X: {platform['x']}")
+    animation.move(platform, shaft_center_x, original_y, platform_speed_px)
+    animation.call(platform, lambda p: print(f"Aligned with Shaft - Spot_ID: {spot_id}, X: {p['x']}"))
 
     # Step 2: Vertical movement down to ground level
-    dy = 1
-    while platform['y'] < ground_y: 
-        platform['y'] += dy
-        canvas.move(platform['rect'], 0, dy)
-        canvas.update()
-        time.sleep(0.005)
-
-    # Snap to exact ground level
-    canvas.move(platform['rect'], 0, ground_y - platform['y'])
-    platform['y'] = ground_y
+    animation.move(platform, shaft_center_x, ground_y, platform_speed_px)
 
-    print(f"Moved to Ground - Spot_ID: {spot_id}, Y: {platform['y']}")
+    def loading(p):
+        print(f"Moved to Ground - Spot_ID: {spot_id}, Y: {p['y']}")
+        if action == 'park':
+            print(f"Car is being loaded onto Spot_ID: {spot_id}...")
+        elif action == 'retrieve':
+            print(f"Car is being unloaded from Spot_ID: {spot_id}...")
+    animation.call(platform, loading)
 
     # Simulate loading/unloading
-    if action == 'park':
-        print(f"Car is being loaded onto Spot_ID: {spot_id}...")
-    elif action == 'retrieve':
-        print(f"Car is being unloaded from Spot_ID: {spot_id}...")
-    time.sleep(1)
+    animation.wait(platform, loading_time_s)
 
     # Step 3: Vertical movement back up to original position
-    while platform['y'] > original_y:  
-        platform['y'] -= dy
-        canvas.move(platform['rect'], 0, -dy)
-        canvas.update()
-        time.sleep(0.005)
-
-    
-    canvas.move(platform['rect'], 0, original_y - platform['y'])
-    platform['y'] = original_y
-
-    print(f"Returned to Original Height - Spot_ID: {spot_id}, Y: {platform['y']}")
+    animation.move(platform, shaft_center_x, original_y, platform_speed_px)
+    animation.call(platform, lambda p: print(f"Returned to Original Height - Spot_ID: {spot_id}, Y: {p['y']}"))
 
     # Step 4: Horizontal movement back to original position
-    dx = 1 if platform['x'] < original_x else -1
-    while abs(platform['x'] - original_x) > 1: 
-        platform['x'] += dx
-        canvas.move(platform['rect'], dx, 0)
-        canvas.update()
-        time.sleep(0.005)
-
-    
-    canvas.move(platform['rect'], original_x - platform['x'], 0)
-    platform['x'] = original_x
-
-    print(f"Returned to Original Position - Spot_ID: {spot_id}, X: {platform['x']}")
+    animation.move(platform, original_x, original_y, platform_speed_px)
+
+    def returned(p):
+        metrics.motor_move_seconds('platform').observe(time.perf_counter() - started)
+        tracer.add_span("platform move", started, time.perf_counter(), spot_id=spot_id, action=action)
+        print(f"Returned to Original Position - Spot_ID: {spot_id}, X: {p['x']}")
+        if on_done:
+            on_done()
+    animation.call(platform, returned)
+    return True
+
+# Function to get the dispatcher that queues platform moves through one
+# shaft; the shaft is its single elevator
+def get_dispatcher(shaft):
+    dispatcher = dispatchers.get(shaft)
+    if dispatcher is None:
+        model = GarageModel(topology=topology, loading_time_s=loading_time_s)
+        dispatcher = dispatchers[shaft] = Dispatcher(model, 1, dispatch_policy, serve_request,
+                                                     clock=lambda: animation.clock())
+    return dispatcher
+
+# Function to run a dispatched request: the spot's platform goes through
+# its shaft, and the shaft is free again once it is back in place
+def serve_request(elevator, request, done):
+    spot_id = request.spot[0]
+    shaft = topology.spot_shaft[spot_id] if spot_id in topology else 0
+    print(f"Shaft {shaft + 1}: {request.kind} for Spot_ID {spot_id}")
+    if not move_platform(spot_id, request.kind, on_done=done):
+        done()
+
+# Function to queue a park or retrieve for the spot's shaft; on_done is
+# called once its platform is back in place
+def dispatch_move(kind, spot, receipt_id, on_done):
+    spot_id = spot[0]
+    dispatcher = get_dispatcher(topology.spot_shaft[spot_id] if spot_id in topology else 0)
+    dispatcher.submit(Request(kind, None, receipt_id=receipt_id, spot=spot), on_done=lambda request: on_done())
+    waiting = dispatcher.waiting()
+    if waiting:
+        print(f"Waiting for a free shaft: {waiting} request(s) queued")
 
 def clear_all_parking_spots():
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
     try:
-        # Reset all parking spots to available
-        cursor.execute("UPDATE Parking_Spots SET Is_occupied = 0")
-        
-        # Clear all receipts
-        cursor.execute("DELETE FROM Parking_Receipts")
-        
-        conn.commit()
+        # Reset all parking spots to available and close their receipts
+        repo.clear_all_parking_spots()
 
         # Update the canvas
         for spot_id, platform in platforms.items():
             canvas.itemconfig(platform['rect'], fill='green') 
         
-        print("All parking spots cleared, and all receipt records deleted.")
-        messagebox.showinfo("Clear All", "All parking spots have been cleared and receipts deleted.")
+        print("All parking spots cleared, and all open receipts closed.")
+        messagebox.showinfo("Clear All", "All parking spots have been cleared and their receipts closed.")
     except sqlite3.Error as e:
         print(f"Error clearing parking spots and receipts: {e}")
-    finally:
-        conn.close()
+
+# Function to get the resting canvas position of a spot's platform
+def platform_position(spot_id):
+    if spot_id not in topology:
+        return None
+    return topology.spot_canvas[spot_id]
+
+# Function to set up the platforms without a window. Motion then runs on a
+# virtual clock through animation.advance() / animation.run_until_idle().
+def initialize_headless():
+    global canvas, platforms, animation
+    canvas = None
+    platforms = {}
+    animation = AnimationEngine()
+
+    repo = connect_db()
+    if repo is None:
+        return animation
+    try:
+        for spot_id, level_id, spot_type, is_occupied in repo.list_spots():
+            position = platform_position(spot_id)
+            if position is None:
+                continue
+            x, y = position
+            platforms[spot_id] = {'rect': None, 'x': x, 'y': y, 'home_x': x, 'home_y': y}
+    except sqlite3.Error as e:
+        print(f"Error initializing simulation: {e}")
+    return animation
 
 # Function for the graphical simulation
 def initialize_simulation(frame):
-    global canvas, platforms
+    global canvas, platforms, animation
     platforms = {}  
 
     frame.update_idletasks()
 
-    # Set canvas dimensions
-    canvas_width = 1920 
-    canvas_height = 800  
-    canvas = tk.Canvas(frame, width=canvas_width, height=canvas_height, bg='white')
+    canvas = tk.Canvas(frame, width=topology.canvas_width, height=topology.canvas_height, bg='white')
     canvas.pack(fill='both', expand=True)
+    animation = AnimationEngine(canvas)
 
-    conn = connect_db()
-    if conn is None:
+    repo = connect_db()
+    if repo is None:
         return
-    cursor = conn.cursor()
 
     try:
         # Check parking spots
-        cursor.execute("""
-            SELECT Spot_ID, Level_ID, Spot_type, Is_occupied
-            FROM Parking_Spots
-        """)
-        spots_data = cursor.fetchall()
+        spots_data = repo.list_spots()
 
         # Define platform and shaft dimensions
-        platform_width_px = level_height_cm * cm_to_px
-        platform_height_px = platform_width_px / 4
-        shaft_center = canvas_width // 2 
-
-        # Calculate left and right platform positions relative to the shaft
-        left_block_center = shaft_center - platform_width_px
-        right_block_center = shaft_center + platform_width_px
-
-        # Draw the elevator shaft first
-        canvas.create_rectangle(
-            shaft_center - platform_width_px / 2, 100,
-            shaft_center + platform_width_px / 2, canvas_height + 50,
-            fill='black', outline='black'
-        )
+        platform_width_px = topology.platform_width_px
+        platform_height_px = topology.platform_height_px
+        canvas_height = topology.canvas_height
+
+        # Outermost platform positions, left of the first shaft and right of the last
+        outer_offset = topology.spots_per_side * platform_width_px
+        left_block_center = topology.shaft_x(0) - outer_offset
+        right_block_center = topology.shaft_x(topology.shafts - 1) + outer_offset
+
+        # Draw the elevator shafts first
+        for shaft in range(topology.shafts):
+            shaft_center = topology.shaft_x(shaft)
+            canvas.create_rectangle(
+                shaft_center - platform_width_px / 2, 100,
+                shaft_center + platform_width_px / 2, canvas_height + 50,
+                fill='black', outline='black'
+            )
 
         # Draw the platforms after the shaft
         for spot in spots_data:
             spot_id, level_id, spot_type, is_occupied = spot
-            y = canvas_height - (level_id * level_height_cm * cm_to_px) 
-
-            if spot_type.lower() == 'left':
-                x = left_block_center
-            elif spot_type.lower() == 'right':
-                x = right_block_center
-            else:
+            position = platform_position(spot_id)
+            if position is None:
                 continue
+            x, y = position
 
             color = 'red' if is_occupied else 'green'
 
@@ -357,7 +343,7 @@ def initialize_simulation(frame):
                 x + platform_width_px / 2, y + platform_height_px / 2,
                 fill=color, outline='black'
             )
-            platforms[spot_id] = {'rect': rect, 'x': x, 'y': y}
+            platforms[spot_id] = {'rect': rect, 'x': x, 'y': y, 'home_x': x, 'home_y': y}
 
         # Draw the tower boundary (structure rectangle)
         tower_margin = 5  
@@ -371,39 +357,42 @@ def initialize_simulation(frame):
 
     except sqlite3.Error as e:
         print(f"Error initializing simulation: {e}")
-    finally:
-        conn.close()
 
-# Function to print the parking overview
+# Function to get the in-memory overview, loaded from the database once
+def get_overview():
+    global overview
+    repo = connect_db()
+    if repo is None:
+        return None
+    if overview is None:
+        overview = ParkingOverview(repo)
+    overview.refresh()
+    return overview
+
+# Function to print the full parking overview
 def print_parking_overview():
-    conn = connect_db()
-    if conn is None:
-        return
-    cursor = conn.cursor()
     try:
-        cursor.execute("""
-            SELECT ps.Level_ID, ps.Spot_ID, ps.Spot_type, ps.Is_occupied, pr.Receipt_ID
-            FROM Parking_Spots ps
-            LEFT JOIN Parking_Receipts pr ON ps.Spot_ID = pr.Spot_ID AND pr.Exit_time IS NULL
-            ORDER BY ps.Level_ID, ps.Spot_ID
-        """)
-        data = cursor.fetchall()
+        overview = get_overview()
+        if overview is None:
+            return
+        overview.take_changes()
+        print()
+        print(overview.render())
+    except sqlite3.Error as e:
+        print(f"Error printing parking overview: {e}")
 
-        
-        print("\nParking Overview:")
-        print(f"{'Level':<8}{'Spot_ID':<10}{'Side':<10}{'Occupied':<12}{'Receipt_ID':<15}")
-        print("-" * 55) 
-
-        for row in data:
-            level_id, spot_id, spot_type, is_occupied, receipt_id = row
-            occupied_text = 'Yes' if is_occupied else 'No'
-            receipt_id_text = receipt_id if receipt_id else 'N/A'
-            
-            print(f"{level_id:<8}{spot_id:<10}{spot_type:<10}{occupied_text:<12}{receipt_id_text:<15}")
+# Function to print only the spots that changed since the last overview
+def print_overview_changes():
+    try:
+        overview = get_overview()
+        if overview is None:
+            return
+        changes = overview.render_changes()
+        if changes:
+            print()
+            print(changes)
     except sqlite3.Error as e:
         print(f"Error printing parking overview: {e}")
-    finally:
-        conn.close()
 
 # GUI for the main menu
 def welcome_screen():
@@ -477,24 +466,42 @@ def welcome_screen():
 
 # Function for parking a car
 def park_car():
-    result = find_available_platform()
+    started = time.perf_counter()
+    repo = connect_db()
+    if repo is None:
+        metrics.request_failed('park')
+        return
+    # Claim the closest spot and generate the receipt in one transaction
+    try:
+        with tracer.span("park", cat="db"):
+            result = repo.park()
+    except sqlite3.Error as e:
+        print(f"Error parking car: {e}")
+        metrics.request_failed('park')
+        messagebox.showerror("Error", "Failed to generate parking receipt.")
+        return
     if result:
-        spot_id, level_id, spot_type = result
-        # Move platform to pick up the car
-        move_platform(spot_id, 'park')
-        # Mark spot as occupied
-        update_spot_status(spot_id, True)
-        # Generate receipt
-        receipt_id = insert_parking_receipt(spot_id)
-        if receipt_id:
-            print(f"Your parking receipt ID is: {receipt_id}")
-            messagebox.showinfo("Receipt", f"Your parking receipt ID is: {receipt_id}")
-        else:
-            messagebox.showerror("Error", "Failed to generate parking receipt.")
+        spot_id, level_id, spot_type, receipt_id = result
+        print(f"Spot {spot_id} marked as occupied")
+        print(f"Inserted parking receipt for Spot_ID {spot_id}: {receipt_id}")
+        print(f"Your parking receipt ID is: {receipt_id}")
+
+        # The move plays out from the Tk event loop, so the whole park is
+        # one span from here until the platform is back
+        def parked():
+            metrics.request_seconds('park').observe(time.perf_counter() - started)
+            tracer.add_span("park request", started, time.perf_counter(), spot_id=spot_id, receipt_id=receipt_id)
+            set_platform_color(spot_id, True)
+            # Print what changed in the parking overview
+            print_overview_changes()
+            messagebox.showinfo("Receipt", f"Your parking receipt ID is: {format_receipt_id(receipt_id)}")
+
+        # Move platform to pick up the car once a shaft is free
+        dispatch_move('park', (spot_id, level_id, spot_type), receipt_id, parked)
     else:
+        metrics.request_failed('park')
         messagebox.showinfo("No Available Spots", "No available spots. Please try again later.")
-    # Print parking overview
-    print_parking_overview()
+        print_overview_changes()
 
 # Function to display the retrieve car screen
 def retrieve_car_screen():
@@ -530,25 +537,79 @@ def retrieve_car_screen():
     )
     retrieve_button.pack(pady=10)
 
-# Function to retrieve a car
+# Function to retrieve a car; receipt_id is as typed, and is normalized
+# once here so every lookup, message and trace uses the stored form
 def retrieve_car(receipt_id):
-    spot_id = validate_receipt(receipt_id)
+    started = time.perf_counter()
+    typed = receipt_id
+    receipt_id = normalize_receipt_id(typed)
+    if receipt_id is None:
+        metrics.request_failed('retrieve')
+        messagebox.showerror("Invalid Receipt", f"{typed} is not a valid receipt ID (its check symbol does not "
+                                                f"match). Please check it and type it again.")
+        return
+    if not receipt_id:
+        metrics.request_failed('retrieve')
+        messagebox.showerror("Error", "No receipt ID entered.")
+        return
+    repo = connect_db()
+    if repo is None:
+        metrics.request_failed('retrieve')
+        return
+    # Close the receipt and free the spot in one transaction
+    try:
+        with tracer.span("retrieve", cat="db"):
+            spot_id = repo.retrieve(receipt_id)
+    except sqlite3.Error as e:
+        print(f"Error retrieving car: {e}")
+        spot_id = None
     if spot_id:
-        # Move platform to drop off the car
-        move_platform(spot_id, 'retrieve')
-        # Mark spot as available
-        update_spot_status(spot_id, False)
-        # Update receipt
-        update_exit_time(receipt_id)
-        # Notify user
-        messagebox.showinfo("Car Retrieved", "Your car has been retrieved and is ready for pickup.")
+        print(f"Updated parking receipt {receipt_id} with exit time")
+        print(f"Spot {spot_id} marked as available")
+        fee = settle_payment(receipt_id)
+
+        # The receipt is closed by now; a failed lookup must not report it
+        # as unknown
+        spot = topology.spot(spot_id)
+        if spot is None:
+            try:
+                spot = repo.get_spot(spot_id)
+            except sqlite3.Error as e:
+                print(f"Error looking up Spot_ID {spot_id}: {e}")
+        if spot is None:
+            metrics.request_failed('retrieve')
+            messagebox.showerror("Error", f"Receipt {format_receipt_id(receipt_id)} is closed, but Spot_ID {spot_id} could not be "
+                                          f"found to move its platform. Please ask an attendant for your car.")
+            print_overview_changes()
+            return
+
+        def retrieved():
+            metrics.request_seconds('retrieve').observe(time.perf_counter() - started)
+            tracer.add_span("retrieve request", started, time.perf_counter(), spot_id=spot_id,
+                            receipt_id=receipt_id)
+            set_platform_color(spot_id, False)
+            # Print what changed in the parking overview
+            print_overview_changes()
+            # Notify user
+            message = "Your car has been retrieved and is ready for pickup."
+            if fee is not None:
+                message += f" Parking fee: {format_amount(fee)}"
+            messagebox.showinfo("Car Retrieved", message)
+
+        # Move platform to drop off the car once a shaft is free
+        dispatch_move('retrieve', (spot_id, *spot), receipt_id, retrieved)
     else:
-        messagebox.showerror("Error", f"No active parking receipt found for Receipt ID {receipt_id}")
-    # Print parking overview
-    print_parking_overview()
+        metrics.request_failed('retrieve')
+        messagebox.showerror("Error", f"No active parking receipt found for Receipt ID {format_receipt_id(receipt_id)}")
+        print_overview_changes()
 
 if __name__ == "__main__":
     try:
+        # Timings at http://127.0.0.1:9108/metrics; --metrics-dump prints them on exit
+        metrics.dump_at_exit()
+        metrics.start_endpoint()
+        # --trace [FILE] records the park/retrieve steps for chrome://tracing or Perfetto
+        trace_from_argv()
         setup_database()
         populate_parking_spots()
         print_parking_overview()  # Initial parking overview
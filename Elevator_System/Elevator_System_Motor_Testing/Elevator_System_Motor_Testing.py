@@ -1,17 +1,17 @@
-import serial
+import os
+import sys
 import time
 
-# Serial setup for Arduino communication
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.controller_link import ControllerLink, serial_opener
+
+# Serial setup for Arduino communication. The port is opened in the
+# background; a command waits up to connect_timeout_s for it.
 arduino_port = 'COM3' 
 baud_rate = 9600
-try:
-    arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
-    print(f"Connected to Arduino on {arduino_port}")
-except serial.SerialException as e:
-    print(f"Failed to connect to Arduino: {e}")
-    arduino = None
-
-time.sleep(2)  # Wait for connection
+connect_timeout_s = 5
+controller = ControllerLink(serial_opener(arduino_port, baud_rate))
 
 # Test Type: 'horizontal' | 'vertical'
 test_type = 'horizontal'  
@@ -21,6 +21,7 @@ class MotorTest:
         self.test_type = test_type
 
     def send_command(self, command):
+        arduino = controller.wait(connect_timeout_s)
         if arduino:
             try:
                 arduino.write((command + '\n').encode())
@@ -31,8 +32,9 @@ class MotorTest:
                     print(f"Arduino response: {response}")
             except Exception as e:
                 print(f"Error sending command: {e}")
+                controller.failed(e, arduino)
         else:
-            print("Arduino connection not established.")
+            print(f"Arduino connection not established: {controller.status_text()}")
 
     def run_test(self):
         if self.test_type == 'horizontal':
@@ -48,6 +50,8 @@ class MotorTest:
         else:
             print("Invalid test type specified.")
 
-# Create an instance of MotorTest based on test type
-motor_test_instance = MotorTest(test_type)
-motor_test_instance.run_test()
+if __name__ == "__main__":
+    # Create an instance of MotorTest based on test type
+    motor_test_instance = MotorTest(test_type)
+    motor_test_instance.run_test()
+    controller.close()
@@ -13,6 +13,14 @@ const int sensorThreshold = 15; // Distance threshold in cm
 // Status variables
 bool carDetected = false;
 
+// Acceleration ramp for MOVE_VERTICAL_PROFILE, loaded by RAMP lines from
+// Python: half-periods in microseconds of the first steps of a move.
+// Deceleration runs the table backwards, and the steps in between use the
+// last entry.
+const int maxRampSteps = 400;
+unsigned int rampDelays[maxRampSteps];
+int rampLength = 0;
+
 void setup() {
   Serial.begin(9600);
 
@@ -54,6 +62,58 @@ void moveVertical(int steps) {
   Serial.println("Movement complete");
 }
 
+// Function to load part of the ramp: "<first index> d,d,d,..."
+void loadRamp(String args) {
+  int space = args.indexOf(' ');
+  int index = args.substring(0, space).toInt();
+  if (space < 0 || index < 0 || index > rampLength) {
+    Serial.println("Invalid Ramp");
+    return;
+  }
+  int from = space + 1;
+  while (from > 0 && index < maxRampSteps) {
+    int comma = args.indexOf(',', from);
+    String value = (comma < 0) ? args.substring(from) : args.substring(from, comma);
+    rampDelays[index++] = value.toInt();
+    from = (comma < 0) ? -1 : comma + 1;
+  }
+  rampLength = index;
+  Serial.print("Ramp ");
+  Serial.println(rampLength);
+}
+
+// Function to move the vertical motors along the loaded ramp
+void moveVerticalProfile(long steps) {
+  if (rampLength == 0) {
+    Serial.println("No ramp loaded");
+    return;
+  }
+  bool direction = (steps > 0); // True for UP, False for DOWN
+  steps = abs(steps);
+
+  for (int i = 0; i < 4; i++) {
+    digitalWrite(dirPins[i], direction);
+  }
+
+  for (long s = 0; s < steps; s++) {
+    long index = min(s, steps - 1 - s);
+    if (index > rampLength - 1) {
+      index = rampLength - 1;
+    }
+    unsigned int halfPeriod = rampDelays[index];
+    for (int i = 0; i < 4; i++) {
+      digitalWrite(stepPins[i], HIGH);
+    }
+    delayMicroseconds(halfPeriod);
+    for (int i = 0; i < 4; i++) {
+      digitalWrite(stepPins[i], LOW);
+    }
+    delayMicroseconds(halfPeriod);
+  }
+
+  Serial.println("Movement complete");
+}
+
 // Function to check if a car is detected in the parking spot
 int readSensorDistance() {
   // Send trigger pulse
@@ -80,6 +140,11 @@ void processCommand(String command) {
     int steps = command.substring(19).toInt(); // Parse step count
     moveVertical(-steps);
     Serial.println("Moved Down");
+  } else if (command.startsWith("MOVE_VERTICAL_PROFILE")) {
+    long steps = command.substring(22).toInt(); // Signed step count
+    moveVerticalProfile(steps);
+  } else if (command.startsWith("RAMP ")) {
+    loadRamp(command.substring(5));
   } else if (command == "CHECK_SPOT") {
     int distance = readSensorDistance();
     if (distance < sensorThreshold) {
@@ -1,188 +1,356 @@
 import sqlite3
+import threading
 import time
-from datetime import datetime
-import random
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 import os 
-import serial 
+import sys
+
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared import metrics
+from elevator_shared.animation import FrameLatencyMonitor
+from elevator_shared.billing import BillingEngine, format_amount
+from elevator_shared.controller_link import ControllerLink, serial_opener
+from elevator_shared.db import get_repository
+from elevator_shared.motion_profile import MotionLimits, move_time, plan_move, profile_move_command
+from elevator_shared.receipt_ids import format_receipt_id
+from elevator_shared.status_poller import StatusPoller
+from elevator_shared.tracing import trace_from_argv, tracer
 
 # Constants
 steps_to_level_1 = 2000 
+# Stepper limits for ramped moves (steps/s, /s^2, /s^3). The sketch's old
+# fixed 500 us half-period is 1000 steps/s with no ramp at all.
+motion_limits = MotionLimits(max_speed=2500, max_accel=12000, max_jerk=120000, start_speed=1000)
 db_path = os.path.join(os.path.dirname(__file__), 'database', 'elevator_system.db')
 arduino_port = 'COM3'
 baud_rate = 9600
 status_label = None
+controller_label = None
+repo = None
+poller = None
+frame_monitor = None
+status_drain_ms = 100
+
+# Serial setup for Arduino communication. The port is opened on a
+# background thread (retrying until the Arduino is plugged in), so the
+# window comes up at once. The status poller and the buttons both talk to
+# the Arduino, so every command/reply pair holds serial_lock.
+serial_lock = threading.Lock()
+loaded_ramp = None  # the ramp the sketch holds, so it is only sent when it changes
+ramps_supported = True  # False once the sketch answers RAMP with "Invalid Command"
+fixed_step_delay_us = 500  # half-period of the sketch's plain MOVE_VERTICAL_UP/DOWN
 
-# Serial setup for Arduino communication
-arduino = None
-try:
-    arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
+# Function to run once the port is open: the Arduino reset on opening, so
+# it holds no ramp (and may be running another sketch)
+def on_controller_connect(port):
+    global loaded_ramp, ramps_supported
+    loaded_ramp = None
+    ramps_supported = True
     print(f"Connected to Arduino on {arduino_port}")
-except serial.SerialException as e:
-    print(f"Failed to connect to Arduino: {e}")
+    return port
+
+controller = ControllerLink(serial_opener(arduino_port, baud_rate), on_connect=on_controller_connect)
 
 # Database Functions
+def connect_db():
+    global repo
+    if repo is None:
+        try:
+            repo = get_repository(db_path)
+        except sqlite3.Error as e:
+            print(f"Failed to connect to the database: {e}")
+            return None
+    return repo
+
 def setup_database():
-    try:
-        conn = sqlite3.connect(db_path)
-        conn.close()
+    if connect_db() is not None:
         print("Connected to database.")
-    except sqlite3.Error as e:
-        print(f"Failed to connect to the database: {e}")
 
 def insert_parking_receipt(spot_id):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    receipt_id = f"R{random.randint(1000, 9999)}"
+    repo = connect_db()
+    if repo is None:
+        return None
     try:
-        cursor.execute(
-            "INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID) VALUES (?, ?, ?)",
-            (receipt_id, entry_time, spot_id)
-        )
-        conn.commit()
+        with tracer.span("insert_parking_receipt", cat="db"):
+            receipt_id = repo.insert_parking_receipt(spot_id)
     except sqlite3.Error as e:
         print(f"Error inserting parking receipt: {e}")
         receipt_id = None
-    finally:
-        conn.close()
     if receipt_id:
         print(f"Inserted parking receipt for Spot_ID {spot_id}: {receipt_id}")
     return receipt_id
 
 def validate_receipt(receipt_id):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    repo = connect_db()
+    if repo is None:
+        return None
     try:
-        cursor.execute(
-            "SELECT Spot_ID FROM Parking_Receipts WHERE Receipt_ID = ? AND Exit_time IS NULL",
-            (receipt_id,)
-        )
-        result = cursor.fetchone()
-        return result[0] if result else None
+        with tracer.span("validate_receipt", cat="db"):
+            return repo.validate_receipt(receipt_id)
     except sqlite3.Error as e:
         print(f"Error retrieving Spot_ID: {e}")
         return None
-    finally:
-        conn.close()
 
 def update_exit_time(receipt_id):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    exit_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    repo = connect_db()
+    if repo is None:
+        return
     try:
-        cursor.execute(
-            "UPDATE Parking_Receipts SET Exit_time = ? WHERE Receipt_ID = ?",
-            (exit_time, receipt_id)
-        )
-        conn.commit()
+        with tracer.span("update_exit_time", cat="db"):
+            repo.update_exit_time(receipt_id)
     except sqlite3.Error as e:
         print(f"Error updating parking receipt: {e}")
-    finally:
-        conn.close()
     print(f"Updated parking receipt {receipt_id} with exit time")
 
+# Function to charge a closed receipt; returns the fee in cents or None
+def settle_payment(receipt_id):
+    repo = connect_db()
+    if repo is None:
+        return None
+    try:
+        with tracer.span("settle_payment", cat="db"):
+            fee = BillingEngine(repo).settle(receipt_id)
+    except sqlite3.Error as e:
+        print(f"Error recording payment: {e}")
+        return None
+    if fee is not None:
+        print(f"Recorded payment of {format_amount(fee)} for receipt {receipt_id}")
+    return fee
+
 # Function to update the status of a parking spot
 def update_spot_status(spot_id, is_occupied):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    repo = connect_db()
+    if repo is None:
+        return
     try:
-        cursor.execute("""
-            UPDATE Parking_Spots
-            SET Is_occupied = ?
-            WHERE Spot_ID = ?
-        """, (is_occupied, spot_id))
-        conn.commit()
+        with tracer.span("update_spot_status", cat="db"):
+            repo.update_spot_status(spot_id, is_occupied)
     except sqlite3.Error as e:
         print(f"Error updating spot status: {e}")
-    finally:
-        conn.close()
     status = "occupied" if is_occupied else "available"
     print(f"Spot {spot_id} marked as {status}")
 
 # Arduino Movement Functions
-def send_command(command):
+# Sends command and returns the first reply line; lines reads that many
+# lines in all, for commands the sketch answers with more than one
+def send_command(command, verbose=True, timeout=None, lines=1):
+    arduino = controller.handle
     if arduino:
         try:
-            arduino.write((command + '\n').encode())
-            response = arduino.readline().decode().strip()
-            print(f"Arduino response: {response}")
+            with tracer.span(command, cat="serial") as span, serial_lock:
+                previous_timeout = arduino.timeout
+                if timeout is not None:
+                    arduino.timeout = timeout
+                try:
+                    started = time.perf_counter()
+                    arduino.write((command + '\n').encode())
+                    response = arduino.readline().decode().strip()
+                    for _ in range(lines - 1):
+                        if response:
+                            arduino.readline()
+                    elapsed = time.perf_counter() - started
+                finally:
+                    arduino.timeout = previous_timeout
+                span.set(reply=response)
+            # readline() gives up with an empty line after the timeout
+            if response:
+                metrics.record_command(command, elapsed)
+            else:
+                metrics.command_timed_out(command)
+            if verbose:
+                print(f"Arduino response: {response}")
             return response
         except Exception as e:
             print(f"Error sending command: {e}")
+            metrics.command_failed()
+            # Most likely unplugged; reconnect in the background
+            controller.failed(e, arduino)
     else:
-        print("Arduino connection not established.")
+        print(f"Arduino connection not established: {controller.status_text()}")
     return None
 
+# Function to move the elevator by steps (negative is down) along an
+# acceleration ramp, loading the ramp into the sketch first if needed. A
+# sketch from before ramps gets the plain fixed-speed move instead.
+# Returns whether the move completed.
+def move_vertical(steps):
+    global loaded_ramp, ramps_supported
+    with tracer.span("move_vertical", steps=steps):
+        if not ramps_supported:
+            return move_vertical_fixed(steps)
+        profile = plan_move(steps, motion_limits)
+        if not profile.runs_on(loaded_ramp):
+            loaded_ramp = None
+            for command in profile.ramp_commands():
+                response = send_command(command, verbose=False)
+                if response == "Invalid Command":
+                    print("The sketch has no motion ramps; moving at its fixed speed.")
+                    ramps_supported = False
+                    return move_vertical_fixed(steps)
+                if not response or not response.startswith("Ramp"):
+                    print(f"Failed to load the motion ramp: {response}")
+                    return False
+            loaded_ramp = profile.ramp
+        # Wait for the whole move, not just the usual read timeout
+        response = send_command(profile_move_command(steps), timeout=profile.duration_s + 1)
+        if response == "No ramp loaded":
+            # The sketch reset without the port reopening; send it next time
+            loaded_ramp = None
+        return response == "Movement complete"
+
+# Function for the sketch's plain move, which answers "Movement complete"
+# and then "Moved Up" or "Moved Down"
+def move_vertical_fixed(steps):
+    command = f"MOVE_VERTICAL_UP {steps}" if steps >= 0 else f"MOVE_VERTICAL_DOWN {-steps}"
+    response = send_command(command, timeout=move_time(steps, step_delay_us=fixed_step_delay_us) + 1, lines=2)
+    return response == "Movement complete"
+
 def move_to_ground_level():
-    send_command("MOVE_VERTICAL_DOWN TO GROUND")
+    if not move_vertical(-steps_to_level_1):
+        print("Failed to move to ground level.")
+        return False
     print("Moved to ground level.")
+    return True
 
 def move_to_level_1():
-    send_command(f"MOVE_VERTICAL_UP {steps_to_level_1}")
+    if not move_vertical(steps_to_level_1):
+        print("Failed to move to Level 1.")
+        return False
     print("Moved to Level 1.")
+    return True
 
-def check_parking_spot():
-    response = send_command("CHECK_SPOT")
+def check_parking_spot(verbose=True):
+    response = send_command("CHECK_SPOT", verbose)
     if response == "Spot Occupied":
-        print("Level 1 is occupied.")
+        if verbose:
+            print("Level 1 is occupied.")
         return True
     elif response == "Spot Free":
-        print("Level 1 is available.")
+        if verbose:
+            print("Level 1 is available.")
         return False
     else:
         print("Error checking occupancy.")
         return None
 
+# Function for the status poller: None without asking while there is no
+# controller yet, so a missing Arduino is not reported on every poll
+def poll_parking_spot():
+    if not controller.is_connected:
+        return None
+    return check_parking_spot(verbose=False)
+
+# Function to poll the spot status off the Tk thread; the poller checks
+# often while the elevator moves and every few seconds when idle
+def start_status_poller():
+    global poller
+    if poller is None:
+        poller = StatusPoller(poll_parking_spot)
+        poller.start()
+    return poller
+
+# Function to mark a park/retrieve in progress for the status poller
+def set_moving(moving):
+    if poller is not None:
+        poller.set_moving(moving)
+
 # Park and Retrieve Functions
 def park_car():
-    if check_parking_spot():
-        messagebox.showerror("Error", "Level 1 is occupied. Cannot park.")
-        return
-    move_to_level_1()
-    spot_id = 1  # Assuming Spot_ID=1 corresponds to Level 1
-    receipt_id = insert_parking_receipt(spot_id)
-    if receipt_id:
-        messagebox.showinfo("Receipt", f"Your parking receipt ID is: {receipt_id}")
-        print(f"Car parked at Spot_ID {spot_id}. Receipt ID: {receipt_id}")
-        # Update Parking_Spots table to set Is_occupied = True
-        update_spot_status(spot_id, True)
-    else:
-        messagebox.showerror("Error", "Failed to generate parking receipt.")
+    with tracer.span("park"):
+        started = time.perf_counter()
+        if check_parking_spot():
+            metrics.request_failed('park')
+            messagebox.showerror("Error", "Level 1 is occupied. Cannot park.")
+            return
+        set_moving(True)
+        try:
+            moved = move_to_level_1()
+        finally:
+            set_moving(False)
+        if not moved:
+            metrics.request_failed('park')
+            messagebox.showerror("Error", "The elevator did not reach Level 1. Cannot park.")
+            return
+        spot_id = 1  # Assuming Spot_ID=1 corresponds to Level 1
+        receipt_id = insert_parking_receipt(spot_id)
+        if receipt_id:
+            metrics.request_seconds('park').observe(time.perf_counter() - started)
+            messagebox.showinfo("Receipt", f"Your parking receipt ID is: {format_receipt_id(receipt_id)}")
+            print(f"Car parked at Spot_ID {spot_id}. Receipt ID: {receipt_id}")
+            # Update Parking_Spots table to set Is_occupied = True
+            update_spot_status(spot_id, True)
+        else:
+            metrics.request_failed('park')
+            messagebox.showerror("Error", "Failed to generate parking receipt.")
 
 def retrieve_car():
     receipt_id = simpledialog.askstring("Input", "Enter your receipt ID:")
     if receipt_id:
-        spot_id = validate_receipt(receipt_id)
-        if spot_id:
-            move_to_ground_level()
-            update_exit_time(receipt_id)
-            messagebox.showinfo("Success", "Your car has been retrieved.")
-            print(f"Car retrieved from Spot_ID {spot_id} with Receipt ID: {receipt_id}")
-            # Update Parking_Spots table to set Is_occupied = False
-            update_spot_status(spot_id, False)
-        else:
-            messagebox.showerror("Error", "Invalid receipt ID or car already retrieved.")
+        with tracer.span("retrieve", receipt_id=receipt_id):
+            started = time.perf_counter()
+            spot_id = validate_receipt(receipt_id)
+            if spot_id:
+                set_moving(True)
+                try:
+                    moved = move_to_ground_level()
+                finally:
+                    set_moving(False)
+                if not moved:
+                    metrics.request_failed('retrieve')
+                    messagebox.showerror("Error", "The elevator did not reach the ground level. Please try again.")
+                    return
+                update_exit_time(receipt_id)
+                fee = settle_payment(receipt_id)
+                metrics.request_seconds('retrieve').observe(time.perf_counter() - started)
+                message = "Your car has been retrieved."
+                if fee is not None:
+                    message += f" Parking fee: {format_amount(fee)}"
+                messagebox.showinfo("Success", message)
+                print(f"Car retrieved from Spot_ID {spot_id} with Receipt ID: {receipt_id}")
+                # Update Parking_Spots table to set Is_occupied = False
+                update_spot_status(spot_id, False)
+            else:
+                metrics.request_failed('retrieve')
+                messagebox.showerror("Error", "Invalid receipt ID or car already retrieved.")
     else:
         messagebox.showerror("Error", "No receipt ID entered.")
 
+# Function to show the newest status the poller has published; runs on the
+# Tk thread and never touches the serial port
 def update_status():
-    status = check_parking_spot()
-    if status is True:
-        status_label.config(text="Status: Occupied", fg="red")
-    elif status is False:
-        status_label.config(text="Status: Available", fg="green")
-    else:
-        status_label.config(text="Status: Error Checking", fg="orange")
-    status_label.after(3000, update_status)
+    result = poller.latest()
+    if result is not None:
+        status = result[1]
+        if status is True:
+            status_label.config(text="Status: Occupied", fg="red")
+        elif status is False:
+            status_label.config(text="Status: Available", fg="green")
+        elif not controller.is_connected:
+            status_label.config(text="Status: Waiting for controller", fg="orange")
+        else:
+            status_label.config(text="Status: Error Checking", fg="orange")
+    controller_label.config(text=controller.status_text(), fg="green" if controller.is_connected else "gray")
+    status_label.after(status_drain_ms, update_status)
+
+# Function to stop the poller and print how responsive the GUI was
+def close_gui(root):
+    if poller is not None:
+        poller.stop()
+    controller.close()
+    if frame_monitor is not None:
+        frame_monitor.stop()
+        print(frame_monitor.report())
+    root.destroy()
 
 # GUI Setup
 def setup_gui():
-    global status_label
+    global status_label, controller_label, frame_monitor
     root = tk.Tk()
     root.title("Elevator System")
     root.geometry("800x600")
+    root.protocol("WM_DELETE_WINDOW", lambda: close_gui(root))
 
     tk.Label(root, text="Welcome to the Parking System", font=("Helvetica", 16)).pack(pady=10)
 
@@ -221,14 +389,27 @@ def setup_gui():
     status_label = tk.Label(root, text="Checking status...", font=("Helvetica", 14), fg="blue")
     status_label.pack(pady=10)
 
+    # Controller connection, made in the background
+    controller_label = tk.Label(root, text=controller.status_text(), font=("Helvetica", 10), fg="gray")
+    controller_label.pack(pady=5)
+    controller.start()
+
     # Start status updates
+    start_status_poller()
     update_status()
+    frame_monitor = FrameLatencyMonitor(root)
+    frame_monitor.start()
 
     root.mainloop()
 
 # Main Execution
 if __name__ == "__main__":
     try:
+        # Timings at http://127.0.0.1:9108/metrics; --metrics-dump prints them on exit
+        metrics.dump_at_exit()
+        # --trace [FILE] records the park/retrieve steps for chrome://tracing or Perfetto
+        trace_from_argv()
+        metrics.start_endpoint()
         setup_database()
         setup_gui()
     except Exception as e:
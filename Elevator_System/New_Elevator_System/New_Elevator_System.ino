@@ -15,6 +15,19 @@ const int occupiedThreshold = 15;
 
 bool carDetected = false;
 
+// Compact binary protocol, switched on by the text command "PROTO BIN1".
+// Frames are 0xA5 | length | opcode | seq | args | crc8, with step counts
+// as zigzag varints (see elevator_shared/binary_protocol.py).
+const byte syncByte = 0xA5;
+const byte opPlan = 0x30;
+const byte opResult = 0x80;
+const byte opEvent = 0x81;
+const byte opNak = 0x82;
+const byte opAck = 0x83;
+const byte opPlanDone = 0x84;
+const byte codeUnknown = 0x7F;
+bool binaryMode = false;
+
 void setup() {
   Serial.begin(9600);
   pinMode(vertStepPin, OUTPUT);
@@ -39,6 +52,91 @@ void moveMotor(int stepPin, int dirPin, int steps) {
   }
 }
 
+byte crc8(const byte *data, int length) {
+  byte crc = 0;
+  for (int i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+int putVarint(byte *out, long value) {
+  unsigned long zigzag = (value << 1) ^ (value >> 31);
+  int count = 0;
+  do {
+    byte low = zigzag & 0x7F;
+    zigzag >>= 7;
+    out[count++] = zigzag ? (low | 0x80) : low;
+  } while (zigzag);
+  return count;
+}
+
+long getVarint(const byte *data, int &pos, int end) {
+  unsigned long value = 0;
+  int shift = 0;
+  while (pos < end) {
+    byte b = data[pos++];
+    value |= (unsigned long)(b & 0x7F) << shift;
+    if (!(b & 0x80)) {
+      break;
+    }
+    shift += 7;
+  }
+  return (long)(value >> 1) ^ -(long)(value & 1);
+}
+
+void sendFrame(byte opcode, byte seq, const byte *args, int argLength) {
+  byte body[16];
+  body[0] = argLength + 2;
+  body[1] = opcode;
+  body[2] = seq;
+  memcpy(body + 3, args, argLength);
+  Serial.write(syncByte);
+  Serial.write(body, argLength + 3);
+  Serial.write(crc8(body, argLength + 3));
+}
+
+// Result code for a step's result text; moves report their own opcode
+byte resultCode(byte stepOpcode, String result) {
+  if (result == "") return (stepOpcode >= 0x10 && stepOpcode <= 0x13) ? stepOpcode : 0x00;
+  if (result == "Spot Free") return 0x01;
+  if (result == "Spot Occupied") return 0x02;
+  if (result == "Car Loaded") return 0x03;
+  if (result == "Dwelled") return 0x04;
+  if (result == "Car in Spot") return 0x05;
+  if (result == "Car not detected") return 0x06;
+  return codeUnknown;
+}
+
+// Text form of one binary step, so it can go through runStep()
+String stepText(byte opcode, const byte *data, int &pos, int end) {
+  String name;
+  switch (opcode) {
+    case 0x01: return "CHECK_SPOT";
+    case 0x02: return "LOAD_CAR";
+    case 0x10: name = "MOVE_VERTICAL_UP "; break;
+    case 0x11: name = "MOVE_VERTICAL_DOWN "; break;
+    case 0x12: name = "MOVE_HORIZONTAL_LEFT "; break;
+    case 0x13: name = "MOVE_HORIZONTAL_RIGHT "; break;
+    case 0x20: name = "DWELL "; break;
+    case 0x21: name = "WAIT_CAR "; break;
+    default: return "";
+  }
+  return name + String(getVarint(data, pos, end));
+}
+
+void reportCarInSpot() {
+  if (binaryMode) {
+    byte code = 0x05;
+    sendFrame(opEvent, 0, &code, 1);
+  } else {
+    Serial.println("Car in Spot");
+  }
+}
+
 void checkCarInSpot() {
   digitalWrite(triggerPin, LOW);
   delayMicroseconds(2);
@@ -50,21 +148,162 @@ void checkCarInSpot() {
   int distance = duration * 0.034 / 2;
 
   if (distance < occupiedThreshold && !carDetected) {
-    Serial.println("Car in Spot");
+    reportCarInSpot();
     carDetected = true;
   } else if (distance >= occupiedThreshold && carDetected) {
     carDetected = false;
   }
 }
 
+// Runs one step of a PLAN frame and returns its result text ("" for moves,
+// "?" if the step is not understood)
+String runStep(String step) {
+  if (step == "CHECK_SPOT") {
+    return carDetected ? "Spot Occupied" : "Spot Free";
+  } else if (step == "LOAD_CAR") {
+    return "Car Loaded";
+  } else if (step.startsWith("MOVE_VERTICAL_UP ")) {
+    moveMotor(vertStepPin, vertDirPin, step.substring(16).toInt());
+    return "";
+  } else if (step.startsWith("MOVE_VERTICAL_DOWN ")) {
+    moveMotor(vertStepPin, vertDirPin, -step.substring(18).toInt());
+    return "";
+  } else if (step.startsWith("MOVE_HORIZONTAL_LEFT ")) {
+    moveMotor(leftStepPin, leftDirPin, step.substring(20).toInt());
+    return "";
+  } else if (step.startsWith("MOVE_HORIZONTAL_RIGHT ")) {
+    moveMotor(rightStepPin, rightDirPin, step.substring(21).toInt());
+    return "";
+  } else if (step.startsWith("DWELL ")) {
+    delay(step.substring(6).toInt());
+    return "Dwelled";
+  } else if (step.startsWith("WAIT_CAR ")) {
+    unsigned long timeoutMs = step.substring(9).toInt();
+    unsigned long start = millis();
+    while (!carDetected && millis() - start < timeoutMs) {
+      checkCarInSpot();
+      delay(50);
+    }
+    return carDetected ? "Car in Spot" : "Car not detected";
+  }
+  return "?";
+}
+
+// PLAN <seq> STEP;STEP;... runs the steps back to back, printing
+// ACK <seq> <index> [result] after each one, then PLAN_DONE <seq>.
+// An unknown step is answered with NAK and ends the plan.
+void runPlan(String frame) {
+  int seqEnd = frame.indexOf(' ', 5);
+  if (seqEnd < 0) {
+    Serial.println("NAK 0 0 Bad frame");
+    return;
+  }
+  String seq = frame.substring(5, seqEnd);
+  int start = seqEnd + 1;
+  int index = 0;
+  while (start <= (int)frame.length()) {
+    int end = frame.indexOf(';', start);
+    if (end < 0) {
+      end = frame.length();
+    }
+    String result = runStep(frame.substring(start, end));
+    if (result == "?") {
+      Serial.print("NAK ");
+      Serial.print(seq);
+      Serial.print(' ');
+      Serial.print(index);
+      Serial.println(" Unknown command");
+      return;
+    }
+    Serial.print("ACK ");
+    Serial.print(seq);
+    Serial.print(' ');
+    Serial.print(index);
+    if (result.length() > 0) {
+      Serial.print(' ');
+      Serial.print(result);
+    }
+    Serial.println();
+    start = end + 1;
+    index++;
+  }
+  Serial.print("PLAN_DONE ");
+  Serial.println(seq);
+}
+
+// Binary PLAN: the steps back to back, an ACK frame after each one
+void runBinaryPlan(byte seq, const byte *data, int pos, int end) {
+  byte index = 0;
+  while (pos < end) {
+    byte opcode = data[pos++];
+    String result = runStep(stepText(opcode, data, pos, end));
+    byte args[2] = {index, resultCode(0, result)};
+    if (result == "?") {
+      sendFrame(opNak, seq, args, 2);
+      return;
+    }
+    sendFrame(opAck, seq, args, 2);
+    index++;
+  }
+  sendFrame(opPlanDone, seq, 0, 0);
+}
+
+void readFrame() {
+  if (Serial.read() != syncByte) {
+    return;
+  }
+  byte frame[64];
+  if (Serial.readBytes(frame, 1) != 1) {
+    return;
+  }
+  int length = frame[0];
+  if (length < 2 || length > 61 || Serial.readBytes(frame + 1, length + 1) != (size_t)(length + 1)) {
+    return;
+  }
+  if (crc8(frame, length + 1) != frame[length + 1]) {
+    return;  // Corrupt frame: the host times out and can resend
+  }
+  byte opcode = frame[1];
+  byte seq = frame[2];
+  int end = length + 1;
+  if (opcode == opPlan) {
+    runBinaryPlan(seq, frame, 3, end);
+    return;
+  }
+  int pos = 3;
+  String step = stepText(opcode, frame, pos, end);
+  String result = runStep(step);
+  byte args[6];
+  int argLength = 0;
+  args[argLength++] = result == "?" ? codeUnknown : resultCode(opcode, result);
+  if (result == "" && opcode >= 0x10 && opcode <= 0x13) {
+    int valuePos = 3;
+    argLength += putVarint(args + argLength, getVarint(frame, valuePos, end));
+  }
+  sendFrame(opResult, seq, args, argLength);
+}
+
 void loop() {
   checkCarInSpot();
 
+  if (binaryMode) {
+    if (Serial.available() > 0) {
+      readFrame();
+    }
+    return;
+  }
+
   if (Serial.available() > 0) {
     String command = Serial.readStringUntil('\n');
     command.trim();
 
-    if (command == "CHECK_SPOT") {
+    if (command == "PROTO BIN1") {
+      Serial.println("PROTO BIN1 OK");
+      Serial.println("DONE");
+      binaryMode = true;
+    } else if (command.startsWith("PLAN ")) {
+      runPlan(command);
+    } else if (command == "CHECK_SPOT") {
       if (carDetected) {
         Serial.println("Spot Occupied");
       } else {
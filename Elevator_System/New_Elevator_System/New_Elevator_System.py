@@ -1,12 +1,21 @@
 import sqlite3
 import time
-import serial
+import threading
 import tkinter as tk
 import os
-import random
-from datetime import datetime
+import sys
 from tkinter import messagebox
 
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared import metrics
+from elevator_shared.controller_link import ControllerLink, serial_opener
+from elevator_shared.db import get_repository
+from elevator_shared.motion_plan import MotionPlan, PlanClient
+from elevator_shared.receipt_ids import format_receipt_id, next_receipt_id
+from elevator_shared.tracing import export_snapshot, trace_from_argv, tracer
+from elevator_shared.transport import SerialTransport, TransportError, TransportTimeout
+
 # Database connection
 db_path = os.path.join(os.path.dirname(__file__), 'database', 'elevator_system.db')
 
@@ -16,18 +25,75 @@ steps_to_middle_position = -1000    # Move left horizontal motor to middle posit
 steps_to_level_1 = -200     # Move elevator down to level 1
 steps_to_original_position = 1000  # Move right horizontal motor back
 steps_to_ground_level = -2500  # Move elevator back down to ground level
+load_settle_ms = 1000  # Pause after loading the car
 
 # Serial setup for Arduino communication
 arduino_port = 'COM3' 
 baud_rate = 9600
-try:
-    arduino = serial.Serial(arduino_port, baud_rate, timeout=1)
+# Seconds a command waits for the background connection to come up
+connect_timeout_s = 5
+
+# Milliseconds between refreshes of the controller status label
+controller_status_ms = 500
+
+# Seconds to wait for a command's DONE and for the car to reach the spot
+command_timeout = 30
+car_in_spot_timeout = 120
+# Seconds to wait for the first ACK of a plan before falling back to
+# one command at a time (older sketches answer PLAN with "Unknown command")
+plan_ack_timeout = 2
+
+# With --trace, a park slower than this is also written to its own trace file
+slow_park_s = 10
+
+use_motion_plans = True
+# Switch to the compact binary framing if the sketch supports it
+use_binary_protocol = True
+
+
+# Runs on the controller link's thread once the port is open. Replies are
+# read on a background thread and matched to waiting commands.
+def on_controller_connect(arduino):
     print(f"Connected to Arduino on {arduino_port}")
-except serial.SerialException as e:
-    print(f"Failed to connect to Arduino: {e}")
-    arduino = None
+    transport = SerialTransport(arduino, done_lines={"DONE"}, event_lines={"Car in Spot"})
+    if use_binary_protocol:
+        if transport.negotiate_binary():
+            print("Using binary protocol.")
+        else:
+            print("Controller does not support the binary protocol, using text.")
+    return transport, PlanClient(transport)
+
 
-time.sleep(2)
+# The port is opened in the background, retrying until the Arduino is
+# plugged in, so the window comes up at once
+controller = ControllerLink(serial_opener(arduino_port, baud_rate), on_connect=on_controller_connect)
+
+
+# (transport, plans) while the controller is connected, else (None, None).
+# With a timeout, waits that long for a link that is still connecting.
+def controller_handle(timeout=None):
+    handle = controller.wait(timeout) if timeout else controller.handle
+    return handle or (None, None)
+
+
+# Drops a transport whose port has failed, so the link reconnects
+def check_transport(transport):
+    handle = controller.handle
+    if handle and handle[0] is transport and not transport.alive:
+        controller.failed(TransportError("Serial link lost"), handle)
+
+
+# The park sequence after CHECK_SPOT, sent to the controller as one frame
+def park_plan():
+    return (MotionPlan("park")
+            .add("LOAD_CAR")
+            .dwell(load_settle_ms)
+            .add("MOVE_VERTICAL_UP", steps_above_level_1)
+            .add("MOVE_HORIZONTAL_LEFT", steps_to_middle_position)
+            .add("MOVE_VERTICAL_DOWN", steps_to_level_1)
+            .wait_car(car_in_spot_timeout * 1000)
+            .add("MOVE_HORIZONTAL_RIGHT", steps_to_original_position)
+            .add("MOVE_VERTICAL_DOWN", steps_to_ground_level))
 
 class ParkingSimulatorApp:
     def __init__(self, root):
@@ -48,155 +114,261 @@ class ParkingSimulatorApp:
         )
         self.start_button.pack(side="top", pady=10)
 
-        print(f"Connected to SQLite database and Arduino at port {arduino_port}")
+        # Connect to the Arduino in the background and show how that is going
+        self.controller_label = tk.Label(self.root, text=controller.status_text(), font=("Helvetica", 10), fg="gray")
+        self.controller_label.pack(side="top", pady=5)
+        controller.start()
+        self.update_controller_status()
+
         self.setup_database()
 
     def setup_database(self):
+        self.repo = None
         try:
-            conn = sqlite3.connect(db_path)
-            conn.close()
+            self.repo = get_repository(db_path)
             print("Connected to database.")
         except sqlite3.Error as e:
             print(f"Failed to connect to the database: {e}")
 
     def send_command(self, command, steps=None):
-        if arduino:
+        transport, _ = controller_handle(connect_timeout_s)
+        if transport:
+            if steps is not None:
+                full_command = f"{command} {steps}"
+            else:
+                full_command = command
+            print(f"Sent command: {full_command}")
             try:
-                if steps is not None:
-                    full_command = f"{command} {steps}\n"
-                else:
-                    full_command = f"{command}\n"
-                arduino.write(full_command.encode())
-                print(f"Sent command: {full_command.strip()}")
-                while True:
-                    if arduino.in_waiting > 0:
-                        response = arduino.readline().decode().strip()
-                        print(f"Arduino response: {response}")
-                        if response == "DONE":
-                            break
-                return response
-            except Exception as e:
+                lines = transport.request(full_command, timeout=command_timeout)
+            except TransportError as e:
                 print(f"Error sending command: {e}")
+                check_transport(transport)
                 return None
+            for response in lines:
+                print(f"Arduino response: {response}")
+            # The first line is the answer ("Spot Free", "Car Loaded", ...)
+            return lines[0]
         else:
             print("Arduino not connected.")
             return None
 
+    # Shows a message box from the Tk thread
+    def notify(self, show, title, message):
+        self.root.after(0, lambda: show(title, message))
+
+    # IDs come from the repository's node, claimed in the database, when
+    # there is one
     def generate_receipt_id(self):
-        return f"R{random.randint(1000, 9999)}"
+        if self.repo is not None:
+            return self.repo.receipt_id_factory()
+        return next_receipt_id()
 
+    # Runs the park sequence on a worker thread so the window stays responsive
     def park_car(self):
+        self.start_button.config(state="disabled")
+
+        def run():
+            try:
+                with tracer.span("park") as span:
+                    self.park_sequence()
+                if span.duration is not None and span.duration > slow_park_s:
+                    print(f"Slow park ({span.duration:.1f} s), trace written to {export_snapshot('park')}")
+            finally:
+                self.root.after(0, lambda: self.start_button.config(state="normal"))
+        threading.Thread(target=run, daemon=True).start()
+
+    def park_sequence(self):
         print("Starting park sequence...")
+        started = time.perf_counter()
 
         # Check if the parking spot is free
         response = self.send_command("CHECK_SPOT")
+        if response is None:
+            print("No answer from the controller. Aborting.")
+            metrics.request_failed('park')
+            self.notify(messagebox.showerror, "Controller", "The controller is not answering. No car was parked.")
+            return
         if response == "Spot Occupied":
             print("Parking spot is occupied. Aborting.")
-            messagebox.showwarning("Parking Spot", "Parking spot is occupied. Aborting.")
+            metrics.request_failed('park')
+            self.notify(messagebox.showwarning, "Parking Spot", "Parking spot is occupied. Aborting.")
             return
 
         print("Parking spot is free. Proceeding with parking.")
 
-        # Load car
-        self.send_command("LOAD_CAR")
-        time.sleep(1)
-
-        # Move elevator slightly above level 1
-        self.send_command("MOVE_VERTICAL_UP", steps_above_level_1)
-
-        # Move left horizontal motor to the middle position
-        self.send_command("MOVE_HORIZONTAL_LEFT", steps_to_middle_position)
-
-        # Move elevator down to level 1
-        self.send_command("MOVE_VERTICAL_DOWN", steps_to_level_1)
-
-        # Wait for "Car in Spot" signal
-        self.monitor_car_in_spot()
-
-        # Move right horizontal motor back to position
-        self.send_command("MOVE_HORIZONTAL_RIGHT", steps_to_original_position)
-
-        # Move elevator back down to ground level
-        self.send_command("MOVE_VERTICAL_DOWN", steps_to_ground_level)
+        _, plans = controller_handle()
+        try:
+            planned = use_motion_plans and plans and self.run_park_plan(plans)
+        except TransportError as e:
+            # The controller took the plan and stopped partway; no receipt
+            # for a car that is not parked
+            print(f"Park plan failed: {e}. Aborting.")
+            metrics.request_failed('park')
+            self.notify(messagebox.showerror, "Parking Failed",
+                        "The parking sequence did not finish. No receipt was issued; please ask an attendant.")
+            return
+        if not planned:
+            with tracer.span("park moves"):
+                moved = self.park_moves()
+            if not moved:
+                print("Park moves did not finish. Aborting.")
+                metrics.request_failed('park')
+                self.notify(messagebox.showerror, "Parking Failed",
+                            "The parking sequence did not finish. No receipt was issued; please ask an attendant.")
+                return
 
         # Log to Parking_Receipts table
         receipt_id = self.generate_receipt_id()
-        entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         spot_id = 1 
 
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
-                VALUES (?, ?, ?)
-            """, (receipt_id, entry_time, spot_id))
-            conn.commit()
+            with tracer.span("insert_parking_receipt", cat="db"):
+                self.repo.insert_parking_receipt(spot_id, receipt_id)
+            metrics.request_seconds('park').observe(time.perf_counter() - started)
             print(f"Inserted parking receipt: {receipt_id}")
-            messagebox.showinfo("Parking Successful", f"Your Receipt ID is: {receipt_id}")
+            self.notify(messagebox.showinfo, "Parking Successful", f"Your Receipt ID is: {format_receipt_id(receipt_id)}")
         except sqlite3.Error as e:
             print(f"Error inserting parking receipt: {e}")
-            messagebox.showerror("Database Error", "Failed to log parking receipt.")
-        finally:
-            conn.close()
+            metrics.request_failed('park')
+            self.notify(messagebox.showerror, "Database Error", "Failed to log parking receipt.")
 
         # Update Parking_Spots table to set Is_occupied = True
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE Parking_Spots
-                SET Is_occupied = 1
-                WHERE Spot_ID = ?
-            """, (spot_id,))
-            conn.commit()
+            with tracer.span("update_spot_status", cat="db"):
+                self.repo.update_spot_status(spot_id, True)
             print(f"Updated Parking_Spots for Spot_ID {spot_id} to occupied.")
         except sqlite3.Error as e:
             print(f"Error updating Parking_Spots: {e}")
-            messagebox.showerror("Database Error", "Failed to update parking spot status.")
-        finally:
-            conn.close()
+            self.notify(messagebox.showerror, "Database Error", "Failed to update parking spot status.")
 
         print("Car parked successfully.")
 
+    # Streams the whole park sequence as one plan and follows its ACKs.
+    # Returns False if the controller does not take plans, and raises
+    # TransportError if a step after the first fails (a NAK, no PLAN_DONE
+    # in time or the link going down).
+    def run_park_plan(self, plans):
+        plan = park_plan()
+        step_started = [time.perf_counter()]
+
+        # Steps run back to back, so a step took from the previous ACK to its own
+        def on_step(index, step, result):
+            now = time.perf_counter()
+            if step.startswith("MOVE_"):
+                metrics.motor_move_seconds(metrics.move_axis(step)).observe(now - step_started[0])
+            tracer.add_span(step, step_started[0], now, cat="plan", result=result)
+            step_started[0] = now
+            print(f"Step {index} done: {step} {result}".rstrip())
+            if step.startswith("WAIT_CAR"):
+                if result == "Car in Spot":
+                    print("Car detected in the parking spot.")
+                    self.mark_spot_occupied()
+                else:
+                    print("Car not detected in the parking spot.")
+
+        try:
+            handle = plans.send(plan, on_step=on_step)
+        except TransportError as e:
+            print(f"Error sending plan: {e}")
+            check_transport(plans.transport)
+            return False
+        print(f"Sent plan {handle.sequence}: {'; '.join(plan.steps)}")
+        try:
+            handle.wait_step(0, plan_ack_timeout)
+        except TransportTimeout:
+            plans.cancel(handle)
+            print("Controller did not acknowledge the plan, sending commands one at a time.")
+            return False
+        except TransportError as e:
+            print(f"Plan rejected: {e}")
+            return False
+        try:
+            with tracer.span("park plan", steps=len(plan)):
+                handle.wait(car_in_spot_timeout + command_timeout * len(plan))
+        except TransportError:
+            plans.cancel(handle)
+            check_transport(plans.transport)
+            raise
+        return True
+
+    # The park sequence one command at a time, for sketches without PLAN.
+    # Returns False as soon as a command gets no answer.
+    def park_moves(self):
+        # Load car
+        if self.send_command("LOAD_CAR") is None:
+            return False
+        with tracer.span("load settle"):
+            time.sleep(load_settle_ms / 1000)
+
+        # Move elevator slightly above level 1
+        if self.send_command("MOVE_VERTICAL_UP", steps_above_level_1) is None:
+            return False
+
+        # Move left horizontal motor to the middle position
+        if self.send_command("MOVE_HORIZONTAL_LEFT", steps_to_middle_position) is None:
+            return False
+
+        # Move elevator down to level 1
+        if self.send_command("MOVE_VERTICAL_DOWN", steps_to_level_1) is None:
+            return False
+
+        # Wait for "Car in Spot" signal
+        self.monitor_car_in_spot()
+
+        # Move right horizontal motor back to position
+        if self.send_command("MOVE_HORIZONTAL_RIGHT", steps_to_original_position) is None:
+            return False
+
+        # Move elevator back down to ground level
+        return self.send_command("MOVE_VERTICAL_DOWN", steps_to_ground_level) is not None
+
     def monitor_car_in_spot(self):
         print("Monitoring for car arrival in the parking spot...")
-        while True:
-            if arduino:
-                response = arduino.readline().decode().strip()
-                if response == "Car in Spot":
-                    print("Car detected in the parking spot.")
+        transport, _ = controller_handle()
+        if not transport:
+            print("Arduino not connected.")
+            return
+        try:
+            with tracer.span("wait for car", cat="serial"):
+                transport.wait_event("Car in Spot", timeout=car_in_spot_timeout)
+        except TransportTimeout:
+            print("Car not detected in the parking spot.")
+            return
+        print("Car detected in the parking spot.")
+        self.mark_spot_occupied()
 
-                    # Update the Parking_Spots table to set Is_occupied = True
-                    spot_id = 1
-                    try:
-                        conn = sqlite3.connect(db_path)
-                        cursor = conn.cursor()
-                        cursor.execute("""
-                            UPDATE Parking_Spots
-                            SET Is_occupied = 1
-                            WHERE Spot_ID = ?
-                        """, (spot_id,))
-                        conn.commit()
-                        print("Parking spot updated to 'occupied' in the database.")
-                        messagebox.showinfo("Parking Confirmed", "Car detected and spot marked as occupied.")
-                    except sqlite3.Error as e:
-                        print(f"Error updating Parking_Spots: {e}")
-                        messagebox.showerror("Database Error", "Failed to update parking spot status.")
-                    finally:
-                        conn.close()
-                    break
-            else:
-                print("Arduino not connected.")
-                break
+    def mark_spot_occupied(self):
+        # Update the Parking_Spots table to set Is_occupied = True
+        spot_id = 1
+        try:
+            with tracer.span("update_spot_status", cat="db"):
+                self.repo.update_spot_status(spot_id, True)
+            print("Parking spot updated to 'occupied' in the database.")
+            self.notify(messagebox.showinfo, "Parking Confirmed", "Car detected and spot marked as occupied.")
+        except sqlite3.Error as e:
+            print(f"Error updating Parking_Spots: {e}")
+            self.notify(messagebox.showerror, "Database Error", "Failed to update parking spot status.")
+
+    # Shows the controller connection state, refreshed from the Tk thread
+    def update_controller_status(self):
+        self.controller_label.config(text=controller.status_text(),
+                                     fg="green" if controller.is_connected else "gray")
+        self.root.after(controller_status_ms, self.update_controller_status)
 
     def on_close(self):
-        if arduino:
-            arduino.close()
-            print("Arduino connection closed.")
+        transport, _ = controller_handle()
+        if transport:
+            transport.close()
+        controller.close()
+        print("Arduino connection closed.")
         self.root.destroy()
 
 if __name__ == "__main__":
+    # Timings at http://127.0.0.1:9108/metrics; --metrics-dump prints them on exit
+    metrics.dump_at_exit()
+    metrics.start_endpoint()
+    # --trace [FILE] records the park steps for chrome://tracing or Perfetto
+    trace_from_argv()
     root = tk.Tk()
     app = ParkingSimulatorApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_close)
@@ -1,11 +1,20 @@
+import argparse
 import sqlite3
+import tempfile
+import threading
 import time
 import tkinter as tk
 import os
-import random
-from datetime import datetime
+import sys
 from tkinter import messagebox
 
+# Shared modules live in Elevator_System/elevator_shared
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from elevator_shared.animation import VirtualClock
+from elevator_shared.controller_model import MockArduino
+from elevator_shared.db import create_database, get_repository
+from elevator_shared.receipt_ids import format_receipt_id, next_receipt_id
+
 # Database connection
 db_path = os.path.join(os.path.dirname(__file__), 'database', 'elevator_system.db')
 
@@ -15,70 +24,25 @@ steps_to_middle_position = -1000
 steps_to_level_1 = -200
 steps_to_original_position = 1000
 steps_to_ground_level = -2500
+load_settle_ms = 1000  # Pause after loading the car
 
-# Mock Arduino class for simulation
-class MockArduino:
-    def __init__(self):
-        self.vertical_position = 0
-        self.horizontal_position_left = 0
-        self.horizontal_position_right = 0
-        print("Mock Arduino initialized.")
-
-    def write(self, command):
-        try:
-            command = command.decode().strip()
-            parts = command.split()
-            if not parts:
-                print("No command received.")
-                return
-
-            motor_command = parts[0]
-            steps = int(parts[1]) if len(parts) > 1 else None
-
-            if motor_command == 'LOAD_CAR':
-                print("Car Loaded.")
-
-            elif motor_command == 'MOVE_VERTICAL_UP' and steps is not None:
-                self.vertical_position += steps
-                print(f"Elevator moved up by {steps} steps to position {self.vertical_position}.")
-
-            elif motor_command == 'MOVE_VERTICAL_DOWN' and steps is not None:
-                self.vertical_position -= steps
-                print(f"Elevator moved down by {steps} steps to position {self.vertical_position}.")
+# Mock controller: motion takes steps * 2 * delayMicroseconds like the
+# sketch. A seed makes the occupied-spot draws repeatable.
+mock_seed = None
+mock_occupied_probability = 0.0
 
-            elif motor_command == 'MOVE_HORIZONTAL_LEFT' and steps is not None:
-                self.horizontal_position_left += steps
-                print(f"Left horizontal motor moved by {steps} steps to position {self.horizontal_position_left}.")
-
-            elif motor_command == 'MOVE_HORIZONTAL_RIGHT' and steps is not None:
-                self.horizontal_position_right += steps
-                print(f"Right horizontal motor moved by {steps} steps to position {self.horizontal_position_right}.")
-
-            elif motor_command == 'CHECK_SPOT':
-                print("Spot Free.")
-
-            else:
-                print(f"Unknown command: {motor_command}")
-
-        except Exception as e:
-            print(f"Error in MockArduino.write: {e}")
-
-    def readline(self):
-        # Simulate response from Arduino
-        time.sleep(0.5)
-        if random.choice([True, False]):
-            return b"Car in Spot\n"
-        else:
-            return b"Car not in Spot\n"
-
-# GUI
+# GUI (root=None runs without a window and prints message boxes instead)
 class ParkingSimulatorApp:
-    def __init__(self, root):
+    def __init__(self, root, arduino=None, seed=mock_seed):
         self.root = root
+        self.arduino = arduino or MockArduino(seed=seed, occupied_probability=mock_occupied_probability)
+        print("Mock Arduino initialized.")
+        print("Connected to SQLite database at:", db_path)
+        self.setup_database()
+        if root is None:
+            return
         self.root.title("Elevator System Mock Simulator")
-        self.arduino = MockArduino()
 
-        
         self.start_button = tk.Button(
             self.root, 
             text="Park Your Car", 
@@ -92,13 +56,10 @@ class ParkingSimulatorApp:
         )
         self.start_button.pack(side="top", pady=10)
 
-        print("Connected to SQLite database at:", db_path)
-        self.setup_database()
-
     def setup_database(self):
+        self.repo = None
         try:
-            conn = sqlite3.connect(db_path)
-            conn.close()
+            self.repo = get_repository(db_path)
             print("Connected to database.")
         except sqlite3.Error as e:
             print(f"Failed to connect to the database: {e}")
@@ -112,10 +73,15 @@ class ParkingSimulatorApp:
                     full_command = f"{command}\n"
                 self.arduino.write(full_command.encode())
                 print(f"Sent command: {full_command.strip()}")
-                time.sleep(1) 
-                response = self.arduino.readline().decode().strip()
-                print(f"Arduino response: {response}")
-                return response
+                lines = []
+                while True:
+                    response = self.arduino.readline().decode().strip()
+                    if not response or response == "DONE":
+                        break
+                    print(f"Arduino response: {response}")
+                    lines.append(response)
+                # The first line is the answer ("Spot Free", "Car Loaded", ...)
+                return lines[0] if lines else None
             except Exception as e:
                 print(f"Error sending command: {e}")
                 return None
@@ -123,24 +89,50 @@ class ParkingSimulatorApp:
             print("Arduino not connected.")
             return None
 
+    # Shows a message box from the Tk thread, or prints it when headless
+    def notify(self, show, title, message):
+        if self.root is None:
+            print(f"{title}: {message}")
+            return
+        self.root.after(0, lambda: show(title, message))
+
+    # IDs come from the repository's node, claimed in the database, when
+    # there is one
     def generate_receipt_id(self):
-        return f"R{random.randint(1000, 9999)}"
+        if self.repo is not None:
+            return self.repo.receipt_id_factory()
+        return next_receipt_id()
 
+    # Runs the park sequence on a worker thread so the window stays responsive
     def park_car(self):
+        self.start_button.config(state="disabled")
+
+        def run():
+            try:
+                self.park_sequence()
+            finally:
+                self.root.after(0, lambda: self.start_button.config(state="normal"))
+        threading.Thread(target=run, daemon=True).start()
+
+    # Returns the receipt ID, or None if the car could not be parked
+    def park_sequence(self):
         print("Starting park sequence...")
+        started = self.arduino.now()
 
         # Check if the parking spot is free
         response = self.send_command("CHECK_SPOT")
-        if response == "Car in Spot":
+        if response == "Spot Occupied":
             print("Parking spot is occupied. Aborting.")
-            messagebox.showwarning("Parking Spot", "Parking spot is occupied. Aborting.")
-            return
+            self.notify(messagebox.showwarning, "Parking Spot", "Parking spot is occupied. Aborting.")
+            return None
 
         print("Parking spot is free. Proceeding with parking.")
 
         # Parking sequence
         self.send_command("LOAD_CAR")
-        time.sleep(1)
+        # Settle on the host, as New_Elevator_System does between commands;
+        # the mock clock advances instead of sleeping when it is virtual
+        self.arduino.wait(load_settle_ms / 1000)
         self.send_command("MOVE_VERTICAL_UP", steps_above_level_1)
         self.send_command("MOVE_HORIZONTAL_LEFT", steps_to_middle_position)
         self.send_command("MOVE_VERTICAL_DOWN", steps_to_level_1)
@@ -148,20 +140,11 @@ class ParkingSimulatorApp:
         # Update parking spot status in database
         spot_id = 1  
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO Parking_Spots (Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational, Sensor_ID)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(Spot_ID) DO UPDATE SET Is_occupied=1
-            """, (spot_id, 1, 'left', True, True, 201)) 
-            conn.commit()
+            self.repo.upsert_parking_spot(spot_id, 1, 'left', True, True, 201)
             print(f"Updated Parking_Spots for Spot_ID {spot_id} to occupied.")
         except sqlite3.Error as e:
             print(f"Error updating Parking_Spots: {e}")
-            messagebox.showerror("Database Error", "Failed to update parking spot status.")
-        finally:
-            conn.close()
+            self.notify(messagebox.showerror, "Database Error", "Failed to update parking spot status.")
 
         # Complete parking sequence
         self.send_command("MOVE_HORIZONTAL_RIGHT", steps_to_original_position)
@@ -169,32 +152,58 @@ class ParkingSimulatorApp:
 
         # Log parking action in Parking_Receipts
         receipt_id = self.generate_receipt_id()
-        entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
-                VALUES (?, ?, ?)
-            """, (receipt_id, entry_time, spot_id))
-            conn.commit()
+            self.repo.insert_parking_receipt(spot_id, receipt_id)
             print(f"Inserted parking receipt: {receipt_id}")
-            messagebox.showinfo("Parking Successful", f"Your Receipt ID is: {receipt_id}")
+            self.notify(messagebox.showinfo, "Parking Successful", f"Your Receipt ID is: {format_receipt_id(receipt_id)}")
         except sqlite3.Error as e:
             print(f"Error inserting parking receipt: {e}")
-            messagebox.showerror("Database Error", "Failed to log parking receipt.")
-        finally:
-            conn.close()
+            self.notify(messagebox.showerror, "Database Error", "Failed to log parking receipt.")
+            receipt_id = None
 
-        print("Car parked successfully.")
+        print(f"Car parked successfully in {self.arduino.now() - started:.2f} s of controller time.")
+        return receipt_id
 
     def on_close(self):
         print("Application closed.")
         self.root.destroy()
 
+# Runs park sequences without a window against a scratch database, on the
+# virtual clock unless real_time is set. Used as a quick end-to-end check.
+def run_headless(parks, seed, real_time=False):
+    global db_path
+    clock = None if real_time else VirtualClock()
+    arduino = MockArduino(clock=clock, seed=seed, occupied_probability=mock_occupied_probability)
+    wall_start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'elevator_system.db')
+        create_database(db_path)
+        app = ParkingSimulatorApp(None, arduino=arduino, seed=seed)
+        controller_start = arduino.now()
+        receipts = [app.park_sequence() for _ in range(parks)]
+        controller_time = arduino.now() - controller_start
+        app.repo.close()
+    parked = sum(1 for receipt in receipts if receipt)
+    print(f"Parked {parked}/{parks} cars: {controller_time:.1f} s of controller time "
+          f"in {time.perf_counter() - wall_start:.3f} s wall clock.")
+    return receipts
+
+
 # Main
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ParkingSimulatorApp(root)
-    root.protocol("WM_DELETE_WINDOW", app.on_close)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="Elevator System Mock Simulator")
+    parser.add_argument('--seed', type=int, default=mock_seed)
+    parser.add_argument('--virtual', action='store_true', help="fast-forward motion on a virtual clock")
+    parser.add_argument('--headless', type=int, metavar='PARKS', help="run this many parks without a window and exit")
+    parser.add_argument('--real-time', action='store_true', help="with --headless, wait out motion in real time")
+    args = parser.parse_args()
+
+    if args.headless:
+        run_headless(args.headless, args.seed, real_time=args.real_time)
+    else:
+        root = tk.Tk()
+        arduino = MockArduino(clock=VirtualClock() if args.virtual else None, seed=args.seed,
+                              occupied_probability=mock_occupied_probability)
+        app = ParkingSimulatorApp(root, arduino=arduino, seed=args.seed)
+        root.protocol("WM_DELETE_WINDOW", app.on_close)
+        root.mainloop()
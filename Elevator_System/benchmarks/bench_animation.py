@@ -0,0 +1,51 @@
+# Headless AnimationEngine throughput: how many full park motions (align,
+# down, load, up, back) per second of CPU, one platform at a time and with
+# twelve platforms moving at once.
+#
+#   python bench_animation.py [cycles]
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.animation import AnimationEngine
+
+default_cycles = 5000
+speed_px = 200
+shaft_x = 960
+ground_y = 775
+
+
+def queue_park(engine, platform):
+    home_x, home_y = platform['x'], platform['y']
+    engine.move(platform, shaft_x, home_y, speed_px)
+    engine.move(platform, shaft_x, ground_y, speed_px)
+    engine.wait(platform, 1)
+    engine.move(platform, shaft_x, home_y, speed_px)
+    engine.move(platform, home_x, home_y, speed_px)
+
+
+def run(cycles, concurrent):
+    engine = AnimationEngine()
+    platforms = [{'x': 860 if n % 2 else 1060, 'y': 800 - (n // 2 + 1) * 100} for n in range(concurrent)]
+    start = time.perf_counter()
+    simulated = 0.0
+    for _ in range(cycles // concurrent):
+        for platform in platforms:
+            queue_park(engine, platform)
+        simulated += engine.run_until_idle()
+    return time.perf_counter() - start, simulated
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else default_cycles
+    print(f"{'platforms':>10}{'cycles/s':>12}{'simulated s':>14}{'speedup':>12}")
+    for concurrent in (1, 12):
+        elapsed, simulated = run(cycles, concurrent)
+        done = cycles // concurrent * concurrent
+        print(f"{concurrent:>10}{done / elapsed:>12.0f}{simulated:>14.1f}{simulated / elapsed:>11.0f}x")
+
+
+if __name__ == "__main__":
+    main()
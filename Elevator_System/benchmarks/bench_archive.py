@@ -0,0 +1,161 @@
+# Keeping Parking_Receipts small: the old clear_all_parking_spots()
+# DELETE FROM Parking_Receipts against ReceiptArchiver moving the same
+# closed receipts to the archive database in chunks. A kiosk thread parks
+# and retrieves a car in a loop meanwhile; its slowest transaction is how
+# long the job kept the kiosk waiting on the write lock. Also times
+# validate_receipt and the overview join on the hot table before and
+# after. Prints MISMATCH and exits 1 if a receipt is lost or the billing
+# audit of the archived months changes.
+#
+#   python bench_archive.py [closed_receipts]
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.archive import ReceiptArchiver
+from elevator_shared.billing import BillingEngine
+from elevator_shared.db import ParkingRepository, create_database
+
+default_receipts = 500_000
+spots = 400
+open_receipts = 300
+keep_days = 30
+lookups = 2000
+
+
+def build(db_path, count):
+    create_database(db_path)
+    repo = ParkingRepository(db_path)
+    repo.populate_parking_spots([(n, (n - 1) // 20 + 1, 'Left' if n % 2 else 'Right', 0, 1, 200 + n)
+                                 for n in range(1, spots + 1)])
+    rng = random.Random(1)
+    now = datetime.now()
+    rows = []
+    for n in range(count):
+        exit_time = now - timedelta(seconds=rng.uniform(0, 365 * 86400))
+        entry_time = exit_time - timedelta(seconds=rng.expovariate(1 / 10800))
+        rows.append((f"R{n:08d}", entry_time.strftime("%Y-%m-%d %H:%M:%S"),
+                     exit_time.strftime("%Y-%m-%d %H:%M:%S"), rng.randint(1, spots)))
+    with repo.pool.write() as conn:
+        conn.executemany("INSERT INTO Parking_Receipts VALUES (?, ?, ?, ?)", rows)
+    engine = BillingEngine(repo)
+    engine.bill_unpaid("2000-01-01", "2100-01-01")
+    parked = [repo.park()[3] for _ in range(open_receipts)]
+    repo.close()
+    return parked
+
+
+# Parks and retrieves a car until stop is set; reports the slowest park
+# or retrieve in seconds and how many receipts it made
+def kiosk(repo, stop, result):
+    slowest = 0.0
+    cycles = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        receipt_id = repo.park()[3]
+        slowest = max(slowest, time.perf_counter() - started)
+        started = time.perf_counter()
+        repo.retrieve(receipt_id)
+        slowest = max(slowest, time.perf_counter() - started)
+        cycles += 1
+        time.sleep(0.01)
+    result.append((slowest, cycles))
+
+
+def with_kiosk(repo, job):
+    stop = threading.Event()
+    result = []
+    thread = threading.Thread(target=kiosk, args=(repo, stop, result))
+    thread.start()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    job()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    return (elapsed,) + result[0]
+
+
+def hot_lookups(repo, parked):
+    rng = random.Random(2)
+    started = time.perf_counter()
+    for _ in range(lookups):
+        repo.validate_receipt(rng.choice(parked))
+    validate_us = (time.perf_counter() - started) / lookups * 1e6
+    started = time.perf_counter()
+    for _ in range(20):
+        repo.parking_overview()
+    overview_ms = (time.perf_counter() - started) / 20 * 1e3
+    return validate_us, overview_ms
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else default_receipts
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, 'base.db')
+        started = time.perf_counter()
+        parked = build(base, count)
+        print(f"{count:,} closed receipts over a year, {open_receipts} open "
+              f"(built in {time.perf_counter() - started:.1f} s)")
+
+        old_path = os.path.join(tmp, 'old.db')
+        shutil.copy(base, old_path)
+        repo = ParkingRepository(old_path)
+
+        def delete_all():
+            with repo.pool.write() as conn:
+                conn.execute("DELETE FROM Parking_Receipts")
+
+        elapsed, slowest, _ = with_kiosk(repo, delete_all)
+        repo.close()
+        print(f"  old DELETE FROM Parking_Receipts  {elapsed:7.2f} s   kiosk waited up to {slowest * 1e3:8.1f} ms"
+              f"   (history and open receipts gone)")
+
+        new_path = os.path.join(tmp, 'new.db')
+        shutil.copy(base, new_path)
+        repo = ParkingRepository(new_path)
+        before_lookups = hot_lookups(repo, parked)
+        engine = BillingEngine(repo)
+        with repo.pool.read() as conn:
+            before_total = conn.execute("SELECT COUNT(*) FROM Parking_Receipts").fetchone()[0]
+        archiver = ReceiptArchiver(repo, keep_days=keep_days)
+        cutoff = archiver.cutoff()
+        before_audit = engine.audit("2000-01-01", cutoff).summary()
+        moved = []
+        elapsed, slowest, kiosk_receipts = with_kiosk(repo, lambda: moved.append(archiver.run(cutoff)))
+        counts = archiver.counts()
+        print(f"  ReceiptArchiver (chunks of {archiver.chunk_size})   {elapsed:7.2f} s   "
+              f"kiosk waited up to {slowest * 1e3:8.1f} ms   ({moved[0][0]:,} receipts archived)")
+
+        after_lookups = hot_lookups(repo, parked)
+        print(f"  hot Parking_Receipts rows        {before_total:>10,} -> {counts['main.Parking_Receipts']:,}")
+        print(f"  validate_receipt                 {before_lookups[0]:8.1f} us -> {after_lookups[0]:.1f} us")
+        print(f"  parking overview join            {before_lookups[1]:8.2f} ms -> {after_lookups[1]:.2f} ms")
+
+        with repo.pool.read() as conn:
+            history = conn.execute("SELECT COUNT(*) FROM Receipt_History").fetchone()[0]
+        after_audit = engine.audit("2000-01-01", cutoff).summary()
+        if history != before_total + kiosk_receipts or counts['main.Parking_Receipts'] + counts['archive.Parking_Receipts'] != history:
+            print(f"MISMATCH: {before_total:,} receipts before archiving and {kiosk_receipts:,} parked since, "
+                  f"{history:,} in the history after")
+            failed = True
+        if after_audit != before_audit:
+            print("MISMATCH: billing audit changed by archiving")
+            print(before_audit)
+            print(after_audit)
+            failed = True
+        repo.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Fees for a month of receipts: Tariff.fees() over NumPy arrays versus
+# Tariff.fee() called row by row, as a per-receipt loop would. The loop
+# is timed on a sample and scaled up to the full count; prints MISMATCH
+# and exits 1 if the two disagree on any sampled receipt. Then the
+# BillingEngine audit (load from SQLite, fees, payments) of a month of
+# receipts in a temporary database.
+#
+#   python bench_billing.py [receipts] [db_receipts]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.billing import BillingEngine, default_tariff, format_amount, period_bounds
+from elevator_shared.db import ParkingRepository, create_database
+
+default_receipts = 10_000_000
+default_db_receipts = 200_000
+sample_size = 200_000
+month = '2024-09'
+
+
+# Exits spread over the month; stays mostly short, some over several days
+def synthetic_stays(count, seed=1):
+    rng = np.random.default_rng(seed)
+    start, end = (int(datetime.fromisoformat(d).timestamp()) for d in period_bounds(month))
+    exits = rng.integers(start, end, count, dtype=np.int64)
+    stays = rng.exponential(3 * 3600, count).astype(np.int64)
+    long = rng.random(count) < 0.02
+    stays[long] += rng.integers(86400, 5 * 86400, long.sum())
+    return exits - stays, exits
+
+
+def bench_arrays(count):
+    entries, exits = synthetic_stays(count)
+    start = time.perf_counter()
+    fees = default_tariff.fees(entries, exits)
+    vector_s = time.perf_counter() - start
+
+    sample = min(sample_size, count)
+    sample_entries, sample_exits = entries[:sample].tolist(), exits[:sample].tolist()
+    start = time.perf_counter()
+    loop_fees = [default_tariff.fee(a, b) for a, b in zip(sample_entries, sample_exits)]
+    loop_s = (time.perf_counter() - start) * count / sample
+
+    mismatches = int((fees[:sample] != np.array(loop_fees)).sum())
+    print(f"{count:,} receipts, {format_amount(int(fees.sum()))} billed")
+    print(f"  row by row  {loop_s:8.2f} s  (from {sample:,})")
+    print(f"  vectorized  {vector_s:8.2f} s  {loop_s / vector_s:6.0f}x")
+    if mismatches:
+        print(f"MISMATCH: {mismatches:,} of {sample:,} sampled fees differ")
+    return mismatches == 0
+
+
+def bench_audit(count, tmp):
+    db_path = os.path.join(tmp, 'billing.db')
+    create_database(db_path)
+    repo = ParkingRepository(db_path)
+    entries, exits = synthetic_stays(count, seed=2)
+    text = lambda t: datetime.fromtimestamp(int(t)).strftime("%Y-%m-%d %H:%M:%S")
+    with repo.pool.write() as conn:
+        conn.executemany("""
+            INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Exit_time, Spot_ID)
+            VALUES (?, ?, ?, 1)
+        """, ((f"R{n:08d}", text(a), text(b)) for n, (a, b) in enumerate(zip(entries, exits))))
+    engine = BillingEngine(repo)
+    start, end = period_bounds(month)
+
+    started = time.perf_counter()
+    billed = engine.bill_unpaid(start, end)
+    bill_s = time.perf_counter() - started
+    started = time.perf_counter()
+    audit = engine.audit(start, end)
+    audit_s = time.perf_counter() - started
+    print(f"{count:,} receipts in SQLite, month {month}")
+    print(f"  bill_unpaid {bill_s:8.2f} s  ({billed[0]:,} payments)")
+    print(f"  audit       {audit_s:8.2f} s")
+    print("  " + audit.summary().replace("\n", "\n  "))
+    if len(audit.mismatched()) or len(audit.unpaid()):
+        print("MISMATCH: payments recorded by bill_unpaid do not match the audit")
+        return False
+    return True
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else default_receipts
+    db_count = int(sys.argv[2]) if len(sys.argv) > 2 else default_db_receipts
+    ok = bench_arrays(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            ok = bench_audit(db_count, tmp) and ok
+        except sqlite3.Error as e:
+            print(f"Error building the benchmark database: {e}")
+            ok = False
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
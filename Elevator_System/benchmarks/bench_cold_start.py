@@ -0,0 +1,85 @@
+# Cold start to first frame for the four scripts that talk to the Arduino.
+# Each run is a fresh Python process timed until the script is imported,
+# which is when its window can draw its first frame (the GUIs build the
+# window and enter mainloop() straight after; Tk itself needs a display,
+# so it is left out). The controller is a FakeArduino on a pseudo-terminal
+# swapped in for COM3.
+#
+#   before  the port opened and time.sleep(2) at import, as the scripts did
+#   after   ControllerLink connecting in the background
+#
+# "ready" is when the controller could take its first command.
+#
+#   python bench_cold_start.py [runs]
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(here, '..')))
+
+scripts = (
+    ('Final_System_Vertical_Only', 'Final_System_Vertical_Only/Final_System_Vertical_Only.py'),
+    ('New_Elevator_System', 'New_Elevator_System/New_Elevator_System.py'),
+    ('6_Motor_No_Simulation',
+     'Elevator_System_6_Motor/Elevator_System_6_Motor_No_Simulation/Elevator_System_6_Motor_No_Simulation.py'),
+    ('Motor_Testing', 'Elevator_System_Motor_Testing/Elevator_System_Motor_Testing.py'),
+)
+default_runs = 3
+settle_s = 2.0
+
+
+def child(mode, path, started):
+    from elevator_shared.controller_link import ControllerLink
+    from elevator_shared.fake_arduino import FakeArduino
+
+    fake = FakeArduino('vertical')
+    link = ControllerLink(lambda: fake.open_port(timeout=1.0), settle_s=settle_s)
+    if mode == 'before':
+        # What the scripts did at import: open the port, then sleep
+        link.wait()
+    spec = importlib.util.spec_from_file_location('cold_start_script', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if mode == 'after':
+        # The script's own link is still idle; point it at the fake and
+        # start it the way setup_gui() does
+        module.controller = link
+        link.start()
+    frame = time.time()
+    ready = link.wait(10) and time.time()
+    print(json.dumps({'frame': frame - started, 'ready': ready - started if ready else None}))
+    link.close()
+    fake.close()
+
+
+def measure(mode, path, runs):
+    results = []
+    for _ in range(runs):
+        started = time.time()
+        output = subprocess.run([sys.executable, __file__, '--child', mode, path, repr(started)],
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: min(r[key] for r in results) for key in results[0]}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else default_runs
+    root = os.path.abspath(os.path.join(here, '..'))
+    print(f"{'script':<28}{'before frame s':>15}{'after frame s':>15}{'after ready s':>15}")
+    for name, path in scripts:
+        path = os.path.join(root, path)
+        before = measure('before', path, runs)
+        after = measure('after', path, runs)
+        print(f"{name:<28}{before['frame']:>15.3f}{after['frame']:>15.3f}{after['ready']:>15.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3], float(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,105 @@
+# Park/retrieve transactions per second with per-call sqlite3.connect
+# (the original helpers) versus the pooled ParkingRepository.
+#
+#   python bench_db_pool.py [cycles]
+
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database, now_text
+
+default_cycles = 2000
+
+
+def make_database(path):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    spots = []
+    for level in range(1, 7):
+        spots.append((level * 2 - 1, level, 'left', 0, 1, 200 + level * 2 - 1))
+        spots.append((level * 2, level, 'right', 0, 1, 200 + level * 2))
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", spots)
+    conn.commit()
+    conn.close()
+
+
+# The helpers as they were written before the pool: one connection per call
+class PerCallHelpers:
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _run(self, sql, params=(), fetch=False):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            if fetch:
+                return cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def find_available_platform(self):
+        return self._run("""
+            SELECT Spot_ID, Level_ID, Spot_type FROM Parking_Spots
+            WHERE Is_occupied = 0 AND Is_operational = 1
+            ORDER BY ABS(Level_ID - 1), Spot_ID LIMIT 1
+        """, fetch=True)
+
+    def update_spot_status(self, spot_id, is_occupied):
+        self._run("UPDATE Parking_Spots SET Is_occupied = ? WHERE Spot_ID = ?", (is_occupied, spot_id))
+
+    def insert_parking_receipt(self, spot_id, receipt_id):
+        self._run("INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID) VALUES (?, ?, ?)",
+                  (receipt_id, now_text(), spot_id))
+        return receipt_id
+
+    def validate_receipt(self, receipt_id):
+        result = self._run("SELECT Spot_ID FROM Parking_Receipts WHERE Receipt_ID = ? AND Exit_time IS NULL",
+                           (receipt_id,), fetch=True)
+        return result[0] if result else None
+
+    def update_exit_time(self, receipt_id):
+        self._run("UPDATE Parking_Receipts SET Exit_time = ? WHERE Receipt_ID = ?", (now_text(), receipt_id))
+
+
+def run_cycles(helpers, cycles):
+    ids = (f"B{n}" for n in itertools.count())
+    start = time.perf_counter()
+    for _ in range(cycles):
+        spot_id = helpers.find_available_platform()[0]
+        helpers.update_spot_status(spot_id, True)
+        receipt_id = helpers.insert_parking_receipt(spot_id, next(ids))
+        spot_id = helpers.validate_receipt(receipt_id)
+        helpers.update_spot_status(spot_id, False)
+        helpers.update_exit_time(receipt_id)
+    return time.perf_counter() - start
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else default_cycles
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, 'before.db')
+        make_database(before_path)
+        before = run_cycles(PerCallHelpers(before_path), cycles)
+
+        after_path = os.path.join(tmp, 'after.db')
+        make_database(after_path)
+        repo = ParkingRepository(after_path)
+        after = run_cycles(repo, cycles)
+        repo.close()
+
+    # Each cycle is one park plus one retrieve
+    print(f"{'':<12}{'seconds':>10}{'cycles/s':>12}{'txn/s':>12}")
+    for name, elapsed in (("per-call", before), ("pooled", after)):
+        print(f"{name:<12}{elapsed:>10.3f}{cycles / elapsed:>12.1f}{2 * cycles / elapsed:>12.1f}")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
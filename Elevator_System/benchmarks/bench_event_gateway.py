@@ -0,0 +1,112 @@
+# Load test for the LogParkingEvents gateway: N fake bay controllers on
+# pseudo-terminals, each sending Parked/Retrieved alternately at a fixed
+# rate, all read by one EventGateway writing to one database. Reports
+# events/s and latency from the controller writing the line to the commit
+# that contains it.
+#
+#   python bench_event_gateway.py [controllers] [events_per_controller_per_s] [seconds]
+
+import asyncio
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.event_gateway import EventGateway
+from elevator_shared.fake_arduino import FakeArduino
+from elevator_shared.simulator import percentile
+
+default_controllers = 100
+default_rate = 5.0
+default_seconds = 5.0
+
+
+def make_database(path, spots):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+        for spot_id in range(1, spots + 1)))
+    conn.commit()
+    conn.close()
+
+
+# Emits events round-robin over the controllers until stop is set,
+# recording when each spot's events were sent
+def drive(fakes, rate, sent, stop):
+    interval = 1.0 / (rate * len(fakes))
+    kinds = {spot_id: itertools.cycle(("Parked", "Retrieved")) for spot_id in fakes}
+    next_at = time.perf_counter()
+    for spot_id in itertools.cycle(fakes):
+        if stop.is_set():
+            return
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        next_at += interval
+        sent[spot_id].append(time.perf_counter())
+        fakes[spot_id].emit(next(kinds[spot_id]))
+
+
+def main():
+    controllers = int(sys.argv[1]) if len(sys.argv) > 1 else default_controllers
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else default_rate
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else default_seconds
+
+    fakes = {spot_id: FakeArduino('new') for spot_id in range(1, controllers + 1)}
+    sent = {spot_id: deque() for spot_id in fakes}
+    end_to_end = []
+
+    def on_commit(batch):
+        committed_at = time.perf_counter()
+        for event in batch:
+            end_to_end.append(committed_at - sent[event.spot_id].popleft())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gateway.db')
+        make_database(path, controllers)
+        receipt_ids = (f"G{n}" for n in itertools.count(1))
+        repo = ParkingRepository(path, readers=1, receipt_id_factory=lambda: next(receipt_ids))
+        gateway = EventGateway(repo, {fake.port_name: spot_id for spot_id, fake in fakes.items()},
+                               on_commit=on_commit, verbose=False)
+        stop = threading.Event()
+        driver = threading.Thread(target=drive, args=(fakes, rate, sent, stop), daemon=True)
+
+        async def run():
+            task = asyncio.ensure_future(gateway.run())
+            await asyncio.sleep(0.5)   # let every port open
+            cpu, start = time.process_time(), time.perf_counter()
+            driver.start()
+            await asyncio.sleep(seconds)
+            stop.set()
+            driver.join()
+            await asyncio.sleep(0.2)   # drain
+            elapsed = time.perf_counter() - start
+            gateway.stop()
+            await task
+            return elapsed, time.process_time() - cpu
+
+        elapsed, cpu = asyncio.run(run())
+        receipts = sqlite3.connect(path).execute("SELECT COUNT(*) FROM Parking_Receipts").fetchone()[0]
+        repo.close()
+    for fake in fakes.values():
+        fake.close()
+
+    print(f"{controllers} controllers, {rate:g} events/s each, {seconds:g} s")
+    print(f"Events written: {gateway.events_written} ({gateway.events_written / elapsed:,.0f}/s) "
+          f"in {gateway.batches} transactions; receipts opened: {receipts}")
+    print(f"Gateway process CPU: {cpu / elapsed:.0%} of one core")
+    print(f"{'latency (ms)':<24}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for name, values in (("receive to commit", list(gateway.latencies)), ("send to commit", end_to_end)):
+        print(f"{name:<24}" + "".join(f"{percentile(values, q) * 1000:>8.2f}" for q in (0.5, 0.95, 0.99))
+              + f"{max(values, default=0) * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# Spot events ingested per second: a commit per UPDATE of Parking_Spots (how
+# update_spot_status wrote before the event log) versus EventLog.record()
+# from one thread, holding events back (the default) and writing each with
+# its change (append_every=1, "write-through"), and from several (group
+# commit), and batched appends as apply_sensor_readings makes them. Then
+# the startup cost of rebuilding spot state from a long log, from the
+# newest snapshot and by full replay.
+#
+#   python bench_event_log.py [seconds_per_run] [log_events]
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.event_log import event, load_state
+
+default_seconds = 2.0
+# Half a snapshot interval past the last snapshot, so startup has a tail to replay
+default_log_events = 1005000
+spots = 10000
+writer_threads = 8
+append_batch = 1000
+
+
+def make_database(path):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+        for spot_id in range(1, spots + 1)))
+    conn.commit()
+    conn.close()
+
+
+def run_for(seconds, step):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        count += step()
+    return count / (time.perf_counter() - start)
+
+
+def update_per_event(repo, seconds):
+    rng = random.Random(1)
+
+    def step():
+        with repo.pool.write() as conn:
+            conn.execute("UPDATE Parking_Spots SET Is_occupied = ? WHERE Spot_ID = ?",
+                         (rng.random() < 0.5, rng.randint(1, spots)))
+        return 1
+    return run_for(seconds, step)
+
+
+def record_events(repo, seconds, threads):
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def writer(n):
+        rng = random.Random(n)
+        while not stop.is_set():
+            repo.event_log.record("sensor", rng.randint(1, spots), rng.random() < 0.5)
+            counts[n] += 1
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    commits = repo.event_log.commits
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed, sum(counts) / max(repo.event_log.commits - commits, 1)
+
+
+def append_batches(repo, seconds):
+    rng = random.Random(2)
+
+    def step():
+        events = [event("sensor", rng.randint(1, spots), rng.random() < 0.5) for _ in range(append_batch)]
+        with repo.pool.write() as conn:
+            repo.event_log.append(conn, events)
+        return append_batch
+    return run_for(seconds, step)
+
+
+def startup(path, log_events):
+    repo = ParkingRepository(path, readers=1)
+    rng = random.Random(3)
+    kinds = ("park", "retrieve", "sensor", "sensor", "fault")
+    for first in range(0, log_events, append_batch):
+        events = []
+        for _ in range(min(append_batch, log_events - first)):
+            kind = rng.choice(kinds)
+            value = None if kind in ("park", "retrieve") else int(rng.random() < (0.05 if kind == "fault" else 0.5))
+            events.append(event(kind, rng.randint(1, spots), value))
+        with repo.pool.write() as conn:
+            repo.event_log.append(conn, events, project=False)
+    repo.close()
+
+    conn = sqlite3.connect(path)
+    results = []
+    for name, use_snapshot in (("newest snapshot + tail", True), ("full replay", False)):
+        start = time.perf_counter()
+        state, replayed = load_state(conn, use_snapshot=use_snapshot)
+        results.append((name, replayed, time.perf_counter() - start, state))
+    conn.close()
+    return results
+
+
+def ingest(path, seconds, durable):
+    # FULL fsyncs every commit, as a garage PC that must not lose an event
+    # to a power cut would run
+    repo = ParkingRepository(path, readers=1, synchronous="FULL" if durable else "NORMAL")
+    print(f"  {'UPDATE + commit per event':<34}{update_per_event(repo, seconds):>12,.0f} events/s")
+    rate, _ = record_events(repo, seconds, 1)
+    print(f"  {'record(), 1 thread':<34}{rate:>12,.0f} events/s")
+    append_every = repo.event_log.append_every
+    repo.event_log.append_every = 1
+    rate, _ = record_events(repo, seconds, 1)
+    repo.event_log.append_every = append_every
+    print(f"  {'record(), 1 thread, write-through':<34}{rate:>12,.0f} events/s")
+    rate, per_commit = record_events(repo, seconds, writer_threads)
+    print(f"  {f'record(), {writer_threads} threads':<34}{rate:>12,.0f} events/s  ({per_commit:.1f} events per commit)")
+    print(f"  {f'append() in batches of {append_batch}':<34}{append_batches(repo, seconds):>12,.0f} events/s")
+    return repo
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else default_seconds
+    log_events = int(sys.argv[2]) if len(sys.argv) > 2 else default_log_events
+
+    for durable in (False, True):
+        print(f"Ingest, {spots} spots, synchronous={'FULL' if durable else 'NORMAL'}:")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'log.db')
+            make_database(path)
+            repo = ingest(path, seconds, durable)
+            repo.close()
+
+    print(f"Startup with {log_events:,} events logged:")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'startup.db')
+        make_database(path)
+        results = startup(path, log_events)
+    for name, replayed, elapsed, _ in results:
+        print(f"  {name:<34}{elapsed * 1000:>9.1f} ms  ({replayed:,} events replayed)")
+    if results[0][3].spots != results[1][3].spots:
+        print("  MISMATCH between snapshot and full replay")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Command throughput over a pseudo-terminal loopback to a fake Arduino with
+# the text protocol and with the binary framing from binary_protocol.py.
+# Commands are a park sequence's mix of CHECK_SPOT, LOAD_CAR and moves,
+# answered instantly. Runs once on the raw pty (framing and parsing cost)
+# and once with 9600 baud wire timing (what the real link allows).
+#
+#   python bench_framing.py [commands]
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.fake_arduino import FakeArduino
+from elevator_shared.transport import SerialTransport
+
+default_commands = 3000
+baud_rate = 9600
+command_mix = [
+    "CHECK_SPOT",
+    "LOAD_CAR",
+    "MOVE_VERTICAL_UP 2700",
+    "MOVE_HORIZONTAL_LEFT -1000",
+    "MOVE_VERTICAL_DOWN -200",
+    "MOVE_HORIZONTAL_RIGHT 1000",
+    "MOVE_VERTICAL_DOWN -2500",
+]
+
+
+# Bytes written by the host per command, counted on the port
+class CountingPort:
+    def __init__(self, port):
+        self.port = port
+        self.written = 0
+
+    def __getattr__(self, name):
+        return getattr(self.port, name)
+
+    def write(self, data):
+        self.written += len(data)
+        return self.port.write(data)
+
+
+def measure(encoding, commands, baud):
+    fake = FakeArduino('new', baud=baud)
+    port = CountingPort(fake.open_port(timeout=0.1))
+    transport = SerialTransport(port, done_lines={"DONE"})
+    if encoding == "binary" and not transport.negotiate_binary():
+        raise RuntimeError("Binary protocol not negotiated")
+    port.written = 0
+    start = time.perf_counter()
+    for n in range(commands):
+        transport.request(command_mix[n % len(command_mix)])
+    elapsed = time.perf_counter() - start
+    transport.close()
+    fake.close()
+    return commands / elapsed, port.written / commands
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else default_commands
+    print(f"{'':<22}{'commands/s':>12}{'bytes/cmd':>11}")
+    for baud in (None, baud_rate):
+        count = commands if baud is None else max(1, commands // 50)
+        for encoding in ("text", "binary"):
+            rate, size = measure(encoding, count, baud)
+            label = f"{encoding} ({'pty' if baud is None else f'{baud} baud'})"
+            print(f"{label:<22}{rate:>12.0f}{size:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Cost of recording a sample in metrics.py: a histogram observe, a timed
+# block, a counter and a serial command (round trip plus motor move), and
+# what the instrumentation adds to a pooled database read. Then four
+# threads record at once and the endpoint is scraped; prints MISMATCH if
+# a sample is lost or the exposition disagrees, and LIMIT VIOLATED if a
+# sample costs more than limit_us. Exits 1 on either.
+#
+#   python bench_metrics.py [samples]
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import urlopen
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared import db, metrics
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.metrics import Histogram, MetricsRegistry
+
+default_samples = 200_000
+limit_us = 5.0
+threads = 4
+
+
+class NullHistogram:
+    def observe(self, value):
+        pass
+
+
+def per_call_us(function, samples):
+    started = time.perf_counter()
+    for _ in range(samples):
+        function()
+    return (time.perf_counter() - started) / samples * 1e6
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else default_samples
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', "Benchmark samples")
+    counter = registry.counter('bench_total', "Benchmark events")
+
+    def timed():
+        with histogram.time():
+            pass
+
+    baseline = per_call_us(lambda: None, samples)
+    costs = {
+        'Histogram.observe': per_call_us(lambda: histogram.observe(0.003), samples) - baseline,
+        'with Histogram.time()': per_call_us(timed, samples) - baseline,
+        'Counter.inc': per_call_us(counter.inc, samples) - baseline,
+        'record_command (2 histograms)': per_call_us(lambda: metrics.record_command("MOVE_VERTICAL_UP 2700", 0.8),
+                                                     samples) - baseline,
+    }
+    failed = False
+    print(f"{'per sample':<32}{'us':>8}")
+    for name, cost in costs.items():
+        print(f"{name:<32}{cost:>8.2f}")
+        if cost > limit_us:
+            print(f"LIMIT VIOLATED: {name} takes {cost:.2f} us, over {limit_us} us")
+            failed = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'metrics.db')
+        create_database(db_path)
+        repo = ParkingRepository(db_path)
+        repo.populate_parking_spots([(1, 1, 'Left', 0, 1, 201)])
+        reads = samples // 10
+        instrumented = per_call_us(lambda: repo.get_spot(1), reads)
+        # The same read with the pool's histogram swapped for one that drops samples
+        read_seconds, db.read_seconds = db.read_seconds, NullHistogram()
+        try:
+            bare = per_call_us(lambda: repo.get_spot(1), reads)
+        finally:
+            db.read_seconds = read_seconds
+        print(f"{'pooled get_spot()':<32}{instrumented:>8.2f}   ({instrumented - bare:+.2f} us for the metrics)")
+        repo.close()
+
+    # Concurrent samples must all land
+    shared = Histogram()
+    per_thread = samples // threads
+    workers = [threading.Thread(target=lambda: [shared.observe(0.01) for _ in range(per_thread)])
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    counts, total, count = shared.snapshot()
+    if count != per_thread * threads or sum(counts) != count:
+        print(f"MISMATCH: {threads} threads observed {per_thread * threads:,} samples, histogram holds {count:,}")
+        failed = True
+
+    server = registry.serve(port=0)
+    try:
+        port = server.server_address[1]
+        started = time.perf_counter()
+        with urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            text = response.read().decode()
+        scrape_us = (time.perf_counter() - started) * 1e6
+    finally:
+        server.shutdown()
+    print(f"{'scrape /metrics':<32}{scrape_us:>8.0f}   ({len(text.splitlines())} lines)")
+    expected = (f'bench_seconds_bucket{{le="+Inf"}} {histogram.count}', f'bench_seconds_count {histogram.count}',
+                f'bench_total {counter.value}', '# TYPE bench_seconds histogram')
+    for line in expected:
+        if line not in text.splitlines():
+            print(f"MISMATCH: {line!r} not in the scraped metrics")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Park sequence latency against a fake Arduino on a pseudo-terminal with
+# 9600 baud wire timing: one command and reply at a time (as
+# New_Elevator_System.park_sequence did) versus the whole sequence streamed
+# as one PLAN frame with per-step ACKs. Motor and dwell time are scaled by
+# time_scale so a run takes well under a second; host idle is the wall time
+# left over after the motors. What idle remains with a plan is mostly the
+# frame itself crossing the wire (about 1 ms per byte) before the first step,
+# which the binary framing shrinks. Then runs more plans than a binary
+# frame's one-byte sequence number holds; prints MISMATCH and exits 1 if
+# one is not acknowledged after the numbers wrap.
+#
+#   python bench_motion_plan.py [runs] [time_scale]
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.binary_protocol import encode_command
+from elevator_shared.controller_model import ControllerModel
+from elevator_shared.fake_arduino import FakeArduino
+from elevator_shared.motion_plan import MotionPlan, PlanClient
+from elevator_shared.transport import SerialTransport, TransportError
+
+default_runs = 5
+default_time_scale = 0.01
+baud_rate = 9600
+load_settle_ms = 1000
+wraparound_plans = 300
+
+# Same steps as New_Elevator_System.park_plan()
+park_steps = [
+    ("LOAD_CAR", None),
+    ("MOVE_VERTICAL_UP", 2700),
+    ("MOVE_HORIZONTAL_LEFT", -1000),
+    ("MOVE_VERTICAL_DOWN", -200),
+    ("MOVE_HORIZONTAL_RIGHT", 1000),
+    ("MOVE_VERTICAL_DOWN", -2500),
+]
+
+
+def park_plan():
+    plan = MotionPlan("park")
+    for command, steps in park_steps:
+        plan.add(command, steps)
+        if command == "LOAD_CAR":
+            plan.dwell(load_settle_ms)
+        if command == "MOVE_VERTICAL_DOWN" and steps == -200:
+            plan.wait_car(120000)
+    return plan
+
+
+# The sketch only runs WAIT_CAR inside a plan; on its own it reports the
+# car with an unsolicited "Car in Spot", which park_moves() waits for
+def per_command(fake, transport, plans, time_scale):
+    for command, steps in park_steps:
+        transport.request(command if steps is None else f"{command} {steps}")
+        if command == "LOAD_CAR":
+            time.sleep(load_settle_ms / 1000 * time_scale)
+        if command == "MOVE_VERTICAL_DOWN" and steps == -200:
+            fake.emit("Car in Spot")
+            transport.wait_event("Car in Spot", timeout=120)
+
+
+def pipelined(fake, transport, plans, time_scale):
+    plans.run(park_plan(), timeout=60)
+
+
+# Plans sent one after another on a binary link until the sequence numbers
+# have wrapped; returns the failures
+def wraparound():
+    fake = FakeArduino('new')
+    transport = SerialTransport(fake.open_port(timeout=0.1), done_lines={"DONE"},
+                                event_lines={"Car in Spot"})
+    transport.negotiate_binary()
+    plans = PlanClient(transport)
+    failures = []
+    for n in range(1, wraparound_plans + 1):
+        handle = plans.send(MotionPlan("settle").dwell(0))
+        try:
+            handle.wait(timeout=2)
+        except TransportError as e:
+            plans.cancel(handle)
+            failures.append(f"plan {n} (seq {handle.sequence}): {e}")
+    transport.close()
+    fake.close()
+    return failures
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else default_runs
+    time_scale = float(sys.argv[2]) if len(sys.argv) > 2 else default_time_scale
+    model = ControllerModel('new')
+    motor_s = sum(model.move_duration(steps or 0) for _, steps in park_steps) * time_scale
+    motor_s += load_settle_ms / 1000 * time_scale
+
+    print(f"Motor and dwell time per park: {motor_s * 1000:.0f} ms (time_scale {time_scale})")
+    print(f"{'':<14}{'wall ms':>10}{'host idle ms':>14}{'bytes':>8}")
+    modes = (("per-command", per_command, False), ("pipelined", pipelined, False),
+             ("pipelined bin", pipelined, True))
+    for name, run, binary in modes:
+        fake = FakeArduino('new', time_scale=time_scale, baud=baud_rate)
+        transport = SerialTransport(fake.open_port(timeout=0.1), done_lines={"DONE"},
+                                    event_lines={"Car in Spot"})
+        if binary:
+            transport.negotiate_binary()
+        plans = PlanClient(transport)
+        walls = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            run(fake, transport, plans, time_scale)
+            walls.append(time.perf_counter() - start)
+        if run is per_command:
+            sent = sum(len(command) + 1 for command in fake.commands) // runs
+        elif binary:
+            sent = len(encode_command(park_plan().encode(1), 1))
+        else:
+            sent = len(park_plan().encode(1)) + 1
+        transport.close()
+        fake.close()
+        wall = sorted(walls)[len(walls) // 2]
+        print(f"{name:<14}{wall * 1000:>10.0f}{(wall - motor_s) * 1000:>14.0f}{sent:>8}")
+
+    failures = wraparound()
+    print(f"{wraparound_plans} plans on a binary link: {wraparound_plans - len(failures)} acknowledged")
+    for failure in failures[:5]:
+        print(f"MISMATCH: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Ramped moves from motion_profile versus the vertical sketch's fixed 500 us
+# half-period, for trapezoid and S-curve limits. For every distance it
+# checks that the planned motion stays within the speed, acceleration and
+# jerk limits (finite differences over the step times), that the rounded
+# table the sketch runs is never faster than planned, and that a
+# MockArduino running the RAMP/MOVE_VERTICAL_PROFILE commands takes
+# exactly the time the estimator gives. Exits 1 on any violation.
+#
+#   python bench_motion_profile.py [plans_per_distance]
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.animation import VirtualClock
+from elevator_shared.controller_model import MockArduino
+from elevator_shared.motion_profile import (MotionLimits, measured_limits, move_time, plan_move,
+                                            profile_move_command)
+
+default_plans = 20
+distances = (1, 2, 3, 10, 51, 200, 799, 2000, 4000, 12000)
+fixed_delay_us = 500
+# Finite differences of the exact curve come within this of the limit
+tolerance = 1e-3
+limit_sets = (
+    MotionLimits(max_speed=2500, max_accel=12000, start_speed=1000),
+    MotionLimits(max_speed=2500, max_accel=12000, max_jerk=120000, start_speed=1000),
+)
+
+
+def run_on_mock(profile):
+    clock = VirtualClock()
+    arduino = MockArduino(clock=clock, sketch='vertical')
+    for command in profile.ramp_commands():
+        arduino.write((command + '\n').encode())
+        arduino.readline()
+    start = clock()
+    arduino.write((profile_move_command(profile.steps) + '\n').encode())
+    return clock() - start, arduino.readline().decode().strip()
+
+
+def check(profile, limits):
+    problems = []
+    speed, accel, jerk = measured_limits(profile.ideal_intervals())
+    if speed > limits.max_speed * (1 + tolerance):
+        problems.append(f"speed {speed:.0f} > {limits.max_speed}")
+    if accel > limits.max_accel * (1 + tolerance):
+        problems.append(f"acceleration {accel:.0f} > {limits.max_accel}")
+    if limits.max_jerk is not None and jerk > limits.max_jerk * (1 + tolerance):
+        problems.append(f"jerk {jerk:.0f} > {limits.max_jerk}")
+    for half, ideal in zip(profile.half_periods_us(), profile.ideal_intervals()):
+        slack_us = 2 * half - ideal * 1e6
+        if not -1e-6 <= slack_us < 2:
+            problems.append(f"step rounded by {slack_us:.2f} us")
+            break
+    mock_s, reply = run_on_mock(profile)
+    if reply != "Movement complete" or abs(mock_s - profile.duration_s) > 1e-9:
+        problems.append(f"controller took {mock_s:.6f} s ({reply!r}), estimate {profile.duration_s:.6f} s")
+    return (speed, accel, jerk), problems
+
+
+def main():
+    plans = int(sys.argv[1]) if len(sys.argv) > 1 else default_plans
+    failed = False
+    for limits in limit_sets:
+        print(f"{limits.shape}: {limits.max_speed:.0f} steps/s, {limits.max_accel:.0f} steps/s^2"
+              + (f", {limits.max_jerk:.0f} steps/s^3" if limits.max_jerk else ""))
+        print(f"  {'steps':>6}{'ramp':>6}{'fixed s':>9}{'ramped s':>10}{'speedup':>9}"
+              f"{'max v':>8}{'max a':>8}{'max j':>11}{'plan us':>9}")
+        for steps in distances:
+            start = time.perf_counter()
+            for _ in range(plans):
+                profile = plan_move(steps, limits)
+            plan_us = (time.perf_counter() - start) / plans * 1e6
+            (speed, accel, jerk), problems = check(profile, limits)
+            fixed = move_time(steps, None, fixed_delay_us)
+            print(f"  {steps:>6}{len(profile.ramp):>6}{fixed:>9.3f}{profile.duration_s:>10.3f}"
+                  f"{fixed / profile.duration_s:>8.2f}x{speed:>8.0f}{accel:>8.0f}"
+                  f"{jerk if limits.max_jerk else '-':>11{'.0f' if limits.max_jerk else ''}}{plan_us:>9.0f}")
+            for problem in problems:
+                print(f"    LIMIT VIOLATED: {problem}")
+                failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
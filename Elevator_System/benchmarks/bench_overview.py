@@ -0,0 +1,97 @@
+# Cost of showing the parking overview after each park or retrieve, by
+# garage size: re-running parking_overview() and formatting every row (what
+# print_parking_overview did) versus ParkingOverview.refresh() plus the
+# rows that changed. Each garage has half its spots occupied and a closed
+# receipt history of receipts_per_spot receipts per spot.
+#
+#   python bench_overview.py [operations]
+
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.overview import ParkingOverview, format_row
+
+default_operations = 20
+spot_counts = (100, 10000, 100000)
+receipts_per_spot = 5
+
+
+def make_database(path, spots):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    rng = random.Random(1)
+    occupied = set(rng.sample(range(1, spots + 1), spots // 2))
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', spot_id in occupied, 1, 200 + spot_id)
+        for spot_id in range(1, spots + 1)))
+
+    def receipts():
+        for n in range(spots * receipts_per_spot):
+            yield f"H{n:09d}", "2024-10-01 08:00:00", "2024-10-01 17:00:00", rng.randint(1, spots)
+        for spot_id in occupied:
+            yield f"O{spot_id:09d}", "2024-11-24 09:00:00", None, spot_id
+    conn.executemany("INSERT INTO Parking_Receipts VALUES (?, ?, ?, ?)", receipts())
+    conn.commit()
+    conn.close()
+
+
+def print_full_overview(repo, out):
+    out.write("Parking Overview:\n")
+    for row in repo.parking_overview():
+        out.write(format_row(*row) + "\n")
+
+
+def print_changes(overview, out):
+    overview.refresh()
+    text = overview.render_changes()
+    if text:
+        out.write(text + "\n")
+
+
+# Alternates park() and retrieve() of the last parked car, showing the
+# overview after each; returns mean milliseconds spent on the overview
+def measure(repo, show, operations):
+    out = io.StringIO()
+    parked = []
+    spent = 0.0
+    for n in range(operations):
+        if n % 2 == 0:
+            parked.append(repo.park()[3])
+        else:
+            repo.retrieve(parked.pop())
+        start = time.perf_counter()
+        show(out)
+        spent += time.perf_counter() - start
+    return spent / operations * 1000, len(out.getvalue())
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else default_operations
+    print(f"{'spots':>8}{'receipts':>11}{'full ms/op':>12}{'bytes':>12}{'delta ms/op':>13}{'bytes':>8}{'load ms':>9}")
+    for spots in spot_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'overview.db')
+            make_database(path, spots)
+            repo = ParkingRepository(path, readers=1)
+            full_ms, full_bytes = measure(repo, lambda out: print_full_overview(repo, out), operations)
+            start = time.perf_counter()
+            overview = ParkingOverview(repo)
+            load_ms = (time.perf_counter() - start) * 1000
+            delta_ms, delta_bytes = measure(repo, lambda out: print_changes(overview, out), operations)
+            if overview.rows() != [tuple(row) for row in repo.parking_overview()]:
+                print("MISMATCH between the overview and parking_overview()")
+                sys.exit(1)
+            repo.close()
+        print(f"{spots:>8}{spots * receipts_per_spot + spots // 2:>11}{full_ms:>12.2f}{full_bytes // operations:>12}"
+              f"{delta_ms:>13.3f}{delta_bytes // operations:>8}{load_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
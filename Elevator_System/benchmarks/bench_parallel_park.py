@@ -0,0 +1,119 @@
+# Fires parallel parks from many kiosks (one repository and connection set
+# per kiosk thread) at a local database and checks that no spot was handed
+# out twice. The old three-transaction sequence is run the same way for
+# comparison.
+#
+#   python bench_parallel_park.py [parks] [kiosks] [spots]
+
+import itertools
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database, nearest_free_spot
+
+default_parks = 5000
+default_kiosks = 16
+default_spots = 4000
+
+
+def make_database(path, spots):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    rows = [(spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+            for spot_id in range(1, spots + 1)]
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+# Spots holding more than one open receipt
+def count_double_allocations(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("""
+        SELECT Spot_ID, COUNT(*) FROM Parking_Receipts
+        WHERE Exit_time IS NULL
+        GROUP BY Spot_ID HAVING COUNT(*) > 1
+    """).fetchall()
+    parked = conn.execute("SELECT COUNT(*) FROM Parking_Receipts WHERE Exit_time IS NULL").fetchone()[0]
+    conn.close()
+    return sum(count - 1 for _, count in rows), parked
+
+
+def atomic_park(repo):
+    return repo.park() is not None
+
+
+# find -> update -> insert, each committed on its own like the original park_car()
+def three_step_park(repo):
+    with repo.pool.read() as conn:
+        spot = nearest_free_spot(conn)
+    if spot is None:
+        return False
+    repo.update_spot_status(spot[0], True)
+    repo.insert_parking_receipt(spot[0])
+    return True
+
+
+def run(park, path, parks, kiosks):
+    ids = itertools.count()
+    ids_lock = threading.Lock()
+    remaining = [parks]
+    errors = []
+
+    def next_id():
+        with ids_lock:
+            return f"S{next(ids)}"
+
+    def kiosk():
+        repo = ParkingRepository(path, readers=1, receipt_id_factory=next_id)
+        try:
+            while True:
+                with ids_lock:
+                    if remaining[0] == 0:
+                        return
+                    remaining[0] -= 1
+                try:
+                    park(repo)
+                except sqlite3.Error as e:
+                    errors.append(e)
+        finally:
+            repo.close()
+
+    threads = [threading.Thread(target=kiosk) for _ in range(kiosks)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(errors)
+
+
+def main():
+    parks = int(sys.argv[1]) if len(sys.argv) > 1 else default_parks
+    kiosks = int(sys.argv[2]) if len(sys.argv) > 2 else default_kiosks
+    spots = int(sys.argv[3]) if len(sys.argv) > 3 else default_spots
+
+    print(f"{parks} parks from {kiosks} kiosks into {spots} spots")
+    print(f"{'':<12}{'seconds':>10}{'parks/s':>10}{'errors':>8}{'parked':>8}{'double':>8}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, park in (("three-step", three_step_park), ("atomic", atomic_park)):
+            path = os.path.join(tmp, f"{name}.db")
+            make_database(path, spots)
+            elapsed, errors = run(park, path, parks, kiosks)
+            doubles, parked = count_double_allocations(path)
+            print(f"{name:<12}{elapsed:>10.3f}{parks / elapsed:>10.1f}{errors:>8}{parked:>8}{doubles:>8}")
+            if park is atomic_park and (doubles or parked != min(parks, spots)):
+                failed = True
+    if failed:
+        print("FAILED: atomic park double-allocated or lost spots")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
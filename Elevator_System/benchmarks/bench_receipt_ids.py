@@ -0,0 +1,110 @@
+# Receipt IDs: how soon the old random "R1234" IDs collide, how fast the
+# time-ordered generator issues IDs, and what the ordering buys when the
+# receipts are inserted: new keys appended at the end of the primary key
+# index versus the same number of random keys of the same length.
+#
+#   python bench_receipt_ids.py [ids_to_generate] [receipts_to_insert]
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.receipt_ids import ReceiptIdGenerator, alphabet, check_symbol, receipt_id_length
+
+default_ids = 2000000
+default_receipts = 1000000
+insert_batch = 1000
+collision_trials = 2000
+# A small page cache (KiB), as on the garage PC, so random inserts have to go to disk
+cache_kib = 2000
+
+
+def old_receipt_id(rng):
+    return f"R{rng.randint(1000, 9999)}"
+
+
+def receipts_until_collision(rng):
+    seen = set()
+    while True:
+        receipt_id = old_receipt_id(rng)
+        if receipt_id in seen:
+            return len(seen)
+        seen.add(receipt_id)
+
+
+def random_receipt_ids(rng):
+    while True:
+        payload = "".join(rng.choice(alphabet) for _ in range(receipt_id_length - 2))
+        yield f"R{payload}{check_symbol(payload)}"
+
+
+def generate(count):
+    generator = ReceiptIdGenerator(node=1)
+    start = time.perf_counter()
+    ids = [generator() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    unique = len(set(ids)) == count
+    ordered = all(a < b for a, b in zip(ids, ids[1:]))
+    return count / elapsed, unique, ordered, ids[0]
+
+
+def insert(path, ids):
+    count = len(ids)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{cache_kib}")
+    conn.execute("""
+        CREATE TABLE Parking_Receipts (
+            Receipt_ID TEXT PRIMARY KEY, Entry_time DATETIME, Exit_time DATETIME, Spot_ID INT)
+    """)
+    tail_start = None
+    start = time.perf_counter()
+    for done in range(0, count, insert_batch):
+        if done == count - count // 10:
+            tail_start = time.perf_counter()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO Parking_Receipts VALUES (?, '2024-11-24 09:00:00', NULL, 1)",
+                         ((receipt_id,) for receipt_id in ids[done:done + insert_batch]))
+        conn.execute("COMMIT")
+    end = time.perf_counter()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    conn.close()
+    tail_rate = (count // 10) / (end - tail_start) if tail_start else 0
+    return count / (end - start), tail_rate, pages * page_size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else default_ids
+    receipts = int(sys.argv[2]) if len(sys.argv) > 2 else default_receipts
+
+    rng = random.Random(1)
+    draws = sorted(receipts_until_collision(rng) for _ in range(collision_trials))
+    print(f"Old R1000-R9999 IDs: first collision after {draws[len(draws) // 2]} receipts (median of "
+          f"{collision_trials}), {draws[0]} at the earliest; the 9001st receipt always collides")
+
+    rate, unique, ordered, sample = generate(count)
+    print(f"Generated {count:,} IDs at {rate:,.0f}/s (e.g. {sample}): "
+          f"{'all unique' if unique else 'DUPLICATES'}, {'strictly increasing' if ordered else 'NOT ORDERED'}")
+
+    print(f"Inserting {receipts:,} receipts, {insert_batch} per transaction, {cache_kib} KiB page cache:")
+    print(f"  {'keys':<16}{'inserts/s':>12}{'last 10%/s':>12}{'file MB':>10}")
+    generator = ReceiptIdGenerator(node=1)
+    random_ids = random_receipt_ids(random.Random(2))
+    # Keys are drawn up front so only the inserts are timed
+    keys = (("time-ordered", [generator() for _ in range(receipts)]),
+            ("random", [next(random_ids) for _ in range(receipts)]))
+    for name, ids in keys:
+        with tempfile.TemporaryDirectory() as tmp:
+            overall, tail, size = insert(os.path.join(tmp, 'receipts.db'), ids)
+        print(f"  {name:<16}{overall:>12,.0f}{tail:>12,.0f}{size / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
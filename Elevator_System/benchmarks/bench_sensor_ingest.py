@@ -0,0 +1,102 @@
+# Sustained sensor readings per second at 10, 1k and 10k sensors: the old
+# UpdateSpotStatus.update_parking_status (two statements and a commit per
+# reading) versus SensorIngestor. Each sensor flips state on about 5% of its
+# readings, the rest repeat the previous state, as a parked or empty spot
+# does between cars.
+#
+#   python bench_sensor_ingest.py [seconds_per_run]
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.sensor_ingest import SensorIngestor
+
+default_seconds = 2.0
+sensor_counts = (10, 1000, 10000)
+change_probability = 0.05
+
+
+def make_database(path, sensors):
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+        for spot_id in range(1, sensors + 1)))
+    conn.commit()
+    conn.close()
+
+
+# Endless round-robin stream of (sensor_id, spot_id, status)
+def readings(sensors, rng):
+    states = ["Available"] * sensors
+    while True:
+        for n in range(sensors):
+            if rng.random() < change_probability:
+                states[n] = "Occupied" if states[n] == "Available" else "Available"
+            yield 200 + n + 1, n + 1, states[n]
+
+
+# update_parking_status() as it was: a commit per reading
+def per_reading(path, sensors, seconds):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    stream = readings(sensors, random.Random(1))
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        sensor_id, spot_id, status = next(stream)
+        cursor.execute("UPDATE Parking_Spots SET Is_occupied = ? WHERE Spot_ID = ?",
+                       (1 if status == "Occupied" else 0, spot_id))
+        cursor.execute('''
+            INSERT INTO Parking_Sensors (Sensor_ID, Spot_ID, Status, Last_checked, Sensor_type)
+            VALUES (?, ?, ?, datetime('now'), 'Ultrasonic')
+            ON CONFLICT(Sensor_ID, Spot_ID) DO UPDATE SET
+                Status = excluded.Status,
+                Last_checked = datetime('now')
+        ''', (sensor_id, spot_id, status))
+        conn.commit()
+        count += 1
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return count / elapsed, count
+
+
+def batched(path, sensors, seconds):
+    repo = ParkingRepository(path, readers=1)
+    ingestor = SensorIngestor(repo)
+    stream = readings(sensors, random.Random(1))
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(100):
+            ingestor.submit(*next(stream))
+        count += 100
+    ingestor.close()
+    elapsed = time.perf_counter() - start
+    rows = ingestor.rows_written
+    repo.close()
+    return count / elapsed, rows
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else default_seconds
+    print(f"{'sensors':>8}{'per-reading/s':>16}{'batched/s':>14}{'rows written':>15}")
+    for sensors in sensor_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'old.db')
+            make_database(path, sensors)
+            old_rate, _ = per_reading(path, sensors, seconds)
+            path = os.path.join(tmp, 'new.db')
+            make_database(path, sensors)
+            new_rate, rows = batched(path, sensors, seconds)
+        print(f"{sensors:>8}{old_rate:>16,.0f}{new_rate:>14,.0f}{rows:>15,}")
+
+
+if __name__ == "__main__":
+    main()
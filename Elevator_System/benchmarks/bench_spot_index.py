@@ -0,0 +1,84 @@
+# Closest-free-spot lookup: the ORDER BY ABS(Level_ID - 1) query versus the
+# in-memory FreeSpotIndex, at 12, 1k and 100k spots. Each round allocates
+# the closest spot and frees a random occupied one, so the free set keeps
+# changing the way it does in a running garage.
+#
+#   python bench_spot_index.py [rounds]
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import SCHEMA, nearest_free_spot
+from elevator_shared.spot_index import FreeSpotIndex
+
+sizes = (12, 1000, 100000)
+default_rounds = 2000
+
+
+def make_database(spots):
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    rows = [(spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+            for spot_id in range(1, spots + 1)]
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", rows)
+    # Start half full so the closest free spot is not simply Spot_ID 1
+    occupied = random.Random(spots).sample(range(1, spots + 1), spots // 2)
+    conn.executemany("UPDATE Parking_Spots SET Is_occupied = 1 WHERE Spot_ID = ?", [(s,) for s in occupied])
+    conn.commit()
+    return conn, occupied
+
+
+# Only the lookups are timed; the UPDATEs keeping the table in step are not
+def run_sql(conn, occupied, rounds, rng):
+    elapsed = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        spot_id = nearest_free_spot(conn)[0]
+        elapsed += time.perf_counter() - start
+        conn.execute("UPDATE Parking_Spots SET Is_occupied = 1 WHERE Spot_ID = ?", (spot_id,))
+        occupied.append(spot_id)
+        freed = occupied.pop(rng.randrange(len(occupied)))
+        conn.execute("UPDATE Parking_Spots SET Is_occupied = 0 WHERE Spot_ID = ?", (freed,))
+    return elapsed, nearest_free_spot(conn)
+
+
+# Lookup plus the index bookkeeping for the allocation and the free
+def run_index(index, occupied, rounds, rng):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        spot_id = index.nearest()[0]
+        index.set_free(spot_id, False)
+        occupied.append(spot_id)
+        freed = occupied.pop(rng.randrange(len(occupied)))
+        index.set_free(freed, True)
+    return time.perf_counter() - start, index.nearest()
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else default_rounds
+    print(f"{'spots':>8}{'load ms':>10}{'sql us/op':>12}{'index us/op':>13}{'speedup':>9}")
+    for spots in sizes:
+        conn, occupied = make_database(spots)
+        start = time.perf_counter()
+        index = FreeSpotIndex.load(conn)
+        load = time.perf_counter() - start
+
+        # Same starting state and the same random frees, so both paths must
+        # end on the same closest spot
+        sql, sql_last = run_sql(conn, list(occupied), rounds, random.Random(1))
+        indexed, index_last = run_index(index, list(occupied), rounds, random.Random(1))
+        conn.close()
+
+        print(f"{spots:>8}{load * 1e3:>10.2f}{sql / rounds * 1e6:>12.2f}"
+              f"{indexed / rounds * 1e6:>13.2f}{sql / indexed:>8.1f}x")
+        if tuple(sql_last) != tuple(index_last):
+            print(f"MISMATCH: sql chose {sql_last}, index chose {index_last}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# GUI frame latency in Final_System_Vertical_Only while the spot status is
+# polled: CHECK_SPOT on the Tk thread every 3 s (what update_status did)
+# versus StatusPoller on a worker thread drained every 100 ms. The
+# controller is a FakeArduino on a pseudo-terminal at 9600 baud, answering
+# normally and then not at all (each poll waits out the 1 s read timeout).
+# Tk needs a display, so the event loop is a stand-in with the same after().
+#
+#   python bench_status_poll.py [seconds_per_run]
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.animation import FrameLatencyMonitor
+from elevator_shared.fake_arduino import FakeArduino
+from elevator_shared.status_poller import StatusPoller
+
+default_seconds = 10.0
+inline_interval_ms = 3000
+drain_ms = 100
+
+
+# Single-threaded after() loop, run like root.mainloop() for a fixed time
+class EventLoop:
+    def __init__(self):
+        self._calls = []
+        self._order = itertools.count()
+
+    def after(self, ms, callback):
+        heapq.heappush(self._calls, (time.monotonic() + ms / 1000, next(self._order), callback))
+
+    def run(self, seconds):
+        end = time.monotonic() + seconds
+        while self._calls and self._calls[0][0] < end:
+            due, _, callback = heapq.heappop(self._calls)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            callback()
+
+
+def make_check(port, lock):
+    def check():
+        with lock:
+            port.write(b"CHECK_SPOT\n")
+            response = port.readline().decode().strip()
+        if response == "Spot Occupied":
+            return True
+        if response == "Spot Free":
+            return False
+        return None
+    return check
+
+
+def run_inline(loop, check):
+    def update_status():
+        check()
+        loop.after(inline_interval_ms, update_status)
+    update_status()
+
+
+def run_poller(loop, check):
+    poller = StatusPoller(check)
+    poller.start()
+
+    def update_status():
+        poller.latest()
+        loop.after(drain_ms, update_status)
+    update_status()
+    return poller
+
+
+def measure(mode, silent, seconds):
+    fake = FakeArduino('vertical', baud=9600)
+    fake.silent = silent
+    port = fake.open_port(timeout=1.0)
+    loop = EventLoop()
+    monitor = FrameLatencyMonitor(loop)
+    monitor.start()
+    check = make_check(port, threading.Lock())
+    poller = run_poller(loop, check) if mode == "poller" else None
+    if poller is None:
+        run_inline(loop, check)
+    loop.run(seconds)
+    polls = poller.polls if poller else None
+    if poller:
+        poller.stop()
+    port.close()
+    fake.close()
+    return monitor.summary(), polls
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else default_seconds
+    print(f"{'controller':<12}{'polling':<10}{'frames':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'>100 ms':>9}{'polls':>7}")
+    for silent in (False, True):
+        for mode in ("inline", "poller"):
+            s, polls = measure(mode, silent, seconds)
+            print(f"{'silent' if silent else 'answering':<12}{mode:<10}{s['frames']:>8}{s['p50_ms']:>9.1f}"
+                  f"{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}{s['slow_frames']:>9}{polls if polls is not None else '-':>7}")
+
+
+if __name__ == "__main__":
+    main()
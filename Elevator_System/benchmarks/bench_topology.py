@@ -0,0 +1,82 @@
+# Spot -> step coordinates and canvas position, per request: the old
+# repo.get_spot() query plus the arithmetic the 6-motor scripts did, versus
+# the lookup tables GarageTopology compiles from its file. Garages of 6,
+# 500 and 5000 levels with a spot either side of one shaft (the layout the
+# old arithmetic knows); prints MISMATCH and exits 1 if the two disagree.
+#
+#   python bench_topology.py [lookups]
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.topology import GarageTopology
+
+level_counts = (6, 500, 5000)
+default_lookups = 20000
+
+# The scripts' old constants
+level_height_cm = 20
+cm_to_steps = 10
+cm_to_px = 5
+canvas_width = 1920
+canvas_height = 800
+steps_to_middle_position = 1000
+
+
+def old_lookup(repo, spot_id):
+    level_id, spot_type = repo.get_spot(spot_id)
+    steps = int(level_id * level_height_cm * cm_to_steps)
+    command = "MOVE_HORIZONTAL_LEFT" if spot_type.lower() == 'left' else "MOVE_HORIZONTAL_RIGHT"
+    platform_width_px = level_height_cm * cm_to_px
+    shaft_center = canvas_width // 2
+    y = canvas_height - (level_id * level_height_cm * cm_to_px)
+    x = shaft_center - platform_width_px if spot_type.lower() == 'left' else shaft_center + platform_width_px
+    return (steps, command, steps_to_middle_position), (x, y)
+
+
+def new_lookup(topology, spot_id):
+    return topology.spot_steps[spot_id], topology.spot_canvas[spot_id]
+
+
+def main():
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else default_lookups
+    print(f"{'levels':>7}{'spots':>8}{'compile ms':>12}{'query+math us':>15}{'table us':>10}{'speedup':>9}")
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for levels in level_counts:
+            start = time.perf_counter()
+            topology = GarageTopology(levels=levels)
+            compile_ms = (time.perf_counter() - start) * 1e3
+            db_path = os.path.join(tmp, f'garage_{levels}.db')
+            create_database(db_path)
+            repo = ParkingRepository(db_path)
+            repo.populate_parking_spots(topology.parking_spots())
+            rng = random.Random(levels)
+            spot_ids = [rng.randint(1, topology.spot_count) for _ in range(lookups)]
+
+            start = time.perf_counter()
+            old = [old_lookup(repo, spot_id) for spot_id in spot_ids]
+            old_us = (time.perf_counter() - start) / lookups * 1e6
+            start = time.perf_counter()
+            new = [new_lookup(topology, spot_id) for spot_id in spot_ids]
+            new_us = (time.perf_counter() - start) / lookups * 1e6
+            repo.close()
+
+            print(f"{levels:>7}{topology.spot_count:>8}{compile_ms:>12.2f}{old_us:>15.2f}{new_us:>10.3f}"
+                  f"{old_us / new_us:>8.0f}x")
+            for spot_id, a, b in zip(spot_ids, old, new):
+                if a != b:
+                    print(f"  MISMATCH for Spot_ID {spot_id}: {a} != {b}")
+                    failed = True
+                    break
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Cost of a tracing.py span with the tracer off (the default, what every
+# instrumented call path pays) and on, and what a traced pooled read adds.
+# Then fills the ring buffer past its capacity from four threads, checks
+# nested spans fall inside their parent and reads the export back as JSON.
+# Prints LIMIT VIOLATED if a span costs more than its limit and MISMATCH if
+# the buffer or the export is wrong; exits 1 on either.
+#
+#   python bench_tracing.py [samples]
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared import tracing
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.tracing import Tracer
+
+default_samples = 200_000
+disabled_limit_us = 1.0
+enabled_limit_us = 5.0
+capacity = 10_000
+threads = 4
+
+
+def per_call_us(function, samples):
+    started = time.perf_counter()
+    for _ in range(samples):
+        function()
+    return (time.perf_counter() - started) / samples * 1e6
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else default_samples
+    tracer = Tracer(capacity=samples)
+
+    def traced():
+        with tracer.span("CHECK_SPOT", cat="serial", spot_id=3):
+            pass
+
+    baseline = per_call_us(lambda: None, samples)
+    disabled = per_call_us(traced, samples) - baseline
+    tracer.enable()
+    enabled = per_call_us(traced, samples) - baseline
+    failed = False
+    print(f"{'per span':<32}{'us':>8}")
+    for name, cost, limit in (('with span(), tracer off', disabled, disabled_limit_us),
+                              ('with span(), tracer on', enabled, enabled_limit_us)):
+        print(f"{name:<32}{cost:>8.2f}")
+        if cost > limit:
+            print(f"LIMIT VIOLATED: {name} takes {cost:.2f} us, over {limit} us")
+            failed = True
+    if len(tracer.events) != samples:
+        print(f"MISMATCH: {samples:,} spans recorded, buffer holds {len(tracer.events):,}")
+        failed = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'tracing.db')
+        create_database(db_path)
+        repo = ParkingRepository(db_path)
+        repo.populate_parking_spots([(1, 1, 'Left', 0, 1, 201)])
+        reads = samples // 10
+        bare = per_call_us(lambda: repo.get_spot(1), reads)
+        tracing.tracer.enable()
+        try:
+            traced_read = per_call_us(lambda: repo.get_spot(1), reads)
+        finally:
+            tracing.tracer.disable()
+            tracing.tracer.clear()
+        print(f"{'pooled get_spot()':<32}{bare:>8.2f}   ({traced_read - bare:+.2f} us traced)")
+        repo.close()
+
+        # Four threads write past the capacity; the buffer keeps the newest
+        ring = Tracer(capacity=capacity).enable()
+        per_thread = capacity
+        workers = [threading.Thread(target=lambda: [ring.instant("tick") for _ in range(per_thread)])
+                   for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if len(ring.events) != capacity:
+            print(f"MISMATCH: {per_thread * threads:,} spans into a buffer of {capacity:,}, "
+                  f"it holds {len(ring.events):,}")
+            failed = True
+
+        # A park with two commands inside it, exported and read back
+        nested = Tracer().enable()
+        with nested.span("park", receipt_id="R00000001"):
+            with nested.span("MOVE_VERTICAL_UP 2700", cat="serial") as span:
+                time.sleep(0.002)
+                span.set(reply="DONE")
+            with nested.span("insert_parking_receipt", cat="db"):
+                pass
+        nested.instant("Car in Spot")
+        path = nested.export(os.path.join(tmp, 'trace.json'))
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+        spans = {event["name"]: event for event in events if event["ph"] == "X"}
+        park = spans.get("park")
+        children = [spans.get("MOVE_VERTICAL_UP 2700"), spans.get("insert_parking_receipt")]
+        if park is None or None in children or len(spans) != 3:
+            print(f"MISMATCH: export holds spans {sorted(spans)}")
+            failed = True
+        else:
+            for child in children:
+                if child["ts"] < park["ts"] or child["ts"] + child["dur"] > park["ts"] + park["dur"]:
+                    print(f"MISMATCH: {child['name']} is not inside the park span")
+                    failed = True
+            if children[0].get("args", {}).get("reply") != "DONE":
+                print("MISMATCH: the reply set inside the span is missing from the export")
+                failed = True
+        if sum(event["ph"] == "i" for event in events) != 1:
+            print("MISMATCH: the instant event is missing from the export")
+            failed = True
+        print(f"{'export':<32}{len(events):>8}   events, nested spans inside their parent")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
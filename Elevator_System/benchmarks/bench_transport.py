@@ -0,0 +1,59 @@
+# Serial round trips against a fake Arduino on a pseudo-terminal: the old
+# busy-wait loop from New_Elevator_System.send_command versus
+# SerialTransport. Reports round trips per second with instant replies, and
+# CPU burned while waiting for a move that takes real motor time.
+#
+#   python bench_transport.py [round_trips]
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from elevator_shared.fake_arduino import FakeArduino
+from elevator_shared.transport import SerialTransport
+
+default_round_trips = 2000
+move_steps = 500   # 1 s at the New_Elevator_System.ino step rate
+
+
+# send_command() as it was: spin on in_waiting until DONE
+def busy_wait_command(arduino, command):
+    arduino.write((command + '\n').encode())
+    while True:
+        if arduino.in_waiting > 0:
+            response = arduino.readline().decode().strip()
+            if response == "DONE":
+                return response
+
+
+def measure(run, round_trips, command):
+    start, cpu = time.perf_counter(), time.process_time()
+    for _ in range(round_trips):
+        run(command)
+    return time.perf_counter() - start, time.process_time() - cpu
+
+
+def main():
+    round_trips = int(sys.argv[1]) if len(sys.argv) > 1 else default_round_trips
+    print(f"{'':<12}{'round trips/s':>15}{'move wall s':>13}{'move CPU s':>12}")
+    for name in ("busy-wait", "transport"):
+        fake = FakeArduino('new', time_scale=0.0)
+        port = fake.open_port(timeout=1.0)
+        if name == "busy-wait":
+            run = lambda command: busy_wait_command(port, command)
+            close = port.close
+        else:
+            transport = SerialTransport(port, done_lines={"DONE"})
+            run = transport.request
+            close = transport.close
+        elapsed, _ = measure(run, round_trips, "CHECK_SPOT")
+        fake.time_scale = 1.0
+        move_wall, move_cpu = measure(run, 1, f"MOVE_VERTICAL_UP {move_steps}")
+        close()
+        fake.close()
+        print(f"{name:<12}{round_trips / elapsed:>15.0f}{move_wall:>13.2f}{move_cpu:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Modules shared by the elevator system variants
@@ -0,0 +1,227 @@
+import time
+from collections import deque
+
+from .simulator import percentile
+
+# Milliseconds between frames when driven by Tk (~60 fps)
+frame_ms = 16
+
+
+# Manually advanced clock for headless runs
+class VirtualClock:
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class _Move:
+    def __init__(self, target_x, target_y, speed):
+        self.target_x = target_x
+        self.target_y = target_y
+        self.speed = speed
+
+    def begin(self, sprite, t):
+        self.start = t
+        self.from_x = sprite['x']
+        self.from_y = sprite['y']
+        distance = ((self.target_x - self.from_x) ** 2 + (self.target_y - self.from_y) ** 2) ** 0.5
+        self.end = t + (distance / self.speed if self.speed > 0 else 0.0)
+
+    def position(self, t):
+        if t >= self.end or self.end == self.start:
+            return self.target_x, self.target_y
+        fraction = (t - self.start) / (self.end - self.start)
+        return (self.from_x + (self.target_x - self.from_x) * fraction,
+                self.from_y + (self.target_y - self.from_y) * fraction)
+
+
+class _Wait:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def begin(self, sprite, t):
+        self.end = t + self.seconds
+
+
+class _Call:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def begin(self, sprite, t):
+        self.end = t
+
+
+class _Track:
+    def __init__(self, sprite):
+        self.sprite = sprite
+        self.queue = deque()
+        self.current = None
+        self.last_end = 0.0
+
+
+# Frame-scheduled animation of canvas items. Every sprite is a dict with
+# 'x', 'y' and optionally 'rect' (a canvas item id), like the platform
+# entries in the simulation. Each sprite has its own queue of moves, waits
+# and callbacks; all sprites animate at the same time. Positions are
+# interpolated from elapsed time, so speed is in pixels per second no matter
+# how often frames arrive.
+#
+# With a canvas the engine schedules itself with after(). Headless engines
+# (canvas=None) only move when advance() or run_until_idle() is called,
+# normally with a VirtualClock so no real time passes.
+class AnimationEngine:
+    def __init__(self, canvas=None, clock=None):
+        self.canvas = canvas
+        self.clock = clock or (VirtualClock() if canvas is None else time.monotonic)
+        self._tracks = {}
+        self._scheduled = False
+        self.frames = 0
+
+    @property
+    def headless(self):
+        return self.canvas is None
+
+    def move(self, sprite, x, y, speed):
+        self._enqueue(sprite, _Move(x, y, speed))
+
+    def wait(self, sprite, seconds):
+        self._enqueue(sprite, _Wait(seconds))
+
+    # Runs callback(sprite) once everything queued before it has finished
+    def call(self, sprite, callback):
+        self._enqueue(sprite, _Call(callback))
+
+    def is_busy(self, sprite=None):
+        if sprite is None:
+            return bool(self._tracks)
+        return id(sprite) in self._tracks
+
+    def _enqueue(self, sprite, segment):
+        track = self._tracks.get(id(sprite))
+        if track is None:
+            track = self._tracks[id(sprite)] = _Track(sprite)
+            track.last_end = self.clock()
+        track.queue.append(segment)
+        self._schedule()
+
+    def _schedule(self):
+        if self.headless or self._scheduled:
+            return
+        self._scheduled = True
+        self.canvas.after(frame_ms, self._on_frame)
+
+    def _on_frame(self):
+        self._scheduled = False
+        self.tick()
+        if self._tracks:
+            self._schedule()
+
+    # Brings every sprite up to the clock's current time
+    def tick(self):
+        now = self.clock()
+        self.frames += 1
+        for key, track in list(self._tracks.items()):
+            while track.queue:
+                segment = track.queue[0]
+                if track.current is not segment:
+                    # A segment starts when the previous one ended, not at
+                    # this frame, so leftover frame time is not lost
+                    segment.begin(track.sprite, track.last_end)
+                    track.current = segment
+                if isinstance(segment, _Move):
+                    self._place(track.sprite, *segment.position(now))
+                if now < segment.end:
+                    break
+                track.queue.popleft()
+                track.current = None
+                track.last_end = segment.end
+                if isinstance(segment, _Call):
+                    segment.callback(track.sprite)
+            if not track.queue:
+                del self._tracks[key]
+
+    def _place(self, sprite, x, y):
+        dx = x - sprite['x']
+        dy = y - sprite['y']
+        sprite['x'] = x
+        sprite['y'] = y
+        if self.canvas is not None and sprite.get('rect') is not None and (dx or dy):
+            self.canvas.move(sprite['rect'], dx, dy)
+
+    # Headless only: moves the virtual clock forward in frame-sized steps
+    def advance(self, seconds, step=frame_ms / 1000):
+        end = self.clock() + seconds
+        while self.clock() < end:
+            self.clock.advance(min(step, end - self.clock()))
+            self.tick()
+
+    # Headless only: jumps straight to the end of each segment until every
+    # queue is empty. Returns the simulated seconds that passed.
+    def run_until_idle(self, limit=3600.0):
+        start = self.clock()
+        self.tick()
+        while self._tracks and self.clock() - start < limit:
+            ends = [track.current.end for track in self._tracks.values() if track.current is not None]
+            if ends:
+                self.clock.advance(max(0.0, min(ends) - self.clock()))
+            self.tick()
+        return self.clock() - start
+
+
+# How late the Tk event loop runs scheduled callbacks. A tick is scheduled
+# every interval_ms with after(); how much later than that it actually runs
+# is recorded. Anything blocking the Tk thread (a serial read, a database
+# call) shows up as a late frame as long as the block.
+class FrameLatencyMonitor:
+    def __init__(self, widget, interval_ms=frame_ms, window=10000, clock=time.monotonic):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.clock = clock
+        self.lateness = deque(maxlen=window)
+        self.frames = 0
+        self.worst = 0.0
+        self._expected = None
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._schedule()
+
+    def stop(self):
+        self._running = False
+
+    def _schedule(self):
+        self._expected = self.clock() + self.interval_ms / 1000
+        self.widget.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        late = max(0.0, self.clock() - self._expected)
+        self.lateness.append(late)
+        self.worst = max(self.worst, late)
+        self.frames += 1
+        if self._running:
+            self._schedule()
+
+    # Milliseconds late: p50, p99 and max over the window, and the number
+    # of frames in the window later than slow_ms
+    def summary(self, slow_ms=100):
+        values = list(self.lateness)
+        return {
+            'frames': self.frames,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': self.worst * 1000,
+            'slow_frames': sum(1 for late in values if late * 1000 > slow_ms),
+        }
+
+    def report(self, slow_ms=100):
+        s = self.summary(slow_ms)
+        return (f"GUI frame latency over {s['frames']} frames: p50 {s['p50_ms']:.1f} ms, "
+                f"p99 {s['p99_ms']:.1f} ms, max {s['max_ms']:.1f} ms, "
+                f"{s['slow_frames']} frames over {slow_ms} ms")
@@ -0,0 +1,152 @@
+import argparse
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from .db import archive_path_for, get_repository
+from .receipt_ids import normalize_receipt_id
+
+# Closed receipts younger than this stay in the hot table
+default_keep_days = 90
+# Receipts moved per transaction, and the pause between chunks that lets
+# the kiosks' own writes in
+default_chunk_size = 500
+default_pause_s = 0.05
+
+
+# Moves closed receipts older than a cutoff, with their payments, from the
+# hot Parking_Receipts/Payments tables into the archive database, so the
+# hot table only holds open and recent receipts. History stays queryable
+# through the Receipt_History and Payment_History views (see db.py).
+#
+# Each chunk is two short write transactions: copy to the archive, then
+# delete what the archive now holds. A transaction over attached files is
+# not atomic across them when the main database is in WAL mode; this way
+# a crash in between leaves the chunk in both files (hidden by the views)
+# and the next run copies it again, but never in neither.
+class ReceiptArchiver:
+    def __init__(self, repo, archive_path=None, keep_days=default_keep_days, chunk_size=default_chunk_size,
+                 pause_s=default_pause_s):
+        self.repo = repo
+        repo.attach_archive(archive_path or archive_path_for(repo.db_path))
+        self.keep_days = keep_days
+        self.chunk_size = chunk_size
+        self.pause_s = pause_s
+
+    def cutoff(self, now=None):
+        now = now or datetime.now()
+        return (now - timedelta(days=self.keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Moves up to chunk_size receipts closed before cutoff; returns
+    # (receipts, payments) moved
+    def archive_chunk(self, cutoff):
+        with self.repo.pool.write() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS Archive_Batch (Receipt_ID TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.Archive_Batch")
+            receipts = conn.execute("""
+                INSERT INTO temp.Archive_Batch (Receipt_ID)
+                SELECT Receipt_ID FROM main.Parking_Receipts
+                WHERE Exit_time IS NOT NULL AND Exit_time < ?
+                ORDER BY Exit_time
+                LIMIT ?
+            """, (cutoff, self.chunk_size)).rowcount
+            if not receipts:
+                return 0, 0
+            conn.execute("""
+                INSERT OR REPLACE INTO archive.Parking_Receipts (Receipt_ID, Entry_time, Exit_time, Spot_ID)
+                SELECT Receipt_ID, Entry_time, Exit_time, Spot_ID FROM main.Parking_Receipts
+                WHERE Receipt_ID IN (SELECT Receipt_ID FROM temp.Archive_Batch)
+            """)
+            payments = conn.execute("""
+                INSERT OR REPLACE INTO archive.Payments
+                    (Payment_ID, Receipt_ID, Payment_time, Amount, Payment_method)
+                SELECT Payment_ID, Receipt_ID, Payment_time, Amount, Payment_method FROM main.Payments
+                WHERE Receipt_ID IN (SELECT Receipt_ID FROM temp.Archive_Batch)
+            """).rowcount
+        with self.repo.pool.write() as conn:
+            # Only what reached the archive; a payment made since the copy
+            # stays in the hot table until the receipt's next run
+            conn.execute("""
+                DELETE FROM main.Payments
+                WHERE Receipt_ID IN (SELECT Receipt_ID FROM temp.Archive_Batch)
+                  AND EXISTS (SELECT 1 FROM archive.Payments a WHERE a.Payment_ID = main.Payments.Payment_ID)
+            """)
+            conn.execute("""
+                DELETE FROM main.Parking_Receipts
+                WHERE Receipt_ID IN (SELECT Receipt_ID FROM temp.Archive_Batch)
+                  AND EXISTS (SELECT 1 FROM archive.Parking_Receipts a
+                              WHERE a.Receipt_ID = main.Parking_Receipts.Receipt_ID)
+            """)
+        return receipts, payments
+
+    # Archives everything closed before cutoff (default: keep_days ago),
+    # chunk by chunk; returns (receipts, payments) moved
+    def run(self, cutoff=None, max_chunks=None):
+        cutoff = cutoff or self.cutoff()
+        total_receipts = total_payments = chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            receipts, payments = self.archive_chunk(cutoff)
+            if not receipts:
+                break
+            total_receipts += receipts
+            total_payments += payments
+            chunks += 1
+            if self.pause_s:
+                time.sleep(self.pause_s)
+        return total_receipts, total_payments
+
+    # (Receipt_ID, Entry_time, Exit_time, Spot_ID, archived) or None
+    def find(self, receipt_id):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return None
+        with self.repo.pool.read() as conn:
+            for schema in ('main', 'archive'):
+                row = conn.execute(f"""
+                    SELECT Receipt_ID, Entry_time, Exit_time, Spot_ID FROM {schema}.Parking_Receipts
+                    WHERE Receipt_ID = ?
+                """, (receipt_id,)).fetchone()
+                if row is not None:
+                    return tuple(row) + (schema == 'archive',)
+        return None
+
+    # Row counts of the hot and archived tables
+    def counts(self):
+        with self.repo.pool.read() as conn:
+            return {f"{schema}.{table}": conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+                    for schema in ('main', 'archive') for table in ('Parking_Receipts', 'Payments')}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move closed receipts older than --keep-days, with their payments, to the archive database.")
+    parser.add_argument('db', help="database with Parking_Receipts and Payments")
+    parser.add_argument('--archive', help="archive database (default: DB_archive.db next to DB)")
+    parser.add_argument('--keep-days', type=float, default=default_keep_days)
+    parser.add_argument('--chunk-size', type=int, default=default_chunk_size)
+    parser.add_argument('--find', metavar='RECEIPT_ID', help="look a receipt up in the hot and archived tables")
+    args = parser.parse_args()
+
+    try:
+        archiver = ReceiptArchiver(get_repository(args.db), args.archive, args.keep_days, args.chunk_size)
+        if args.find:
+            row = archiver.find(args.find)
+            if row is None:
+                print(f"No receipt {args.find}")
+            else:
+                where = "archived" if row[4] else "hot"
+                print(f"{row[0]} ({where}): spot {row[3]}, entry {row[1]}, exit {row[2]}")
+            return
+        cutoff = archiver.cutoff()
+        started = time.perf_counter()
+        receipts, payments = archiver.run(cutoff)
+        print(f"Archived {receipts:,} receipts closed before {cutoff} and {payments:,} payments "
+              f"in {time.perf_counter() - started:.1f} s")
+        for table, count in archiver.counts().items():
+            print(f"  {table}: {count:,}")
+    except sqlite3.Error as e:
+        print(f"Error archiving receipts: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import itertools
+import math
+import sqlite3
+
+from .db import get_repository, now_text
+from .receipt_ids import normalize_receipt_id
+
+seconds_per_day = 86400
+default_payment_method = 'card'
+
+
+# Parking fees, in cents. A stay is billed in units of unit_minutes,
+# rounded up:
+#
+#   tiers: [(hours, cents per unit), ...] charged in order; the last tier's
+#          hours may be None (open-ended)
+#   grace_minutes: stays this short are free
+#   daily_cap: most a stay pays per 24 hours from entry, or None
+#   night: (start hour, end hour, cents per unit) for units in the night
+#          window (it may wrap midnight, e.g. 22 to 6), or None
+#
+# Each whole 24 hours of a stay costs the price of a full day (capped);
+# the rest is split into day and night time, the day time billed by the
+# tiers and the night time at the night rate, and capped again.
+#
+# fee() bills one stay in plain Python; fees() bills arrays of stays with
+# NumPy, by the same formulas, to the same cent.
+class Tariff:
+    def __init__(self, tiers, unit_minutes=60, grace_minutes=0, daily_cap=None, night=None):
+        if not tiers:
+            raise ValueError("A tariff needs at least one tier")
+        if any(hours is None for hours, _ in tiers[:-1]):
+            raise ValueError("Only the last tier may be open-ended")
+        self.tiers = [(hours, int(rate)) for hours, rate in tiers]
+        self.unit_minutes = unit_minutes
+        self.grace_minutes = grace_minutes
+        self.daily_cap = daily_cap
+        self.night = night
+        self.unit_s = int(unit_minutes * 60)
+        # Tier boundaries in units and the fee at each
+        self._bounds = [0]
+        self._bound_fees = [0]
+        for hours, rate in self.tiers[:-1]:
+            units = math.ceil(hours * 3600 / self.unit_s)
+            self._bound_fees.append(self._bound_fees[-1] + units * rate)
+            self._bounds.append(self._bounds[-1] + units)
+        if night is not None:
+            start, end, _ = night
+            self._night_start = int(start * 3600) % seconds_per_day
+            self._night_end = int(end * 3600) % seconds_per_day
+            self.night_s = (self._night_end - self._night_start) % seconds_per_day
+        else:
+            self.night_s = 0
+        self.day_price = self._cap(self._part_fee(seconds_per_day - self.night_s, self.night_s))
+
+    def _cap(self, fee):
+        return fee if self.daily_cap is None else min(fee, self.daily_cap)
+
+    def _tiered(self, units):
+        for n in range(len(self._bounds) - 1):
+            if units <= self._bounds[n + 1]:
+                return self._bound_fees[n] + (units - self._bounds[n]) * self.tiers[n][1]
+        return self._bound_fees[-1] + (units - self._bounds[-1]) * self.tiers[-1][1]
+
+    def _part_fee(self, day_s, night_s):
+        fee = self._tiered(-(-day_s // self.unit_s))
+        if self.night is not None:
+            fee += -(-night_s // self.unit_s) * self.night[2]
+        return fee
+
+    # Night seconds between the epoch and t (epoch seconds of the local
+    # clock, as SQLite's strftime('%s') gives for the stored times)
+    def _night_before(self, t):
+        days, second = divmod(t, seconds_per_day)
+        if self._night_start <= self._night_end:
+            part = min(max(second - self._night_start, 0), self.night_s)
+        else:
+            part = min(second, self._night_end) + max(second - self._night_start, 0)
+        return days * self.night_s + part
+
+    # Fee in cents for a stay from entry to exit (epoch seconds)
+    def fee(self, entry, exit):
+        stay = max(0, int(exit) - int(entry))
+        if stay <= self.grace_minutes * 60:
+            return 0
+        days, rest = divmod(stay, seconds_per_day)
+        night_s = 0
+        if self.night is not None:
+            night_s = self._night_before(int(exit)) - self._night_before(int(entry) + days * seconds_per_day)
+        return days * self.day_price + self._cap(self._part_fee(rest - night_s, night_s))
+
+    # Fees in cents (int64 array) for arrays of entry and exit times
+    def fees(self, entries, exits):
+        import numpy as np
+        entries = np.asarray(entries, dtype=np.int64)
+        exits = np.asarray(exits, dtype=np.int64)
+        stay = np.maximum(exits - entries, 0)
+        days, rest = np.divmod(stay, seconds_per_day)
+        night_s = np.zeros_like(stay)
+        if self.night is not None:
+            # Same as _night_before(), for arrays
+            for t, sign in ((exits, 1), (entries + days * seconds_per_day, -1)):
+                t_days, second = np.divmod(t, seconds_per_day)
+                if self._night_start <= self._night_end:
+                    part = np.clip(second - self._night_start, 0, self.night_s)
+                else:
+                    part = np.minimum(second, self._night_end) + np.maximum(second - self._night_start, 0)
+                night_s += sign * (t_days * self.night_s + part)
+        units = -(-(rest - night_s) // self.unit_s)
+        bounds = np.asarray(self._bounds, dtype=np.int64)
+        tier = np.searchsorted(bounds, units, side='left') - 1
+        tier = np.clip(tier, 0, len(bounds) - 1)
+        rates = np.asarray([rate for _, rate in self.tiers], dtype=np.int64)
+        fee = np.asarray(self._bound_fees, dtype=np.int64)[tier] + (units - bounds[tier]) * rates[tier]
+        if self.night is not None:
+            fee += -(-night_s // self.unit_s) * self.night[2]
+        if self.daily_cap is not None:
+            fee = np.minimum(fee, self.daily_cap)
+        fee += days * self.day_price
+        fee[stay <= self.grace_minutes * 60] = 0
+        return fee
+
+
+# First 15 minutes free, 3.00 an hour for two hours, 2.00 up to ten hours,
+# then 1.00; 1.00 an hour overnight; at most 25.00 a day
+default_tariff = Tariff(tiers=[(2, 300), (8, 200), (None, 100)], grace_minutes=15, daily_cap=2500,
+                        night=(22, 6, 100))
+
+
+def format_amount(cents):
+    return f"${cents / 100:,.2f}"
+
+
+# Entry/exit epoch seconds of the receipts closed in [start, end) (date
+# text such as '2024-09-01'), as NumPy arrays plus the Receipt_IDs. SQLite
+# converts the dates, so no date is parsed in Python. table may be the
+# Receipt_History view to include archived receipts.
+def load_closed_receipts(conn, start, end, table='Parking_Receipts'):
+    import numpy as np
+    rows = conn.execute(f"""
+        SELECT Receipt_ID,
+               CAST(strftime('%s', Entry_time) AS INTEGER),
+               CAST(strftime('%s', Exit_time) AS INTEGER)
+        FROM {table}
+        WHERE Exit_time >= ? AND Exit_time < ? AND strftime('%s', Entry_time) IS NOT NULL
+    """, (start, end)).fetchall()
+    receipt_ids = [row[0] for row in rows]
+    times = np.fromiter(itertools.chain.from_iterable(row[1:] for row in rows), dtype=np.int64,
+                        count=2 * len(rows)).reshape(-1, 2)
+    return receipt_ids, times[:, 0], times[:, 1]
+
+
+# Fees for the receipts closed in a period, set against what was paid
+class BillingAudit:
+    def __init__(self, start, end, receipt_ids, fees, paid):
+        self.start = start
+        self.end = end
+        self.receipt_ids = receipt_ids
+        self.fees = fees        # cents, int64
+        self.paid = paid        # cents, int64 (0 with no payment)
+
+    @property
+    def billed_total(self):
+        return int(self.fees.sum())
+
+    @property
+    def paid_total(self):
+        return int(self.paid.sum())
+
+    def unpaid(self):
+        return [self.receipt_ids[n] for n in ((self.paid == 0) & (self.fees > 0)).nonzero()[0]]
+
+    # (Receipt_ID, fee, paid) where a payment was made but differs
+    def mismatched(self):
+        wrong = ((self.paid != self.fees) & (self.paid != 0)).nonzero()[0]
+        return [(self.receipt_ids[n], int(self.fees[n]), int(self.paid[n])) for n in wrong]
+
+    def summary(self):
+        lines = [f"Receipts closed {self.start} to {self.end}: {len(self.receipt_ids):,}",
+                 f"Billed: {format_amount(self.billed_total)}  Paid: {format_amount(self.paid_total)}",
+                 f"Unpaid: {len(self.unpaid()):,}  Paid a different amount: {len(self.mismatched()):,}"]
+        for receipt_id, fee, paid in self.mismatched()[:10]:
+            lines.append(f"  {receipt_id}: fee {format_amount(fee)}, paid {format_amount(paid)}")
+        return "\n".join(lines)
+
+
+# Fees and payments over a ParkingRepository. settle() bills one receipt as
+# the car leaves; recompute(), audit() and bill_unpaid() work on every
+# receipt closed in a period at once, with NumPy. Receipts and payments
+# are read with their archived history when the repository has one.
+class BillingEngine:
+    def __init__(self, repo, tariff=default_tariff):
+        self.repo = repo
+        self.tariff = tariff
+
+    @property
+    def receipts_table(self):
+        return self.repo.history_table('Parking_Receipts')
+
+    @property
+    def payments_table(self):
+        return self.repo.history_table('Payments')
+
+    # (entry, exit) epoch seconds; an open receipt runs until now, or has
+    # no exit (None) when now is None
+    def _stay(self, conn, receipt_id, now=None):
+        return conn.execute(f"""
+            SELECT CAST(strftime('%s', Entry_time) AS INTEGER),
+                   CAST(strftime('%s', COALESCE(Exit_time, ?)) AS INTEGER)
+            FROM {self.receipts_table}
+            WHERE Receipt_ID = ?
+        """, (now, receipt_id)).fetchone()
+
+    # Fee in cents so far for a receipt (open or closed), or None
+    def quote(self, receipt_id):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return None
+        with self.repo.pool.read() as conn:
+            stay = self._stay(conn, receipt_id, now_text())
+        if stay is None or stay[0] is None:
+            return None
+        return self.tariff.fee(*stay)
+
+    # Records the payment for a closed receipt and returns the fee in cents.
+    # A receipt already paid in full is not charged again.
+    def settle(self, receipt_id, method=default_payment_method):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return None
+        with self.repo.pool.write() as conn:
+            stay = self._stay(conn, receipt_id)
+            if stay is None or None in stay:
+                return None
+            fee = self.tariff.fee(*stay)
+            paid = self._paid(conn, receipt_id)
+            if fee > paid:
+                self._insert_payments(conn, [(receipt_id, fee - paid, method)])
+        return fee
+
+    def _paid(self, conn, receipt_id):
+        amount = conn.execute(f"SELECT SUM(Amount) FROM {self.payments_table} WHERE Receipt_ID = ?",
+                              (receipt_id,)).fetchone()[0]
+        return round((amount or 0) * 100)
+
+    # payments are (Receipt_ID, cents, method). Payment_ID is a plain INT
+    # key, so IDs are handed out inside the write transaction, after the
+    # archived ones too so an ID is never reused.
+    def _insert_payments(self, conn, payments):
+        schemas = ('main', 'archive') if self.repo.archive_path else ('main',)
+        first = 1 + max(conn.execute(f"SELECT COALESCE(MAX(Payment_ID), 0) FROM {schema}.Payments").fetchone()[0]
+                        for schema in schemas)
+        paid_at = now_text()
+        conn.executemany("""
+            INSERT INTO Payments (Payment_ID, Receipt_ID, Payment_time, Amount, Payment_method)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(first + n, receipt_id, paid_at, cents / 100, method)
+              for n, (receipt_id, cents, method) in enumerate(payments)])
+
+    # (Receipt_IDs, fees in cents) for every receipt closed in [start, end)
+    def recompute(self, start, end):
+        with self.repo.pool.read() as conn:
+            receipt_ids, entries, exits = load_closed_receipts(conn, start, end, self.receipts_table)
+        return receipt_ids, self.tariff.fees(entries, exits)
+
+    def audit(self, start, end):
+        import numpy as np
+        with self.repo.pool.read() as conn:
+            conn.execute("BEGIN")
+            try:
+                receipt_ids, entries, exits = load_closed_receipts(conn, start, end, self.receipts_table)
+                # Summed here: a GROUP BY over the history views would
+                # materialize all of Payment_History and sort it
+                paid_by_id = {}
+                for receipt_id, amount in conn.execute(f"""
+                    SELECT p.Receipt_ID, p.Amount
+                    FROM {self.receipts_table} pr
+                    CROSS JOIN {self.payments_table} p ON p.Receipt_ID = pr.Receipt_ID
+                    WHERE pr.Exit_time >= ? AND pr.Exit_time < ?
+                """, (start, end)):
+                    paid_by_id[receipt_id] = paid_by_id.get(receipt_id, 0) + (amount or 0)
+            finally:
+                conn.execute("COMMIT")
+        paid = np.rint(np.fromiter((paid_by_id.get(r, 0) or 0 for r in receipt_ids), dtype=float,
+                                   count=len(receipt_ids)) * 100).astype(np.int64)
+        return BillingAudit(start, end, receipt_ids, self.tariff.fees(entries, exits), paid)
+
+    # Records payments for every receipt closed in [start, end) that has
+    # none, in one transaction; returns (receipts, cents) billed
+    def bill_unpaid(self, start, end, method=default_payment_method):
+        audit = self.audit(start, end)
+        due = ((audit.paid == 0) & (audit.fees > 0)).nonzero()[0]
+        payments = [(audit.receipt_ids[n], int(audit.fees[n]), method) for n in due]
+        if payments:
+            with self.repo.pool.write() as conn:
+                # Skip any paid since the audit read
+                paid = {row[0] for row in conn.execute(f"""
+                    SELECT p.Receipt_ID FROM {self.receipts_table} pr
+                    CROSS JOIN {self.payments_table} p ON p.Receipt_ID = pr.Receipt_ID
+                    WHERE pr.Exit_time >= ? AND pr.Exit_time < ?
+                """, (start, end))}
+                payments = [p for p in payments if p[0] not in paid]
+                self._insert_payments(conn, payments)
+        return len(payments), sum(p[1] for p in payments)
+
+
+# Day ('2024-09-14') or month ('2024-09') as a [start, end) pair of date text
+def period_bounds(period):
+    from datetime import date
+    parts = [int(p) for p in period.split('-')]
+    if len(parts) == 3:
+        start = date(*parts)
+        end = date.fromordinal(start.toordinal() + 1)
+    elif len(parts) == 2:
+        start = date(parts[0], parts[1], 1)
+        end = date(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1)
+    else:
+        raise ValueError(f"Expected a day (YYYY-MM-DD) or month (YYYY-MM), not {period!r}")
+    return start.isoformat(), end.isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the fees of the receipts closed in a day or month.")
+    parser.add_argument('db', help="database with Parking_Receipts and Payments")
+    parser.add_argument('period', help="day (YYYY-MM-DD) or month (YYYY-MM)")
+    parser.add_argument('--bill-unpaid', action='store_true', help="record payments for receipts with none")
+    args = parser.parse_args()
+
+    start, end = period_bounds(args.period)
+    try:
+        engine = BillingEngine(get_repository(args.db))
+        if args.bill_unpaid:
+            count, cents = engine.bill_unpaid(start, end)
+            print(f"Billed {count:,} unpaid receipts, {format_amount(cents)}")
+        print(engine.audit(start, end).summary())
+    except sqlite3.Error as e:
+        print(f"Error auditing payments: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import itertools
+
+# Compact framing for the New_Elevator_System.ino link. After the host sends
+# the text command "PROTO BIN1" and gets "PROTO BIN1 OK" / "DONE" back, both
+# ends switch to frames of
+#
+#   0xA5 | length | opcode | seq | args... | crc8
+#
+# where length counts opcode, seq and args, and the CRC (poly 0x07) covers
+# length through args. Step counts are zigzag varints, so
+# "MOVE_VERTICAL_UP 2700" is 7 bytes on the wire instead of 22.
+#
+# The codec translates to and from the text lines of the original protocol,
+# so everything above the transport keeps talking in "CHECK_SPOT",
+# "Spot Free", "ACK 3 1" and so on.
+
+sync_byte = 0xA5
+negotiate_command = "PROTO BIN1"
+negotiate_reply = "PROTO BIN1 OK"
+
+# Host to controller
+command_opcodes = {
+    "CHECK_SPOT": 0x01,
+    "LOAD_CAR": 0x02,
+    "MOVE_VERTICAL_UP": 0x10,
+    "MOVE_VERTICAL_DOWN": 0x11,
+    "MOVE_HORIZONTAL_LEFT": 0x12,
+    "MOVE_HORIZONTAL_RIGHT": 0x13,
+    "DWELL": 0x20,
+    "WAIT_CAR": 0x21,
+}
+command_names = {opcode: name for name, opcode in command_opcodes.items()}
+op_plan = 0x30
+
+# Controller to host
+op_result = 0x80      # seq, code[, value]: reply to a command, then DONE
+op_event = 0x81       # 0, code: unsolicited line such as "Car in Spot"
+op_nak = 0x82         # seq, index, code: plan step failed
+op_ack = 0x83         # seq, index, code: plan step finished
+op_plan_done = 0x84   # seq
+
+# Reply texts by code; codes 0x10-0x1F carry a varint value
+result_texts = {
+    0x00: "",
+    0x01: "Spot Free",
+    0x02: "Spot Occupied",
+    0x03: "Car Loaded",
+    0x04: "Dwelled",
+    0x05: "Car in Spot",
+    0x06: "Car not detected",
+    0x10: "Elevator moved up by {} steps",
+    0x11: "Elevator moved down by {} steps",
+    0x12: "Left horizontal motor moved left by {} steps",
+    0x13: "Right horizontal motor moved right by {} steps",
+    0x7F: "Unknown command",
+}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+
+crc8_table = _crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = crc8_table[crc ^ byte]
+    return crc
+
+
+def encode_varint(value):
+    # Zigzag like the sketch's 32-bit long, then 7 bits per byte
+    value = ((value << 1) ^ (value >> 31)) & 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise FrameError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return (value >> 1) ^ -(value & 1), pos
+        shift += 7
+
+
+def frame(opcode, seq, args=b''):
+    if len(args) + 2 > 255:
+        raise FrameError("Frame too long")
+    body = bytes([len(args) + 2, opcode, seq & 0xFF]) + bytes(args)
+    return bytes([sync_byte]) + body + bytes([crc8(body)])
+
+
+# Splits a byte stream into (opcode, seq, args) frames, skipping noise
+# before the sync byte and frames with a bad CRC
+class FrameReader:
+    def __init__(self):
+        self.crc_errors = 0
+
+    def next_frame(self, buffer):
+        while True:
+            start = buffer.find(bytes([sync_byte]))
+            if start < 0:
+                buffer.clear()
+                return None
+            del buffer[:start]
+            if len(buffer) < 2:
+                return None
+            length = buffer[1]
+            if len(buffer) < length + 3:
+                return None
+            body = bytes(buffer[1:length + 2])
+            crc = buffer[length + 2]
+            if length < 2 or crc8(body) != crc:
+                self.crc_errors += 1
+                del buffer[:1]
+                continue
+            del buffer[:length + 3]
+            return body[1], body[2], body[3:]
+
+
+def _encode_step(step):
+    parts = step.split()
+    if not parts or parts[0] not in command_opcodes:
+        raise FrameError(f"No opcode for {step!r}")
+    out = bytes([command_opcodes[parts[0]]])
+    if len(parts) > 1:
+        out += encode_varint(int(parts[1]))
+    return out
+
+
+def _decode_step(args, pos):
+    opcode = args[pos]
+    pos += 1
+    if opcode not in command_names:
+        raise FrameError(f"Unknown opcode 0x{opcode:02X}")
+    if opcode >= 0x10:
+        value, pos = decode_varint(args, pos)
+        return f"{command_names[opcode]} {value}", pos
+    return command_names[opcode], pos
+
+
+# Host side: text command (or "PLAN <seq> a;b;...") to frame
+def encode_command(line, seq):
+    if line.startswith("PLAN "):
+        _, plan_seq, body = line.split(' ', 2)
+        # The frame has one byte for it, and the controller's ACKs echo it
+        if not 0 < int(plan_seq) < 256:
+            raise FrameError(f"Plan sequence {plan_seq} does not fit a frame (1-255)")
+        args = b''.join(_encode_step(step) for step in body.split(';'))
+        return frame(op_plan, int(plan_seq), args)
+    step = _encode_step(line)
+    return frame(step[0], seq, step[1:])
+
+
+# Controller side: frame to text command
+def decode_command(opcode, seq, args):
+    if opcode == op_plan:
+        steps, pos = [], 0
+        while pos < len(args):
+            step, pos = _decode_step(args, pos)
+            steps.append(step)
+        return f"PLAN {seq} " + ';'.join(steps)
+    step, _ = _decode_step(bytes([opcode]) + args, 0)
+    return step
+
+
+def _result_args(text):
+    for code, template in result_texts.items():
+        if '{}' in template:
+            prefix, suffix = template.split('{}')
+            middle = text[len(prefix):len(text) - len(suffix)]
+            if text.startswith(prefix) and text.endswith(suffix) and middle.lstrip('-').isdigit():
+                return bytes([code]) + encode_varint(int(middle))
+        elif template == text:
+            return bytes([code])
+    return bytes([0x7F])
+
+
+def _result_text(args, pos):
+    code = args[pos]
+    template = result_texts.get(code, "Unknown command")
+    if '{}' in template:
+        value, pos = decode_varint(args, pos + 1)
+        return template.format(value), pos
+    return template, pos + 1
+
+
+# Controller side: one text reply line to a frame. seq is the command being
+# answered, or None for an unsolicited line. DONE is implied by a result
+# frame and gives None.
+def encode_reply(line, seq=None):
+    if line == "DONE":
+        return None
+    parts = line.split(' ', 3)
+    if parts[0] in ("ACK", "NAK"):
+        index = int(parts[2])
+        text = parts[3] if len(parts) > 3 else ''
+        return frame(op_ack if parts[0] == "ACK" else op_nak, int(parts[1]), bytes([index]) + _result_args(text)[:1])
+    if parts[0] == "PLAN_DONE":
+        return frame(op_plan_done, int(parts[1]))
+    if seq is None:
+        return frame(op_event, 0, _result_args(line))
+    return frame(op_result, seq, _result_args(line))
+
+
+# Host side: a frame back to the text lines the sketch would have printed
+def decode_reply(opcode, seq, args):
+    if opcode == op_result:
+        text, _ = _result_text(args, 0)
+        return [text, "DONE"]
+    if opcode == op_event:
+        text, _ = _result_text(args, 0)
+        return [text]
+    if opcode in (op_ack, op_nak):
+        index = args[0]
+        text = result_texts.get(args[1], "Unknown command") if len(args) > 1 else ''
+        prefix = "ACK" if opcode == op_ack else "NAK"
+        return [f"{prefix} {seq} {index} {text}".rstrip()]
+    if opcode == op_plan_done:
+        return [f"PLAN_DONE {seq}"]
+    raise FrameError(f"Unknown reply opcode 0x{opcode:02X}")
+
+
+# Framings plug into SerialTransport. encode() gives the bytes to write and
+# the sequence number replies will carry (None if they carry none);
+# next_lines() takes one message off the front of the receive buffer and
+# returns its (line, seq) pairs, or None if the buffer holds no full message.
+class TextFraming:
+    name = "text"
+
+    def encode(self, command):
+        return (command + '\n').encode(), None
+
+    def next_lines(self, buffer):
+        end = buffer.find(b'\n')
+        if end < 0:
+            return None
+        line = buffer[:end].decode(errors='replace').strip()
+        del buffer[:end + 1]
+        return [(line, None)] if line else []
+
+
+class BinaryFraming:
+    name = "binary"
+
+    def __init__(self):
+        self.reader = FrameReader()
+        self._sequence = itertools.count(0)
+
+    def encode(self, command):
+        # Sequence numbers 1-255; 0 marks unsolicited frames
+        seq = next(self._sequence) % 255 + 1
+        return encode_command(command, seq), seq
+
+    def next_lines(self, buffer):
+        message = self.reader.next_frame(buffer)
+        if message is None:
+            return None
+        opcode, seq, args = message
+        try:
+            lines = decode_reply(opcode, seq, args)
+        except (FrameError, IndexError):
+            return []
+        if opcode != op_result:
+            seq = None
+        return [(line, seq) for line in lines]
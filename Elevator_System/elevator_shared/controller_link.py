@@ -0,0 +1,184 @@
+import threading
+import time
+
+# Connection states, as shown by the GUIs
+idle = 'idle'                 # start() not called yet
+connecting = 'connecting'     # opening the port, or waiting out the reset
+retrying = 'retrying'         # the last attempt failed; waiting to try again
+connected = 'connected'
+closed = 'closed'
+
+
+# Opener for ControllerLink. pyserial is imported on the first attempt,
+# so scripts that never reach the controller do not need it installed.
+def serial_opener(port, baud_rate, timeout=1):
+    def open_port():
+        import serial
+        return serial.Serial(port, baud_rate, timeout=timeout)
+    open_port.port = port
+    return open_port
+
+
+# The connection to the controller, made on a background thread so that
+# importing a script or opening its window never waits on the serial port.
+# Nothing happens until start() (or the first use of handle / wait());
+# until the link is up, handle is None and the scripts carry on with what
+# only needs the database.
+#
+# open_port: callable returning an open port (e.g. serial_opener()). A
+#            failed attempt is retried after backoff_s, doubling up to
+#            max_backoff_s.
+# settle_s: pause after opening before the link counts as connected. The
+#           Arduino resets when the port opens; this is the time.sleep(2)
+#           the scripts used to do at import.
+# on_connect: optional on_connect(port) run on the link's thread once the
+#             port has settled, returning what the script talks through
+#             (e.g. a SerialTransport); handle is then that instead of the
+#             port. It may also reset state the controller lost in the reset.
+class ControllerLink:
+    def __init__(self, open_port, settle_s=2.0, backoff_s=0.5, max_backoff_s=30.0, on_connect=None,
+                 clock=time.monotonic):
+        self.open_port = open_port
+        self.settle_s = settle_s
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.on_connect = on_connect
+        self.clock = clock
+        self.state = idle
+        self.error = None
+        self.attempts = 0
+        self.retry_at = None
+        self.started_at = None
+        self.connected_at = None
+        self._port = None
+        self._handle = None
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def port_name(self):
+        return getattr(self.open_port, 'port', None)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self.started_at = self.clock()
+                self.state = connecting
+                self._thread = threading.Thread(target=self._run, name="controller-link", daemon=True)
+                self._thread.start()
+        return self
+
+    # What to talk to the controller through, or None while not connected.
+    # Never blocks.
+    @property
+    def handle(self):
+        self.start()
+        return self._handle
+
+    @property
+    def is_connected(self):
+        return self._handle is not None
+
+    # Waits up to timeout seconds for the link; returns handle or None
+    def wait(self, timeout=None):
+        self.start()
+        self._connected.wait(timeout)
+        return self._handle
+
+    # Called when talking through handle failed (port unplugged, I/O
+    # error): drops it and reconnects in the background. A handle that was
+    # already replaced is ignored.
+    def failed(self, error, handle=None):
+        with self._lock:
+            if self._handle is None or (handle is not None and handle is not self._handle):
+                return
+            self.error = error
+            handle, port = self._handle, self._port
+            self._handle = self._port = None
+            self._connected.clear()
+            self.state = connecting
+        self._close(handle, port)
+        self._wake.set()
+
+    # Skips the rest of a backoff wait
+    def retry_now(self):
+        self._wake.set()
+
+    def close(self, timeout=2.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            handle, port = self._handle, self._port
+            self._handle = self._port = None
+            self._connected.clear()
+            self.state = closed
+        self._close(handle, port)
+
+    # One line for a status label
+    def status_text(self):
+        where = f" on {self.port_name}" if self.port_name else ""
+        if self.state == connected:
+            return f"Controller connected{where}"
+        if self.state == retrying:
+            wait = max(0.0, (self.retry_at or self.clock()) - self.clock())
+            return f"Controller not found{where} (attempt {self.attempts}), retrying in {wait:.0f} s"
+        if self.state == connecting:
+            if self.connected_at is not None:
+                return f"Connection lost, reconnecting to the controller{where}..."
+            return f"Connecting to the controller{where}..."
+        if self.state == closed:
+            return "Controller connection closed"
+        return "Controller not connected"
+
+    @staticmethod
+    def _close(handle, port):
+        for item in (handle, port):
+            close = getattr(item, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def _run(self):
+        delay = self.backoff_s
+        while not self._stop.is_set():
+            if self._handle is not None:
+                # Up: sleep until failed() or close()
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            self.attempts += 1
+            self.state = connecting
+            port = handle = None
+            try:
+                port = self.open_port()
+                if self._stop.wait(self.settle_s):
+                    self._close(None, port)
+                    return
+                handle = self.on_connect(port) if self.on_connect else port
+            except Exception as e:
+                self._close(handle, port)
+                self.error = e
+                self.retry_at = self.clock() + delay
+                self.state = retrying
+                self._wake.wait(delay)
+                self._wake.clear()
+                delay = min(delay * 2, self.max_backoff_s)
+                continue
+            with self._lock:
+                if self._stop.is_set():
+                    self._close(handle, port)
+                    return
+                self._port, self._handle = port, handle
+                self.error = None
+                self.retry_at = None
+                self.connected_at = self.clock()
+                self.state = connected
+                self._connected.set()
+            delay = self.backoff_s
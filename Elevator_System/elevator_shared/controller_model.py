@@ -0,0 +1,199 @@
+import random
+import time
+from collections import deque
+
+from .binary_protocol import negotiate_command, negotiate_reply
+from .motion_profile import move_duration
+
+# Half-period of a step pulse (delayMicroseconds) in each sketch
+sketch_step_delay_us = {
+    'new': 1000,       # New_Elevator_System.ino
+    'vertical': 500,   # Final_System_Vertical_Only.ino
+}
+
+
+# What the .ino sketches do with each command, without any I/O: the reply
+# lines and how long the motors take (steps * 2 * step delay).
+#
+# sketch: 'new' for New_Elevator_System.ino (every reply ends with DONE,
+#         PLAN frames are acknowledged step by step),
+#         'vertical' for Final_System_Vertical_Only.ino (one reply line)
+# car_delay_s: how long WAIT_CAR takes before the car is seen; past the
+#         step's own timeout it answers "Car not detected" instead
+# supports_binary: whether the 'new' sketch accepts "PROTO BIN1"
+# seed, occupied_probability: CHECK_SPOT also reports the spot occupied
+#         with this probability (another car in the way), drawn from a
+#         random.Random(seed) so runs are repeatable
+class ControllerModel:
+    def __init__(self, sketch='new', occupied=False, car_delay_s=0.0, supports_binary=True,
+                 step_delay_us=None, seed=None, occupied_probability=0.0):
+        self.sketch = sketch
+        self.occupied = occupied
+        self.car_delay_s = car_delay_s
+        self.supports_binary = supports_binary
+        self.step_delay_us = step_delay_us if step_delay_us is not None else sketch_step_delay_us[sketch]
+        self.occupied_probability = occupied_probability
+        self.rng = random.Random(seed)
+        self.vertical_position = 0
+        self.ramp = []   # vertical sketch: half-periods loaded by RAMP
+        self.horizontal_position_left = 0
+        self.horizontal_position_right = 0
+
+    def move_duration(self, steps):
+        return abs(steps) * 2 * self.step_delay_us / 1e6
+
+    def spot_occupied(self):
+        if self.occupied:
+            return True
+        return bool(self.occupied_probability) and self.rng.random() < self.occupied_probability
+
+    # Reply lines and motor time for one command, as the sketch would do it
+    def respond(self, command):
+        parts = command.split()
+        name = parts[0] if parts else ''
+        try:
+            steps = int(parts[1]) if len(parts) > 1 else 0
+        except ValueError:
+            steps = 0
+        if self.sketch == 'vertical':
+            return self._respond_vertical(command, name, steps)
+
+        done = ["DONE"]
+        if command == negotiate_command and self.supports_binary:
+            return [negotiate_reply] + done, 0.0
+        if command == "CHECK_SPOT":
+            return ["Spot Occupied" if self.spot_occupied() else "Spot Free"] + done, 0.0
+        if command == "LOAD_CAR":
+            return ["Car Loaded"] + done, 0.0
+        if name == "MOVE_VERTICAL_UP" and len(parts) > 1:
+            self.vertical_position += steps
+            return [f"Elevator moved up by {steps} steps"] + done, self.move_duration(steps)
+        if name == "MOVE_VERTICAL_DOWN" and len(parts) > 1:
+            self.vertical_position -= steps
+            return [f"Elevator moved down by {steps} steps"] + done, self.move_duration(steps)
+        if name == "MOVE_HORIZONTAL_LEFT" and len(parts) > 1:
+            self.horizontal_position_left += steps
+            return [f"Left horizontal motor moved left by {steps} steps"] + done, self.move_duration(steps)
+        if name == "MOVE_HORIZONTAL_RIGHT" and len(parts) > 1:
+            self.horizontal_position_right += steps
+            return [f"Right horizontal motor moved right by {steps} steps"] + done, self.move_duration(steps)
+        return ["Unknown command"] + done, 0.0
+
+    # One PLAN step: a command as above, or DWELL / WAIT_CAR, which
+    # New_Elevator_System.ino only runs inside a plan (runStep) and
+    # answers "Unknown command" to on their own
+    def _plan_step(self, step):
+        parts = step.split()
+        if len(parts) > 1 and parts[0] in ("DWELL", "WAIT_CAR"):
+            try:
+                milliseconds = int(parts[1])
+            except ValueError:
+                milliseconds = 0
+            if parts[0] == "DWELL":
+                return ["Dwelled"], milliseconds / 1000
+            if self.occupied:
+                return ["Car in Spot"], 0.0
+            # The sketch gives up once the step's timeout has passed
+            if self.car_delay_s > milliseconds / 1000:
+                return ["Car not detected"], milliseconds / 1000
+            self.occupied = True
+            return ["Car in Spot"], self.car_delay_s
+        return self.respond(step)
+
+    # (duration, line) pairs for a PLAN frame: each step's time, then its
+    # ACK, as New_Elevator_System.ino does; moves are acknowledged without
+    # text. A frame with nothing after the sequence number is a bad frame.
+    def plan_replies(self, frame):
+        parts = frame.split(' ', 2)
+        if len(parts) < 3:
+            yield 0.0, "NAK 0 0 Bad frame"
+            return
+        _, sequence, body = parts
+        for index, step in enumerate(body.strip().split(';')):
+            lines, duration = self._plan_step(step)
+            if lines[0] == "Unknown command":
+                yield 0.0, f"NAK {sequence} {index} Unknown command"
+                return
+            if step.startswith("MOVE_"):
+                yield duration, f"ACK {sequence} {index}"
+            else:
+                yield duration, f"ACK {sequence} {index} {lines[0]}"
+        yield 0.0, f"PLAN_DONE {sequence}"
+
+    def _respond_vertical(self, command, name, steps):
+        if name == "MOVE_VERTICAL_UP":
+            self.vertical_position += steps
+            return ["Movement complete", "Moved Up"], self.move_duration(steps)
+        if name == "MOVE_VERTICAL_DOWN":
+            self.vertical_position -= steps
+            return ["Movement complete", "Moved Down"], self.move_duration(steps)
+        if name == "MOVE_VERTICAL_PROFILE":
+            if not self.ramp:
+                return ["No ramp loaded"], 0.0
+            self.vertical_position += steps
+            return ["Movement complete"], move_duration(self.ramp, steps)
+        parts = command.split()
+        if name == "RAMP" and len(parts) > 2:
+            del self.ramp[steps:]
+            self.ramp.extend(int(value) for value in parts[2].split(','))
+            return [f"Ramp {len(self.ramp)}"], 0.0
+        if command == "CHECK_SPOT":
+            return ["Spot Occupied" if self.spot_occupied() else "Spot Free"], 0.0
+        return ["Invalid Command"], 0.0
+
+
+# In-process stand-in for serial.Serial talking to a ControllerModel, for
+# the mock simulator and for tests. write() runs the command and waits out
+# its motor time; readline() returns the reply lines in order.
+#
+# clock: None to wait in real time (demos), or an animation.VirtualClock
+#        that is advanced instead, so a whole park runs in microseconds
+class MockArduino(ControllerModel):
+    def __init__(self, clock=None, **model_options):
+        super().__init__(**model_options)
+        self.clock = clock
+        self.commands = []
+        self._replies = deque()
+
+    def now(self):
+        return self.clock() if self.clock is not None else time.monotonic()
+
+    def wait(self, seconds):
+        if seconds <= 0:
+            return
+        if self.clock is not None:
+            self.clock.advance(seconds)
+        else:
+            time.sleep(seconds)
+
+    @property
+    def in_waiting(self):
+        return sum(len(line) + 2 for line in self._replies)
+
+    def write(self, data):
+        for command in data.decode().splitlines():
+            command = command.strip()
+            if not command:
+                continue
+            self.commands.append(command)
+            if self.sketch == 'new' and command.startswith("PLAN "):
+                for duration, line in self.plan_replies(command):
+                    self.wait(duration)
+                    self._replies.append(line)
+                continue
+            lines, duration = self.respond(command)
+            self.wait(duration)
+            self._replies.extend(lines)
+        return len(data)
+
+    # Like pyserial with a timeout: b'' when nothing is waiting
+    def readline(self):
+        if not self._replies:
+            return b''
+        return (self._replies.popleft() + '\r\n').encode()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
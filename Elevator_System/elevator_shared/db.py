@@ -0,0 +1,688 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from .event_log import EventLog, event, last_seq, spot_flags
+from .metrics import registry
+from .migrations import migrate
+from .receipt_ids import ReceiptIdGenerator, claim_node, normalize_receipt_id, release_node
+from .spot_index import FreeSpotIndex
+from .tracing import tracer
+
+# Number of read-only connections kept open per database
+default_readers = 4
+
+# Prepared statements cached per connection (sqlite3 keys the cache by SQL text)
+statement_cache_size = 128
+
+# NORMAL only fsyncs at checkpoints; FULL also fsyncs the WAL on every
+# commit, so a power cut cannot lose a committed transaction
+default_synchronous = "NORMAL"
+
+# Seconds a connection waits on a locked database before giving up
+busy_timeout = 5.0
+
+# Time in each pooled transaction, waiting for the connection included
+transaction_help = "Database transactions, from asking for a connection until it is handed back"
+errors_help = "Database transactions that raised"
+write_seconds = registry.histogram('elevator_db_transaction_seconds', transaction_help, kind='write')
+read_seconds = registry.histogram('elevator_db_transaction_seconds', transaction_help, kind='read')
+write_errors = registry.counter('elevator_db_errors_total', errors_help, kind='write')
+read_errors = registry.counter('elevator_db_errors_total', errors_help, kind='read')
+
+# Same tables as the shipped elevator_system.db, used for fresh/benchmark databases
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Levels (
+    Level_ID INT PRIMARY KEY,
+    Level_name TEXT
+);
+CREATE TABLE IF NOT EXISTS Parking_Receipts (
+    Receipt_ID TEXT PRIMARY KEY,
+    Entry_time DATETIME,
+    Exit_time DATETIME,
+    Spot_ID INT,
+    FOREIGN KEY (Spot_ID) REFERENCES Parking_Spots(Spot_ID)
+);
+CREATE TABLE IF NOT EXISTS Payments (
+    Payment_ID INT PRIMARY KEY,
+    Receipt_ID TEXT,
+    Payment_time DATETIME,
+    Amount DECIMAL,
+    Payment_method TEXT,
+    FOREIGN KEY (Receipt_ID) REFERENCES Parking_Receipts(Receipt_ID)
+);
+CREATE TABLE IF NOT EXISTS Parking_Sensors (
+    Sensor_ID INT,
+    Spot_ID INT,
+    Status TEXT,
+    Last_checked DATETIME,
+    Sensor_type TEXT,
+    PRIMARY KEY (Sensor_ID, Spot_ID),
+    FOREIGN KEY (Spot_ID) REFERENCES Parking_Spots(Spot_ID)
+);
+CREATE TABLE IF NOT EXISTS Parking_Spots (
+    Spot_ID INT,
+    Level_ID INT,
+    Spot_type TEXT,
+    Is_occupied BOOL,
+    Is_operational BOOL,
+    Sensor_ID INT,
+    PRIMARY KEY (Spot_ID),
+    FOREIGN KEY (Level_ID) REFERENCES Levels(Level_ID),
+    FOREIGN KEY (Sensor_ID) REFERENCES Parking_Sensors(Sensor_ID)
+);
+"""
+
+
+# Closed receipts and their payments moved out of the hot tables (see
+# archive.py). The file is attached to every pooled connection as
+# "archive"; no foreign keys, since SQLite cannot check them across files.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive.Parking_Receipts (
+    Receipt_ID TEXT PRIMARY KEY,
+    Entry_time DATETIME,
+    Exit_time DATETIME,
+    Spot_ID INT
+);
+CREATE TABLE IF NOT EXISTS archive.Payments (
+    Payment_ID INT PRIMARY KEY,
+    Receipt_ID TEXT,
+    Payment_time DATETIME,
+    Amount DECIMAL,
+    Payment_method TEXT
+);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_receipts_exit_time ON Parking_Receipts (Exit_time);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_payments_receipt ON Payments (Receipt_ID);
+"""
+
+# Hot and archived rows as one table, per connection. A chunk being moved
+# is briefly in both files, so archived rows still in the hot table are
+# left out.
+HISTORY_VIEWS = """
+CREATE TEMP VIEW IF NOT EXISTS Receipt_History AS
+    SELECT * FROM main.Parking_Receipts
+    UNION ALL
+    SELECT * FROM archive.Parking_Receipts
+    WHERE Receipt_ID NOT IN (SELECT Receipt_ID FROM main.Parking_Receipts);
+CREATE TEMP VIEW IF NOT EXISTS Payment_History AS
+    SELECT * FROM main.Payments
+    UNION ALL
+    SELECT * FROM archive.Payments
+    WHERE Payment_ID NOT IN (SELECT Payment_ID FROM main.Payments);
+"""
+
+
+def create_database(path):
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# elevator_system.db -> elevator_system_archive.db
+def archive_path_for(db_path):
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def now_text():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# The first free spot on the lowest ({pick}=MIN, {op}='>=') or highest
+# ({pick}=MAX, {op}='<') free level on one side of the entry level
+nearest_free_level_sql = """
+    SELECT Spot_ID, Level_ID, Spot_type
+    FROM Parking_Spots
+    WHERE Is_occupied = 0 AND Is_operational = 1 AND Level_ID = (
+        SELECT {pick}(Level_ID) FROM Parking_Spots
+        WHERE Is_occupied = 0 AND Is_operational = 1 AND Level_ID {op} ?
+    )
+    ORDER BY Spot_ID
+    LIMIT 1
+"""
+
+
+# Spot selectors run inside the park transaction and return
+# (Spot_ID, Level_ID, Spot_type) or None
+def nearest_free_spot(conn, entry_level=1):
+    # The closest free level at or above the entry and the closest below
+    # it are each a seek on idx_spots_free; ORDER BY ABS(Level_ID - ?)
+    # would read and sort every free spot instead
+    candidates = []
+    for pick, op in (('MIN', '>='), ('MAX', '<')):
+        row = conn.execute(nearest_free_level_sql.format(pick=pick, op=op), (entry_level,)).fetchone()
+        if row is not None:
+            candidates.append(row)
+    return min(candidates, key=lambda row: (abs(row[1] - entry_level), row[0]), default=None)
+
+
+def select_spot(spot_id):
+    def selector(conn):
+        return conn.execute("""
+            SELECT Spot_ID, Level_ID, Spot_type
+            FROM Parking_Spots
+            WHERE Spot_ID = ? AND Is_occupied = 0 AND Is_operational = 1
+        """, (spot_id,)).fetchone()
+    return selector
+
+
+# Idle reader connections, handed out first come, first served. With a
+# queue.Queue a thread that puts its connection back and asks again at once
+# takes it straight back, and a thread already waiting (a park loading the
+# spot index under the write lock, say) can wait for as long as readers
+# keep looping.
+class _ReaderQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = []
+        self._waiting = deque()
+
+    def get(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            waiter = [threading.Event(), None]
+            self._waiting.append(waiter)
+        waiter[0].wait()
+        return waiter[1]
+
+    def put(self, conn):
+        with self._lock:
+            if self._waiting:
+                waiter = self._waiting.popleft()
+                waiter[1] = conn
+                waiter[0].set()
+            else:
+                self._idle.append(conn)
+
+
+# One writer connection plus a few readers, all long-lived and in WAL mode.
+# WAL lets the readers run while the writer holds its lock, and with
+# synchronous=NORMAL a commit only appends to the WAL instead of fsyncing
+# the main database file.
+class ConnectionPool:
+    def __init__(self, db_path, readers=default_readers, synchronous=default_synchronous):
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self._writer_lock = threading.Lock()
+        self._writer = self._open()
+        self._readers = _ReaderQueue()
+        for _ in range(readers):
+            self._readers.put(self._open(query_only=True))
+        self._reader_count = readers
+        self._closed = False
+
+    def _open(self, query_only=False):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=busy_timeout,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=statement_cache_size,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        if query_only:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    # Runs the block in a single write transaction on the writer connection
+    @contextmanager
+    def write(self):
+        started = time.perf_counter()
+        try:
+            with tracer.span("db write", cat="db"), self._writer_lock:
+                conn = self._writer
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                else:
+                    conn.execute("COMMIT")
+        except sqlite3.Error:
+            write_errors.inc()
+            raise
+        finally:
+            write_seconds.observe(time.perf_counter() - started)
+
+    # Borrows a reader connection for the duration of the block
+    @contextmanager
+    def read(self):
+        started = time.perf_counter()
+        with tracer.span("db read", cat="db"):
+            conn = self._readers.get()
+            try:
+                yield conn
+            except sqlite3.Error:
+                read_errors.inc()
+                raise
+            finally:
+                self._readers.put(conn)
+                read_seconds.observe(time.perf_counter() - started)
+
+    # Attaches another database file to every connection as schema name.
+    # ATTACH cannot run inside a transaction, so it waits for the writer
+    # and every reader to be free. setup(conn), if given, then runs on each
+    # connection, the writer first.
+    def attach(self, path, name, setup=None):
+        with self._writer_lock:
+            connections = [self._writer] + [self._readers.get() for _ in range(self._reader_count)]
+            try:
+                for conn in connections:
+                    conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+                    if setup is not None:
+                        setup(conn)
+            finally:
+                for conn in connections[1:]:
+                    self._readers.put(conn)
+
+    # Installs (or with None removes) a statement trace callback on every
+    # connection in the pool
+    def set_trace_callback(self, callback):
+        with self._writer_lock:
+            self._writer.set_trace_callback(callback)
+        readers = [self._readers.get() for _ in range(self._reader_count)]
+        for conn in readers:
+            conn.set_trace_callback(callback)
+            self._readers.put(conn)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._writer_lock:
+            self._writer.close()
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+
+
+# Data access for the parking tables. Methods raise sqlite3.Error and leave
+# reporting to the caller, the same way the scripts wrap their own queries.
+#
+# Spot changes are recorded in the event log (see event_log.py) in the
+# same transaction that makes them, except that update_spot_status and
+# set_spot_operational commit the change and write the event shortly after.
+#
+# archive_path: archive of closed receipts to attach (created if missing).
+#               By default the one next to db_path is attached if it exists.
+# receipt_id_factory: by default a ReceiptIdGenerator on a node claimed in
+#               Receipt_Nodes while the repository is open, so processes
+#               sharing the database do not issue the same IDs.
+class ParkingRepository:
+    def __init__(self, db_path, readers=default_readers, receipt_id_factory=None, entry_level=1,
+                 synchronous=default_synchronous, archive_path=None):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, readers, synchronous)
+        self.event_log = EventLog(self.pool)
+        self.receipt_node = None
+        self._node_claimed = False
+        self._node_holder = f"{socket.gethostname()} {os.getpid()}"
+        with self.pool.write() as conn:
+            migrate(conn)
+            self.event_log.start(conn)
+            if receipt_id_factory is None:
+                self.receipt_node = claim_node(conn, self._node_holder, now_text())
+                self._node_claimed = True
+        if receipt_id_factory is None:
+            receipt_id_factory = ReceiptIdGenerator(node=self.receipt_node)
+        self.receipt_id_factory = receipt_id_factory
+        self.entry_level = entry_level
+        self._spot_index = None
+        self._spot_index_lock = threading.Lock()
+        self.archive_path = None
+        if archive_path is not None or os.path.exists(archive_path_for(db_path)):
+            self.attach_archive(archive_path or archive_path_for(db_path))
+
+    # Attaches the receipt archive, creating its tables, and adds the
+    # Receipt_History and Payment_History views to every connection
+    def attach_archive(self, archive_path):
+        if self.archive_path is not None:
+            return
+        self.pool.attach(archive_path, "archive", self._setup_archive)
+        self.archive_path = archive_path
+
+    @staticmethod
+    def _setup_archive(conn):
+        query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+        if not query_only:
+            conn.execute("PRAGMA archive.journal_mode=WAL")
+            conn.executescript(ARCHIVE_SCHEMA)
+        # TEMP views are a write to the temp schema, which query_only refuses
+        conn.execute("PRAGMA query_only=0")
+        try:
+            conn.executescript(HISTORY_VIEWS)
+        finally:
+            conn.execute(f"PRAGMA query_only={query_only}")
+
+    # Table to read receipts or payments from when history is wanted:
+    # the history view with an archive attached, else the table itself
+    def history_table(self, table):
+        if self.archive_path is None:
+            return table
+        return {"Parking_Receipts": "Receipt_History", "Payments": "Payment_History"}[table]
+
+    def close(self):
+        self.event_log.close()
+        if self._node_claimed:
+            self._node_claimed = False
+            try:
+                with self.pool.write() as conn:
+                    release_node(conn, self.receipt_node, self._node_holder)
+            except sqlite3.Error:
+                pass  # the node goes to the back of the rotation instead
+        self.pool.close()
+        # The next get_repository() for this file opens a new one
+        with _repositories_lock:
+            key = os.path.abspath(self.db_path)
+            if _repositories.get(key) is self:
+                del _repositories[key]
+
+    # Free-spot index, loaded from Parking_Spots on first use and updated
+    # after every committed change made through this repository
+    @property
+    def spot_index(self):
+        if self._spot_index is None:
+            with self._spot_index_lock:
+                if self._spot_index is None:
+                    with self.pool.read() as conn:
+                        self._spot_index = FreeSpotIndex.load(conn, self.entry_level)
+        return self._spot_index
+
+    def reload_spot_index(self):
+        with self.pool.read() as conn:
+            self._spot_index = FreeSpotIndex.load(conn, self.entry_level)
+
+    # Selector that takes the closest spot from the index. Other processes
+    # can change Parking_Spots behind the index's back, so the candidate is
+    # re-checked by primary key inside the transaction and skipped if stale.
+    def indexed_spot(self, spot_type=None):
+        def selector(conn):
+            index = self.spot_index
+            while True:
+                spot = index.nearest(spot_type)
+                if spot is None:
+                    return None
+                row = conn.execute("""
+                    SELECT Is_occupied, Is_operational FROM Parking_Spots
+                    WHERE Spot_ID = ?
+                """, (spot[0],)).fetchone()
+                if row and not row[0] and row[1]:
+                    return spot
+                index.set_free(spot[0], False)
+        return selector
+
+    def populate_parking_spots(self, parking_spots):
+        with self.pool.write() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM Parking_Spots").fetchone()[0]
+            if count:
+                return False
+            conn.executemany("""
+                INSERT INTO Parking_Spots (Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational, Sensor_ID)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, parking_spots)
+            self.event_log.append(conn, [event("spot", spot[0], spot_flags(spot[3], spot[4]))
+                                         for spot in parking_spots], project=False)
+        self.reload_spot_index()
+        return True
+
+    def insert_parking_receipt(self, spot_id, receipt_id=None):
+        with self.pool.write() as conn:
+            if receipt_id is None:
+                return self._insert_receipt(conn, spot_id, now_text())
+            conn.execute("""
+                INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
+                VALUES (?, ?, ?)
+            """, (receipt_id, now_text(), spot_id))
+        return receipt_id
+
+    def update_exit_time(self, receipt_id):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return
+        with self.pool.write() as conn:
+            conn.execute("""
+                UPDATE Parking_Receipts
+                SET Exit_time = ?
+                WHERE Receipt_ID = ?
+            """, (now_text(), receipt_id))
+
+    def find_available_platform(self, spot_type=None):
+        return self.spot_index.nearest(spot_type)
+
+    def update_spot_status(self, spot_id, is_occupied):
+        self.event_log.record("park" if is_occupied else "retrieve", spot_id)
+        self.spot_index.set_free(spot_id, not is_occupied)
+
+    # Takes a spot out of service (a fault) or puts it back
+    def set_spot_operational(self, spot_id, is_operational):
+        self.event_log.record("fault", spot_id, 0 if is_operational else 1)
+        if self._spot_index is not None:
+            is_free = not self.event_log.state.is_occupied(spot_id)
+            self._spot_index.set_operational(spot_id, is_operational, is_free)
+
+    # Writes a batch of sensor readings in one transaction. spot_changes are
+    # (is_occupied, spot_id) for spots whose state changed; sensor_rows are
+    # (sensor_id, spot_id, status, last_checked) for Parking_Sensors.
+    def apply_sensor_readings(self, spot_changes, sensor_rows):
+        with self.pool.write() as conn:
+            if spot_changes:
+                self.event_log.append(conn, [event("sensor", spot_id, 1 if is_occupied else 0)
+                                             for is_occupied, spot_id in spot_changes])
+            conn.executemany("""
+                INSERT INTO Parking_Sensors (Sensor_ID, Spot_ID, Status, Last_checked, Sensor_type)
+                VALUES (?, ?, ?, ?, 'Ultrasonic')
+                ON CONFLICT(Sensor_ID, Spot_ID) DO UPDATE SET
+                    Status = excluded.Status,
+                    Last_checked = excluded.Last_checked
+            """, sensor_rows)
+        # Only keep the index current if something loaded it; a pure
+        # ingestion process never needs it
+        if self._spot_index is not None:
+            for is_occupied, spot_id in spot_changes:
+                self._spot_index.set_free(spot_id, not is_occupied)
+
+    # Writes controller events in one transaction. events are
+    # (kind, spot_id, time_text) with kind "Parked" (spot occupied, receipt
+    # opened) or "Retrieved" (spot freed, its open receipt closed).
+    def apply_parking_events(self, events):
+        with self.pool.write() as conn:
+            logged = []
+            for kind, spot_id, time_text in events:
+                if kind == "Parked":
+                    receipt_id = self._insert_receipt(conn, spot_id, time_text)
+                    logged.append(event("park", spot_id, detail=receipt_id, time_text=time_text))
+                else:
+                    conn.execute("""
+                        UPDATE Parking_Receipts
+                        SET Exit_time = ?
+                        WHERE Spot_ID = ? AND Exit_time IS NULL
+                    """, (time_text, spot_id))
+                    logged.append(event("retrieve", spot_id, time_text=time_text))
+            if logged:
+                self.event_log.append(conn, logged)
+        if self._spot_index is not None:
+            for kind, spot_id, _ in events:
+                self._spot_index.set_free(spot_id, kind != "Parked")
+
+    # A failed statement does not end the transaction, so a clashing
+    # receipt ID can simply be redrawn
+    def _insert_receipt(self, conn, spot_id, time_text, attempts=5):
+        for attempt in range(attempts):
+            receipt_id = self.receipt_id_factory()
+            try:
+                conn.execute("""
+                    INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
+                    VALUES (?, ?, ?)
+                """, (receipt_id, time_text, spot_id))
+                return receipt_id
+            except sqlite3.IntegrityError:
+                if attempt == attempts - 1:
+                    raise
+
+    def upsert_parking_spot(self, spot_id, level_id, spot_type, is_occupied, is_operational, sensor_id):
+        with self.pool.write() as conn:
+            conn.execute("""
+                INSERT INTO Parking_Spots (Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational, Sensor_ID)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(Spot_ID) DO UPDATE SET Is_occupied=excluded.Is_occupied
+            """, (spot_id, level_id, spot_type, is_occupied, is_operational, sensor_id))
+            is_operational = conn.execute(
+                "SELECT Is_operational FROM Parking_Spots WHERE Spot_ID = ?", (spot_id,)).fetchone()[0]
+            self.event_log.append(conn, [event("spot", spot_id, spot_flags(is_occupied, is_operational))],
+                                  project=False)
+        self.reload_spot_index()
+
+    # Takes the ID as typed; a generated ID with a wrong check symbol is
+    # rejected without a query
+    def validate_receipt(self, receipt_id):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return None
+        with self.pool.read() as conn:
+            result = conn.execute("""
+                SELECT Spot_ID FROM Parking_Receipts
+                WHERE Receipt_ID = ? AND Exit_time IS NULL
+            """, (receipt_id,)).fetchone()
+        return result[0] if result else None
+
+    def get_spot(self, spot_id):
+        with self.pool.read() as conn:
+            return conn.execute("""
+                SELECT Level_ID, Spot_type
+                FROM Parking_Spots
+                WHERE Spot_ID = ?
+            """, (spot_id,)).fetchone()
+
+    def list_spots(self):
+        with self.pool.read() as conn:
+            return conn.execute("""
+                SELECT Spot_ID, Level_ID, Spot_type, Is_occupied
+                FROM Parking_Spots
+            """).fetchall()
+
+    def parking_overview(self):
+        with self.pool.read() as conn:
+            return self._overview_rows(conn)
+
+    # The overview rows and the last event log sequence number they
+    # include, read in one transaction
+    def parking_overview_at(self):
+        self.event_log.flush()
+        with self.pool.read() as conn:
+            conn.execute("BEGIN")
+            try:
+                return last_seq(conn), self._overview_rows(conn)
+            finally:
+                conn.execute("COMMIT")
+
+    @staticmethod
+    def _overview_rows(conn):
+        return conn.execute("""
+            SELECT ps.Level_ID, ps.Spot_ID, ps.Spot_type, ps.Is_occupied, pr.Receipt_ID
+            FROM Parking_Spots ps
+            LEFT JOIN Parking_Receipts pr ON ps.Spot_ID = pr.Spot_ID AND pr.Exit_time IS NULL
+            ORDER BY ps.Level_ID, ps.Spot_ID
+        """).fetchall()
+
+    def open_receipt(self, spot_id):
+        with self.pool.read() as conn:
+            result = conn.execute("""
+                SELECT Receipt_ID FROM Parking_Receipts
+                WHERE Spot_ID = ? AND Exit_time IS NULL
+            """, (spot_id,)).fetchone()
+        return result[0] if result else None
+
+    # Claims a spot and writes its receipt in one BEGIN IMMEDIATE transaction.
+    # Returns (Spot_ID, Level_ID, Spot_type, Receipt_ID), or None when the
+    # selector finds no free spot. The default selector is the free-spot index.
+    def park(self, spot_selector=None, receipt_id=None):
+        spot_selector = spot_selector or self.indexed_spot()
+        with self.pool.write() as conn:
+            spot = spot_selector(conn)
+            if spot is None:
+                return None
+            spot_id = spot[0]
+            claimed = conn.execute("""
+                UPDATE Parking_Spots
+                SET Is_occupied = 1
+                WHERE Spot_ID = ? AND Is_occupied = 0
+            """, (spot_id,)).rowcount
+            if claimed != 1:
+                raise sqlite3.IntegrityError(f"Spot {spot_id} is already occupied")
+            if receipt_id is None:
+                receipt_id = self._insert_receipt(conn, spot_id, now_text())
+            else:
+                conn.execute("""
+                    INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID)
+                    VALUES (?, ?, ?)
+                """, (receipt_id, now_text(), spot_id))
+            self.event_log.append(conn, [event("park", spot_id, detail=receipt_id)], project=False)
+        self.spot_index.set_free(spot_id, False)
+        return tuple(spot) + (receipt_id,)
+
+    # Closes an open receipt and frees its spot in one transaction.
+    # Returns the Spot_ID, or None when the receipt is unknown or already closed.
+    def retrieve(self, receipt_id):
+        receipt_id = normalize_receipt_id(receipt_id)
+        if receipt_id is None:
+            return None
+        with self.pool.write() as conn:
+            result = conn.execute("""
+                SELECT Spot_ID FROM Parking_Receipts
+                WHERE Receipt_ID = ? AND Exit_time IS NULL
+            """, (receipt_id,)).fetchone()
+            if result is None:
+                return None
+            spot_id = result[0]
+            conn.execute("""
+                UPDATE Parking_Spots
+                SET Is_occupied = 0
+                WHERE Spot_ID = ?
+            """, (spot_id,))
+            conn.execute("""
+                UPDATE Parking_Receipts
+                SET Exit_time = ?
+                WHERE Receipt_ID = ?
+            """, (now_text(), receipt_id))
+            self.event_log.append(conn, [event("retrieve", spot_id, detail=receipt_id)], project=False)
+        self.spot_index.set_free(spot_id, True)
+        return spot_id
+
+    # Frees every spot and closes its open receipt. Receipts are kept as
+    # history; the archive job (archive.py) moves them out once old enough.
+    def clear_all_parking_spots(self):
+        with self.pool.write() as conn:
+            self.event_log.append(conn, [event("reset")])
+            conn.execute("""
+                UPDATE Parking_Receipts
+                SET Exit_time = ?
+                WHERE Exit_time IS NULL
+            """, (now_text(),))
+        self.reload_spot_index()
+
+
+# Repositories are shared per database file so every module in a process
+# reuses the same pool instead of opening its own connections. Closing one
+# removes it from here.
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(db_path):
+    key = os.path.abspath(db_path)
+    with _repositories_lock:
+        repo = _repositories.get(key)
+        if repo is None:
+            repo = ParkingRepository(key)
+            _repositories[key] = repo
+        return repo
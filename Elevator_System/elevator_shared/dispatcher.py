@@ -0,0 +1,239 @@
+import threading
+import time
+
+
+class Request:
+    def __init__(self, kind, arrival, stay=None, receipt_id=None, spot=None):
+        self.kind = kind            # 'park', 'retrieve', or 'move' (an empty elevator to spot[1])
+        self.arrival = arrival
+        self.stay = stay
+        self.receipt_id = receipt_id
+        self.spot = spot            # (Spot_ID, Level_ID, Spot_type)
+        self.start = None
+        self.finish = None
+        self.elevator = None        # set when the request is assigned
+        self.from_level = None      # where the elevator started the trip
+        self.via_level = None       # SCAN: level the car runs to before the pickup
+        self.on_done = None
+
+    # Parks are picked up at the ground and taken to the spot's level,
+    # retrieves the other way round
+    @property
+    def pickup_level(self):
+        return 0 if self.kind == 'park' else self.spot[1]
+
+    @property
+    def dropoff_level(self):
+        return 0 if self.kind == 'retrieve' else self.spot[1]
+
+
+class Elevator:
+    def __init__(self, number):
+        self.number = number
+        self.level = 0
+        self.direction = 1          # 1 up, -1 down: the way the last trip went
+        self.busy = False
+        self.busy_until = 0.0
+        self.busy_time = 0.0
+        self.planned = []           # destination dispatch: assigned, not started
+
+
+# Policies pick the next (elevator, request) pair from the queue and the
+# idle elevators, or None to leave the rest waiting. They only read levels
+# and the dispatcher's trip estimates; the dispatcher does the bookkeeping.
+# A policy may also have on_submit(request, dispatcher), called as each
+# request is queued.
+
+# Oldest request first, to the lowest-numbered idle elevator
+class FcfsPolicy:
+    name = 'fcfs'
+
+    def assign(self, queue, idle, dispatcher):
+        return idle[0], queue[0]
+
+
+# Oldest request first, to the idle elevator closest to its pickup level
+class NearestCarPolicy:
+    name = 'nearest'
+
+    def assign(self, queue, idle, dispatcher):
+        request = queue[0]
+        elevator = min(idle, key=lambda e: (abs(e.level - request.pickup_level), e.number))
+        return elevator, request
+
+
+# Elevator algorithm. Each elevator keeps going the way it last went and
+# takes the closest pickup on its way (at or beyond its level). When there
+# is nothing left that way, LOOK turns round on the spot; SCAN first runs
+# on to the end of the shaft (ground or top level), then turns round.
+class ScanPolicy:
+    def __init__(self, look=True):
+        self.look = look
+        self.name = 'look' if look else 'scan'
+
+    def assign(self, queue, idle, dispatcher):
+        best = None
+        for elevator in idle:
+            for request in queue:
+                distance = (request.pickup_level - elevator.level) * elevator.direction
+                if distance >= 0:
+                    key = (0, distance, request.arrival)
+                    via = None
+                elif self.look:
+                    key = (1, -distance, request.arrival)
+                    via = None
+                else:
+                    end = dispatcher.levels if elevator.direction > 0 else 0
+                    key = (1, abs(end - elevator.level) + abs(end - request.pickup_level), request.arrival)
+                    via = end if end != elevator.level else None
+                if best is None or key < best[0]:
+                    best = (key, elevator, request, via)
+        _, elevator, request, via = best
+        request.via_level = via
+        return elevator, request
+
+
+# Destination dispatch: a request is given to an elevator as soon as it
+# arrives, the one that would finish it soonest counting the trips already
+# given to it, and each elevator then serves its own requests in order.
+# Riders are grouped by destination up front instead of whichever elevator
+# comes free first taking the next one.
+class DestinationPolicy:
+    name = 'destination'
+
+    def assign(self, queue, idle, dispatcher):
+        for elevator in idle:
+            if elevator.planned:
+                return elevator, elevator.planned[0]
+        return None
+
+    def on_submit(self, request, dispatcher):
+        now = dispatcher.now()
+        best = None
+        for elevator in dispatcher.elevators:
+            t = max(now, elevator.busy_until) if elevator.busy else now
+            level = elevator.level
+            for planned in elevator.planned:
+                t += dispatcher.estimate(level, planned)
+                level = planned.dropoff_level
+            t += dispatcher.estimate(level, request)
+            if best is None or t < best[0]:
+                best = (t, elevator)
+        request.elevator = best[1]
+        best[1].planned.append(request)
+
+
+policies = {
+    'fcfs': FcfsPolicy,
+    'nearest': NearestCarPolicy,
+    'look': lambda: ScanPolicy(look=True),
+    'scan': lambda: ScanPolicy(look=False),
+    'destination': DestinationPolicy,
+}
+
+
+def make_policy(name):
+    try:
+        return policies[name]()
+    except KeyError:
+        raise ValueError(f"Unknown dispatch policy {name!r}, expected one of {', '.join(policies)}")
+
+
+# Queues park and retrieve requests and hands them to N elevators as the
+# policy decides. serve(elevator, request, done) runs the motion (queues
+# move_platform() animation, sends the serial commands, or schedules a
+# simulated finish) and calls done() when the elevator is free again;
+# done() may come from any thread, and serve() may call it before
+# returning. Each request's own on_done(request) runs after that.
+#
+# model: anything with levels and trip_time(from_level, request), e.g.
+#        simulator.GarageModel; used for the policies' estimates
+# home: optional home(elevator, dispatcher) giving the level to send an
+#       elevator to when it goes idle with nothing queued (0 to return to
+#       the ground, a forecast's pick), or None to leave it where it is.
+#       The elevator is sent as a 'move' request through serve().
+class Dispatcher:
+    def __init__(self, model, elevators, policy, serve, clock=time.monotonic, home=None):
+        self.model = model
+        self.levels = model.levels
+        self.elevators = [Elevator(n) for n in range(elevators)]
+        self.policy = make_policy(policy) if isinstance(policy, str) else policy
+        self.serve = serve
+        self.clock = clock
+        self.home = home
+        self.queue = []
+        self.completed = 0
+        self._lock = threading.RLock()
+
+    def now(self):
+        return self.clock()
+
+    def estimate(self, from_level, request):
+        return self.model.trip_time(from_level, request)
+
+    def submit(self, request, on_done=None):
+        with self._lock:
+            if request.arrival is None:
+                request.arrival = self.now()
+            request.on_done = on_done
+            self.queue.append(request)
+            on_submit = getattr(self.policy, 'on_submit', None)
+            if on_submit is not None:
+                on_submit(request, self)
+        self._dispatch()
+
+    def waiting(self):
+        with self._lock:
+            return len(self.queue)
+
+    def _dispatch(self):
+        starts = []
+        with self._lock:
+            while self.queue:
+                idle = [e for e in self.elevators if not e.busy]
+                if not idle:
+                    break
+                pair = self.policy.assign(self.queue, idle, self)
+                if pair is None:
+                    break
+                elevator, request = pair
+                self._start(elevator, request)
+                starts.append((elevator, request))
+            if self.home is not None and not self.queue:
+                for elevator in self.elevators:
+                    if elevator.busy:
+                        continue
+                    level = self.home(elevator, self)
+                    if level is not None and level != elevator.level:
+                        request = Request('move', self.now(), spot=(None, level, None))
+                        self._start(elevator, request)
+                        starts.append((elevator, request))
+        for elevator, request in starts:
+            self.serve(elevator, request, lambda elevator=elevator, request=request: self._done(elevator, request))
+
+    def _start(self, elevator, request):
+        if request.kind != 'move':
+            self.queue.remove(request)
+        if request in elevator.planned:
+            elevator.planned.remove(request)
+        now = self.now()
+        request.elevator = elevator
+        request.start = now
+        request.from_level = elevator.level
+        elevator.busy = True
+        elevator.busy_until = now + self.estimate(elevator.level, request)
+        came_from = request.pickup_level if request.kind != 'move' else elevator.level
+        if request.dropoff_level != came_from:
+            elevator.direction = 1 if request.dropoff_level > came_from else -1
+        elevator.level = request.dropoff_level
+
+    def _done(self, elevator, request):
+        with self._lock:
+            request.finish = self.now()
+            elevator.busy = False
+            elevator.busy_time += request.finish - request.start
+            if request.kind != 'move':
+                self.completed += 1
+        if request.on_done:
+            request.on_done(request)
+        self._dispatch()
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from .db import now_text
+from .metrics import registry
+
+# Messages a bay controller sends, and whether they leave the spot occupied
+event_kinds = {"Parked": True, "Retrieved": False}
+
+# Events written per transaction at most
+default_max_batch = 500
+
+# Seconds before reopening a port that failed
+reconnect_delay_s = 2.0
+
+# Recent event-to-commit latencies kept for reporting
+latency_samples = 100000
+
+# A batch that fails with "database is locked" (or another OperationalError)
+# is retried after commit_backoff_s, doubling up to max_commit_backoff_s,
+# and dropped after commit_attempts tries
+commit_attempts = 6
+commit_backoff_s = 0.1
+max_commit_backoff_s = 2.0
+
+dropped_events = registry.counter('elevator_gateway_dropped_events_total',
+                                  "Parking events the gateway gave up writing")
+commit_retries = registry.counter('elevator_gateway_commit_retries_total',
+                                  "Event batches written again after a database error")
+
+
+class ParkingEvent:
+    __slots__ = ('kind', 'spot_id', 'port', 'received_at', 'time_text')
+
+    def __init__(self, kind, spot_id, port, received_at, time_text):
+        self.kind = kind
+        self.spot_id = spot_id
+        self.port = port
+        self.received_at = received_at
+        self.time_text = time_text
+
+
+# "Parked" / "Retrieved" take the port's spot; "Parked 7" names the spot
+# itself, for a controller that serves more than one. Anything else is None.
+def parse_event(line, default_spot):
+    parts = line.split()
+    if not parts or parts[0] not in event_kinds:
+        return None
+    if len(parts) > 1:
+        try:
+            return parts[0], int(parts[1])
+        except ValueError:
+            return None
+    return parts[0], default_spot
+
+
+def _open_posix_port(port, baud_rate):
+    import termios
+    import tty
+    fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        speed = getattr(termios, f"B{baud_rate}", None)
+        if speed is not None:
+            attrs = termios.tcgetattr(fd)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+# Listens to one controller per port and writes their events through a
+# single writer task. Readers never touch the database: they decode lines
+# into ParkingEvents on an asyncio.Queue, and the writer drains whatever
+# has queued up into one ParkingRepository.apply_parking_events()
+# transaction (run in a worker thread so the loop keeps reading), so the
+# number of controllers changes the batch size, not the number of commits.
+#
+# ports: {port name: Spot_ID reported by that controller}
+# on_commit(events): called on the loop after each committed batch
+class EventGateway:
+    def __init__(self, repo, ports, baud_rate=9600, max_batch=default_max_batch, on_commit=None, verbose=True):
+        self.repo = repo
+        self.ports = dict(ports)
+        self.baud_rate = baud_rate
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self.verbose = verbose
+        self.events_written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.latencies = deque(maxlen=latency_samples)
+        self._queue = None
+        self._loop = None
+        self._stopping = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        readers = [asyncio.ensure_future(self._watch_port(port)) for port in self.ports]
+        writer = asyncio.ensure_future(self._write_events())
+        await self._stopping.wait()
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        # Let the writer finish what was already queued
+        await self._queue.put(None)
+        await writer
+
+    # Safe to call from any thread
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def _on_line(self, port, line, received_at):
+        if self.verbose:
+            print(f"Received from {port}: '{line}'")
+        parsed = parse_event(line, self.ports[port])
+        if parsed is None:
+            return
+        kind, spot_id = parsed
+        self._queue.put_nowait(ParkingEvent(kind, spot_id, port, received_at, now_text()))
+
+    async def _watch_port(self, port):
+        while True:
+            try:
+                if os.name == 'posix':
+                    await self._read_posix(port)
+                else:
+                    await self._read_threaded(port)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error on serial port {port}: {e}")
+            await asyncio.sleep(reconnect_delay_s)
+
+    # Non-blocking file descriptor watched by the event loop itself
+    async def _read_posix(self, port):
+        fd = _open_posix_port(port, self.baud_rate)
+        if self.verbose:
+            print(f"Connected to Arduino on port {port}")
+        buffer = bytearray()
+        failed = self._loop.create_future()
+
+        def readable():
+            try:
+                chunk = os.read(fd, 4096)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self._fail(failed, e)
+                return
+            if not chunk:
+                self._fail(failed, EOFError(f"{port} closed"))
+                return
+            received_at = time.perf_counter()
+            buffer.extend(chunk)
+            while True:
+                end = buffer.find(b'\n')
+                if end < 0:
+                    break
+                line = buffer[:end].decode('utf-8', errors='replace').strip()
+                del buffer[:end + 1]
+                if line:
+                    self._on_line(port, line, received_at)
+
+        self._loop.add_reader(fd, readable)
+        try:
+            await failed
+        finally:
+            self._loop.remove_reader(fd)
+            os.close(fd)
+
+    # Windows COM ports cannot be watched by the loop; read them with
+    # pyserial on a thread of their own and hand lines over
+    async def _read_threaded(self, port):
+        import serial
+        ser = serial.Serial(port, self.baud_rate, timeout=1)
+        if self.verbose:
+            print(f"Connected to Arduino on port {port}")
+        done = self._loop.create_future()
+        closing = threading.Event()
+
+        def read_lines():
+            try:
+                while not closing.is_set():
+                    line = ser.readline().decode('utf-8', errors='replace').strip()
+                    if line:
+                        self._loop.call_soon_threadsafe(self._on_line, port, line, time.perf_counter())
+            except Exception as e:
+                self._loop.call_soon_threadsafe(self._fail, done, e)
+
+        thread = threading.Thread(target=read_lines, name=f"serial-{port}", daemon=True)
+        thread.start()
+        try:
+            await done
+        finally:
+            closing.set()
+            await asyncio.to_thread(thread.join, 2.0)
+            ser.close()
+
+    @staticmethod
+    def _fail(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    async def _write_events(self):
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                return
+            batch = [event]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                event = self._queue.get_nowait()
+                if event is None:
+                    await self._commit(batch)
+                    return
+                batch.append(event)
+            await self._commit(batch)
+
+    # A failed batch is rolled back whole, so it is written again, ahead of
+    # anything queued since; only a batch that keeps failing, or fails for
+    # a reason waiting cannot fix, is dropped (and counted)
+    async def _commit(self, batch):
+        rows = [(event.kind, event.spot_id, event.time_text) for event in batch]
+        delay = commit_backoff_s
+        for attempt in range(1, commit_attempts + 1):
+            try:
+                await asyncio.to_thread(self.repo.apply_parking_events, rows)
+                break
+            except sqlite3.OperationalError:
+                if attempt == commit_attempts:
+                    self._drop(batch)
+                    return
+            except sqlite3.Error:
+                self._drop(batch)
+                return
+            self.retries += 1
+            commit_retries.inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_commit_backoff_s)
+        committed_at = time.perf_counter()
+        self.latencies.extend(committed_at - event.received_at for event in batch)
+        self.events_written += len(batch)
+        self.batches += 1
+        if self.verbose:
+            for event in batch:
+                print(f"{event.kind}: Spot_ID={event.spot_id} at {event.time_text}")
+        if self.on_commit:
+            self.on_commit(batch)
+
+    def _drop(self, batch):
+        self.dropped += len(batch)
+        dropped_events.inc(len(batch))
@@ -0,0 +1,428 @@
+import sqlite3
+import struct
+import threading
+import time
+
+
+# What each event does to its spot:
+#   park / retrieve   spot occupied / freed (Detail: Receipt_ID if known)
+#   sensor            occupancy reported by the spot sensor (Value: 1 or 0)
+#   fault             spot out of service (Value: 1) or back in service (0)
+#   reset             every spot freed (no Spot_ID)
+#   spot              spot added or redefined (Value: spot flags below)
+event_kinds = ("park", "retrieve", "sensor", "fault", "reset", "spot")
+
+# Per-spot flags kept in memory and in snapshots
+occupied_flag = 1
+operational_flag = 2
+
+# Events appended between snapshots
+default_snapshot_every = 10000
+
+# Snapshots kept, besides the first one a full replay starts from
+default_snapshots_kept = 3
+
+# Events record() holds back before writing them to Spot_Events, and the
+# longest it holds one
+default_append_every = 64
+default_append_delay = 0.05
+
+
+def now_text():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def event(kind, spot_id=None, value=None, detail=None, time_text=None):
+    if kind not in event_kinds:
+        raise ValueError(f"Unknown spot event {kind!r}")
+    return kind, spot_id, value, detail, time_text or now_text()
+
+
+def spot_flags(is_occupied, is_operational):
+    return (occupied_flag if is_occupied else 0) | (operational_flag if is_operational else 0)
+
+
+# Spot_ID -> flags as of one event sequence number, rebuilt from the newest
+# snapshot plus the events after it
+class SpotState:
+    def __init__(self, seq=0, spots=None):
+        self.seq = seq
+        self.spots = spots if spots is not None else {}
+
+    def copy(self):
+        return SpotState(self.seq, dict(self.spots))
+
+    def apply(self, seq, kind, spot_id, value):
+        spots = self.spots
+        if kind == "reset":
+            for key, flags in spots.items():
+                spots[key] = flags & ~occupied_flag
+        elif kind == "spot":
+            spots[spot_id] = value
+        else:
+            flags = spots.get(spot_id, operational_flag)
+            if kind == "park" or (kind == "sensor" and value):
+                flags |= occupied_flag
+            elif kind == "retrieve" or kind == "sensor":
+                flags &= ~occupied_flag
+            elif kind == "fault":
+                flags = flags & ~operational_flag if value else flags | operational_flag
+            spots[spot_id] = flags
+        self.seq = seq
+
+    def is_occupied(self, spot_id):
+        return bool(self.spots.get(spot_id, 0) & occupied_flag)
+
+    def is_operational(self, spot_id):
+        return bool(self.spots.get(spot_id, operational_flag) & operational_flag)
+
+    # (Spot_ID, Is_occupied, Is_operational) in Spot_ID order
+    def rows(self):
+        return [(spot_id, bool(flags & occupied_flag), bool(flags & operational_flag))
+                for spot_id, flags in sorted(self.spots.items())]
+
+    # Count, then every Spot_ID, then every flag byte
+    def encode(self):
+        ids = list(self.spots)
+        return struct.pack(f"<I{len(ids)}i{len(ids)}B", len(ids), *ids, *(self.spots[i] for i in ids))
+
+    @classmethod
+    def decode(cls, seq, blob):
+        count = struct.unpack_from("<I", blob)[0]
+        values = struct.unpack_from(f"<{count}i{count}B", blob, 4)
+        return cls(seq, dict(zip(values[:count], values[count:])))
+
+    @classmethod
+    def from_spots_table(cls, conn, seq):
+        rows = conn.execute("SELECT Spot_ID, Is_occupied, Is_operational FROM Parking_Spots").fetchall()
+        return cls(seq, {spot_id: spot_flags(occupied, operational) for spot_id, occupied, operational in rows})
+
+
+update_occupied_sql = "UPDATE Parking_Spots SET Is_occupied = ? WHERE Spot_ID = ?"
+update_operational_sql = "UPDATE Parking_Spots SET Is_operational = ? WHERE Spot_ID = ?"
+
+# Columns in event() order, so events bind as they are
+insert_event_sql = """
+    INSERT INTO Spot_Events (Kind, Spot_ID, Value, Detail, Event_time)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def last_seq(conn):
+    return conn.execute("SELECT MAX(Seq) FROM Spot_Events").fetchone()[0] or 0
+
+
+def latest_snapshot(conn, at_or_before=None):
+    if at_or_before is None:
+        return conn.execute("""
+            SELECT Seq, State FROM Spot_Snapshots
+            WHERE Seq = (SELECT MAX(Seq) FROM Spot_Snapshots)
+        """).fetchone()
+    return conn.execute("""
+        SELECT Seq, State FROM Spot_Snapshots
+        WHERE Seq = (SELECT MAX(Seq) FROM Spot_Snapshots WHERE Seq <= ?)
+    """, (at_or_before,)).fetchone()
+
+
+# (Seq, Event_time, Kind, Spot_ID, Value, Detail) after one sequence number,
+# up to another if given
+def read_events(conn, after, upto=None):
+    if upto is None:
+        return conn.execute("""
+            SELECT Seq, Event_time, Kind, Spot_ID, Value, Detail FROM Spot_Events
+            WHERE Seq > ? ORDER BY Seq
+        """, (after,))
+    return conn.execute("""
+        SELECT Seq, Event_time, Kind, Spot_ID, Value, Detail FROM Spot_Events
+        WHERE Seq > ? AND Seq <= ? ORDER BY Seq
+    """, (after, upto))
+
+
+def catch_up(conn, state, upto=None):
+    replayed = 0
+    for seq, _, kind, spot_id, value, _ in read_events(conn, state.seq, upto):
+        state.apply(seq, kind, spot_id, value)
+        replayed += 1
+    return replayed
+
+
+# Spot state as of upto (default: the end of the log). Starts from the
+# newest snapshot at or before that point unless use_snapshot is False, in
+# which case every event is replayed onto the baseline snapshot the log
+# started from. Returns (SpotState, events replayed).
+def load_state(conn, upto=None, use_snapshot=True):
+    if use_snapshot:
+        snapshot = latest_snapshot(conn, upto)
+    else:
+        snapshot = conn.execute("""
+            SELECT Seq, State FROM Spot_Snapshots
+            WHERE Seq = (SELECT MIN(Seq) FROM Spot_Snapshots)
+        """).fetchone()
+    if snapshot is None:
+        # Nothing logged yet: the flags in Parking_Spots are the state
+        return SpotState.from_spots_table(conn, last_seq(conn)), 0
+    state = SpotState.decode(*snapshot)
+    return state, catch_up(conn, state, upto)
+
+
+# Append-only, sequence-numbered log of spot events (Spot_Events), the
+# record spot state is rebuilt from. Every change the repository makes to
+# a spot goes through append(), inside the transaction that makes it, or
+# through record() for a change that is nothing but the event.
+#
+# record() is group commit: callers that arrive while a commit is running
+# queue their events, and the next caller to find the writer free commits
+# everything queued in one transaction and wakes the rest. That transaction
+# only updates Parking_Spots; the events themselves are held back and
+# written together, once append_every of them are waiting, append_delay
+# seconds after the first, before anything else is appended and on
+# close(). A lone writer so commits one row per event, as the bare UPDATE
+# did before the log. The price is that a crash can lose the held-back
+# events (never the Parking_Spots change), and another process writing the
+# same spot meanwhile can log its event first; append_every=1 writes every
+# event with its change.
+#
+# Parking_Spots is kept as a projection for the scripts that query it: each
+# append coalesces its events to one UPDATE per spot touched. Every
+# snapshot_every events the state is also written to Spot_Snapshots, so a
+# process starting up loads one row and replays at most that many events.
+class EventLog:
+    def __init__(self, pool, snapshot_every=default_snapshot_every, snapshots_kept=default_snapshots_kept,
+                 append_every=default_append_every, append_delay=default_append_delay):
+        self.pool = pool
+        self.snapshot_every = snapshot_every
+        self.snapshots_kept = snapshots_kept
+        self.append_every = append_every
+        self.append_delay = append_delay
+        self.events_appended = 0
+        self.commits = 0
+        self.snapshots_written = 0
+        self.load_seconds = None
+        self.events_replayed = 0
+        self._state = None
+        self._state_lock = threading.Lock()
+        self._snapshot_seq = None
+        self._group = threading.Condition()
+        self._queued = []
+        self._committing = False
+        self._held = []     # recorded events not yet in Spot_Events, guarded by the writer lock
+        self._timer = None
+
+    # Current state: loaded on first use, then brought up to date with the
+    # events appended since (by any process) on every access
+    @property
+    def state(self):
+        self.flush()
+        with self._state_lock:
+            with self.pool.read() as conn:
+                conn.execute("BEGIN")
+                try:
+                    if self._state is None:
+                        start = time.perf_counter()
+                        self._state, self.events_replayed = load_state(conn)
+                        self.load_seconds = time.perf_counter() - start
+                        lost = self._lost_events(conn)
+                    else:
+                        lost = None
+                        catch_up(conn, self._state)
+                finally:
+                    conn.execute("COMMIT")
+        if lost:
+            with self.pool.write() as conn:
+                self.append(conn, lost, project=False)
+            return self.state
+        return self._state
+
+    # Events held back by a process that died never reached the log: one
+    # "spot" event per spot whose flags in Parking_Spots differ from the
+    # replayed state brings the log back in line
+    def _lost_events(self, conn):
+        table = SpotState.from_spots_table(conn, self._state.seq).spots
+        return [event("spot", spot_id, flags) for spot_id, flags in sorted(table.items())
+                if self._state.spots.get(spot_id) != flags]
+
+    # Records one event in its own group-committed transaction and returns
+    # once its Parking_Spots change is committed (the event follows, see
+    # above). A caller that finds the writer free commits straight away.
+    def record(self, kind, spot_id=None, value=None, detail=None):
+        entry = event(kind, spot_id, value, detail)
+        queued = None
+        with self._group:
+            if self._committing:
+                queued = _Queued(entry)
+                self._queued.append(queued)
+                while self._committing and not queued.done and queued.error is None:
+                    self._group.wait()
+                if queued.done or queued.error is not None:
+                    return queued.result()
+            self._committing = True
+            batch, self._queued = self._queued, []
+        events = [waiting.event for waiting in batch]
+        if queued is None:
+            events.append(entry)
+        try:
+            with self.pool.write() as conn:
+                self._hold(conn, events)
+            for waiting in batch:
+                waiting.done = True
+        except Exception as e:
+            for waiting in batch:
+                waiting.error = e
+            if queued is None:
+                raise
+        finally:
+            with self._group:
+                self._committing = False
+                self.commits += 1
+                if batch or self._queued:
+                    self._group.notify_all()
+        if queued is not None:
+            queued.result()
+
+    # Updates Parking_Spots for the events and holds them back, writing
+    # everything held once there are append_every events
+    def _hold(self, conn, events):
+        self._project(conn, events)
+        if len(self._held) + len(events) >= self.append_every:
+            self.append(conn, events, project=False)
+            return
+        # Last, so a failed statement above leaves nothing held
+        self._held.extend(events)
+        if self._timer is None:
+            self._timer = threading.Timer(self.append_delay, self._flush_held)
+            self._timer.daemon = True
+            self._timer.start()
+
+    # Writes the events record() is holding back
+    def flush(self):
+        if self._held:
+            with self.pool.write() as conn:
+                self._write_held(conn)
+
+    def _flush_held(self):
+        try:
+            with self.pool.write() as conn:
+                self._timer = None
+                self._write_held(conn)
+        except sqlite3.Error:
+            # Closed or locked: the next append writes them
+            self._timer = None
+
+    def close(self):
+        timer = self._timer
+        if timer is not None:
+            timer.cancel()
+        self.flush()
+
+    # Called in a write transaction when a repository opens the database.
+    # The first time, records the Parking_Spots flags the log starts from.
+    def start(self, conn):
+        snapshot = conn.execute("SELECT MAX(Seq) FROM Spot_Snapshots").fetchone()[0]
+        if snapshot is None:
+            snapshot = last_seq(conn)
+            self._write_snapshot(conn, SpotState.from_spots_table(conn, snapshot))
+        self._snapshot_seq = snapshot
+
+    # Writes events (see event()) in the caller's write transaction and
+    # returns the last sequence number, after any events record() is holding
+    # back. With project=False the caller has already written the matching
+    # Parking_Spots change itself.
+    def append(self, conn, events, project=True):
+        if self._snapshot_seq is None:
+            self.start(conn)
+        if self._held:
+            self._write_held(conn)
+        if not events:
+            return last_seq(conn)
+        last = self._insert(conn, events)
+        if project:
+            self._project(conn, events)
+        return last
+
+    def _write_held(self, conn):
+        if self._snapshot_seq is None:
+            self.start(conn)
+        if self._held:
+            self._insert(conn, self._held)
+            self._held = []
+
+    def _insert(self, conn, events):
+        # SQLite numbers the rows: Seq is the rowid, so each insert gets the
+        # highest Seq + 1 without a MAX(Seq) lookup, and the write lock keeps
+        # one transaction's events consecutive
+        if len(events) == 1:
+            last = conn.execute(insert_event_sql, events[0]).lastrowid
+        else:
+            conn.executemany(insert_event_sql, events)
+            last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        self.events_appended += len(events)
+        if last - self._snapshot_seq >= self.snapshot_every:
+            self._take_snapshot(conn, last)
+        return last
+
+    # Brings Parking_Spots in line with the events, one statement per spot
+    def _project(self, conn, events):
+        occupied = {}
+        operational = {}
+        for kind, spot_id, value, _, _ in events:
+            if kind == "reset":
+                self._flush_projection(conn, occupied, operational)
+                conn.execute("UPDATE Parking_Spots SET Is_occupied = 0 WHERE Is_occupied != 0")
+            elif kind == "fault":
+                operational[spot_id] = 0 if value else 1
+            elif kind == "spot":
+                occupied[spot_id] = value & occupied_flag
+                operational[spot_id] = 1 if value & operational_flag else 0
+            else:
+                occupied[spot_id] = 1 if kind == "park" or (kind == "sensor" and value) else 0
+        self._flush_projection(conn, occupied, operational)
+
+    @staticmethod
+    def _flush_projection(conn, occupied, operational):
+        for sql, changes in ((update_occupied_sql, occupied), (update_operational_sql, operational)):
+            # One spot (a park, a retrieve, a sensor) is the common case,
+            # and execute() costs less than executemany() for a single row
+            if len(changes) == 1:
+                (spot_id, value), = changes.items()
+                conn.execute(sql, (value, spot_id))
+            elif changes:
+                conn.executemany(sql, ((value, spot_id) for spot_id, value in changes.items()))
+            changes.clear()
+
+    # Snapshots a copy so a rolled-back transaction cannot leave uncommitted
+    # events in the shared state
+    def _take_snapshot(self, conn, upto):
+        with self._state_lock:
+            if self._state is not None and self._state.seq >= self._snapshot_seq:
+                state = self._state.copy()
+                catch_up(conn, state, upto)
+            else:
+                state, _ = load_state(conn, upto)
+        self._write_snapshot(conn, state)
+        self._snapshot_seq = state.seq
+
+    def _write_snapshot(self, conn, state):
+        conn.execute("""
+            INSERT OR REPLACE INTO Spot_Snapshots (Seq, Taken_at, State)
+            VALUES (?, ?, ?)
+        """, (state.seq, now_text(), state.encode()))
+        # The first snapshot stays: it is where a full replay starts
+        conn.execute("""
+            DELETE FROM Spot_Snapshots
+            WHERE Seq > (SELECT MIN(Seq) FROM Spot_Snapshots)
+              AND Seq < (SELECT Seq FROM Spot_Snapshots ORDER BY Seq DESC LIMIT 1 OFFSET ?)
+        """, (self.snapshots_kept - 1,))
+        self.snapshots_written += 1
+
+
+class _Queued:
+    __slots__ = ('event', 'done', 'error')
+
+    def __init__(self, entry):
+        self.event = entry
+        self.done = False
+        self.error = None
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,197 @@
+import fcntl
+import os
+import queue
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+
+from .binary_protocol import FrameError, FrameReader, decode_command, encode_reply, negotiate_reply
+from .controller_model import ControllerModel
+
+# Minimal pyserial-style port over a file descriptor (used for the host end
+# of a pseudo-terminal, so code written against serial.Serial runs on it)
+class PtyPort:
+    def __init__(self, fd, timeout=1.0):
+        self.fd = fd
+        self.timeout = timeout
+        self.is_open = True
+
+    def fileno(self):
+        return self.fd
+
+    @property
+    def in_waiting(self):
+        buf = fcntl.ioctl(self.fd, termios.FIONREAD, struct.pack('i', 0))
+        return struct.unpack('i', buf)[0]
+
+    def read(self, size=1):
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        if not ready:
+            return b''
+        return os.read(self.fd, size)
+
+    def readline(self):
+        line = bytearray()
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while not line.endswith(b'\n'):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                break
+            line.extend(os.read(self.fd, 1))
+        return bytes(line)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            os.close(self.fd)
+
+
+# Stand-in for the Arduino on the far end of a pseudo-terminal. It answers
+# like ControllerModel, taking the model's motor time (scaled) for each
+# move, so host code can be tested and benchmarked without hardware.
+#
+# time_scale: 1.0 for real motor timing, 0 to answer immediately
+# baud: if set, every line in either direction also takes its time on the
+#       wire (10 bits per byte), as over the real 9600 baud link. Replies
+#       go out on their own thread, like the sketch's interrupt-driven
+#       Serial buffer, so the next step does not wait for them.
+# Other options (sketch, occupied, car_delay_s, ...) go to ControllerModel.
+class FakeArduino(ControllerModel):
+    def __init__(self, sketch='new', time_scale=0.0, baud=None, **model_options):
+        super().__init__(sketch, **model_options)
+        self.binary = False
+        self.time_scale = time_scale
+        self.baud = baud
+        self.commands = []
+        self.silent = False
+        self._master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port_name = os.ttyname(slave)
+        self._slave = slave
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._outgoing = queue.Queue()
+        self._thread = threading.Thread(target=self._serve, name="fake-arduino", daemon=True)
+        self._thread.start()
+        if baud:
+            self._sender = threading.Thread(target=self._send_loop, name="fake-arduino-tx", daemon=True)
+            self._sender.start()
+
+    # Host end of the link, usable wherever a serial.Serial is expected
+    def open_port(self, timeout=1.0):
+        return PtyPort(self._slave, timeout)
+
+    def wire_time(self, data):
+        return len(data) * 10 / self.baud if self.baud else 0.0
+
+    def run_plan(self, frame):
+        for duration, line in self.plan_replies(frame):
+            self._pause(duration)
+            self.emit(line)
+
+    # Sends a line the controller would send on its own, e.g. "Car in Spot",
+    # or (with seq) a reply to a binary command
+    def emit(self, line, seq=None):
+        if self.binary:
+            data = encode_reply(line, seq)
+            if data is None:
+                return
+        else:
+            data = (line + '\r\n').encode()
+        if self.baud:
+            self._outgoing.put(data)
+            return
+        self._write(data)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        if self.baud:
+            self._outgoing.put(None)
+            self._sender.join(timeout=1.0)
+        os.close(self._master)
+
+    def _write(self, data):
+        with self._write_lock:
+            os.write(self._master, data)
+
+    def _send_loop(self):
+        while True:
+            data = self._outgoing.get()
+            if data is None:
+                return
+            time.sleep(self.wire_time(data))
+            try:
+                self._write(data)
+            except OSError:
+                return
+
+    # Takes one command off the front of buffer: (command, seq, bytes on
+    # the wire), or None if it is not all there yet
+    def _next_command(self, buffer, reader):
+        if self.binary:
+            before = len(buffer)
+            message = reader.next_frame(buffer)
+            if message is None:
+                return None
+            try:
+                command = decode_command(*message)
+            except (FrameError, IndexError):
+                command = ''
+            return command, message[1], before - len(buffer)
+        if b'\n' not in buffer:
+            return None
+        end = buffer.index(b'\n')
+        command = buffer[:end].decode(errors='replace').strip()
+        del buffer[:end + 1]
+        return command, None, end + 1
+
+    def _serve(self):
+        buffer = bytearray()
+        reader = FrameReader()
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                chunk = os.read(self._master, 4096)
+            except OSError:
+                return
+            buffer.extend(chunk)
+            while True:
+                received = self._next_command(buffer, reader)
+                if received is None:
+                    break
+                command, seq, size = received
+                self.commands.append(command)
+                if self.baud:
+                    time.sleep(size * 10 / self.baud)
+                if self.silent:
+                    continue
+                if self.sketch == 'new' and command.startswith("PLAN "):
+                    self.run_plan(command)
+                    continue
+                lines, duration = self.respond(command)
+                self._pause(duration)
+                for line in lines:
+                    self.emit(line, seq)
+                if lines[0] == negotiate_reply:
+                    self.binary = True
+
+    def _pause(self, duration):
+        if duration and self.time_scale:
+            time.sleep(duration * self.time_scale)
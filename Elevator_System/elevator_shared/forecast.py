@@ -0,0 +1,245 @@
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .db import create_database
+from .simulator import GarageModel, GarageSimulation, percentile, trace_arrivals
+
+hours_per_week = 168
+# 1970-01-01 was a Thursday; hour of week 0 is Monday 00:00-01:00
+_epoch_hour_of_week = 72
+# Car-hours of the average hazard mixed into every hour, so a night hour
+# with a handful of cars parked does not get a wild rate
+hazard_prior_hours = 20
+
+
+def hour_of_week(epoch_seconds):
+    return (np.asarray(epoch_seconds, dtype=np.int64) // 3600 + _epoch_hour_of_week) % hours_per_week
+
+
+# Entry and exit times of every receipt as int64 epoch seconds (exit -1
+# while the car is still parked). SQLite converts the dates, so no row is
+# parsed in Python.
+def load_receipts(conn):
+    cursor = conn.execute("""
+        SELECT CAST(strftime('%s', Entry_time) AS INTEGER),
+               COALESCE(CAST(strftime('%s', Exit_time) AS INTEGER), -1)
+        FROM Parking_Receipts
+        WHERE strftime('%s', Entry_time) IS NOT NULL
+    """)
+    times = np.fromiter(itertools.chain.from_iterable(cursor), dtype=np.int64).reshape(-1, 2)
+    return times[:, 0], times[:, 1]
+
+
+# Hourly demand learned from receipt history, by hour of the week:
+#   arrival_rate[h]      parks per hour
+#   departure_rate[h]    retrieves per hour
+#   departure_hazard[h]  retrieves per parked car per hour
+# Retrieves are forecast from the cars parked right now and the hazard,
+# so an empty level is never expected to call for the elevator.
+class DemandForecast:
+    def __init__(self, arrival_rate, departure_rate, departure_hazard):
+        self.arrival_rate = arrival_rate
+        self.departure_rate = departure_rate
+        self.departure_hazard = departure_hazard
+
+    # Learns from receipts entered before until (epoch seconds; default all
+    # of them). Exits at or after until count as still parked, so a
+    # forecast fitted on the past knows nothing of what came next.
+    @classmethod
+    def fit(cls, entries, exits, until=None):
+        if until is None:
+            until = int(max(entries.max(), exits.max())) + 1
+        keep = entries < until
+        entries, exits = entries[keep], exits[keep]
+        exits = np.where(exits < until, exits, -1)
+        if not len(entries):
+            return cls(np.zeros(hours_per_week), np.zeros(hours_per_week), np.zeros(hours_per_week))
+        first_hour = int(entries.min()) // 3600
+        hours = np.arange(first_hour, until // 3600 + 1)
+        hour_index = hour_of_week(hours * 3600)
+        observed = np.bincount(hour_index, minlength=hours_per_week)
+
+        arrivals = np.bincount(hour_of_week(entries), minlength=hours_per_week)
+        closed = exits >= 0
+        departures = np.bincount(hour_of_week(exits[closed]), minlength=hours_per_week)
+
+        # Cars parked at some point in each hour: +1 from the entry hour,
+        # -1 after the exit hour (open receipts run to the end)
+        change = np.zeros(len(hours) + 1, dtype=np.int64)
+        np.add.at(change, entries // 3600 - first_hour, 1)
+        leave = np.where(closed, exits // 3600 - first_hour + 1, len(hours))
+        np.add.at(change, np.minimum(leave, len(hours)), -1)
+        parked = np.cumsum(change)[:len(hours)]
+        exposure = np.bincount(hour_index, weights=parked, minlength=hours_per_week)
+
+        average = departures.sum() / max(exposure.sum(), 1)
+        hazard = (departures + hazard_prior_hours * average) / (exposure + hazard_prior_hours)
+        observed = np.maximum(observed, 1)
+        return cls(arrivals / observed, departures / observed, hazard)
+
+    # Expected pickups per level in the next horizon_s: parks at the ground
+    # (index 0), retrieves at each level from occupancy[level] parked cars
+    def expected_pickups(self, epoch_seconds, occupancy, horizon_s):
+        h = int(hour_of_week(epoch_seconds))
+        hours = horizon_s / 3600
+        pickups = np.asarray(occupancy, dtype=float) * -np.expm1(-self.departure_hazard[h] * hours)
+        pickups[0] += self.arrival_rate[h] * hours
+        return pickups
+
+    # Hours of the day (0-23) with the most retrieves per day on average
+    def rush_hours(self, count=3):
+        return sorted(int(h) for h in np.argsort(self.departure_rate.reshape(7, 24).sum(axis=0))[-count:])
+
+
+# Dispatcher home for idle elevators: the level that leaves the expected
+# pickups closest to some elevator, counting where the other elevators
+# are or will be (greedy weighted k-median over the levels). Returns None
+# when nothing is expected, so an idle elevator at night stays put.
+#
+# occupancy: callable giving parked cars per level (index 0 unused)
+# clock_epoch: callable giving the current time in epoch seconds
+class Prepositioner:
+    def __init__(self, forecast, levels, occupancy, clock_epoch, horizon_s=900):
+        self.forecast = forecast
+        self.occupancy = occupancy
+        self.clock_epoch = clock_epoch
+        self.horizon_s = horizon_s
+        positions = np.arange(levels + 1)
+        self._distance = np.abs(positions[:, None] - positions[None, :])
+        self.moves = 0
+
+    def __call__(self, elevator, dispatcher):
+        pickups = self.forecast.expected_pickups(self.clock_epoch(), self.occupancy(), self.horizon_s)
+        if not pickups.any():
+            return None
+        others = [e.level for e in dispatcher.elevators if e is not elevator]
+        if others:
+            nearest = self._distance[others].min(axis=0)
+            cost = (np.minimum(self._distance, nearest) * pickups).sum(axis=1)
+        else:
+            cost = (self._distance * pickups).sum(axis=1)
+        level = int(cost.argmin())
+        if cost[level] >= cost[elevator.level]:
+            return None
+        self.moves += 1
+        return level
+
+
+# A month of made-up receipts with a commuter rush: weekday arrivals around
+# 8:00 staying the working day, shoppers through the day, fewer on weekends
+def write_synthetic_receipts(path, days, cars_per_day, seed):
+    create_database(path)
+    rng = random.Random(seed)
+    start = datetime(2024, 9, 2)   # a Monday
+    rows = []
+    for day in range(int(days)):
+        midnight = start + timedelta(days=day)
+        weekday = midnight.weekday() < 5
+        commuters = int(cars_per_day * 0.6) if weekday else 0
+        shoppers = int(cars_per_day * (0.4 if weekday else 0.5))
+        stays = []
+        for _ in range(commuters):
+            stays.append((rng.gauss(8.0, 0.6), max(1.0, rng.gauss(9.0, 0.8))))
+        for _ in range(shoppers):
+            stays.append((rng.uniform(10.0, 20.0), rng.expovariate(1 / 1.5)))
+        for hour, stay in stays:
+            entry = midnight + timedelta(hours=hour)
+            rows.append((f"H{len(rows):08d}", entry.strftime('%Y-%m-%d %H:%M:%S'),
+                         (entry + timedelta(hours=stay)).strftime('%Y-%m-%d %H:%M:%S'), 1))
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Receipts VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def replay(receipts_db, model, elevators, policy, home_name, forecast, start_epoch, horizon_s):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'replay.db')
+        create_database(db_path)
+        simulation = GarageSimulation(model, db_path, elevators=elevators, policy=policy)
+        prepositioner = None
+        if home_name == 'ground':
+            simulation.dispatcher.home = lambda elevator, dispatcher: 0
+        elif home_name == 'forecast':
+            prepositioner = Prepositioner(forecast, model.levels, lambda: simulation.occupancy,
+                                          lambda: start_epoch + simulation.now, horizon_s)
+            simulation.dispatcher.home = prepositioner
+        try:
+            report = simulation.run(trace_arrivals(receipts_db))
+        finally:
+            simulation.close()
+    return simulation.requests, report, prepositioner
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay receipt history with idle elevators returning to the ground, staying put, "
+                    "or pre-positioned by a forecast learned from the earlier receipts.")
+    parser.add_argument('--receipts', help="database with the Parking_Receipts history (default: synthetic)")
+    parser.add_argument('--synthetic-days', type=float, default=35)
+    parser.add_argument('--cars-per-day', type=int, default=600)
+    parser.add_argument('--test-days', type=float, default=7, help="the last days, replayed and scored")
+    parser.add_argument('--levels', type=int, default=30)
+    parser.add_argument('--spots-per-level', type=int, default=20)
+    parser.add_argument('--elevators', type=int, default=2)
+    parser.add_argument('--policy', default='nearest')
+    parser.add_argument('--step-delay-us', type=int, default=2000)
+    parser.add_argument('--horizon-minutes', type=float, default=15)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        receipts_db = args.receipts
+        if receipts_db is None:
+            receipts_db = os.path.join(tmp, 'history.db')
+            write_synthetic_receipts(receipts_db, args.synthetic_days, args.cars_per_day, args.seed)
+        conn = sqlite3.connect(receipts_db)
+        try:
+            entries, exits = load_receipts(conn)
+        finally:
+            conn.close()
+        if not len(entries):
+            print("No receipts to learn from.")
+            return
+        start_epoch = int(entries.min())
+        end_epoch = int(max(entries.max(), exits.max()))
+        split = end_epoch - int(args.test_days * 86400)
+        forecast = DemandForecast.fit(entries, exits, until=split)
+        rush = forecast.rush_hours()
+        print(f"{len(entries):,} receipts; trained on those before {datetime.fromtimestamp(split, timezone.utc):%Y-%m-%d %H:%M}, "
+              f"rush hours {', '.join(f'{h}:00' for h in rush)}")
+
+        model = GarageModel(levels=args.levels, spots_per_level=args.spots_per_level,
+                            step_delay_us=args.step_delay_us, lift_cars=True)
+        print(f"{args.elevators} lift cars, {args.levels} levels, policy {args.policy}, test period only")
+        print(f"{'idle elevators':<16}{'retrieve mean s':>16}{'p95 s':>8}{'rush mean s':>13}{'rush p95 s':>12}"
+              f"{'park mean s':>13}{'moves':>8}")
+        results = {}
+        for home_name in ('ground', 'stay', 'forecast'):
+            requests, _, prepositioner = replay(receipts_db, model, args.elevators, args.policy, home_name,
+                                                forecast, start_epoch, args.horizon_minutes * 60)
+            scored = [r for r in requests if start_epoch + r.arrival >= split]
+            retrieves = [r.finish - r.arrival for r in scored if r.kind == 'retrieve']
+            rush_retrieves = [r.finish - r.arrival for r in scored if r.kind == 'retrieve'
+                              and int(start_epoch + r.arrival) // 3600 % 24 in rush]
+            parks = [r.finish - r.arrival for r in scored if r.kind == 'park']
+            results[home_name] = (np.mean(retrieves) if retrieves else 0.0,
+                                  np.mean(rush_retrieves) if rush_retrieves else 0.0)
+            print(f"{home_name:<16}{results[home_name][0]:>16.2f}{percentile(retrieves, 0.95):>8.2f}"
+                  f"{results[home_name][1]:>13.2f}{percentile(rush_retrieves, 0.95):>12.2f}"
+                  f"{np.mean(parks) if parks else 0.0:>13.2f}{prepositioner.moves if prepositioner else '-':>8}")
+    for baseline in ('ground', 'stay'):
+        saved, rush_saved = (results[baseline][n] - results['forecast'][n] for n in (0, 1))
+        print(f"Forecast vs {baseline}: {saved:.2f} s saved per retrieve, "
+              f"{rush_saved:.2f} s ({rush_saved / max(results[baseline][1], 1e-9):.0%}) at rush hour")
+
+
+if __name__ == "__main__":
+    main()
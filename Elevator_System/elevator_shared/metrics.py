@@ -0,0 +1,249 @@
+import argparse
+import atexit
+import bisect
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from a quick SQLite read up to
+# a full park sequence
+default_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# The endpoint only listens on the kiosk itself
+default_metrics_host = '127.0.0.1'
+default_metrics_port = 9108
+
+content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Bucket counts, sum and count of observed values, as a Prometheus
+# histogram. observe() is a bisect and three additions under a lock, so
+# it can be called on every transaction and serial command.
+class Histogram:
+    def __init__(self, buckets=default_buckets):
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    # with histogram.time(): ... observes the block's duration, even if it raises
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+# Named metric families, each holding one Histogram or Counter per label
+# set. Look a metric up once and keep it; the lookup costs more than
+# recording a sample.
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}  # name -> [kind, help, {labels: metric}]
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help, buckets=default_buckets, **labels):
+        return self._get(name, 'histogram', help, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help, **labels):
+        return self._get(name, 'counter', help, labels, Counter)
+
+    def _get(self, name, kind, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, [kind, help, {}])
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} is a {family[0]}, not a {kind}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    # Every metric in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            families = [(name, kind, help, list(metrics.items()))
+                        for name, (kind, help, metrics) in sorted(self._families.items())]
+        lines = []
+        for name, kind, help, metrics in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in sorted(metrics, key=lambda item: item[0]):
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(labels)} {metric.value}")
+                    continue
+                counts, total, count = metric.snapshot()
+                cumulative = 0
+                for bound, bucket in zip(metric.bounds + (float('inf'),), counts):
+                    cumulative += bucket
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total!r}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    # Serves render() at /metrics on a daemon thread; returns the server
+    # (server.shutdown() stops it). Raises OSError if the port is taken.
+    def serve(self, port=default_metrics_port, host=default_metrics_host):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+        return server
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+# The process-wide registry the shared modules and scripts record into
+registry = MetricsRegistry()
+
+serial_round_trip_help = "Command sent until its reply, per command (for moves, the move itself)"
+serial_timeouts_help = "Commands with no reply in time"
+serial_errors_help = "Commands that failed on the serial link"
+motor_move_help = "Motor move commands, sent until the controller reports them done"
+request_help = "Park or retrieve, from the kiosk button until the car is parked or handed back"
+request_failures_help = "Park or retrieve requests that did not complete"
+
+_command_metrics = {}
+
+
+def request_seconds(kind):
+    return registry.histogram('elevator_request_seconds', request_help, kind=kind)
+
+
+def request_failed(kind):
+    registry.counter('elevator_request_failures_total', request_failures_help, kind=kind).inc()
+
+
+def motor_move_seconds(axis):
+    return registry.histogram('elevator_motor_move_seconds', motor_move_help, axis=axis)
+
+
+# Axis a MOVE_* command drives
+def move_axis(command):
+    return 'horizontal' if 'HORIZONTAL' in command else 'vertical'
+
+
+# Histograms a command is timed into, by its first word: the serial round
+# trip, and for MOVE_* commands the motor move too
+def _for_command(command):
+    verb = (command.split(None, 1) or [''])[0]
+    metrics = _command_metrics.get(verb)
+    if metrics is None:
+        histograms = [registry.histogram('elevator_serial_round_trip_seconds', serial_round_trip_help,
+                                         command=verb)]
+        if verb.startswith('MOVE_'):
+            histograms.append(motor_move_seconds(move_axis(verb)))
+        timeouts = registry.counter('elevator_serial_timeouts_total', serial_timeouts_help, command=verb)
+        metrics = _command_metrics[verb] = (histograms, timeouts)
+    return metrics
+
+
+def record_command(command, seconds):
+    for histogram in _for_command(command)[0]:
+        histogram.observe(seconds)
+
+
+def command_timed_out(command):
+    _for_command(command)[1].inc()
+
+
+def command_failed():
+    registry.counter('elevator_serial_errors_total', serial_errors_help).inc()
+
+
+# Starts the local endpoint for a script; a port already taken (another
+# kiosk script running) is reported and otherwise ignored
+def start_endpoint(port=default_metrics_port):
+    try:
+        server = registry.serve(port)
+    except OSError as e:
+        print(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    print(f"Metrics at http://{default_metrics_host}:{port}/metrics")
+    return server
+
+
+# A script started with --metrics-dump prints its metrics when it exits
+def dump_at_exit(argv=None):
+    if '--metrics-dump' in (sys.argv if argv is None else argv):
+        atexit.register(lambda: print(registry.render(), end=''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the metrics of a running kiosk script.")
+    parser.add_argument('--metrics-dump', action='store_true', help="print the metrics (the default)")
+    parser.add_argument('--port', type=int, default=default_metrics_port)
+    parser.add_argument('--host', default=default_metrics_host)
+    args = parser.parse_args()
+
+    from urllib.error import URLError
+    from urllib.request import urlopen
+    url = f"http://{args.host}:{args.port}/metrics"
+    try:
+        with urlopen(url, timeout=5) as response:
+            print(response.read().decode(), end='')
+    except (URLError, OSError) as e:
+        print(f"Could not read {url}: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import sqlite3
+
+# Schema changes on top of the shipped elevator_system.db, applied in order.
+# The applied version is kept in PRAGMA user_version, so every database
+# file knows which of these it already has.
+MIGRATIONS = [
+    (1, "Index open receipts by spot", [
+        # validate_receipt / overview join / log_parking_exit only look at
+        # receipts with no exit time, which stay a small part of the table
+        """
+        CREATE INDEX IF NOT EXISTS idx_receipts_open_spot
+        ON Parking_Receipts (Spot_ID, Receipt_ID)
+        WHERE Exit_time IS NULL
+        """,
+    ]),
+    (2, "Index free operational spots", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_spots_free
+        ON Parking_Spots (Level_ID, Spot_ID, Spot_type)
+        WHERE Is_occupied = 0 AND Is_operational = 1
+        """,
+    ]),
+    (3, "Spot event log and snapshots", [
+        # Seq is the rowid, so appending an event writes at the end of the table
+        """
+        CREATE TABLE IF NOT EXISTS Spot_Events (
+            Seq INTEGER PRIMARY KEY,
+            Event_time DATETIME,
+            Kind TEXT,
+            Spot_ID INT,
+            Value INT,
+            Detail TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Spot_Snapshots (
+            Seq INTEGER PRIMARY KEY,
+            Taken_at DATETIME,
+            State BLOB
+        )
+        """,
+    ]),
+    (4, "Index receipts by exit time and payments by receipt", [
+        # Billing recomputes and audits the receipts closed in a day or month
+        """
+        CREATE INDEX IF NOT EXISTS idx_receipts_exit_time
+        ON Parking_Receipts (Exit_time)
+        WHERE Exit_time IS NOT NULL
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_payments_receipt
+        ON Payments (Receipt_ID)
+        """,
+    ]),
+    (5, "Receipt ID nodes claimed by repositories", [
+        # Claim_seq orders the claims, so the next repository to open takes
+        # the node claimed longest ago (see receipt_ids.claim_node)
+        """
+        CREATE TABLE IF NOT EXISTS Receipt_Nodes (
+            Node INTEGER PRIMARY KEY,
+            Claim_seq INT,
+            Holder TEXT,
+            Claimed_at DATETIME
+        )
+        """,
+    ]),
+]
+
+latest_version = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# Applies every migration newer than the database's version. The caller
+# owns the transaction; returns the (version, description) pairs applied.
+def migrate(conn, target=latest_version):
+    version = current_version(conn)
+    applied = []
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        for statement in statements:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {int(number)}")
+        applied.append((number, description))
+    return applied
+
+
+def migrate_file(db_path, target=latest_version):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            applied = migrate(conn, target)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return applied
+    finally:
+        conn.close()
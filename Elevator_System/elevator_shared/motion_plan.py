@@ -0,0 +1,158 @@
+import itertools
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from .transport import TransportError, TransportTimeout
+
+# Step separator inside a PLAN frame
+step_separator = ';'
+
+
+# A park or retrieve sequence compiled into one frame:
+#
+#   PLAN <seq> LOAD_CAR;DWELL 1000;MOVE_VERTICAL_UP 2700;...
+#
+# The controller runs the steps back to back and reports each one as it
+# finishes, so the host does not sit idle between moves:
+#
+#   ACK <seq> <index> <reply text>     step finished
+#   NAK <seq> <index> <reason>         step failed, the rest is skipped
+#   PLAN_DONE <seq>                    all steps finished
+#
+# DWELL <ms> pauses on the controller, WAIT_CAR <ms> waits for the spot
+# sensor to see a car.
+class MotionPlan:
+    def __init__(self, name):
+        self.name = name
+        self.steps = []
+
+    def add(self, command, steps=None):
+        self.steps.append(command if steps is None else f"{command} {steps}")
+        return self
+
+    def dwell(self, milliseconds):
+        return self.add("DWELL", int(milliseconds))
+
+    def wait_car(self, milliseconds):
+        return self.add("WAIT_CAR", int(milliseconds))
+
+    def encode(self, sequence):
+        return f"PLAN {sequence} " + step_separator.join(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def parse_plan(line):
+    _, sequence, body = line.split(' ', 2)
+    return int(sequence), body.split(step_separator)
+
+
+# Progress of a plan that has been sent. step_results[i] resolves to the
+# ACK text of step i; done resolves to the list of all ACK texts, or fails
+# with TransportError on a NAK.
+class PlanHandle:
+    def __init__(self, plan, sequence, on_step=None):
+        self.plan = plan
+        self.sequence = sequence
+        self.on_step = on_step
+        self.step_results = [Future() for _ in plan.steps]
+        self.done = Future()
+
+    def wait(self, timeout=None):
+        try:
+            return self.done.result(timeout)
+        except FutureTimeout:
+            raise TransportTimeout(f"Plan {self.plan.name} #{self.sequence} not done within {timeout} s") from None
+
+    def wait_step(self, index, timeout=None):
+        try:
+            return self.step_results[index].result(timeout)
+        except FutureTimeout:
+            raise TransportTimeout(f"Step {index} of plan {self.plan.name} #{self.sequence} "
+                                   f"not acknowledged within {timeout} s") from None
+
+    def _ack(self, index, text):
+        if 0 <= index < len(self.step_results) and not self.step_results[index].done():
+            self.step_results[index].set_result(text)
+            if self.on_step:
+                self.on_step(index, self.plan.steps[index], text)
+
+    def _nak(self, index, reason):
+        error = TransportError(f"Step {index} ({self.plan.steps[index] if 0 <= index < len(self.plan) else '?'}) failed: {reason}")
+        for future in self.step_results[index:]:
+            if not future.done():
+                future.set_exception(error)
+        if not self.done.done():
+            self.done.set_exception(error)
+
+    def _finish(self):
+        if not self.done.done():
+            self.done.set_result([future.result() for future in self.step_results if future.done()])
+
+
+# Sends plans over a SerialTransport and routes their ACK/NAK/PLAN_DONE
+# lines by sequence number, independently of ordinary command replies
+class PlanClient:
+    def __init__(self, transport):
+        self.transport = transport
+        self._sequence = itertools.count(1)
+        self._plans = {}
+        self._lock = threading.Lock()
+        transport.route("ACK ", self._on_line)
+        transport.route("NAK ", self._on_line)
+        transport.route("PLAN_DONE ", self._on_line)
+
+    def send(self, plan, on_step=None):
+        sequence = self._next_sequence()
+        handle = PlanHandle(plan, sequence, on_step)
+        with self._lock:
+            self._plans[sequence] = handle
+        try:
+            self.transport.send_line(plan.encode(sequence))
+        except TransportError:
+            with self._lock:
+                self._plans.pop(sequence, None)
+            raise
+        return handle
+
+    # 1-65535 as text; binary frames carry one byte, so 1-255 there (the
+    # same range BinaryFraming gives commands). Checked on every send, as
+    # the link can switch to binary after the client is made.
+    def _next_sequence(self):
+        limit = 255 if self.transport.framing.name == "binary" else 65535
+        return (next(self._sequence) - 1) % limit + 1
+
+    # Stops tracking a plan the controller never answered
+    def cancel(self, handle):
+        with self._lock:
+            self._plans.pop(handle.sequence, None)
+
+    def run(self, plan, timeout=None, on_step=None):
+        return self.send(plan, on_step).wait(timeout)
+
+    def _on_line(self, line):
+        parts = line.split(' ', 3)
+        try:
+            sequence = int(parts[1])
+        except (IndexError, ValueError):
+            return
+        with self._lock:
+            handle = self._plans.get(sequence)
+            if handle is not None and parts[0] in ("NAK", "PLAN_DONE"):
+                del self._plans[sequence]
+        if handle is None:
+            return
+        if parts[0] == "PLAN_DONE":
+            handle._finish()
+            return
+        try:
+            index = int(parts[2])
+        except (IndexError, ValueError):
+            return
+        text = parts[3] if len(parts) > 3 else ''
+        if parts[0] == "ACK":
+            handle._ack(index, text)
+        else:
+            handle._nak(index, text)
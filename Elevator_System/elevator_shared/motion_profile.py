@@ -0,0 +1,235 @@
+import functools
+import math
+
+# Ramp values per RAMP line, so the sketch never holds more than a short
+# String of them at once
+ramp_chunk = 32
+# Longest ramp the sketch has room for (unsigned int rampDelays[400])
+max_ramp_steps = 400
+
+
+# Stepper limits, in steps per second (per s^2, per s^3)
+#
+# max_jerk: None for a trapezoidal profile (acceleration switches on and
+#           off at once), or a limit for an S-curve
+# start_speed: speed the motor can start and stop at without ramping
+class MotionLimits:
+    def __init__(self, max_speed, max_accel, max_jerk=None, start_speed=400.0):
+        if not 0 < start_speed < max_speed:
+            raise ValueError(f"start_speed {start_speed} must be between 0 and max_speed {max_speed}")
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.max_jerk = max_jerk
+        self.start_speed = start_speed
+
+    @property
+    def shape(self):
+        return 'trapezoid' if self.max_jerk is None else 's-curve'
+
+
+# Acceleration from v0 to vp as (duration, jerk, starting acceleration)
+# segments: one constant-acceleration segment for a trapezoid; jerk up,
+# (hold,) jerk down for an S-curve, which starts and ends at zero
+# acceleration
+def _ramp_segments(v0, vp, accel, jerk):
+    dv = vp - v0
+    if dv <= 0:
+        return []
+    if jerk is None:
+        return [(dv / accel, 0.0, accel)]
+    if dv >= accel * accel / jerk:
+        tj = accel / jerk
+        return [(tj, jerk, 0.0), (dv / accel - tj, 0.0, accel), (tj, -jerk, accel)]
+    tj = math.sqrt(dv / jerk)
+    return [(tj, jerk, 0.0), (tj, -jerk, jerk * tj)]
+
+
+# Both ramp shapes are point-symmetric in speed, so the distance is the
+# mean of the two speeds times the duration
+def _ramp_distance(v0, vp, limits):
+    duration = sum(segment[0] for segment in _ramp_segments(v0, vp, limits.max_accel, limits.max_jerk))
+    return (v0 + vp) / 2 * duration
+
+
+# Speed reached by ramping up over distance steps (at most max_speed)
+def _speed_after(distance, limits):
+    low, high = limits.start_speed, limits.max_speed
+    if _ramp_distance(low, high, limits) <= distance:
+        return high
+    for _ in range(60):
+        middle = (low + high) / 2
+        if _ramp_distance(limits.start_speed, middle, limits) <= distance:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+# Highest speed a move of steps can reach and still ramp back down, with
+# the ramps ending on whole steps (an odd move cruises its middle step)
+def peak_speed(steps, limits):
+    return _speed_after(steps // 2, limits)
+
+
+# Ideal (unrounded) times, from the start of the ramp, at which each whole
+# step of an acceleration from start_speed to vp is reached
+def ramp_step_times(vp, limits):
+    v0 = limits.start_speed
+    times = []
+    t0, s0, a0 = 0.0, 0.0, 0.0
+    v = v0
+    step = 1
+    for duration, jerk, a0 in _ramp_segments(v0, vp, limits.max_accel, limits.max_jerk):
+        def position(tau, s0=s0, v=v, a0=a0, jerk=jerk):
+            return s0 + v * tau + a0 * tau * tau / 2 + jerk * tau ** 3 / 6
+        end = position(duration)
+        # A ramp planned to end on a whole step may fall short by rounding
+        while step <= end + 1e-9:
+            low, high = 0.0, duration
+            for _ in range(50):
+                middle = (low + high) / 2
+                if position(middle) < step:
+                    low = middle
+                else:
+                    high = middle
+            times.append(t0 + high)
+            step += 1
+        t0 += duration
+        s0 = end
+        v += a0 * duration + jerk * duration * duration / 2
+    return times
+
+
+# A move as the controller runs it. ramp holds the half-periods in us
+# (the delayMicroseconds() on each side of a step pulse) of the first
+# steps; deceleration uses the same table backwards, and the steps in
+# between run at the last entry:
+#
+#   half-period of step s = ramp[min(s, steps - 1 - s, len(ramp) - 1)]
+#
+# ideal holds the unrounded step intervals (seconds) the ramp was made from
+class MotionProfile:
+    def __init__(self, steps, ramp, limits, ideal):
+        self.steps = steps
+        self.ramp = ramp
+        self.limits = limits
+        self.ideal = ideal
+
+    @property
+    def duration_s(self):
+        return move_duration(self.ramp, self.steps)
+
+    # Half-periods of every step, in order
+    def half_periods_us(self):
+        last = len(self.ramp) - 1
+        return [self.ramp[min(s, self.steps - 1 - s, last)] for s in range(self.steps)]
+
+    # Unrounded step intervals of every step, in order
+    def ideal_intervals(self):
+        last = len(self.ramp) - 1
+        return [self.ideal[min(s, self.steps - 1 - s, last)] for s in range(self.steps)]
+
+    # Whether a controller holding loaded (the last ramp sent) can run this
+    # move without being sent the ramp again
+    def runs_on(self, loaded):
+        if loaded is None or tuple(loaded[:len(self.ramp)]) != self.ramp:
+            return False
+        return len(loaded) == len(self.ramp) or self.steps <= 2 * len(self.ramp)
+
+    def ramp_commands(self):
+        return ramp_commands(self.ramp)
+
+
+def move_duration(ramp, steps):
+    steps = abs(steps)
+    if steps == 0:
+        return 0.0
+    last = len(ramp) - 1
+    half = steps // 2
+    if half < last:
+        total = 2 * sum(ramp[:half]) + (steps % 2) * ramp[half]
+    else:
+        total = 2 * sum(ramp[:last]) + (steps - 2 * last) * ramp[last]
+    return 2 * total / 1e6
+
+
+# Step intervals of the ramp to vp, ending with the cruise interval, and
+# the half-periods for them rounded up so no step is faster than planned
+def _ramp_table(vp, limits):
+    times = ramp_step_times(vp, limits)
+    intervals = [b - a for a, b in zip([0.0] + times, times)] + [1.0 / vp]
+    return intervals, [math.ceil(interval / 2 * 1e6) for interval in intervals]
+
+
+_full_ramps = {}
+
+
+# Plans a move of steps (either direction; the sign goes in the command)
+def plan_move(steps, limits):
+    steps = abs(steps)
+    key = (limits.max_speed, limits.max_accel, limits.max_jerk, limits.start_speed)
+    if key not in _full_ramps:
+        # Cruise at the speed reached on the last whole step of the ramp, so
+        # the ramp does not end with a jump to max_speed part way into a step
+        whole = math.floor(_ramp_distance(limits.start_speed, limits.max_speed, limits) + 1e-9)
+        ideal, table = _ramp_table(_speed_after(whole, limits), limits)
+        if len(table) > max_ramp_steps:
+            raise ValueError(f"A ramp to {limits.max_speed} steps/s takes {len(table)} steps, "
+                             f"more than the controller's {max_ramp_steps}; lower the speed or raise the acceleration")
+        _full_ramps[key] = (ideal, tuple(table))
+    ideal, table = _full_ramps[key]
+    if limits.max_jerk is None or steps >= 2 * (len(table) - 1):
+        # A trapezoid that cannot reach full speed is the full ramp cut short
+        return MotionProfile(steps, table, limits, ideal)
+    # An S-curve that cannot reach full speed needs its own ramp, which
+    # ends at zero acceleration half way
+    ideal, table = _ramp_table(peak_speed(steps, limits), limits)
+    length = max(1, steps // 2 + 1)
+    return MotionProfile(steps, tuple(table[:length]), limits, ideal[:length])
+
+
+# Move times kept for the distinct (steps, limits) pairs seen last; a
+# garage has a few hundred distances, a sweep of limits many more
+move_time_cache_size = 4096
+
+
+@functools.lru_cache(maxsize=move_time_cache_size)
+def _move_time(steps, max_speed, max_accel, max_jerk, start_speed):
+    return plan_move(steps, MotionLimits(max_speed, max_accel, max_jerk, start_speed)).duration_s
+
+
+# Seconds a move of steps takes on the controller (what the simulator and
+# dispatcher use); with limits=None, fixed half-periods of step_delay_us
+def move_time(steps, limits=None, step_delay_us=500):
+    steps = abs(int(steps))
+    if limits is None:
+        return steps * 2 * step_delay_us / 1e6
+    return _move_time(steps, limits.max_speed, limits.max_accel, limits.max_jerk, limits.start_speed)
+
+
+# Lines that load a ramp into the sketch: "RAMP <first index> d,d,..."
+def ramp_commands(ramp):
+    return [f"RAMP {start} " + ",".join(str(d) for d in ramp[start:start + ramp_chunk])
+            for start in range(0, len(ramp), ramp_chunk)]
+
+
+def profile_move_command(steps):
+    return f"MOVE_VERTICAL_PROFILE {steps}"
+
+
+# Largest speed, acceleration and jerk in a sequence of step intervals
+# (seconds), by finite differences between step midpoints
+def measured_limits(intervals):
+    speeds, times = [], []
+    t = 0.0
+    for interval in intervals:
+        speeds.append(1.0 / interval)
+        times.append(t + interval / 2)
+        t += interval
+    accels, accel_times = [], []
+    for n in range(1, len(speeds)):
+        accels.append((speeds[n] - speeds[n - 1]) / (times[n] - times[n - 1]))
+        accel_times.append((times[n] + times[n - 1]) / 2)
+    jerks = [(accels[n] - accels[n - 1]) / (accel_times[n] - accel_times[n - 1]) for n in range(1, len(accels))]
+    return (max(speeds, default=0.0), max((abs(a) for a in accels), default=0.0),
+            max((abs(j) for j in jerks), default=0.0))
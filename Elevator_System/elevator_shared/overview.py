@@ -0,0 +1,141 @@
+import threading
+
+from .event_log import occupied_flag, read_events
+
+overview_header = f"{'Level':<8}{'Spot_ID':<10}{'Side':<10}{'Occupied':<12}{'Receipt_ID':<15}"
+
+
+def format_row(level_id, spot_id, spot_type, is_occupied, receipt_id):
+    return (f"{level_id:<8}{spot_id:<10}{spot_type:<10}{'Yes' if is_occupied else 'No':<12}"
+            f"{receipt_id if receipt_id else 'N/A':<15}")
+
+
+# The parking overview (level, spot, side, occupied, open receipt) kept in
+# memory. It is read from the database once; after that refresh() applies
+# the spot events logged since (by any process), so bringing it up to date
+# costs the number of changes, not the number of spots or receipts.
+# Changed spots are collected until take_changes() / render_changes()
+# hands them out, and per-level occupancy is counted as events arrive.
+class ParkingOverview:
+    def __init__(self, repo):
+        self.repo = repo
+        self._lock = threading.Lock()
+        self._spots = {}    # Spot_ID -> [Level_ID, Spot_type, Is_occupied, Receipt_ID]
+        self._levels = {}   # Level_ID -> [occupied, total]
+        self._occupied = 0
+        self._dirty = set()
+        self._order = None  # Spot_IDs in display order, rebuilt when spots are added
+        self.seq, rows = repo.parking_overview_at()
+        for level_id, spot_id, spot_type, is_occupied, receipt_id in rows:
+            self._add_spot(spot_id, level_id, spot_type, bool(is_occupied), receipt_id)
+
+    # Applies the events logged since the last refresh; returns how many
+    def refresh(self):
+        with self._lock:
+            self.repo.event_log.flush()
+            with self.repo.pool.read() as conn:
+                events = read_events(conn, self.seq).fetchall()
+            for seq, _, kind, spot_id, value, detail in events:
+                self._apply(kind, spot_id, value, detail)
+                self.seq = seq
+            return len(events)
+
+    def _apply(self, kind, spot_id, value, detail):
+        if kind == "reset":
+            # clear_all_parking_spots also closes every open receipt
+            for spot_id, spot in self._spots.items():
+                if spot[2] or spot[3]:
+                    self._set(spot_id, False, None)
+            return
+        spot = self._spots.get(spot_id)
+        if spot is None:
+            # A spot added since the overview was loaded
+            details = self.repo.get_spot(spot_id)
+            if details is None:
+                return
+            self._add_spot(spot_id, details[0], details[1], False, None)
+            spot = self._spots[spot_id]
+        if kind == "park":
+            self._set(spot_id, True, detail or self.repo.open_receipt(spot_id))
+        elif kind == "retrieve":
+            self._set(spot_id, False, None)
+        elif kind == "sensor":
+            self._set(spot_id, bool(value), spot[3])
+        elif kind == "spot":
+            self._set(spot_id, bool(value & occupied_flag), spot[3])
+
+    def _add_spot(self, spot_id, level_id, spot_type, is_occupied, receipt_id):
+        self._spots[spot_id] = [level_id, spot_type, is_occupied, receipt_id]
+        counts = self._levels.setdefault(level_id, [0, 0])
+        counts[0] += is_occupied
+        counts[1] += 1
+        self._occupied += is_occupied
+        self._order = None
+
+    def _set(self, spot_id, is_occupied, receipt_id):
+        spot = self._spots[spot_id]
+        if spot[2] == is_occupied and spot[3] == receipt_id:
+            return
+        if spot[2] != is_occupied:
+            change = 1 if is_occupied else -1
+            self._levels[spot[0]][0] += change
+            self._occupied += change
+        spot[2] = is_occupied
+        spot[3] = receipt_id
+        self._dirty.add(spot_id)
+
+    def _row(self, spot_id):
+        level_id, spot_type, is_occupied, receipt_id = self._spots[spot_id]
+        return level_id, spot_id, spot_type, is_occupied, receipt_id
+
+    # (occupied, total) per Level_ID
+    def level_counts(self):
+        with self._lock:
+            return {level_id: tuple(counts) for level_id, counts in self._levels.items()}
+
+    # (occupied, total) over the whole garage
+    def totals(self):
+        with self._lock:
+            return self._occupied, len(self._spots)
+
+    # Every row, in the order parking_overview() returns them
+    def rows(self):
+        with self._lock:
+            if self._order is None:
+                self._order = sorted(self._spots, key=lambda spot_id: (self._spots[spot_id][0], spot_id))
+            return [self._row(spot_id) for spot_id in self._order]
+
+    # Rows changed since the last call, in display order
+    def take_changes(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [self._row(spot_id) for spot_id in dirty]
+        rows.sort(key=lambda row: (row[0], row[1]))
+        return rows
+
+    def render(self):
+        lines = ["Parking Overview:", overview_header, "-" * 55]
+        lines.extend(format_row(*row) for row in self.rows())
+        lines.append(self._summary(None))
+        return "\n".join(lines)
+
+    # Only the rows that changed and the occupancy of their levels, or ""
+    # when nothing changed
+    def render_changes(self):
+        rows = self.take_changes()
+        if not rows:
+            return ""
+        lines = ["Parking Overview changes:", overview_header]
+        lines.extend(format_row(*row) for row in rows)
+        lines.append(self._summary(sorted({row[0] for row in rows})))
+        return "\n".join(lines)
+
+    def _summary(self, levels):
+        occupied, total = self.totals()
+        text = f"Occupied: {occupied}/{total} spots"
+        if levels:
+            with self._lock:
+                counts = [(level_id, *self._levels[level_id]) for level_id in levels]
+            text += " (" + ", ".join(f"level {level_id}: {occupied}/{total}"
+                                     for level_id, occupied, total in counts) + ")"
+        return text
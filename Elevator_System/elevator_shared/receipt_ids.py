@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+
+# Crockford base32: no I, L, O or U, so a receipt read off a screen and
+# typed back in has nothing to confuse. The digits are in ASCII order, so
+# fixed-width IDs sort the same as the numbers they encode.
+alphabet = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_values = {symbol: value for value, symbol in enumerate(alphabet)}
+_values.update({symbol.lower(): value for symbol, value in _values.items()})
+_values.update({'O': 0, 'o': 0, 'I': 1, 'i': 1, 'L': 1, 'l': 1})
+
+prefix = "R"
+
+# Payload bits, most significant first: seconds since receipt_epoch, the
+# issuing node, then a counter within the second. 50 bits = 10 symbols.
+seconds_bits = 30      # 34 years from the epoch
+node_bits = 5          # 32 kiosks / processes
+counter_bits = 15      # 32768 receipts per second per node
+receipt_epoch = 1704067200  # 2024-01-01 00:00:00 UTC
+
+payload_length = (seconds_bits + node_bits + counter_bits) // 5
+receipt_id_length = len(prefix) + payload_length + 1
+
+# The counter is the last three symbols; everything before it is fixed
+# for a given second and node
+_counter_symbols = counter_bits // 5
+_head_symbols = payload_length - _counter_symbols
+
+
+def encode(value, length):
+    symbols = []
+    for _ in range(length):
+        symbols.append(alphabet[value & 31])
+        value >>= 5
+    return "".join(reversed(symbols))
+
+
+# Luhn mod 32 over the payload: catches every single wrong symbol and
+# every swap of two neighbours except 0 with Z
+def _luhn_terms(symbols, rightmost_doubled):
+    total = 0
+    double = rightmost_doubled
+    for symbol in reversed(symbols):
+        value = _values[symbol]
+        if double:
+            value *= 2
+            value = value // 32 + value % 32
+        total += value
+        double = not double
+    return total
+
+
+def check_symbol(payload):
+    return alphabet[-_luhn_terms(payload, True) % 32]
+
+
+# Counter suffix -> (symbols, Luhn terms), built once
+_counter_table = None
+_counter_table_lock = threading.Lock()
+
+
+def _counter_suffixes():
+    global _counter_table
+    if _counter_table is None:
+        with _counter_table_lock:
+            if _counter_table is None:
+                table = []
+                for counter in range(1 << counter_bits):
+                    symbols = encode(counter, _counter_symbols)
+                    table.append((symbols, _luhn_terms(symbols, True)))
+                _counter_table = table
+    return _counter_table
+
+
+# Issues receipt IDs like "R0KQ3ZM000B7": prefix, ten payload symbols,
+# check symbol. IDs from one generator are strictly increasing, so new
+# receipts go to the right-hand end of the Parking_Receipts primary key
+# instead of landing on a random leaf.
+#
+# No database access: uniqueness comes from the node number, which must
+# differ between processes writing to the same database. ParkingRepository
+# claims one from the database (claim_node); without one the process ID is
+# used, which two processes can share modulo 32. The counter runs ahead
+# into the next second rather than wrapping, and a clock stepping back is
+# ignored.
+class ReceiptIdGenerator:
+    def __init__(self, node=None, clock=time.time):
+        if node is None:
+            node = os.getpid()
+        self.node = node % (1 << node_bits)
+        self.clock = clock
+        self._suffixes = None
+        self._lock = threading.Lock()
+        self._second = -1
+        self._counter = 0
+        self._head = None
+        self._head_terms = 0
+
+    def __call__(self):
+        with self._lock:
+            second = int(self.clock()) - receipt_epoch
+            if second > self._second:
+                self._second = second
+                self._counter = 0
+                self._new_head()
+            elif self._counter == 1 << counter_bits:
+                self._second += 1
+                self._counter = 0
+                self._new_head()
+            counter = self._counter
+            self._counter += 1
+            head, head_terms = self._head, self._head_terms
+        suffixes = self._suffixes
+        if suffixes is None:
+            suffixes = self._suffixes = _counter_suffixes()
+        symbols, terms = suffixes[counter]
+        return f"{head}{symbols}{alphabet[-(head_terms + terms) % 32]}"
+
+    def _new_head(self):
+        value = (self._second << node_bits) | self.node
+        head = encode(value, _head_symbols)
+        self._head = prefix + head
+        # The rightmost head symbol sits _counter_symbols places from the end
+        self._head_terms = _luhn_terms(head, _counter_symbols % 2 == 0)
+
+
+# Claims a node for a generator writing to the database on conn, in the
+# caller's write transaction: one never claimed, then one released, then
+# the one claimed longest ago. Up to 32 open repositories therefore hold
+# distinct nodes; one that dies without releasing its node only sends it
+# to the back of the rotation.
+def claim_node(conn, holder, claimed_at):
+    claims = dict(conn.execute("SELECT Node, Claim_seq FROM Receipt_Nodes").fetchall())
+    node = min(range(1 << node_bits), key=lambda n: (claims.get(n, -1), n))
+    conn.execute("""
+        INSERT OR REPLACE INTO Receipt_Nodes (Node, Claim_seq, Holder, Claimed_at)
+        VALUES (?, ?, ?, ?)
+    """, (node, max(claims.values(), default=0) + 1, holder, claimed_at))
+    return node
+
+
+# Hands a node back for the next repository to claim first, unless it has
+# since gone round to another holder
+def release_node(conn, node, holder):
+    conn.execute("UPDATE Receipt_Nodes SET Claim_seq = 0, Holder = NULL WHERE Node = ? AND Holder = ?",
+                 (node, holder))
+
+
+# What a customer typed at the kiosk, in the stored form: upper case, no
+# spaces or dashes, O/I/L read as 0/1. Returns None for something shaped
+# like a generated ID whose check symbol does not match (a typo), and
+# anything else (older "R1234" receipts) stripped but otherwise unchanged.
+def normalize_receipt_id(text):
+    text = text.strip()
+    compact = text.replace("-", "").replace(" ", "")
+    if len(compact) != receipt_id_length or compact[0].upper() != prefix:
+        return text
+    try:
+        body = "".join(alphabet[_values[symbol]] for symbol in compact[1:])
+    except KeyError:
+        return text
+    payload, check = body[:-1], body[-1]
+    if check_symbol(payload) != check:
+        return None
+    return prefix + body
+
+
+# Groups of four for printing on a receipt: "R0KQ-3ZM0-00B7"
+def format_receipt_id(receipt_id):
+    if len(receipt_id) != receipt_id_length:
+        return receipt_id
+    return "-".join(receipt_id[n:n + 4] for n in range(0, len(receipt_id), 4))
+
+
+# Issue time of a generated ID (seconds since 1970), or None
+def receipt_time(receipt_id):
+    receipt_id = normalize_receipt_id(receipt_id)
+    if not receipt_id or len(receipt_id) != receipt_id_length:
+        return None
+    value = 0
+    for symbol in receipt_id[1:1 + _head_symbols]:
+        value = value * 32 + _values[symbol]
+    return (value >> node_bits) + receipt_epoch
+
+
+# Shared by everything in the process that does not bring its own
+next_receipt_id = ReceiptIdGenerator()
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Flush when this many sensors have something to write...
+default_max_batch = 1000
+# ...or when the oldest unwritten reading is this many seconds old
+default_max_delay_s = 0.5
+# An unchanged status is still written this often, to keep Last_checked fresh
+default_touch_interval_s = 30.0
+
+
+def sensor_is_occupied(status):
+    return 1 if status == "Occupied" else 0
+
+
+# Buffers spot sensor readings and writes them in batches through
+# ParkingRepository.apply_sensor_readings(), one transaction per flush
+# instead of one commit per reading.
+#
+# Readings are coalesced per (sensor, spot): only the newest one waiting
+# for a flush is kept, and a reading that repeats the last written status
+# is dropped unless touch_interval_s has passed since it was written.
+# A background thread flushes on whichever comes first of max_batch pending
+# sensors or max_delay_s since the oldest pending reading.
+#
+# on_flush(rows, spot_changes): called after each written batch with the
+# number of sensor rows and the (is_occupied, Spot_ID) changes it made
+class SensorIngestor:
+    def __init__(self, repo, max_batch=default_max_batch, max_delay_s=default_max_delay_s,
+                 touch_interval_s=default_touch_interval_s, on_flush=None):
+        self.repo = repo
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self.touch_interval_s = touch_interval_s
+        self.on_flush = on_flush
+        self.readings = 0
+        self.coalesced = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self._pending = {}
+        self._oldest = None
+        self._written = {}
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._flush_loop, name="sensor-ingest", daemon=True)
+        self._thread.start()
+
+    def submit(self, sensor_id, spot_id, status, checked_at=None):
+        checked_at = checked_at if checked_at is not None else time.time()
+        key = (sensor_id, spot_id)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sensor ingestor closed")
+            self.readings += 1
+            if key in self._pending:
+                self.coalesced += 1
+            else:
+                written = self._written.get(key)
+                if written and written[0] == status and checked_at - written[1] < self.touch_interval_s:
+                    self.coalesced += 1
+                    return
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                    self._lock.notify()
+            self._pending[key] = (status, checked_at)
+            if len(self._pending) >= self.max_batch:
+                self._lock.notify()
+
+    # Writes everything pending now; returns the number of rows written
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._oldest = None
+            if not batch:
+                return 0
+            spot_changes = []
+            sensor_rows = []
+            for (sensor_id, spot_id), (status, checked_at) in batch.items():
+                written = self._written.get((sensor_id, spot_id))
+                if written is None or written[0] != status:
+                    spot_changes.append((sensor_is_occupied(status), spot_id))
+                checked_text = datetime.fromtimestamp(checked_at).strftime("%Y-%m-%d %H:%M:%S")
+                sensor_rows.append((sensor_id, spot_id, status, checked_text))
+            try:
+                self.repo.apply_sensor_readings(spot_changes, sensor_rows)
+            except sqlite3.Error as e:
+                print(f"Error writing sensor readings: {e}")
+                self._requeue(batch)
+                return 0
+            for key, (status, checked_at) in batch.items():
+                self._written[key] = (status, checked_at)
+            self.rows_written += len(sensor_rows)
+            self.flushes += 1
+        if self.on_flush:
+            self.on_flush(len(sensor_rows), spot_changes)
+        return len(sensor_rows)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        self._thread.join()
+        self.flush()
+
+    # Puts a failed batch back, unless newer readings arrived meanwhile
+    def _requeue(self, batch):
+        with self._lock:
+            for key, reading in batch.items():
+                self._pending.setdefault(key, reading)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if len(self._pending) >= self.max_batch:
+                        break
+                    if self._oldest is None:
+                        self._lock.wait()
+                        continue
+                    remaining = self._oldest + self.max_delay_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
@@ -0,0 +1,336 @@
+import argparse
+import heapq
+import itertools
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from .db import ParkingRepository, create_database
+from .dispatcher import Dispatcher, Request, policies
+from .motion_profile import MotionLimits, move_time
+from .topology import GarageTopology
+
+# Physical defaults, matching the 6-motor scripts and sketches
+level_height_cm = 20      # Height between levels in cm
+cm_to_steps = 10          # Conversion factor from cm to steps
+horizontal_steps = 1000   # Steps to slide a platform between spot and shaft
+step_delay_us = 500       # delayMicroseconds() on each half of a step pulse
+loading_time_s = 1.0      # Time to load or unload a car at ground level
+
+
+# Nearest-rank percentile: the smallest value with at least fraction of
+# the values at or below it (the tolerance keeps 0.07 * 100 from rounding
+# up past 7)
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered), math.ceil(fraction * len(ordered) - 1e-9)) - 1)
+    return ordered[rank]
+
+
+# Travel-time model of the garage. In the 6-motor garage every operation
+# brings the spot's platform from its level down to the ground and back:
+# slide into the shaft, travel down, load/unload, travel up, slide back.
+#
+# lift_cars: model a multi-shaft garage instead, where each shaft has a
+#            lift car that goes to the pickup level, takes the vehicle on
+#            or off a platform and carries it to the drop-off level. Then
+#            where a car was left matters, which is what the dispatch
+#            policies compete on.
+# motion: motion_profile.MotionLimits to time moves along acceleration
+#         ramps, or None for fixed step_delay_us half-periods
+# topology: topology.GarageTopology giving the levels, spots and step
+#           distances instead of the arguments before step_delay_us
+class GarageModel:
+    def __init__(self, levels=6, spots_per_level=2, level_height_cm=level_height_cm,
+                 cm_to_steps=cm_to_steps, horizontal_steps=horizontal_steps,
+                 step_delay_us=step_delay_us, loading_time_s=loading_time_s, lift_cars=False, motion=None,
+                 topology=None):
+        if topology is not None:
+            levels = topology.levels
+            spots_per_level = topology.spots_per_level
+            level_height_cm = topology.level_height_cm
+            cm_to_steps = topology.cm_to_steps
+            horizontal_steps = topology.horizontal_steps
+        self.levels = levels
+        self.spots_per_level = spots_per_level
+        self.level_height_cm = level_height_cm
+        self.cm_to_steps = cm_to_steps
+        self.horizontal_steps = horizontal_steps
+        self.topology = topology
+        self.step_delay_us = step_delay_us
+        self.loading_time_s = loading_time_s
+        self.lift_cars = lift_cars
+        self.motion = motion
+
+    @property
+    def seconds_per_step(self):
+        # One step is a HIGH and a LOW half-period
+        return 2 * self.step_delay_us / 1e6
+
+    def vertical_steps(self, from_level, to_level):
+        if self.topology is not None:
+            return abs(self.topology.level_steps[to_level] - self.topology.level_steps[from_level])
+        return int(abs(to_level - from_level) * self.level_height_cm * self.cm_to_steps)
+
+    def travel_time(self, from_level, to_level):
+        return move_time(self.vertical_steps(from_level, to_level), self.motion, self.step_delay_us)
+
+    def slide_time(self):
+        return move_time(self.horizontal_steps, self.motion, self.step_delay_us)
+
+    def service_time(self, level_id):
+        slide = self.slide_time()
+        return 2 * slide + 2 * self.travel_time(0, level_id) + self.loading_time_s
+
+    # Seconds for an elevator left at from_level to serve a request
+    def trip_time(self, from_level, request):
+        if request.kind == 'move':
+            return self.travel_time(from_level, request.dropoff_level)
+        if not self.lift_cars:
+            return self.service_time(request.spot[1])
+        slide = self.slide_time()
+        if request.via_level is not None:
+            travel = self.travel_time(from_level, request.via_level) + self.travel_time(request.via_level, request.pickup_level)
+        else:
+            travel = self.travel_time(from_level, request.pickup_level)
+        travel += self.travel_time(request.pickup_level, request.dropoff_level)
+        return travel + 2 * slide + self.loading_time_s
+
+    # Rows for Parking_Spots, numbered like populate_parking_spots()
+    def parking_spots(self):
+        if self.topology is not None:
+            return self.topology.parking_spots()
+        sides = ['left', 'right'] if self.spots_per_level == 2 else [f"bay{n}" for n in range(self.spots_per_level)]
+        rows = []
+        for level in range(1, self.levels + 1):
+            for n, side in enumerate(sides):
+                spot_id = (level - 1) * self.spots_per_level + n + 1
+                rows.append((spot_id, level, side, False, True, 200 + spot_id))
+        return rows
+
+
+# Arrival streams yield (arrival_time_s, stay_s) in time order
+def poisson_arrivals(rate_per_hour, mean_stay_hours, duration_s, rng):
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate_per_hour / 3600.0)
+        if t >= duration_s:
+            return
+        yield t, rng.expovariate(1.0 / (mean_stay_hours * 3600.0))
+
+
+# Replays Entry_time/Exit_time pairs from a Parking_Receipts table, shifted
+# so the first entry is at t=0. Open receipts stay parked until the end.
+def trace_arrivals(receipts_db):
+    conn = sqlite3.connect(receipts_db)
+    try:
+        rows = conn.execute("""
+            SELECT Entry_time, Exit_time FROM Parking_Receipts
+            WHERE Entry_time IS NOT NULL
+            ORDER BY Entry_time
+        """).fetchall()
+    finally:
+        conn.close()
+    start = None
+    for entry_text, exit_text in rows:
+        try:
+            entry = datetime.fromisoformat(str(entry_text))
+            exit = datetime.fromisoformat(str(exit_text)) if exit_text else None
+        except ValueError:
+            continue
+        if start is None:
+            start = entry
+        stay = (exit - entry).total_seconds() if exit else float('inf')
+        yield (entry - start).total_seconds(), max(0.0, stay)
+
+
+class SimulationReport:
+    def __init__(self, duration_s, cpu_s, requests, rejected, elevators):
+        self.duration_s = duration_s
+        self.cpu_s = cpu_s
+        self.rejected = rejected
+        self.parks = [r for r in requests if r.kind == 'park']
+        self.retrieves = [r for r in requests if r.kind == 'retrieve']
+        self.utilization = [e.busy_time / duration_s if duration_s else 0.0 for e in elevators]
+        self.waits = [r.start - r.arrival for r in self.parks + self.retrieves]
+
+    @property
+    def mean_wait(self):
+        return sum(self.waits) / len(self.waits) if self.waits else 0.0
+
+    @property
+    def requests_per_hour(self):
+        return len(self.waits) / self.duration_s * 3600 if self.duration_s else 0.0
+
+    def summary(self):
+        lines = [
+            f"Simulated {self.duration_s / 86400:.2f} days in {self.cpu_s:.2f} s of CPU "
+            f"({self.duration_s / max(self.cpu_s, 1e-9):,.0f}x real time)",
+            f"Parks: {len(self.parks)}  Retrieves: {len(self.retrieves)}  Turned away (full): {self.rejected}",
+            f"Throughput: {self.requests_per_hour:.1f} requests/hour  Mean wait: {self.mean_wait:.2f} s",
+            "Elevator utilization: " + ", ".join(f"{u:.1%}" for u in self.utilization),
+            f"{'':<18}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}",
+        ]
+        rows = (
+            ("queue wait (s)", self.waits),
+            ("park latency (s)", [r.finish - r.arrival for r in self.parks]),
+            ("retrieve lat. (s)", [r.finish - r.arrival for r in self.retrieves]),
+        )
+        for name, values in rows:
+            lines.append(f"{name:<18}{percentile(values, 0.50):>10.2f}{percentile(values, 0.95):>10.2f}"
+                         f"{percentile(values, 0.99):>10.2f}{max(values, default=0.0):>10.2f}")
+        return "\n".join(lines)
+
+
+# Discrete-event simulation of the garage. Parks and retrieves go through
+# ParkingRepository.park()/retrieve(), so spot allocation is exactly what
+# the running system would do; as at the kiosk, the spot is claimed when
+# the car arrives and the receipt is closed when the driver asks for it.
+# Requests are queued on a Dispatcher with the given policy (see
+# dispatcher.policies) and home (where idle elevators wait); only the
+# motion is replaced by the travel time model.
+class GarageSimulation:
+    def __init__(self, model, db_path, elevators=1, policy='fcfs', home=None):
+        self.model = model
+        self.repo = ParkingRepository(db_path, readers=1, receipt_id_factory=self._next_receipt_id)
+        self.repo.populate_parking_spots(model.parking_spots())
+        self.dispatcher = Dispatcher(model, elevators, policy, self._serve, clock=lambda: self.now, home=home)
+        self.elevators = self.dispatcher.elevators
+        self.now = 0.0
+        self.requests = []
+        self.occupancy = [0] * (model.levels + 1)   # parked cars per Level_ID
+        self.rejected = 0
+        self._events = []
+        self._sequence = itertools.count()
+        self._receipts = itertools.count(1)
+
+    def _next_receipt_id(self):
+        return f"S{next(self._receipts)}"
+
+    def schedule(self, t, action, *args):
+        heapq.heappush(self._events, (t, next(self._sequence), action, args))
+
+    def close(self):
+        self.repo.close()
+
+    def run(self, arrivals, until=None):
+        cpu_start = time.process_time()
+        arrivals = iter(arrivals)
+        self._schedule_next_arrival(arrivals)
+        while self._events:
+            t, _, action, args = heapq.heappop(self._events)
+            if until is not None and t > until:
+                break
+            self.now = t
+            action(*args)
+        duration = until if until is not None else self.now
+        return SimulationReport(duration, time.process_time() - cpu_start,
+                                self.requests, self.rejected, self.elevators)
+
+    def _schedule_next_arrival(self, arrivals):
+        for arrival, stay in arrivals:
+            self.schedule(arrival, self._arrive, arrival, stay, arrivals)
+            return
+
+    def _arrive(self, arrival, stay, arrivals):
+        self._schedule_next_arrival(arrivals)
+        self.submit(Request('park', arrival, stay=stay))
+
+    def submit(self, request):
+        if request.kind == 'park':
+            result = self.repo.park()
+            if result is None:
+                self.rejected += 1
+                return
+            request.spot = result[:3]
+            request.receipt_id = result[3]
+            self.occupancy[request.spot[1]] += 1
+        else:
+            self.repo.retrieve(request.receipt_id)
+            self.occupancy[request.spot[1]] -= 1
+        self.dispatcher.submit(request, on_done=self._finish)
+
+    @property
+    def queue(self):
+        return self.dispatcher.queue
+
+    def _serve(self, elevator, request, done):
+        self.schedule(self.now + self.model.trip_time(request.from_level, request), done)
+
+    def _finish(self, request):
+        self.requests.append(request)
+        if request.kind == 'park' and request.stay != float('inf'):
+            retrieve = Request('retrieve', None, receipt_id=request.receipt_id, spot=request.spot)
+            self.schedule(self.now + request.stay, self._depart, retrieve)
+
+    def _depart(self, request):
+        request.arrival = self.now
+        self.submit(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless discrete-event simulation of the parking garage.")
+    parser.add_argument('--days', type=float, default=7.0)
+    parser.add_argument('--arrivals-per-hour', type=float, default=20.0)
+    parser.add_argument('--mean-stay-hours', type=float, default=3.0)
+    parser.add_argument('--trace', help="replay Entry_time/Exit_time from this database instead of Poisson arrivals")
+    parser.add_argument('--levels', type=int, default=6)
+    parser.add_argument('--spots-per-level', type=int, default=2)
+    parser.add_argument('--topology', help="take the levels, spots and step distances from this topology file")
+    parser.add_argument('--elevators', type=int, default=1)
+    parser.add_argument('--policy', choices=sorted(policies), default='fcfs',
+                        help="how queued requests are handed to elevators")
+    parser.add_argument('--compare', action='store_true',
+                        help="run every policy on the same arrivals and print wait and throughput side by side")
+    parser.add_argument('--lift-cars', action='store_true',
+                        help="model one lift car per shaft carrying vehicles, instead of the 6-motor platforms")
+    parser.add_argument('--step-delay-us', type=int, default=step_delay_us)
+    parser.add_argument('--accel', type=float,
+                        help="time moves on acceleration ramps with this limit (steps/s^2) instead of fixed steps")
+    parser.add_argument('--max-speed', type=float, default=2500, help="with --accel, top speed in steps/s")
+    parser.add_argument('--jerk', type=float, help="with --accel, jerk limit in steps/s^3 for S-curves")
+    parser.add_argument('--start-speed', type=float, default=1000, help="with --accel, speed moves start at")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    motion = MotionLimits(args.max_speed, args.accel, args.jerk, args.start_speed) if args.accel else None
+    topology = GarageTopology.load(args.topology) if args.topology else None
+    model = GarageModel(levels=args.levels, spots_per_level=args.spots_per_level,
+                        step_delay_us=args.step_delay_us, lift_cars=args.lift_cars, motion=motion,
+                        topology=topology)
+    duration = args.days * 86400
+
+    def simulate(policy):
+        if args.trace:
+            arrivals = trace_arrivals(args.trace)
+        else:
+            arrivals = poisson_arrivals(args.arrivals_per_hour, args.mean_stay_hours, duration, random.Random(args.seed))
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'simulation.db')
+            create_database(db_path)
+            simulation = GarageSimulation(model, db_path, elevators=args.elevators, policy=policy)
+            try:
+                return simulation.run(arrivals, until=None if args.trace else duration)
+            finally:
+                simulation.close()
+
+    if not args.compare:
+        print(simulate(args.policy).summary())
+        return
+    print(f"{args.elevators} elevators, {model.levels} levels, "
+          f"{'lift cars' if args.lift_cars else '6-motor platforms'}")
+    print(f"{'policy':<14}{'requests/h':>12}{'mean wait s':>13}{'p95 wait s':>12}{'max wait s':>12}{'turned away':>13}")
+    for policy in policies:
+        report = simulate(policy)
+        print(f"{policy:<14}{report.requests_per_hour:>12.1f}{report.mean_wait:>13.2f}"
+              f"{percentile(report.waits, 0.95):>12.2f}{max(report.waits, default=0.0):>12.2f}{report.rejected:>13}")
+
+
+if __name__ == "__main__":
+    main()
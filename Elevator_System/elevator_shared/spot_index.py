@@ -0,0 +1,115 @@
+import heapq
+import threading
+
+
+# In-memory index of free, operational spots answering "closest free spot"
+# without scanning Parking_Spots. Each spot type has its own heap (plus one
+# heap across all types) ordered by distance from the entry level, then
+# Spot_ID, the same order find_available_platform() uses. Occupied spots
+# are dropped lazily when they reach the top of a heap.
+class FreeSpotIndex:
+    def __init__(self, entry_level=1):
+        self.entry_level = entry_level
+        self._lock = threading.Lock()
+        self._spots = {}       # Spot_ID -> (Level_ID, Spot_type)
+        self._out_of_service = set()  # Spot_IDs that are not operational
+        self._free = set()     # Spot_IDs that are free and operational
+        self._heaps = {None: []}
+        self._queued = {None: set()}  # Spot_IDs with a live entry per heap
+
+    @classmethod
+    def load(cls, conn, entry_level=1):
+        index = cls(entry_level)
+        rows = conn.execute("""
+            SELECT Spot_ID, Level_ID, Spot_type, Is_occupied, Is_operational
+            FROM Parking_Spots
+        """).fetchall()
+        index.reset(rows)
+        return index
+
+    def reset(self, rows):
+        with self._lock:
+            self._spots = {}
+            self._out_of_service = set()
+            self._free = set()
+            self._heaps = {None: []}
+            self._queued = {None: set()}
+            for spot_id, level_id, spot_type, is_occupied, is_operational in rows:
+                self._spots[spot_id] = (level_id, spot_type)
+                self._heaps.setdefault(spot_type, [])
+                self._queued.setdefault(spot_type, set())
+                if not is_operational:
+                    self._out_of_service.add(spot_id)
+                elif not is_occupied:
+                    self._free.add(spot_id)
+            # Build every heap in one pass instead of pushing spot by spot
+            for spot_id in self._free:
+                level_id, spot_type = self._spots[spot_id]
+                entry = (abs(level_id - self.entry_level), spot_id)
+                for key in (None, spot_type):
+                    self._heaps[key].append(entry)
+                    self._queued[key].add(spot_id)
+            for heap in self._heaps.values():
+                heapq.heapify(heap)
+
+    def __len__(self):
+        return len(self._free)
+
+    def __contains__(self, spot_id):
+        return spot_id in self._free
+
+    def add_spot(self, spot_id, level_id, spot_type, is_free=True, is_operational=True):
+        with self._lock:
+            self._spots[spot_id] = (level_id, spot_type)
+            self._heaps.setdefault(spot_type, [])
+            self._queued.setdefault(spot_type, set())
+            if is_operational:
+                self._out_of_service.discard(spot_id)
+            else:
+                self._out_of_service.add(spot_id)
+            self._set_free(spot_id, is_free)
+
+    def set_free(self, spot_id, is_free):
+        with self._lock:
+            if spot_id in self._spots:
+                self._set_free(spot_id, is_free)
+
+    # Out-of-service spots keep their occupancy but are never handed out
+    def set_operational(self, spot_id, is_operational, is_free):
+        with self._lock:
+            if spot_id not in self._spots:
+                return
+            if is_operational:
+                self._out_of_service.discard(spot_id)
+            else:
+                self._out_of_service.add(spot_id)
+            self._set_free(spot_id, is_free)
+
+    def _set_free(self, spot_id, is_free):
+        if not is_free or spot_id in self._out_of_service:
+            self._free.discard(spot_id)
+            return
+        self._free.add(spot_id)
+        level_id, spot_type = self._spots[spot_id]
+        entry = (abs(level_id - self.entry_level), spot_id)
+        for key in (None, spot_type):
+            if spot_id not in self._queued[key]:
+                heapq.heappush(self._heaps[key], entry)
+                self._queued[key].add(spot_id)
+
+    # Returns (Spot_ID, Level_ID, Spot_type) for the closest free spot,
+    # optionally restricted to one spot type, or None
+    def nearest(self, spot_type=None):
+        with self._lock:
+            heap = self._heaps.get(spot_type)
+            if not heap:
+                return None
+            queued = self._queued[spot_type]
+            while heap:
+                spot_id = heap[0][1]
+                if spot_id in self._free:
+                    level_id, spot_type = self._spots[spot_id]
+                    return spot_id, level_id, spot_type
+                heapq.heappop(heap)
+                queued.discard(spot_id)
+            return None
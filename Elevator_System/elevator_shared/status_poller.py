@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+# Runs a status check (e.g. CHECK_SPOT over serial) on a worker thread, so
+# a slow or silent controller never holds up the Tk thread. Each result is
+# put on a queue.Queue as (checked_at, status, seconds the check took);
+# the GUI takes the newest with latest(), scheduled with root.after(), which
+# never blocks.
+#
+# The poll interval adapts: fast_interval_s while a move is in progress
+# (between set_moving(True) and set_moving(False)), for settle_s after one
+# and right after the status changes, then doubling back up to
+# idle_interval_s while the status stays the same.
+class StatusPoller:
+    def __init__(self, check, fast_interval_s=0.25, idle_interval_s=3.0, settle_s=2.0, clock=time.monotonic):
+        self.check = check
+        self.fast_interval_s = fast_interval_s
+        self.idle_interval_s = idle_interval_s
+        self.settle_s = settle_s
+        self.clock = clock
+        self.results = queue.Queue()
+        self.interval = fast_interval_s
+        self.polls = 0
+        self.poll_seconds = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._moving = 0
+        self._settle_until = 0.0
+        self._last_status = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="status-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # Called around a park or retrieve; either way the next poll runs now
+    def set_moving(self, moving):
+        with self._lock:
+            if moving:
+                self._moving += 1
+            else:
+                self._moving = max(0, self._moving - 1)
+                self._settle_until = self.clock() + self.settle_s
+        self._wake.set()
+
+    def poll_now(self):
+        self._wake.set()
+
+    # Newest (checked_at, status, seconds) since the last call, or None
+    def latest(self):
+        result = None
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before the check, so a set_moving() during it polls again
+            self._wake.clear()
+            start = self.clock()
+            try:
+                status = self.check()
+            except Exception as e:
+                print(f"Status poll failed: {e}")
+                status = None
+            took = self.clock() - start
+            self.polls += 1
+            self.poll_seconds.append(took)
+            self.results.put((start, status, took))
+            self._wake.wait(self._next_interval(status))
+
+    def _next_interval(self, status):
+        with self._lock:
+            if self._moving or self.clock() < self._settle_until or status != self._last_status:
+                self.interval = self.fast_interval_s
+            else:
+                self.interval = min(self.interval * 2, self.idle_interval_s)
+            self._last_status = status
+            return self.interval
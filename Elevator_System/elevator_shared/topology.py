@@ -0,0 +1,138 @@
+import json
+import os
+
+default_topology_path = os.path.join(os.path.dirname(__file__), 'garage_6x2.json')
+
+sides = ('left', 'right')
+
+# Settings a topology file may give, with their defaults (the 6-motor
+# garage the scripts were written for)
+defaults = {
+    'levels': 6,
+    'shafts': 1,
+    'spots_per_side': 1,        # spots on each side of a shaft, per level
+    'first_sensor_id': 201,
+    'level_height_cm': 20,      # height between levels
+    'level_offsets_cm': {},     # {"level": cm} added to that level's height
+    'cm_to_steps': 10,          # vertical steps per cm
+    'horizontal_steps': 1000,   # steps to slide a platform one spot width
+    'cm_to_px': 5,
+    'canvas_width': 1920,
+    'canvas_height': 800,
+}
+
+
+# The garage layout, compiled from a topology file into lookup tables
+# indexed by Spot_ID (index 0 unused), so moving to a spot costs a list
+# index instead of a Parking_Spots query and the coordinate arithmetic:
+#
+#   spot_level[id], spot_side[id]   Level_ID and 'left' / 'right'
+#   spot_shaft[id], spot_slot[id]   shaft number, and spots out from it (0 next to it)
+#   spot_steps[id]                  (vertical steps from the ground, horizontal command, horizontal steps)
+#   spot_canvas[id]                 resting (x, y) of the spot's platform on the canvas
+#   level_steps[level]              vertical steps from the ground to a level (0 for the ground)
+#
+# Spots are numbered level by level; within a level, shaft by shaft, the
+# left spots from the shaft outwards, then the right ones. With the
+# defaults that is Spot_ID 2*level-1 left and 2*level right, sensors from
+# 201, as populate_parking_spots() always did.
+class GarageTopology:
+    def __init__(self, **settings):
+        unknown = set(settings) - set(defaults)
+        if unknown:
+            raise ValueError(f"Unknown topology settings: {', '.join(sorted(unknown))}")
+        config = dict(defaults, **settings)
+        for name in ('levels', 'shafts', 'spots_per_side'):
+            if not isinstance(config[name], int) or config[name] < 1:
+                raise ValueError(f"{name} must be a whole number of at least 1, not {config[name]!r}")
+        self.levels = config['levels']
+        self.shafts = config['shafts']
+        self.spots_per_side = config['spots_per_side']
+        self.first_sensor_id = config['first_sensor_id']
+        self.level_height_cm = config['level_height_cm']
+        self.level_offsets_cm = {int(level): offset for level, offset in config['level_offsets_cm'].items()}
+        self.cm_to_steps = config['cm_to_steps']
+        self.horizontal_steps = config['horizontal_steps']
+        self.cm_to_px = config['cm_to_px']
+        self.canvas_width = config['canvas_width']
+        self.canvas_height = config['canvas_height']
+        self._compile()
+
+    @classmethod
+    def load(cls, path=default_topology_path):
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    @property
+    def spots_per_level(self):
+        return self.shafts * 2 * self.spots_per_side
+
+    @property
+    def spot_count(self):
+        return self.levels * self.spots_per_level
+
+    # Platforms are as wide as a level is high
+    @property
+    def platform_width_px(self):
+        return self.level_height_cm * self.cm_to_px
+
+    @property
+    def platform_height_px(self):
+        return self.platform_width_px / 4
+
+    @property
+    def ground_y(self):
+        return self.canvas_height - self.platform_height_px
+
+    def level_height(self, level):
+        return level * self.level_height_cm + self.level_offsets_cm.get(level, 0)
+
+    # Canvas x of each shaft's centre, side by side around the middle
+    def shaft_x(self, shaft):
+        pitch = (2 * self.spots_per_side + 1) * self.platform_width_px
+        return self.canvas_width // 2 + (shaft - (self.shafts - 1) / 2) * pitch
+
+    def _compile(self):
+        count = self.spot_count + 1
+        self.level_steps = [int(self.level_height(level) * self.cm_to_steps) for level in range(self.levels + 1)]
+        self.level_steps[0] = 0
+        self.spot_level = [None] * count
+        self.spot_side = [None] * count
+        self.spot_shaft = [None] * count
+        self.spot_slot = [None] * count
+        self.spot_steps = [None] * count
+        self.spot_canvas = [None] * count
+        width = self.platform_width_px
+        spot_id = 0
+        for level in range(1, self.levels + 1):
+            y = self.canvas_height - self.level_height(level) * self.cm_to_px
+            for shaft in range(self.shafts):
+                center = self.shaft_x(shaft)
+                for side in sides:
+                    direction = -1 if side == 'left' else 1
+                    command = "MOVE_HORIZONTAL_LEFT" if side == 'left' else "MOVE_HORIZONTAL_RIGHT"
+                    for slot in range(self.spots_per_side):
+                        spot_id += 1
+                        self.spot_level[spot_id] = level
+                        self.spot_side[spot_id] = side
+                        self.spot_shaft[spot_id] = shaft
+                        self.spot_slot[spot_id] = slot
+                        self.spot_steps[spot_id] = (self.level_steps[level], command,
+                                                    (slot + 1) * self.horizontal_steps)
+                        self.spot_canvas[spot_id] = (center + direction * (slot + 1) * width, y)
+
+    def __contains__(self, spot_id):
+        return isinstance(spot_id, int) and 0 < spot_id < len(self.spot_level)
+
+    # (Level_ID, Spot_type) like ParkingRepository.get_spot(), or None
+    def spot(self, spot_id):
+        if spot_id not in self:
+            return None
+        return self.spot_level[spot_id], self.spot_side[spot_id]
+
+    # Rows for Parking_Spots: (Spot_ID, Level_ID, Spot_type, Is_occupied,
+    # Is_operational, Sensor_ID)
+    def parking_spots(self):
+        return [(spot_id, self.spot_level[spot_id], self.spot_side[spot_id], False, True,
+                 self.first_sensor_id + spot_id - 1)
+                for spot_id in range(1, self.spot_count + 1)]
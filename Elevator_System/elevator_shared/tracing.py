@@ -0,0 +1,159 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Spans kept; the oldest are dropped once the buffer is full
+default_capacity = 100000
+default_trace_path = 'elevator_trace.json'
+
+
+# Opt-in timeline of nested spans (a park, its commands, the SQLite
+# transactions inside them), exported as Chrome trace JSON for
+# chrome://tracing or ui.perfetto.dev. Spans are complete events ("ph":
+# "X"); the viewer nests them by time on each thread, so nothing is kept
+# per thread while a span is open.
+#
+# Disabled, span() hands back one shared no-op context, so the calls can
+# stay in the code paths. Enabled, a finished span is one append to a
+# deque of capacity entries, which is thread-safe and never grows.
+class Tracer:
+    def __init__(self, capacity=default_capacity, clock=time.perf_counter):
+        self.clock = clock
+        self.enabled = False
+        self.events = deque(maxlen=capacity)
+        self.epoch = clock()
+        self._thread_names = {}
+
+    def enable(self, capacity=None):
+        if capacity is not None and capacity != self.events.maxlen:
+            self.events = deque(self.events, maxlen=capacity)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+
+    # with tracer.span("CHECK_SPOT", cat="serial"): ... Extra keyword
+    # arguments are shown with the span in the viewer.
+    def span(self, name, cat="elevator", **args):
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name, cat, args)
+
+    # A span timed elsewhere, from clock() readings (e.g. a plan step
+    # from one ACK to the next)
+    def add_span(self, name, started, ended, cat="elevator", **args):
+        if self.enabled:
+            self._record(name, cat, started, ended - started, args)
+
+    # A point in time, such as "Car in Spot"
+    def instant(self, name, cat="elevator", **args):
+        if self.enabled:
+            self._record(name, cat, self.clock(), None, args)
+
+    def _record(self, name, cat, started, duration, args):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._thread_names:
+            self._thread_names[tid] = thread.name
+        self.events.append((name, cat, tid, started, duration, args))
+
+    # The buffered spans as a Chrome trace (dict ready for json.dump)
+    def trace(self):
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": os.path.basename(sys.argv[0]) or "python"}}]
+        for tid, name in list(self._thread_names.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        for name, cat, tid, started, duration, args in list(self.events):
+            event = {"name": name, "cat": cat, "pid": pid, "tid": tid,
+                     "ts": round((started - self.epoch) * 1e6, 3)}
+            if duration is None:
+                event["ph"] = "i"
+                event["s"] = "t"
+            else:
+                event["ph"] = "X"
+                event["dur"] = round(duration * 1e6, 3)
+            if args:
+                event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                                 for key, value in args.items()}
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path=default_trace_path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f)
+        return path
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'started', 'duration')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.duration = None
+
+    def __enter__(self):
+        self.started = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = self.tracer.clock() - self.started
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self.name, self.cat, self.started, self.duration, self.args)
+        return False
+
+    # Adds arguments learned inside the span (a reply, a receipt ID)
+    def set(self, **args):
+        self.args.update(args)
+
+
+class _NullSpan:
+    __slots__ = ()
+    duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_null_span = _NullSpan()
+
+# The process-wide tracer the shared modules and scripts record into
+tracer = Tracer()
+
+
+# A script started with --trace [FILE] records spans and writes them to
+# FILE (default elevator_trace.json) when it exits
+def trace_from_argv(argv=None):
+    argv = sys.argv if argv is None else argv
+    if '--trace' not in argv:
+        return None
+    index = argv.index('--trace')
+    path = argv[index + 1] if index + 1 < len(argv) and not argv[index + 1].startswith('-') else default_trace_path
+    tracer.enable()
+    atexit.register(lambda: print(f"Trace written to {tracer.export(path)}"))
+    return path
+
+
+# Writes the buffer next to path as <name>_<label>_<time>.json, for a
+# single slow cycle worth a look; returns the file written
+def export_snapshot(label, path=default_trace_path):
+    root, ext = os.path.splitext(path)
+    return tracer.export(f"{root}_{label}_{time.strftime('%Y%m%d_%H%M%S')}{ext or '.json'}")
@@ -0,0 +1,245 @@
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from .binary_protocol import BinaryFraming, TextFraming, negotiate_command, negotiate_reply
+from .metrics import command_failed, command_timed_out, record_command
+from .tracing import tracer
+
+# Seconds a command may take before its caller gives up
+default_timeout = 30.0
+
+
+class TransportError(Exception):
+    pass
+
+
+class TransportTimeout(TransportError):
+    pass
+
+
+class _Pending:
+    def __init__(self, command):
+        self.command = command
+        self.future = Future()
+        self.future.pending = self
+        self.lines = []
+        self.seq = None
+        self.on_reply = None
+
+
+# Line-framed link to an Arduino. A reader thread splits incoming bytes into
+# lines and hands them to the oldest command still waiting, so callers
+# block on a future (with a timeout) instead of spinning on in_waiting.
+#
+# done_lines: reply lines that end a command ({"DONE"} in New_Elevator_System);
+#            None means every command gets exactly one reply line.
+# event_lines: lines the controller sends on its own (e.g. "Car in Spot").
+#            They never complete a command and are read with wait_event().
+# Lines starting with a prefix passed to route() go to that callback instead
+# (see motion_plan.PlanClient).
+#
+# Bytes on the wire are framed by a TextFraming until negotiate_binary()
+# switches to the compact BinaryFraming (see binary_protocol.py). Binary
+# replies carry the command's sequence number, so a late reply to a
+# command that already timed out is dropped instead of being matched to
+# the next one.
+class SerialTransport:
+    def __init__(self, port, done_lines=None, event_lines=(), poll_interval=0.1):
+        self.port = port
+        self.done_lines = set(done_lines) if done_lines is not None else None
+        self.event_lines = set(event_lines)
+        self.poll_interval = poll_interval
+        self.events = queue.Queue()
+        self._pending = deque()
+        self._routes = []
+        self.framing = TextFraming()
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._closed = threading.Event()
+        self._error = None
+        self._reader = threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)
+        self._reader.start()
+
+    # False once the port has failed or been closed; a timeout or NAK
+    # leaves the link alive
+    @property
+    def alive(self):
+        return self._error is None and not self._closed.is_set()
+
+    # Sends a command and returns a Future resolving to its reply lines
+    def submit(self, command):
+        return self._submit(command)
+
+    def _submit(self, command, on_reply=None):
+        pending = _Pending(command)
+        pending.on_reply = on_reply
+        with self._lock:
+            if self._error is not None:
+                raise TransportError(f"Serial link failed: {self._error}")
+            if self._closed.is_set():
+                raise TransportError("Serial link closed")
+            try:
+                data, pending.seq = self.framing.encode(command)
+            except ValueError as e:
+                raise TransportError(f"Cannot encode {command!r}: {e}") from e
+            self._pending.append(pending)
+            try:
+                self.port.write(data)
+            except Exception as e:
+                self._pending.remove(pending)
+                raise TransportError(f"Error sending command: {e}") from e
+        return pending.future
+
+    # Writes a line that is answered through a route() callback rather than
+    # as a command reply
+    def send_line(self, line):
+        with self._lock:
+            if self._error is not None:
+                raise TransportError(f"Serial link failed: {self._error}")
+            if self._closed.is_set():
+                raise TransportError("Serial link closed")
+            try:
+                self.port.write(self.framing.encode(line)[0])
+            except ValueError as e:
+                raise TransportError(f"Cannot encode {line!r}: {e}") from e
+            except Exception as e:
+                raise TransportError(f"Error sending command: {e}") from e
+
+    # Asks the controller for the binary protocol and switches to it if the
+    # controller agrees. Returns False (staying on text) if it does not.
+    def negotiate_binary(self, timeout=2.0):
+        if self.framing.name == "binary":
+            return True
+        future = self._submit(negotiate_command, on_reply=self._switch_framing)
+        try:
+            lines = self._wait(future, negotiate_command, timeout)
+        except TransportTimeout:
+            return False
+        return bool(lines) and lines[0] == negotiate_reply
+
+    # Runs on the reader thread as soon as the negotiation reply is complete,
+    # so the very next byte is already parsed as a frame
+    def _switch_framing(self, lines):
+        if lines and lines[0] == negotiate_reply:
+            self.framing = BinaryFraming()
+
+    # Hands every incoming line starting with prefix to callback (called on
+    # the reader thread)
+    def route(self, prefix, callback):
+        self._routes.append((prefix, callback))
+
+    # Sends a command and waits for its reply lines; the round trip is
+    # recorded in the serial metrics (see metrics.py) and traced
+    def request(self, command, timeout=default_timeout):
+        started = time.perf_counter()
+        try:
+            with tracer.span(command, cat="serial"):
+                lines = self._wait(self.submit(command), command, timeout)
+        except TransportTimeout:
+            command_timed_out(command)
+            raise
+        except TransportError:
+            command_failed()
+            raise
+        record_command(command, time.perf_counter() - started)
+        return lines
+
+    def _wait(self, future, command, timeout):
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            # Assume the controller dropped the command and free its slot,
+            # otherwise every later reply would be matched one command late
+            with self._lock:
+                if future.pending in self._pending:
+                    self._pending.remove(future.pending)
+            raise TransportTimeout(f"No reply to {command!r} within {timeout} s") from None
+
+    # Waits for an unsolicited line such as "Car in Spot"
+    def wait_event(self, line=None, timeout=None):
+        while True:
+            try:
+                received = self.events.get(timeout=timeout)
+            except queue.Empty:
+                raise TransportTimeout(f"No {line or 'event'!r} within {timeout} s") from None
+            if line is None or received == line:
+                return received
+
+    def close(self):
+        self._closed.set()
+        self._reader.join(timeout=1.0)
+        self._fail_pending(TransportError("Serial link closed"))
+        try:
+            self.port.close()
+        except Exception:
+            pass
+
+    def _read_chunk(self):
+        if hasattr(self.port, 'in_waiting'):
+            # pyserial: read() returns after its own timeout if nothing arrives
+            return self.port.read(self.port.in_waiting or 1)
+        ready, _, _ = select.select([self.port], [], [], self.poll_interval)
+        if not ready:
+            return b''
+        return os.read(self.port.fileno(), 4096)
+
+    def _read_loop(self):
+        while not self._closed.is_set():
+            try:
+                chunk = self._read_chunk()
+            except Exception as e:
+                if not self._closed.is_set():
+                    self._error = e
+                    self._fail_pending(TransportError(f"Serial link failed: {e}"))
+                return
+            if not chunk:
+                continue
+            self._buffer.extend(chunk)
+            while True:
+                # Re-read every time: a reply may have switched the framing
+                lines = self.framing.next_lines(self._buffer)
+                if lines is None:
+                    break
+                for line, seq in lines:
+                    self._dispatch(line, seq)
+
+    def _dispatch(self, line, seq=None):
+        for prefix, callback in self._routes:
+            if line.startswith(prefix):
+                callback(line)
+                return
+        if line in self.event_lines:
+            self.events.put(line)
+            return
+        with self._lock:
+            if not self._pending:
+                # Nothing waiting: treat it as unsolicited
+                self.events.put(line)
+                return
+            if seq is None:
+                pending = self._pending[0]
+            else:
+                pending = next((p for p in self._pending if p.seq == seq), None)
+                if pending is None:
+                    # Reply to a command that already timed out
+                    return
+            pending.lines.append(line)
+            if self.done_lines is not None and line not in self.done_lines:
+                return
+            self._pending.remove(pending)
+        if pending.on_reply:
+            pending.on_reply(pending.lines)
+        pending.future.set_result(pending.lines)
+
+    def _fail_pending(self, error):
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+        for item in pending:
+            if not item.future.done():
+                item.future.set_exception(error)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The shared modules live in Elevator_System/elevator_shared and the
+# database scripts in Database/data_management_scripts; neither is installed
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+for folder in (os.path.join(root, 'Elevator_System'), os.path.join(root, 'Database', 'data_management_scripts')):
+    if folder not in sys.path:
+        sys.path.append(folder)
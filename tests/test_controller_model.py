@@ -0,0 +1,121 @@
+# MockArduino on a virtual clock, checked against what
+# New_Elevator_System.ino and Final_System_Vertical_Only.ino answer
+
+import pytest
+
+from elevator_shared.animation import VirtualClock
+from elevator_shared.controller_model import MockArduino
+from elevator_shared.motion_plan import MotionPlan, PlanHandle
+from elevator_shared.transport import TransportTimeout
+
+
+def send(arduino, command):
+    arduino.write((command + "\n").encode())
+    lines = []
+    while True:
+        line = arduino.readline()
+        if not line:
+            return lines
+        lines.append(line.decode().rstrip("\r\n"))
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+
+def test_plan_acknowledges_every_step_then_finishes(clock):
+    arduino = MockArduino(clock=clock)
+    plan = MotionPlan("park").add("LOAD_CAR").dwell(1000).add("MOVE_VERTICAL_UP", 2700).add("CHECK_SPOT")
+    assert send(arduino, plan.encode(5)) == [
+        "ACK 5 0 Car Loaded",
+        "ACK 5 1 Dwelled",
+        "ACK 5 2",
+        "ACK 5 3 Spot Free",
+        "PLAN_DONE 5",
+    ]
+    # 1 s dwell, then 2700 steps of two 1000 us half-periods
+    assert clock() == pytest.approx(1.0 + 2700 * 2 * 1000 / 1e6)
+    assert arduino.vertical_position == 2700
+
+
+def test_unknown_step_is_refused_and_ends_the_plan(clock):
+    arduino = MockArduino(clock=clock)
+    assert send(arduino, "PLAN 6 LOAD_CAR;FLY 3;MOVE_VERTICAL_UP 100") == [
+        "ACK 6 0 Car Loaded",
+        "NAK 6 1 Unknown command",
+    ]
+    assert arduino.vertical_position == 0
+    assert clock() == 0.0
+
+
+@pytest.mark.parametrize("frame, replies", [
+    ("PLAN 7", ["NAK 0 0 Bad frame"]),
+    ("PLAN 8 MOVE_VERTICAL_UP", ["NAK 8 0 Unknown command"]),
+    ("PLAN 9 CHECK_SPOT;", ["ACK 9 0 Spot Free", "NAK 9 1 Unknown command"]),
+    ("PLAN 10 DWELL", ["NAK 10 0 Unknown command"]),
+])
+def test_malformed_plan_is_refused(clock, frame, replies):
+    assert send(MockArduino(clock=clock), frame) == replies
+
+
+@pytest.mark.parametrize("command", ["DWELL 500", "WAIT_CAR 1000"])
+def test_plan_only_steps_are_unknown_on_their_own(clock, command):
+    arduino = MockArduino(clock=clock, car_delay_s=0.2)
+    assert send(arduino, command) == ["Unknown command", "DONE"]
+    assert clock() == 0.0
+    assert not arduino.occupied
+
+
+def test_wait_car_sees_the_car_within_its_timeout(clock):
+    arduino = MockArduino(clock=clock, car_delay_s=0.5)
+    assert send(arduino, "PLAN 3 WAIT_CAR 1000") == ["ACK 3 0 Car in Spot", "PLAN_DONE 3"]
+    assert clock() == pytest.approx(0.5)
+    assert send(arduino, "CHECK_SPOT") == ["Spot Occupied", "DONE"]
+
+
+def test_wait_car_times_out(clock):
+    arduino = MockArduino(clock=clock, car_delay_s=3.0)
+    assert send(arduino, "PLAN 4 WAIT_CAR 1000") == ["ACK 4 0 Car not detected", "PLAN_DONE 4"]
+    assert clock() == pytest.approx(1.0)
+    assert send(arduino, "CHECK_SPOT") == ["Spot Free", "DONE"]
+
+
+def test_readline_returns_nothing_when_no_reply_is_waiting(clock):
+    arduino = MockArduino(clock=clock)
+    assert arduino.readline() == b''
+    assert arduino.in_waiting == 0
+    arduino.write(b"LOAD_CAR\n")
+    assert arduino.in_waiting == len("Car Loaded\r\nDONE\r\n")
+
+
+def test_plan_handle_times_out_without_plan_done():
+    handle = PlanHandle(MotionPlan("park").add("LOAD_CAR"), 1)
+    with pytest.raises(TransportTimeout):
+        handle.wait(0.01)
+    with pytest.raises(TransportTimeout):
+        handle.wait_step(0, 0.01)
+
+
+def test_commands_take_their_motor_time(clock):
+    arduino = MockArduino(clock=clock)
+    assert send(arduino, "MOVE_HORIZONTAL_LEFT 500") == ["Left horizontal motor moved left by 500 steps", "DONE"]
+    assert clock() == pytest.approx(500 * 2 * 1000 / 1e6)
+    assert send(arduino, "CHECK_SPOT") == ["Spot Free", "DONE"]
+    assert clock() == pytest.approx(1.0)
+
+
+def test_seeded_occupancy_repeats():
+    answers = []
+    for _ in range(2):
+        arduino = MockArduino(clock=VirtualClock(), seed=3, occupied_probability=0.5)
+        answers.append([send(arduino, "CHECK_SPOT")[0] for _ in range(20)])
+    assert answers[0] == answers[1]
+    assert set(answers[0]) == {"Spot Free", "Spot Occupied"}
+
+
+def test_vertical_sketch_has_no_plans(clock):
+    arduino = MockArduino(clock=clock, sketch='vertical')
+    assert send(arduino, "PLAN 1 CHECK_SPOT") == ["Invalid Command"]
+    assert send(arduino, "MOVE_VERTICAL_UP 400") == ["Movement complete", "Moved Up"]
+    assert clock() == pytest.approx(400 * 2 * 500 / 1e6)
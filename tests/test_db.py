@@ -0,0 +1,25 @@
+# get_repository shares one repository per database file, and hands out a
+# new one once that has been closed.
+
+import os
+
+from elevator_shared.db import ParkingRepository, create_database, get_repository
+
+
+def test_get_repository_reopens_after_close(tmp_path):
+    path = str(tmp_path / "shared.db")
+    create_database(path)
+    repo = get_repository(path)
+    try:
+        assert get_repository(os.path.join(str(tmp_path), ".", "shared.db")) is repo
+    finally:
+        repo.close()
+    reopened = get_repository(path)
+    try:
+        assert reopened is not repo
+        assert reopened.parking_overview() == []
+        # Closing a repository opened directly leaves the shared one alone
+        ParkingRepository(path, readers=1).close()
+        assert get_repository(path) is reopened
+    finally:
+        reopened.close()
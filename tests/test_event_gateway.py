@@ -0,0 +1,64 @@
+# EventGateway batch commits: a batch that hits "database is locked" is
+# written again after a backoff, and one that cannot be written is counted
+# as dropped.
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from elevator_shared import event_gateway
+from elevator_shared.event_gateway import EventGateway, ParkingEvent
+
+
+# Stands in for ParkingRepository, raising the given errors in turn before
+# accepting a batch
+class FlakyRepository:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.written = []
+
+    def apply_parking_events(self, rows):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.written.extend(rows)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(event_gateway, 'commit_backoff_s', 0.0)
+
+
+def commit(repo, events=3):
+    gateway = EventGateway(repo, {}, verbose=False)
+    batch = [ParkingEvent("Parked", spot_id, "bay", 0.0, "2024-09-01 08:00:00") for spot_id in range(1, events + 1)]
+    dropped_before = event_gateway.dropped_events.value
+    asyncio.run(gateway._commit(batch))
+    return gateway, event_gateway.dropped_events.value - dropped_before
+
+
+def test_locked_batch_is_retried():
+    repo = FlakyRepository([sqlite3.OperationalError("database is locked")] * 2)
+    gateway, dropped = commit(repo)
+    assert repo.calls == 3
+    assert [row[1] for row in repo.written] == [1, 2, 3]
+    assert (gateway.events_written, gateway.batches, gateway.retries, gateway.dropped) == (3, 1, 2, 0)
+    assert dropped == 0
+
+
+def test_batch_is_dropped_after_the_last_attempt():
+    repo = FlakyRepository([sqlite3.OperationalError("database is locked")] * event_gateway.commit_attempts)
+    gateway, dropped = commit(repo)
+    assert repo.calls == event_gateway.commit_attempts
+    assert (gateway.events_written, gateway.dropped) == (0, 3)
+    assert dropped == 3
+
+
+def test_integrity_error_is_not_retried():
+    repo = FlakyRepository([sqlite3.IntegrityError("UNIQUE constraint failed")])
+    gateway, dropped = commit(repo)
+    assert repo.calls == 1
+    assert (gateway.events_written, gateway.retries, gateway.dropped) == (0, 0, 3)
+    assert dropped == 3
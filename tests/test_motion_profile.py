@@ -0,0 +1,59 @@
+# Ramps from motion_profile: every step interval of a trapezoid or S-curve
+# stays within the speed, acceleration and jerk limits, the rounded table
+# is never faster than planned, and no table outgrows the sketch's
+# rampDelays[400].
+
+import pytest
+
+from elevator_shared.motion_profile import (MotionLimits, max_ramp_steps, measured_limits, move_time,
+                                            plan_move)
+
+# Finite differences of the exact curve come within this of the limit
+tolerance = 1e-3
+distances = (1, 2, 3, 10, 51, 200, 799, 2000, 4000, 12000)
+limit_sets = {
+    'trapezoid': MotionLimits(max_speed=2500, max_accel=12000, start_speed=1000),
+    's-curve': MotionLimits(max_speed=2500, max_accel=12000, max_jerk=120000, start_speed=1000),
+    'steep s-curve': MotionLimits(max_speed=2000, max_accel=20000, max_jerk=400000),
+}
+
+
+@pytest.mark.parametrize("steps", distances)
+@pytest.mark.parametrize("shape", sorted(limit_sets))
+def test_steps_stay_within_limits(shape, steps):
+    limits = limit_sets[shape]
+    profile = plan_move(steps, limits)
+    speed, accel, jerk = measured_limits(profile.ideal_intervals())
+    assert speed <= limits.max_speed * (1 + tolerance)
+    assert accel <= limits.max_accel * (1 + tolerance)
+    if limits.max_jerk is not None:
+        assert jerk <= limits.max_jerk * (1 + tolerance)
+
+
+@pytest.mark.parametrize("steps", distances)
+@pytest.mark.parametrize("shape", sorted(limit_sets))
+def test_rounded_steps_are_never_faster(shape, steps):
+    profile = plan_move(steps, limit_sets[shape])
+    assert len(profile.half_periods_us()) == steps
+    for half, ideal in zip(profile.half_periods_us(), profile.ideal_intervals()):
+        assert 0 <= 2 * half - ideal * 1e6 < 2
+
+
+@pytest.mark.parametrize("steps", distances)
+@pytest.mark.parametrize("shape", sorted(limit_sets))
+def test_ramp_fits_the_sketch(shape, steps):
+    profile = plan_move(steps, limit_sets[shape])
+    assert 1 <= len(profile.ramp) <= max_ramp_steps
+    assert all(0 < half < 65536 for half in profile.ramp)
+
+
+def test_ramp_too_long_for_the_sketch_is_refused():
+    with pytest.raises(ValueError):
+        plan_move(100, MotionLimits(max_speed=20000, max_accel=1000))
+
+
+def test_move_time_matches_the_plan():
+    limits = limit_sets['s-curve']
+    for steps in distances:
+        assert move_time(-steps, limits) == plan_move(steps, limits).duration_s
+    assert move_time(2000) == 2.0
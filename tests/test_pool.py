@@ -0,0 +1,98 @@
+# Pool stress: kiosk threads park through the writer while reader threads
+# query through the readers, on one repository and on two sharing the file
+# (as two processes would). Every park must land and no connection may see
+# "database is locked".
+
+import sqlite3
+import threading
+
+import pytest
+
+from elevator_shared.db import ParkingRepository, create_database
+
+spots = 1000
+kiosks = 4
+parks_per_kiosk = 150
+reader_threads = 8
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "pool.db")
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, (spot_id - 1) // 2 + 1, 'left' if spot_id % 2 else 'right', 0, 1, 200 + spot_id)
+        for spot_id in range(1, spots + 1)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+# Runs target in a thread, keeping whatever it raises in errors
+def start_thread(target, errors):
+    def guarded():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=guarded)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("repositories", [1, 2])
+def test_parks_and_reads_under_load(db_path, repositories):
+    repos = [ParkingRepository(db_path, readers=4) for _ in range(repositories)]
+    parked = [[] for _ in range(kiosks)]
+    writing = threading.Event()
+    writing.set()
+    errors = []
+
+    def kiosk(n):
+        repo = repos[n % repositories]
+        for _ in range(parks_per_kiosk):
+            parked[n].append(repo.park())
+
+    def reader(n):
+        repo = repos[n % repositories]
+        seen = 0
+        while writing.is_set():
+            occupied = sum(row[3] for row in repo.parking_overview())
+            # Readers only see committed parks, and never lose one
+            assert occupied >= seen
+            seen = occupied
+            for kiosk_parks in parked:
+                if kiosk_parks:
+                    assert repo.validate_receipt(kiosk_parks[-1][3]) is not None
+
+    readers = [start_thread(lambda n=n: reader(n), errors) for n in range(reader_threads)]
+    try:
+        for thread in [start_thread(lambda n=n: kiosk(n), errors) for n in range(kiosks)]:
+            thread.join()
+    finally:
+        writing.clear()
+        for thread in readers:
+            thread.join()
+        for repo in repos:
+            repo.close()
+
+    assert not [e for e in errors if isinstance(e, sqlite3.OperationalError)]
+    assert errors == []
+    receipts = [park for kiosk_parks in parked for park in kiosk_parks]
+    assert None not in receipts
+    assert len(receipts) == kiosks * parks_per_kiosk
+
+    conn = sqlite3.connect(db_path)
+    try:
+        open_receipts = conn.execute(
+            "SELECT Spot_ID, Receipt_ID FROM Parking_Receipts WHERE Exit_time IS NULL").fetchall()
+        occupied = conn.execute("SELECT COUNT(*) FROM Parking_Spots WHERE Is_occupied = 1").fetchone()[0]
+        logged = conn.execute("SELECT COUNT(*) FROM Spot_Events WHERE Kind = 'park'").fetchone()[0]
+    finally:
+        conn.close()
+    assert sorted(receipt_id for _, receipt_id in open_receipts) == sorted(park[3] for park in receipts)
+    assert len({spot_id for spot_id, _ in open_receipts}) == len(receipts)
+    assert occupied == len(receipts)
+    assert logged == len(receipts)
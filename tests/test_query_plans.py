@@ -0,0 +1,47 @@
+# EXPLAIN QUERY PLAN for every query the repository and the scripts issue,
+# on a seeded database: none may read a whole table or sort in a temp
+# B-tree. CheckQueryPlans.py runs the same checks at full size.
+
+import pytest
+
+import CheckQueryPlans as plans
+
+spots = 2000
+receipts = 100000
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path, archive_path, occupied = plans.prepare_database(str(tmp_path_factory.mktemp("plans")), spots, receipts)
+    conn = plans.plan_connection(path, archive_path)
+    yield conn, plans.checked_statements(path, archive_path, occupied)
+    conn.close()
+
+
+@pytest.mark.parametrize("name", plans.checked_step_names())
+def test_no_full_scan_or_temp_sort(database, name):
+    conn, statements = database
+    for step, sql, params in statements:
+        if step == name:
+            details, problems = plans.plan_problems(conn, name, sql, params)
+            assert not problems, f"{sql}\n{' | '.join(details)}"
+
+
+def test_repository_steps_issue_statements(database):
+    _, statements = database
+    traced = {name for name, _, _ in statements}
+    # find_available_platform answers from the in-memory spot index
+    assert set(plans.checked_step_names()) - traced <= {"find_available_platform"}
+
+
+def test_full_scan_is_reported(database):
+    conn, _ = database
+    _, problems = plans.plan_problems(conn, "example", "SELECT * FROM Parking_Receipts WHERE Entry_time = ?",
+                                      ("2024-10-01 08:00:00",))
+    assert problems == ["SCAN Parking_Receipts"]
+
+
+def test_temp_sort_is_reported(database):
+    conn, _ = database
+    _, problems = plans.plan_problems(conn, "example", "SELECT Spot_ID FROM Parking_Spots ORDER BY Sensor_ID")
+    assert any(problem.startswith("USE TEMP B-TREE") for problem in problems)
@@ -0,0 +1,81 @@
+# Receipt ID nodes: every repository open on a database claims its own
+# node in Receipt_Nodes, so processes sharing the file never issue the same
+# ID, and a closed repository's node is the next one handed out.
+
+import sqlite3
+
+import pytest
+
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.receipt_ids import ReceiptIdGenerator, node_bits, normalize_receipt_id
+
+nodes = 1 << node_bits
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "receipts.db")
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, spot_id, 'left', 0, 1, 200 + spot_id) for spot_id in range(1, 11)))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_open_repositories_hold_distinct_nodes(db_path):
+    repos = [ParkingRepository(db_path, readers=1) for _ in range(nodes)]
+    try:
+        assert sorted(repo.receipt_node for repo in repos) == list(range(nodes))
+        assert [repo.receipt_id_factory.node for repo in repos] == [repo.receipt_node for repo in repos]
+        # A 33rd takes the node claimed longest ago
+        extra = ParkingRepository(db_path, readers=1)
+        assert extra.receipt_node == repos[0].receipt_node
+        extra.close()
+    finally:
+        for repo in repos:
+            repo.close()
+
+
+def test_closed_repository_node_is_claimed_next(db_path):
+    repos = [ParkingRepository(db_path, readers=1) for _ in range(nodes)]
+    closed = repos.pop(5)
+    closed.close()
+    repos.append(ParkingRepository(db_path, readers=1))
+    try:
+        assert repos[-1].receipt_node == closed.receipt_node
+        assert len({repo.receipt_node for repo in repos}) == nodes
+    finally:
+        for repo in repos:
+            repo.close()
+
+
+def test_repositories_issue_distinct_ids(db_path):
+    clock = lambda: 1730000000.0
+    repos = [ParkingRepository(db_path, readers=1) for _ in range(2)]
+    for repo in repos:
+        repo.receipt_id_factory.clock = clock
+    try:
+        issued = [repo.receipt_id_factory() for repo in repos for _ in range(100)]
+    finally:
+        for repo in repos:
+            repo.close()
+    assert len(set(issued)) == len(issued)
+    assert all(normalize_receipt_id(receipt_id) == receipt_id for receipt_id in issued)
+
+
+def test_clashing_id_is_redrawn(db_path):
+    clash = ReceiptIdGenerator(node=3, clock=lambda: 1730000000.0)
+    taken = clash()
+    ids = iter([taken, clash()])
+    repo = ParkingRepository(db_path, readers=1, receipt_id_factory=lambda: next(ids))
+    try:
+        with repo.pool.write() as conn:
+            conn.execute("INSERT INTO Parking_Receipts (Receipt_ID, Entry_time, Spot_ID) VALUES (?, ?, ?)",
+                         (taken, "2024-09-01 08:00:00", 1))
+        assert repo.receipt_node is None
+        spot = repo.park()
+        assert spot is not None and spot[3] != taken
+    finally:
+        repo.close()
@@ -0,0 +1,41 @@
+# SensorIngestor reports each written batch with the spots it changed, not
+# just how many, so UpdateSpotStatus can print the right spots.
+
+import sqlite3
+
+import pytest
+
+from elevator_shared.db import ParkingRepository, create_database
+from elevator_shared.sensor_ingest import SensorIngestor
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = str(tmp_path / "sensors.db")
+    create_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Parking_Spots VALUES (?, ?, ?, ?, ?, ?)", (
+        (spot_id, spot_id, 'left', 0, 1, 200 + spot_id) for spot_id in range(1, 5)))
+    conn.commit()
+    conn.close()
+    repo = ParkingRepository(path, readers=1)
+    yield repo
+    repo.close()
+
+
+def test_flush_reports_changed_spots(repo):
+    flushes = []
+    ingestor = SensorIngestor(repo, max_delay_s=60, on_flush=lambda rows, changes: flushes.append((rows, changes)))
+    try:
+        ingestor.submit(1, 2, "Occupied")
+        ingestor.submit(2, 3, "Available")
+        ingestor.flush()
+        # A repeat of the written status is coalesced away; a change is not
+        ingestor.submit(1, 2, "Occupied")
+        ingestor.submit(2, 3, "Occupied")
+        ingestor.flush()
+    finally:
+        ingestor.close()
+    assert flushes[0] == (2, [(1, 2), (0, 3)])
+    assert flushes[1] == (1, [(1, 3)])
+    assert [row[3] for row in repo.parking_overview() if row[0] in (2, 3)] == [1, 1]
@@ -0,0 +1,23 @@
+# Nearest-rank percentiles as the simulator and the benchmarks report them.
+
+import random
+
+import pytest
+
+from elevator_shared.simulator import percentile
+
+
+@pytest.mark.parametrize("p", range(1, 101))
+def test_percentile_of_1_to_100(p):
+    values = list(range(1, 101))
+    random.Random(p).shuffle(values)
+    assert percentile(values, p / 100) == p
+
+
+def test_percentile_edges():
+    assert percentile([], 0.99) == 0.0
+    assert percentile([4.0], 0.5) == 4.0
+    assert percentile([3, 1, 2], 0.0) == 1
+    assert percentile([3, 1, 2], 1.0) == 3
+    assert percentile(list(range(1, 11)), 0.95) == 10
+    assert percentile(list(range(1, 11)), 0.5) == 5